@@ -1,18 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import hashlib
 import json
 
 from app.services.llm_service import OllamaService, get_ollama_service
 from app.services.vector_db_service import MilvusService, get_milvus_service
-from app.services.langgraph_service import get_intelligent_rag_service
+from app.services.intelligent_rag_service import get_intelligent_rag_service
+from app.core.admission import admission, AdmissionRejected, AdmissionTicket
+from app.core.cancellation import is_cancelled
 from app.core.config import settings
+from app.core.metrics import REQUESTS_IN_FLIGHT, COALESCED_REQUESTS
+from app.core.singleflight import SingleFlight, StreamCoalescer
+from app.core.sse import (
+    EventStream, EventStreamResponse, TooManyStreams, event_streams, parse_last_event_id, sse_frames,
+)
+from app.core.timings import StageTimings
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# In-flight identical chat requests, shared between concurrent callers
+chat_flights = SingleFlight()
+chat_stream_flights = StreamCoalescer()
+
 # Pydantic Models
 class Message(BaseModel):
     role: str  # "user" or "assistant"
@@ -22,20 +34,68 @@ class ChatRequest(BaseModel):
     query: str
     context_url: str
     messages: List[Message] = []  # Conversation history
-    model: str = "gpt-oss:20b"  # Selected model
+    model: str = settings.DEFAULT_GENERATION_MODEL  # Selected model
     top_k: int = 3
+    debug_timings: bool = False  # Include a per-stage timing breakdown in the response
 
 class Source(BaseModel):
     url: str
     text: str
     distance: float
+    page_url: Optional[str] = None  # The crawled page within the context, when it differs from url
+
+class TimingBreakdown(BaseModel):
+    routing_ms: Optional[float] = None
+    embedding_ms: Optional[float] = None
+    search_ms: Optional[float] = None
+    prompt_build_ms: Optional[float] = None
+    time_to_first_token_ms: Optional[float] = None
+    generation_ms: Optional[float] = None
+    total_ms: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[Source]
+    timings: Optional[TimingBreakdown] = None
+
+def _acquire_slot(model: str, http_request: Request) -> AdmissionTicket:
+    """
+    Waits for a concurrency slot of the model. Clients are identified by the X-Client-ID
+    header (falling back to the peer address) so the queue can be served fairly.
+    """
+    client_id = http_request.headers.get("X-Client-ID") or (
+        http_request.client.host if http_request.client else "anonymous"
+    )
+    try:
+        return admission.get(model).acquire(client_id)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected chat request for model '{model}' from '{client_id}': {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"message": str(e), "queue_position": e.queue_position, "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after), "X-Queue-Position": str(e.queue_position)},
+        )
+
+def _coalescing_key(request: ChatRequest) -> Optional[str]:
+    """
+    Identical in-flight requests (same model, context, query, top_k and history) share one
+    retrieval and generation. Requests asking for their own timing breakdown are never coalesced.
+    """
+    if not settings.CHAT_COALESCING_ENABLED or request.debug_timings:
+        return None
+    payload = json.dumps(
+        [request.model, request.context_url, request.query, request.top_k,
+         [[msg.role, msg.content] for msg in request.messages]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 @router.post("/chat", response_model=ChatResponse)
-def chat_with_rag(request: ChatRequest):
+def chat_with_rag(request: ChatRequest, http_request: Request):
     """
     Performs intelligent RAG-based chat within a specific context (URL).
     Uses LangGraph to determine whether RAG is needed or if direct answers are sufficient.
@@ -45,73 +105,152 @@ def chat_with_rag(request: ChatRequest):
     if not request.context_url:
         raise HTTPException(status_code=400, detail="A context_url must be provided.")
 
+    timings = StageTimings()
+
+    def run_query() -> Dict[str, Any]:
+        ticket = _acquire_slot(request.model, http_request)
+        try:
+            # Convert messages to dict format for the service
+            conversation_history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+
+            # Use intelligent RAG service with LangGraph
+            intelligent_rag = get_intelligent_rag_service()
+            return intelligent_rag.process_query(
+                query=request.query,
+                context_url=request.context_url,
+                model=request.model,
+                conversation_history=conversation_history,
+                top_k=request.top_k,
+                timings=timings
+            )
+        finally:
+            ticket.release()
+
     try:
-        # Convert messages to dict format for the service
-        conversation_history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        # Use intelligent RAG service with LangGraph (temporarily using old service)
-        intelligent_rag = get_intelligent_rag_service()
-        
-        result = intelligent_rag.process_query(
-            query=request.query,
-            context_url=request.context_url,
-            conversation_history=conversation_history,
-            top_k=request.top_k
-        )
+        with REQUESTS_IN_FLIGHT.labels(endpoint="chat").track_inprogress():
+            key = _coalescing_key(request)
+            if key is None:
+                result = run_query()
+            else:
+                result, shared = chat_flights.do(key, run_query)
+                if shared:
+                    COALESCED_REQUESTS.labels(endpoint="chat").inc()
         
         # Convert sources to Pydantic models
         sources = [Source(**src) for src in result.get("sources", [])]
         
         return ChatResponse(
             answer=result["answer"],
-            sources=sources
+            sources=sources,
+            timings=TimingBreakdown(**timings.as_dict()) if request.debug_timings else None
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during intelligent RAG processing: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to process chat query: {str(e)}")
 
+def _event_stream_response(stream: EventStream, after: int = 0) -> EventStreamResponse:
+    return EventStreamResponse(sse_frames(stream, after), headers={"X-Stream-ID": stream.id})
+
 @router.post("/chat-stream")
-def chat_with_rag_stream(request: ChatRequest):
+def chat_with_rag_stream(request: ChatRequest, http_request: Request):
     """
     Performs intelligent streaming RAG-based chat within a specific context (URL).
     Uses LangGraph to determine whether RAG is needed or if direct answers are sufficient.
+    Identical concurrent requests subscribe to a single generation whose events fan out to all of them.
+
+    The response is a text/event-stream whose event ids are "<stream id>:<sequence>". A client
+    that lost the connection can repeat the request with a Last-Event-ID header to receive the
+    rest of the same answer, as long as it reconnects within SSE_DISCONNECT_GRACE_SECONDS (or
+    SSE_RESUME_TTL_SECONDS after the answer finished).
     """
+    resume = parse_last_event_id(http_request.headers.get("Last-Event-ID"))
+    if resume is not None:
+        stream = event_streams.get(resume[0])
+        if stream is None:
+            raise HTTPException(status_code=404, detail="The stream to resume has expired.")
+        logger.info(f"Resuming stream {stream.id} after event {resume[1]}")
+        return _event_stream_response(stream, after=resume[1])
+
     logger.info(f"Received streaming chat query: '{request.query}' in context '{request.context_url}'")
 
     if not request.context_url:
         raise HTTPException(status_code=400, detail="A context_url must be provided.")
 
-    def generate_stream():
+    timings = StageTimings()
+
+    def rag_events():
+        # Convert messages to dict format for the service
+        conversation_history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+
+        # Use intelligent RAG service with streaming
+        intelligent_rag = get_intelligent_rag_service()
+        return intelligent_rag.process_query_stream(
+            query=request.query,
+            context_url=request.context_url,
+            model=request.model,
+            conversation_history=conversation_history,
+            top_k=request.top_k,
+            timings=timings
+        )
+
+    key = _coalescing_key(request)
+    if key is None:
+        # Admission happens before the response starts so overload is reported as 429/503
+        ticket = _acquire_slot(request.model, http_request)
+        events = None
+        release = ticket.release
+    else:
+        flight, subscription, leader = chat_stream_flights.join(key)
+        if leader:
+            try:
+                ticket = _acquire_slot(request.model, http_request)
+            except HTTPException as e:
+                flight.abort(e)
+                subscription.close()
+                raise
+            # The flight owns the slot: it is released when the shared stream ends
+            flight.start(rag_events(), cleanup=ticket.release)
+        else:
+            COALESCED_REQUESTS.labels(endpoint="chat_stream").inc()
+        events = subscription
+        release = subscription.close
+
+    def stream_events():
+        in_flight = REQUESTS_IN_FLIGHT.labels(endpoint="chat_stream")
+        in_flight.inc()
         try:
-            # Convert messages to dict format for the service
-            conversation_history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-            
-            # Use intelligent RAG service with streaming (temporarily using old service)
-            intelligent_rag = get_intelligent_rag_service()
-            
-            # Stream the response from intelligent RAG service
-            for chunk in intelligent_rag.process_query_stream(
-                query=request.query,
-                context_url=request.context_url,
-                conversation_history=conversation_history,
-                top_k=request.top_k
-            ):
-                yield f"data: {json.dumps(chunk)}\n\n"
-                
-            # End stream
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
-            
-        except Exception as e:
-            logger.error(f"Error during intelligent RAG streaming: {e}", exc_info=True)
-            error_response = {
-                "type": "error",
-                "content": f"Failed to process streaming query: {str(e)}"
-            }
-            yield f"data: {json.dumps(error_response)}\n\n"
-
-    return StreamingResponse(
-        generate_stream(),
-        media_type="text/plain",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
-    )
+            try:
+                # Stream the response from intelligent RAG service
+                yield from (rag_events() if events is None else events)
+
+                if request.debug_timings:
+                    yield {"type": "timings", "timings": timings.as_dict()}
+
+                last_event = {"type": "end"}
+            except Exception as e:
+                if is_cancelled():
+                    logger.info(f"Streaming chat cancelled: {e}")
+                else:
+                    logger.error(f"Error during intelligent RAG streaming: {e}", exc_info=True)
+                last_event = {
+                    "type": "error",
+                    "content": f"Failed to process streaming query: {str(e)}"
+                }
+        finally:
+            # Free the slot before the final event so the client never observes it still held
+            in_flight.dec()
+            release()
+        yield last_event
+
+    # The generation runs on its own thread, detached from this response, so it can be resumed
+    try:
+        stream = event_streams.open(stream_events())
+    except TooManyStreams as e:
+        # stream_events never started, so its cleanup will not run
+        release()
+        logger.warning(f"Rejected streaming chat request: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return _event_stream_response(stream)
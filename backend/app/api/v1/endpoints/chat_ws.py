@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
+
+from app.core.admission import admission, AdmissionRejected
+from app.core.config import settings
+from app.core.metrics import REQUESTS_IN_FLIGHT
+from app.core.sse import TooManyStreams, event_streams
+from app.services.intelligent_rag_service import get_intelligent_rag_service
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+class WebSocketChatMessage(BaseModel):
+    conversation_id: str
+    request_id: Optional[str] = None
+    query: str
+    # Only needed on the first message of a conversation
+    context_url: Optional[str] = None
+    model: Optional[str] = None
+    top_k: int = 3
+
+
+class Conversation:
+    def __init__(self, context_url: str, model: str):
+        self.context_url = context_url
+        self.model = model
+        self.history: List[Dict[str, str]] = []
+        self.active_request: Optional[str] = None
+
+    def record_turn(self, query: str, answer: str):
+        self.history.extend([{"role": "user", "content": query}, {"role": "assistant", "content": answer}])
+        del self.history[:-settings.WS_MAX_HISTORY_MESSAGES]
+
+
+class ChatSession:
+    """
+    One WebSocket connection. Conversations are multiplexed over it: every client
+    message names a conversation, the server keeps each conversation's context,
+    model and history, and several conversations can stream at the same time.
+    Every server message carries the conversation_id and request_id it belongs to.
+    At most WS_MAX_CONVERSATIONS are kept; a new one evicts the least recently used
+    conversation that is not answering.
+    """
+
+    def __init__(self, websocket: WebSocket, client_id: str):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._requests: Dict[str, asyncio.Task] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, payload: Dict[str, Any]):
+        async with self._send_lock:
+            await self.websocket.send_json(payload)
+
+    async def run(self):
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    # A malformed frame must not end the other conversations on this socket
+                    await self.send({"type": "error", "content": "Messages must be JSON objects."})
+                    continue
+                await self._dispatch(message if isinstance(message, dict) else {})
+        except WebSocketDisconnect:
+            logger.info(f"WebSocket client '{self.client_id}' disconnected")
+        finally:
+            for task in list(self._requests.values()):
+                task.cancel()
+
+    async def _dispatch(self, message: Dict[str, Any]):
+        kind = message.get("type")
+        if kind == "chat":
+            await self._start_chat(message)
+        elif kind == "cancel":
+            task = self._requests.get(message.get("request_id"))
+            if task:
+                task.cancel()
+        elif kind == "reset":
+            self.conversations.pop(message.get("conversation_id"), None)
+            await self.send({"type": "reset", "conversation_id": message.get("conversation_id")})
+        elif kind == "ping":
+            await self.send({"type": "pong"})
+        else:
+            await self.send({"type": "error", "content": f"Unknown message type: {kind!r}"})
+
+    async def _start_chat(self, message: Dict[str, Any]):
+        try:
+            chat = WebSocketChatMessage(**message)
+        except ValidationError as e:
+            await self.send({"type": "error", "request_id": message.get("request_id"),
+                             "conversation_id": message.get("conversation_id"),
+                             "content": f"Invalid chat message: {e.errors()}"})
+            return
+        request_id = chat.request_id or uuid.uuid4().hex
+        ids = {"conversation_id": chat.conversation_id, "request_id": request_id}
+
+        conversation = self.conversations.get(chat.conversation_id)
+        if conversation is None:
+            if not chat.context_url:
+                await self.send({**ids, "type": "error", "content": "A context_url must be provided."})
+                return
+            if not self._make_room():
+                await self.send({**ids, "type": "error", "content": "Too many conversations on this connection."})
+                return
+            conversation = Conversation(chat.context_url, chat.model or settings.DEFAULT_GENERATION_MODEL)
+            self.conversations[chat.conversation_id] = conversation
+        else:
+            self.conversations.move_to_end(chat.conversation_id)
+            if chat.context_url:
+                conversation.context_url = chat.context_url
+        if chat.model:
+            conversation.model = chat.model
+
+        if conversation.active_request is not None:
+            await self.send({**ids, "type": "error", "content": "The conversation is still answering a message."})
+            return
+        if request_id in self._requests:
+            await self.send({**ids, "type": "error", "content": "The request_id is already in use."})
+            return
+        if len(self._requests) >= settings.WS_MAX_CONCURRENT_REQUESTS:
+            await self.send({**ids, "type": "error", "content": "Too many concurrent requests on this connection."})
+            return
+
+        conversation.active_request = request_id
+        task = asyncio.create_task(self._answer(conversation, chat.query, chat.top_k, ids))
+        self._requests[request_id] = task
+        task.add_done_callback(lambda _: self._finish(conversation, request_id))
+
+    def _make_room(self) -> bool:
+        """Evicts idle conversations, oldest first, until a new one fits. False if all are answering."""
+        while len(self.conversations) >= settings.WS_MAX_CONVERSATIONS:
+            idle = next((cid for cid, c in self.conversations.items() if c.active_request is None), None)
+            if idle is None:
+                return False
+            del self.conversations[idle]
+        return True
+
+    def _finish(self, conversation: Conversation, request_id: str):
+        self._requests.pop(request_id, None)
+        if conversation.active_request == request_id:
+            conversation.active_request = None
+
+    async def _answer(self, conversation: Conversation, query: str, top_k: int, ids: Dict[str, str]):
+        model = conversation.model
+        try:
+            # Waits on the event loop, so queued messages do not hold threadpool threads
+            ticket = await admission.get(model).acquire_async(self.client_id)
+        except (ValueError, RuntimeError) as e:
+            await self.send({**ids, "type": "error", "content": str(e)})
+            return
+        except AdmissionRejected as e:
+            await self.send({**ids, "type": "error", "content": str(e), "retry_after": e.retry_after,
+                             "queue_position": e.queue_position})
+            return
+        except asyncio.CancelledError:
+            await self._send_cancelled(ids)
+            raise
+
+        history = list(conversation.history)
+
+        def events():
+            try:
+                yield from get_intelligent_rag_service().process_query_stream(
+                    query=query,
+                    context_url=conversation.context_url,
+                    model=model,
+                    conversation_history=history,
+                    top_k=top_k
+                )
+            finally:
+                ticket.release()
+
+        # Opened through the registry so its producer thread counts against SSE_MAX_STREAMS
+        try:
+            stream = event_streams.open(events())
+        except TooManyStreams as e:
+            # events() never started, so its cleanup will not run
+            ticket.release()
+            logger.warning(f"Rejected WebSocket chat request: {e}")
+            await self.send({**ids, "type": "error", "content": str(e)})
+            return
+        stream.attach()
+        answer: List[str] = []
+        failed = False
+        seq = 0
+        try:
+            with REQUESTS_IN_FLIGHT.labels(endpoint="chat_ws").track_inprogress():
+                while True:
+                    batch, done = await stream.wait(seq, settings.SSE_HEARTBEAT_SECONDS)
+                    for seq, event in batch:
+                        if event.get("type") == "content":
+                            answer.append(event.get("content", ""))
+                        elif event.get("type") == "error":
+                            failed = True
+                        await self.send({**ids, **event})
+                    if done and not batch:
+                        break
+            if not failed:
+                conversation.record_turn(query, "".join(answer))
+            await self.send({**ids, "type": "end"})
+        except asyncio.CancelledError:
+            stream.cancel()
+            await self._send_cancelled(ids)
+            raise
+        except Exception as e:
+            stream.cancel()
+            logger.error(f"Error during WebSocket chat: {e}", exc_info=True)
+            await self.send({**ids, "type": "error", "content": f"Failed to process chat query: {str(e)}"})
+        finally:
+            stream.detach()
+
+    async def _send_cancelled(self, ids: Dict[str, str]):
+        try:
+            await self.send({**ids, "type": "cancelled"})
+        except Exception:
+            pass  # The connection is already gone
+
+
+@router.websocket("/chat-ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over a single WebSocket with multiplexed conversations and server-side history.
+
+    Client messages:
+      {"type": "chat", "conversation_id", "request_id"?, "query", "context_url"?, "model"?, "top_k"?}
+      {"type": "cancel", "request_id"}
+      {"type": "reset", "conversation_id"}
+      {"type": "ping"}
+
+    The server answers with the same events as /chat-stream (sources, content, error),
+    followed by "end" or "cancelled", each tagged with conversation_id and request_id.
+    """
+    await websocket.accept()
+    client_id = websocket.headers.get("X-Client-ID") or (websocket.client.host if websocket.client else "anonymous")
+    await ChatSession(websocket, client_id).run()
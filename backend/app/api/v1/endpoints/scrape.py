@@ -1,10 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from app.services.scraping_service import scrape_url
-from app.services.llm_service import ollama_service, OllamaService
-from app.services.vector_db_service import milvus_service, MilvusService
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.services.crawler import Crawler, crawl_limits
+from app.services.content_extraction import ExtractedPage, Section
+from app.services.scraping_service import scrape_page
+from app.services.llm_service import ollama_service, OllamaService, EMBEDDING_MODEL
+from app.services.vector_db_service import milvus_service, MilvusService, content_hash
+from app.core.metrics import time_stage, REQUESTS_IN_FLIGHT, STAGE_LATENCY
 import logging
-from typing import List
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -23,6 +29,29 @@ class ProcessResponse(BaseModel):
     text_length: int
     vector_dim: int
     milvus_insert_count: int
+    unchanged_chunks: int = 0  # Already stored with the same text, position and embedding model
+    deleted_chunks: int = 0    # Stale chunks of an earlier version of the page
+
+class CrawlRequest(BaseModel):
+    url: str
+    # Budgets; unset or larger values use the configured CRAWL_MAX_* limits
+    max_depth: Optional[int] = Field(None, ge=0)
+    max_pages: Optional[int] = Field(None, ge=1)
+    max_bytes: Optional[int] = Field(None, ge=1)
+    use_sitemap: bool = True
+
+class CrawlResponse(BaseModel):
+    url: str  # The context the pages are stored under
+    message: str
+    pages_crawled: int
+    pages_skipped: int
+    bytes_downloaded: int
+    stop_reason: Optional[str]
+    text_length: int
+    vector_dim: int
+    milvus_insert_count: int
+    unchanged_chunks: int = 0
+    deleted_chunks: int = 0
 
 # Dependency Injection for services
 def get_ollama_service():
@@ -69,6 +98,72 @@ def chunk_text(text: str, max_size: int = MAX_CHUNK_SIZE, overlap: int = CHUNK_O
     return chunks
 
 
+@dataclass
+class PageChunk:
+    text: str
+    heading_path: List[str]
+    anchor: Optional[str]
+
+
+def chunk_sections(sections: Iterable[Section], max_size: int = MAX_CHUNK_SIZE,
+                   overlap: int = CHUNK_OVERLAP) -> Iterator[PageChunk]:
+    """
+    Packs consecutive sections into chunks of at most max_size characters, so that a
+    chunk only starts mid-section when a single section is larger than that. A chunk
+    carries the heading path and anchor of the section it starts with; the continuation
+    pieces of a split section repeat its heading path as their first line. Sections are
+    consumed lazily, so a streamed document is never held in memory as a whole.
+    """
+    parts: List[str] = []
+    first = None
+    size = 0
+
+    for section in sections:
+        rendered = section.render()
+        if len(rendered) > max_size or (parts and size + 2 + len(rendered) > max_size):
+            if parts:
+                yield PageChunk("\n\n".join(parts), first.heading_path, first.anchor)
+            parts, first, size = [], None, 0
+        if len(rendered) > max_size:
+            for i, piece in enumerate(chunk_text(rendered, max_size, overlap)):
+                if i and section.heading_path:
+                    piece = f"{' > '.join(section.heading_path)}\n\n{piece}"
+                yield PageChunk(piece, section.heading_path, section.anchor)
+            continue
+        if first is None:
+            first = section
+        parts.append(rendered)
+        size += len(rendered) + 2
+    if parts:
+        yield PageChunk("\n\n".join(parts), first.heading_path, first.anchor)
+
+
+def chunk_page(page: ExtractedPage, max_size: int = MAX_CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[PageChunk]:
+    """All chunks of a page, see chunk_sections."""
+    return list(chunk_sections(page.sections, max_size, overlap))
+
+
+def _timed_chunks(chunks: Iterator[PageChunk]) -> Iterator[PageChunk]:
+    """
+    Yields lazily produced chunks, recording the time spent producing them as the
+    "chunk" stage, once the page is done. For streamed documents this includes reading
+    their sections.
+    """
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield chunk
+    finally:
+        STAGE_LATENCY.labels(stage="chunk").observe(elapsed)
+
+
 @router.post("/process-url", response_model=ProcessResponse)
 def scrape_and_embed_url(
     request: ScrapeRequest,
@@ -78,61 +173,208 @@ def scrape_and_embed_url(
     """
     Scrapes a URL, generates embeddings for its content (chunked if necessary), and stores it in Milvus.
     """
-    url = request.url
+    with REQUESTS_IN_FLIGHT.labels(endpoint="process_url").track_inprogress():
+        return _scrape_and_embed_url(request.url, ollama, milvus)
+
+
+def _scrape_and_embed_url(url: str, ollama: OllamaService, milvus: MilvusService) -> ProcessResponse:
     logger.info(f"Processing URL: {url}")
 
     # 1. Scrape the URL
     try:
-        text_content = scrape_url(url)
-        if not text_content:
+        with time_stage("scrape"):
+            page = scrape_page(url)
+        if page is None:
             logger.warning(f"No content found for URL: {url}")
             raise HTTPException(status_code=404, detail="Could not retrieve content from the URL.")
     except Exception as e:
         logger.error(f"Failed during scraping of {url}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to scrape URL: {str(e)}")
 
-    logger.info(f"Scraped content length: {len(text_content)} characters")
-    
-    # 2. Chunk the text if it's too large
-    chunks = chunk_text(text_content)
-    logger.info(f"Split content into {len(chunks)} chunks")
+    # 2. Chunk the page along its sections and 3. embed and store each chunk.
+    # Streamed documents (PDF, text, ...) are read section by section as the chunks are embedded.
+    text_length = 0
+
+    def counted(sections: Iterable[Section]) -> Iterator[Section]:
+        nonlocal text_length
+        for section in sections:
+            text_length += len(section.render()) + (2 if text_length else 0)
+            yield section
+
+    stats = None
+    try:
+        stats = _embed_and_insert(url, _timed_chunks(chunk_sections(counted(page.sections))), ollama, milvus)
+    except Exception as e:
+        logger.error(f"Failed while reading the content of {url}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to scrape URL: {str(e)}")
+    finally:
+        page.close()
+        _notify_if_changed(url, milvus, stats)
+
+    if text_length == 0:
+        logger.warning(f"No content found for URL: {url}")
+        raise HTTPException(status_code=404, detail="Could not retrieve content from the URL.")
+    logger.info(f"Scraped content length: {text_length} characters")
     
-    total_insert_count = 0
-    total_embeddings = []
+    if stats.inserted + stats.unchanged == 0:
+        logger.error(f"Failed to insert any chunks for URL: {url}")
+        raise HTTPException(status_code=500, detail="Failed to insert data into Milvus.")
     
-    # 3. Process each chunk
+    logger.info(f"Successfully processed URL: {url} ({stats.inserted} chunks stored, {stats.unchanged} unchanged, "
+                f"{stats.deleted} stale deleted)")
+    return ProcessResponse(
+        url=url,
+        message=f"Successfully scraped, embedded, and stored the content in {stats.inserted} chunks.",
+        text_length=text_length,
+        vector_dim=stats.vector_dim,
+        milvus_insert_count=stats.inserted,
+        unchanged_chunks=stats.unchanged,
+        deleted_chunks=stats.deleted
+    )
+
+
+@dataclass
+class IngestStats:
+    inserted: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    vector_dim: int = 0
+
+
+def _notify_if_changed(url: str, milvus: MilvusService, stats: Optional[IngestStats]):
+    """
+    Tells the change listeners (the answer cache) about an ingest once, after all of its
+    chunks are written. An ingest that failed part way (no stats) may have written some.
+    """
+    if stats is None or stats.inserted or stats.deleted:
+        milvus.notify_change(url)
+
+
+def _embed_and_insert(url: str, chunks: Iterable[PageChunk], ollama: OllamaService, milvus: MilvusService,
+                      page_url: Optional[str] = None) -> IngestStats:
+    """
+    Stores the chunks of one page under the context `url`, consuming `chunks` lazily.
+    Chunks already stored with the same text, position and embedding model are kept as
+    they are; the stored chunks the page no longer has are deleted once every new chunk
+    has been stored, so a failed re-ingest never loses the previous version. Change
+    listeners are not notified; see _notify_if_changed.
+    """
+    stats = IngestStats()
+    # (content_hash, chunk_index, embedding_model) -> ids of the stored chunks of this page
+    stored = {}
+    for row in milvus.page_chunks(url, page_url or url):
+        key = (row["content_hash"], row["chunk_index"], row["embedding_model"])
+        stored.setdefault(key, []).append(row["id"])
+    kept = set()
+    failed = False
+    ingested_at = int(time.time())
+
     for i, chunk in enumerate(chunks):
-        logger.info(f"Processing chunk {i+1}/{len(chunks)} (length: {len(chunk)} characters)")
+        key = (content_hash(chunk.text), i, EMBEDDING_MODEL)
+        if key in stored:
+            kept.add(key)
+            stats.unchanged += 1
+            continue
+        logger.info(f"Processing chunk {i+1} (length: {len(chunk.text)} characters)")
         
         # Generate embedding for this chunk
         try:
-            embedding = ollama.generate_embedding(chunk)
+            embedding = ollama.generate_embedding(chunk.text)
             if not embedding:
                 logger.error(f"Failed to generate embedding for chunk {i+1} from {url}")
+                failed = True
                 continue  # Skip this chunk but continue with others
-            total_embeddings.append(embedding)
+            stats.vector_dim = stats.vector_dim or len(embedding)
         except Exception as e:
             logger.error(f"Failed during embedding generation for chunk {i+1} from {url}: {e}", exc_info=True)
+            failed = True
             continue  # Skip this chunk but continue with others
         
         # Insert chunk into Milvus
         try:
-            insert_count = milvus.insert_data(url=url, text=chunk, embedding=embedding)
-            total_insert_count += insert_count
+            insert_count = milvus.insert_data(url=url, text=chunk.text, embedding=embedding, page_url=page_url,
+                                              chunk_index=i, heading=" > ".join(chunk.heading_path),
+                                              anchor=chunk.anchor, embedding_model=EMBEDDING_MODEL,
+                                              ingested_at=ingested_at, notify=False)
+            stats.inserted += insert_count
+            failed = failed or not insert_count
             logger.info(f"Successfully inserted chunk {i+1} for URL: {url}")
         except Exception as e:
             logger.error(f"Failed during Milvus insertion for chunk {i+1} from {url}: {e}", exc_info=True)
+            failed = True
             continue  # Skip this chunk but continue with others
-    
-    if total_insert_count == 0:
-        logger.error(f"Failed to insert any chunks for URL: {url}")
+
+    # Keep one copy of each unchanged chunk; everything else stored for the page is stale
+    stale = [id_ for key, ids in stored.items() for id_ in (ids[1:] if key in kept else ids)]
+    if stale and not failed:
+        stats.deleted = milvus.delete_chunks(url, stale, notify=False)
+    return stats
+
+
+@router.post("/crawl", response_model=CrawlResponse)
+def crawl_and_embed_site(
+    request: CrawlRequest,
+    ollama: OllamaService = Depends(get_ollama_service),
+    milvus: MilvusService = Depends(get_milvus_service)
+):
+    """
+    Crawls a site from a seed URL, following same-origin links within the depth, page and
+    byte budgets, and stores every page under one context: the canonical seed URL.
+    Pages are embedded while the next ones are being fetched.
+    """
+    with REQUESTS_IN_FLIGHT.labels(endpoint="crawl").track_inprogress():
+        return _crawl_and_embed_site(request, ollama, milvus)
+
+
+def _crawl_and_embed_site(request: CrawlRequest, ollama: OllamaService, milvus: MilvusService) -> CrawlResponse:
+    try:
+        crawler = Crawler(request.url, use_sitemap=request.use_sitemap, delay=settings.CRAWL_DELAY_SECONDS,
+                          **crawl_limits(request.max_depth, request.max_pages, request.max_bytes))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    context_url = crawler.seed
+    logger.info(f"Crawling site: {context_url}")
+
+    total = IngestStats()
+    text_length = 0
+    failed = False
+    pages = crawler.stream(prefetch=settings.CRAWL_PREFETCH_PAGES)
+    try:
+        for crawled in pages:
+            with time_stage("chunk"):
+                chunks = chunk_page(crawled.page)
+            logger.info(f"Crawled {crawled.url} (depth {crawled.depth}): {len(chunks)} chunks")
+            stats = _embed_and_insert(context_url, chunks, ollama, milvus, page_url=crawled.url)
+            total.inserted += stats.inserted
+            total.unchanged += stats.unchanged
+            total.deleted += stats.deleted
+            total.vector_dim = total.vector_dim or stats.vector_dim
+            text_length += len(crawled.page.text)
+    except Exception as e:
+        failed = True
+        logger.error(f"Crawl of {context_url} failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to crawl site: {str(e)}")
+    finally:
+        pages.close()
+        _notify_if_changed(context_url, milvus, None if failed else total)
+
+    if total.inserted + total.unchanged == 0:
+        logger.error(f"Failed to insert any chunks for site: {context_url}")
         raise HTTPException(status_code=500, detail="Failed to insert data into Milvus.")
-    
-    logger.info(f"Successfully processed and stored {total_insert_count} chunks for URL: {url}")
-    return ProcessResponse(
-        url=url,
-        message=f"Successfully scraped, embedded, and stored the content in {total_insert_count} chunks.",
-        text_length=len(text_content),
-        vector_dim=len(total_embeddings[0]) if total_embeddings else 0,
-        milvus_insert_count=total_insert_count
+
+    logger.info(f"Crawl of {context_url} finished ({crawler.stop_reason}): {crawler.pages} pages, "
+                f"{crawler.skipped} skipped, {crawler.bytes_downloaded} bytes, {total.inserted} chunks stored, "
+                f"{total.unchanged} unchanged, {total.deleted} stale deleted")
+    return CrawlResponse(
+        url=context_url,
+        message=f"Successfully crawled {crawler.pages} pages and stored them in {total.inserted} chunks.",
+        pages_crawled=crawler.pages,
+        pages_skipped=crawler.skipped,
+        bytes_downloaded=crawler.bytes_downloaded,
+        stop_reason=crawler.stop_reason,
+        text_length=text_length,
+        vector_dim=total.vector_dim,
+        milvus_insert_count=total.inserted,
+        unchanged_chunks=total.unchanged,
+        deleted_chunks=total.deleted
     )
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, List, Optional
+from app.core.tracing import tracer, InMemorySpanExporter
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/traces")
+def get_traces(
+    name: Optional[str] = None,
+    min_duration_ms: float = 0.0,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    Returns recently finished spans from the in-memory exporter, slowest first.
+    Use `name` (e.g. "rag.process_query") and `min_duration_ms` to find tail-latency outliers,
+    then look up the other spans sharing the same traceId.
+    """
+    exporter = tracer.exporter
+    if not isinstance(exporter, InMemorySpanExporter):
+        raise HTTPException(status_code=404, detail="The in-memory trace exporter is not enabled.")
+
+    spans = [
+        span for span in exporter.get_finished_spans()
+        if (name is None or span.name == name) and (span.duration_ms or 0.0) >= min_duration_ms
+    ]
+    spans.sort(key=lambda span: span.duration_ms or 0.0, reverse=True)
+    return [span.to_dict() for span in spans[:limit]]
+
+@router.get("/traces/{trace_id}")
+def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """
+    Returns all spans of a single trace in start order.
+    """
+    exporter = tracer.exporter
+    if not isinstance(exporter, InMemorySpanExporter):
+        raise HTTPException(status_code=404, detail="The in-memory trace exporter is not enabled.")
+
+    spans = [span for span in exporter.get_finished_spans() if span.trace_id == trace_id]
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' not found.")
+    spans.sort(key=lambda span: span.start_time_unix_nano)
+    return [span.to_dict() for span in spans]
@@ -0,0 +1,270 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_WAIT
+
+
+class AdmissionRejected(Exception):
+    """A request was not admitted: the queue is full (429) or it waited too long (503)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int, queue_position: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+
+
+class AdmissionTicket:
+    """A held concurrency slot. release() is idempotent."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._released = False
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release(time.monotonic() - self._start)
+
+
+class _Waiter:
+    __slots__ = ("client_id", "event", "future")
+
+    def __init__(self, client_id: str, future: Optional[asyncio.Future] = None):
+        self.client_id = client_id
+        self.event = threading.Event()
+        # Set for acquire_async: resolved on the waiting coroutine's loop
+        self.future = future
+
+    def admit(self):
+        self.event.set()
+        if self.future is not None:
+            self.future.get_loop().call_soon_threadsafe(
+                lambda: self.future.done() or self.future.set_result(True))
+
+
+class AdmissionController:
+    """
+    Concurrency limit for one model backend with a bounded, per-client fair queue.
+
+    At most `max_concurrency` requests run at once. Further requests wait in a
+    queue of at most `max_queue` entries; freed slots are handed out round-robin
+    across clients, so one client flooding the queue cannot starve others.
+
+    acquire() waits in the calling thread, acquire_async() on the event loop. Blocking
+    waits are also limited by `blocking_waiters`, a semaphore shared by all models, so
+    queued requests cannot take every thread of the server's threadpool.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 blocking_waiters: Optional[threading.Semaphore] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._blocking_waiters = blocking_waiters
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._waiters: Dict[str, Deque[_Waiter]] = {}
+        self._rotation: Deque[str] = deque()  # clients with waiters, in service order
+        self._avg_service_time = 1.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def _retry_after(self, position: int) -> int:
+        # Rough wait: how many "rounds" of slots are ahead of this position
+        return max(1, math.ceil(self._avg_service_time * position / self.max_concurrency))
+
+    def _position(self, waiter: _Waiter) -> int:
+        """Position in round-robin order: requests of other clients up to the same depth go first."""
+        own = self._waiters.get(waiter.client_id)
+        depth = own.index(waiter) + 1 if own and waiter in own else 1
+        ahead = sum(min(len(q), depth) for cid, q in self._waiters.items() if cid != waiter.client_id)
+        return ahead + depth
+
+    def _update_depth(self):
+        ADMISSION_QUEUE_DEPTH.labels(model=self.name).set(self._queued)
+
+    def _queue_full(self) -> AdmissionRejected:
+        position = self._queued + 1
+        ADMISSION_REJECTIONS.labels(model=self.name, reason="queue_full").inc()
+        return AdmissionRejected(
+            f"Too many requests queued for model '{self.name}'.", 429,
+            self._retry_after(position), position,
+        )
+
+    def _enqueue(self, client_id: str, future: Optional[asyncio.Future] = None) -> Optional[_Waiter]:
+        """Takes a free slot (returns None) or queues a waiter. Must hold the lock."""
+        if self._in_flight < self.max_concurrency and not self._queued:
+            self._in_flight += 1
+            ADMISSION_WAIT.labels(model=self.name).observe(0.0)
+            return None
+        if self._queued >= self.max_queue:
+            raise self._queue_full()
+        waiter = _Waiter(client_id, future)
+        if client_id not in self._waiters:
+            self._waiters[client_id] = deque()
+            self._rotation.append(client_id)
+        self._waiters[client_id].append(waiter)
+        self._queued += 1
+        self._update_depth()
+        return waiter
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """
+        Removes a waiter that stopped waiting. Returns True if a slot was handed to it
+        meanwhile, which the caller then owns. Must hold the lock.
+        """
+        if waiter.event.is_set():
+            return True
+        self._remove_waiter(waiter)
+        self._update_depth()
+        return False
+
+    def _timed_out(self, waiter: _Waiter) -> AdmissionRejected:
+        position = self._position(waiter)
+        self._give_up(waiter)
+        ADMISSION_REJECTIONS.labels(model=self.name, reason="timeout").inc()
+        return AdmissionRejected(
+            f"Model '{self.name}' is overloaded; request waited {self.queue_timeout:.0f}s in queue.",
+            503, self._retry_after(position), position,
+        )
+
+    def acquire(self, client_id: str) -> AdmissionTicket:
+        """Waits for a slot. Raises AdmissionRejected when the queue is full or the wait times out."""
+        start = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(client_id)
+            if waiter is None:
+                return AdmissionTicket(self)
+            if self._blocking_waiters is not None and not self._blocking_waiters.acquire(blocking=False):
+                self._give_up(waiter)
+                raise self._queue_full()
+
+        try:
+            admitted = waiter.event.wait(self.queue_timeout)
+        finally:
+            if self._blocking_waiters is not None:
+                self._blocking_waiters.release()
+        if not admitted:
+            with self._lock:
+                # A slot may have been handed to us right after the wait timed out
+                if not waiter.event.is_set():
+                    raise self._timed_out(waiter)
+        ADMISSION_WAIT.labels(model=self.name).observe(time.monotonic() - start)
+        return AdmissionTicket(self)
+
+    async def acquire_async(self, client_id: str) -> AdmissionTicket:
+        """acquire() for the event loop: waits without holding a thread, and can be cancelled."""
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            waiter = self._enqueue(client_id, future)
+            if waiter is None:
+                return AdmissionTicket(self)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not waiter.event.is_set():
+                    raise self._timed_out(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                admitted = self._give_up(waiter)
+            if admitted:
+                AdmissionTicket(self).release()
+            raise
+        ADMISSION_WAIT.labels(model=self.name).observe(time.monotonic() - start)
+        return AdmissionTicket(self)
+
+    def _remove_waiter(self, waiter: _Waiter):
+        queue = self._waiters[waiter.client_id]
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            del self._waiters[waiter.client_id]
+            self._rotation.remove(waiter.client_id)
+
+    def _release(self, service_time: float):
+        with self._lock:
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time
+            self._in_flight -= 1
+            while self._in_flight < self.max_concurrency and self._rotation:
+                client_id = self._rotation.popleft()
+                queue = self._waiters[client_id]
+                waiter = queue.popleft()
+                if queue:
+                    self._rotation.append(client_id)
+                else:
+                    del self._waiters[client_id]
+                self._queued -= 1
+                self._in_flight += 1
+                waiter.admit()
+            self._update_depth()
+
+    @contextmanager
+    def admit(self, client_id: str):
+        ticket = self.acquire(client_id)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+
+class AdmissionRegistry:
+    """
+    One AdmissionController per model, sized from settings. Model names come from
+    clients, so a controller is only created for a name `validate` accepts (it raises
+    ValueError otherwise); the LLM service installs its model check at startup.
+    """
+
+    def __init__(self, validate: Optional[Callable[[str], None]] = None):
+        self.validate = validate
+        self._lock = threading.Lock()
+        self._controllers: Dict[str, AdmissionController] = {}
+        self._blocking_waiters = threading.Semaphore(settings.ADMISSION_MAX_BLOCKING_WAITERS)
+
+    def get(self, model: str) -> AdmissionController:
+        with self._lock:
+            controller = self._controllers.get(model)
+            if controller is not None:
+                return controller
+        if self.validate is not None:
+            self.validate(model)
+        with self._lock:
+            controller = self._controllers.get(model)
+            if controller is None:
+                controller = AdmissionController(
+                    model,
+                    settings.MODEL_CONCURRENCY_LIMITS.get(model, settings.DEFAULT_MODEL_CONCURRENCY),
+                    settings.ADMISSION_QUEUE_SIZE,
+                    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                    self._blocking_waiters,
+                )
+                self._controllers[model] = controller
+            return controller
+
+    def clear(self):
+        with self._lock:
+            self._controllers.clear()
+
+
+admission = AdmissionRegistry()
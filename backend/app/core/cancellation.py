@@ -0,0 +1,144 @@
+import contextvars
+import logging
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """Raised by code that noticed its request was cancelled."""
+
+
+class CancellationToken:
+    """
+    Cancellation signal for one request, shared by every thread working on it.
+
+    Code that blocks on something a plain flag cannot interrupt (a socket read
+    from an LLM provider, a gRPC stream) registers a callback with on_cancel();
+    cancel() runs the callbacks on the cancelling thread, which unblocks the
+    worker so it can notice the cancellation and unwind.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._next_id = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            _run_callback(callback)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Registers a callback and returns a function that unregisters it. Runs it now if already cancelled."""
+        with self._lock:
+            if not self._cancelled:
+                callback_id = self._next_id
+                self._next_id += 1
+                self._callbacks[callback_id] = callback
+                return lambda: self._unregister(callback_id)
+        _run_callback(callback)
+        return lambda: None
+
+    def _unregister(self, callback_id: int):
+        with self._lock:
+            self._callbacks.pop(callback_id, None)
+
+    def raise_if_cancelled(self):
+        if self._cancelled:
+            raise Cancelled("The request was cancelled.")
+
+
+def _run_callback(callback: Callable[[], None]):
+    try:
+        callback()
+    except Exception as e:
+        logger.warning(f"Cancellation callback failed: {e}")
+
+
+_current: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar("cancellation", default=None)
+
+
+def current_cancellation() -> Optional[CancellationToken]:
+    """The token of the request being processed by this context, if any."""
+    return _current.get()
+
+
+def is_cancelled() -> bool:
+    token = _current.get()
+    return token is not None and token.cancelled
+
+
+@contextmanager
+def cancellation_scope(token: CancellationToken) -> Iterator[CancellationToken]:
+    """Makes `token` the current one for the code run inside the block (and contexts copied from it)."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def on_cancel(callback: Callable[[], None]) -> Callable[[], None]:
+    """Registers a callback with the current token; a no-op outside a cancellation scope."""
+    token = _current.get()
+    if token is None:
+        return lambda: None
+    return token.on_cancel(callback)
+
+
+def _interrupt_response(response: Any, lock: threading.Lock, state: List[bool]):
+    with lock:
+        if state[0]:
+            return  # Already closed: the connection may be serving another request by now
+        network_stream = response.extensions.get("network_stream")
+        sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+        if sock is None:
+            return
+        try:
+            # Wakes a read blocked in another thread and tells the provider we are gone.
+            # The reading thread sees a broken response and closes it itself.
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def track_response(response: Any):
+    """
+    httpx "response" event hook. Lets the current request's cancellation interrupt
+    the response body while it is being read, which is where a streaming generation
+    spends its time. Works with httpx and the httpx2 fork bundled by some SDKs.
+    """
+    token = _current.get()
+    if token is None:
+        return
+    lock = threading.Lock()
+    state = [False]
+    unregister = token.on_cancel(lambda: _interrupt_response(response, lock, state))
+    close = response.close
+
+    def close_response():
+        with lock:
+            state[0] = True
+        unregister()
+        close()
+
+    response.close = close_response
+
+
+def httpx_event_hooks() -> Dict[str, List[Callable[[Any], None]]]:
+    """event_hooks for the sync httpx clients of the LLM providers."""
+    return {"response": [track_response]}
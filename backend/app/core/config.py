@@ -1,5 +1,7 @@
+from pydantic import PrivateAttr
 from pydantic_settings import BaseSettings
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 from enum import Enum
 import os
 
@@ -8,15 +10,25 @@ class ModelProvider(str, Enum):
     OPENAI = "openai"
     ANTHROPIC = "anthropic"
     GOOGLE = "google"
+    OPENAI_COMPATIBLE = "openai_compatible"
 
 class ModelConfig:
+    """Immutable description of a selectable model. Instances are shared by the model registry."""
+    __slots__ = ("name", "display_name", "provider", "requires_api_key", "context_length")
+
     def __init__(self, name: str, display_name: str, provider: ModelProvider,
                  requires_api_key: bool = False, context_length: int = 4096):
-        self.name = name
-        self.display_name = display_name
-        self.provider = provider
-        self.requires_api_key = requires_api_key
-        self.context_length = context_length
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "display_name", display_name)
+        object.__setattr__(self, "provider", provider)
+        object.__setattr__(self, "requires_api_key", requires_api_key)
+        object.__setattr__(self, "context_length", context_length)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("ModelConfig is immutable")
+
+    def __repr__(self) -> str:
+        return f"ModelConfig(name={self.name!r}, provider={self.provider.value!r})"
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "RAG Web Application"
@@ -26,6 +38,11 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
     GOOGLE_API_KEY: Optional[str] = None
+
+    # OpenAI-compatible server (vLLM, llama.cpp server, ...); models are a comma-separated list
+    OPENAI_COMPATIBLE_BASE_URL: Optional[str] = None
+    OPENAI_COMPATIBLE_API_KEY: Optional[str] = None
+    OPENAI_COMPATIBLE_MODELS: str = ""
     
     # Ollama Settings
     OLLAMA_HOST: str = "http://localhost:11434"
@@ -34,12 +51,121 @@ class Settings(BaseSettings):
     # Default Model
     DEFAULT_GENERATION_MODEL: str = "gpt-oss:20b"
 
+    # Connection pool size of each LLM provider client
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+
+    # Failover: fallback chain per model, e.g. {"gpt-oss:20b": ["llama3.1:8b", "gpt-4o-mini"]}.
+    # The "*" key applies to models without their own chain.
+    MODEL_FALLBACKS: Dict[str, List[str]] = {}
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 120.0
+    LLM_FIRST_TOKEN_TIMEOUT_SECONDS: float = 60.0
+    # Fire a backup request to the next model in the chain after this many seconds (disabled when unset)
+    LLM_HEDGE_AFTER_SECONDS: Optional[float] = None
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Admission control: concurrent generations per model and the bounded wait queue in front of them
+    DEFAULT_MODEL_CONCURRENCY: int = 4
+    MODEL_CONCURRENCY_LIMITS: Dict[str, int] = {}
+    ADMISSION_QUEUE_SIZE: int = 32
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    # Queued HTTP requests wait in threadpool threads; cap them across all models below the
+    # threadpool size (40 by default) so waiting requests cannot starve running ones
+    ADMISSION_MAX_BLOCKING_WAITERS: int = 16
+
+    # Share one retrieval + generation between identical concurrent chat requests
+    CHAT_COALESCING_ENABLED: bool = True
+
+    # Server-sent events for /chat-stream
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+    SSE_RETRY_MS: int = 2000
+    # Tokens arriving within this delay are sent in one frame (0 sends every token on its own)
+    SSE_COALESCE_MAX_DELAY_MS: float = 30.0
+    SSE_COALESCE_MAX_CHARS: int = 1024
+    # A stream with no client attached for this long is cancelled; finished streams stay resumable for the TTL
+    SSE_DISCONNECT_GRACE_SECONDS: float = 10.0
+    SSE_RESUME_TTL_SECONDS: float = 60.0
+    # Streams generating at once, each on its own producer thread; more get 503
+    SSE_MAX_STREAMS: int = 256
+
+    # WebSocket chat: server-side history kept per conversation, parallel answers and conversations per connection
+    WS_MAX_HISTORY_MESSAGES: int = 20
+    WS_MAX_CONCURRENT_REQUESTS: int = 4
+    WS_MAX_CONVERSATIONS: int = 32
+
+    # Semantic answer cache: paraphrased questions in the same context reuse a cached answer
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: float = 3600.0
+
+    # On-disk embedding cache used at ingestion, keyed by (embedding model, sha256(text))
+    EMBEDDING_STORE_ENABLED: bool = True
+    EMBEDDING_STORE_DIR: str = "embedding_cache"
+
+    # Chunk texts in a local compressed SQLite file instead of the Milvus collection, so that
+    # loading the collection pulls only vectors and small metadata into Milvus memory
+    TEXT_STORE_ENABLED: bool = False
+    TEXT_STORE_PATH: str = "text_store.sqlite3"
+    TEXT_STORE_COMPRESSION_LEVEL: int = 3
+
+    # HTML parsing at ingestion: "auto" uses lxml when installed, else html.parser.
+    # Pages of at least HTML_PARSE_POOL_MIN_BYTES are parsed in a pool of worker
+    # processes (default: up to 4, one per core; 0 parses everything inline).
+    HTML_PARSER: str = "auto"
+    HTML_PARSE_WORKERS: Optional[int] = None
+    HTML_PARSE_POOL_MIN_BYTES: int = 256 * 1024
+    # "main" keeps only a page's main content, split into sections at its headings; "full" keeps all text
+    CONTENT_EXTRACTION: str = "main"
+    # Downloads larger than this are rejected; bodies above the spool size are buffered on disk.
+    # PDF, Markdown, text and JSON documents are then extracted section by section as they are embedded.
+    SCRAPE_MAX_DOCUMENT_BYTES: int = 256 * 1024 * 1024
+    SCRAPE_SPOOL_MEMORY_BYTES: int = 8 * 1024 * 1024
+
+    # Site crawls (/crawl): upper bounds for the per-request budgets, the minimum delay between
+    # requests to the site (a larger robots.txt Crawl-delay wins) and pages fetched ahead of embedding
+    CRAWL_MAX_DEPTH: int = 2
+    CRAWL_MAX_PAGES: int = 50
+    CRAWL_MAX_BYTES: int = 50 * 1024 * 1024
+    CRAWL_DELAY_SECONDS: float = 0.0
+    CRAWL_PREFETCH_PAGES: int = 2
+
+    # Model catalog: /api/tags results younger than this are served without revalidation
+    MODEL_CATALOG_TTL_SECONDS: float = 60.0
+    # Enables POST /models/pull and DELETE /models/{name}, which change the Ollama host. They are
+    # not authenticated, so only enable them where every client of this API may administer Ollama.
+    MODEL_MANAGEMENT_ENABLED: bool = False
+
+    # Tracing ("memory", "file" or "none")
+    TRACE_EXPORTER: str = "memory"
+    TRACE_FILE: str = "traces.jsonl"
+    TRACE_MEMORY_MAX_SPANS: int = 10000
+
     class Config:
         case_sensitive = True
 
+    # Memoized model registry and the API keys it was built for
+    _model_registry: Optional[Mapping[str, ModelConfig]] = PrivateAttr(default=None)
+    _model_registry_key: Optional[Tuple[Any, ...]] = PrivateAttr(default=None)
+
     @property
-    def available_models(self) -> Dict[str, ModelConfig]:
-        """Returns a dictionary of available models based on configuration."""
+    def available_models(self) -> Mapping[str, ModelConfig]:
+        """
+        Returns a read-only mapping of available models based on configuration.
+        It is built once and only rebuilt when the provider API keys change or the settings are reloaded.
+        """
+        key = (self.OPENAI_API_KEY, self.ANTHROPIC_API_KEY, self.GOOGLE_API_KEY,
+               self.OPENAI_COMPATIBLE_BASE_URL, self.OPENAI_COMPATIBLE_MODELS)
+        if self._model_registry is None or self._model_registry_key != key:
+            self._model_registry = MappingProxyType(self._build_model_registry())
+            self._model_registry_key = key
+        return self._model_registry
+
+    def invalidate_model_registry(self):
+        self._model_registry = None
+
+    def _build_model_registry(self) -> Dict[str, ModelConfig]:
         models = {}
         
         # Ollama Models (always available)
@@ -88,7 +214,21 @@ class Settings(BaseSettings):
             ]
             for model in google_models:
                 models[model.name] = model
+
+        # OpenAI-compatible server models (if a base URL is provided)
+        if self.OPENAI_COMPATIBLE_BASE_URL:
+            for name in filter(None, (m.strip() for m in self.OPENAI_COMPATIBLE_MODELS.split(","))):
+                models[name] = ModelConfig(name, name, ModelProvider.OPENAI_COMPATIBLE)
         
         return models
 
 settings = Settings()
+
+def reload_settings() -> Settings:
+    """Re-reads configuration from the environment in place and rebuilds the model registry."""
+    fresh = Settings()
+    for field in Settings.model_fields:
+        setattr(settings, field, getattr(fresh, field))
+    settings.invalidate_model_registry()
+    return settings
+
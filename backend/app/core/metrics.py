@@ -0,0 +1,392 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncGenerator, AsyncIterable, Dict, Generator, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.cancellation import is_cancelled
+
+# Latency buckets in seconds, wide enough to cover a cache hit as well as a
+# multi-minute generation on a large local model.
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 400)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts.")
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = float(value)
+
+    @contextmanager
+    def track_inprogress(self):
+        """Increments the gauge for the duration of the block."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+
+    @contextmanager
+    def time(self):
+        """Observes the wall-clock duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """Returns the child series for the given label values."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._new_child()
+                self._children[key] = child
+        return child
+
+    def _label_str(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{self._label_str(key)} {_format_value(child.value)}"]
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            items = sorted(self._children.items())
+        for key, child in items:
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, key, child) -> List[str]:
+        with child._lock:
+            bucket_counts = list(child.bucket_counts)
+            count, total = child.count, child.sum
+        lines = [
+            f"{self.name}_bucket{self._label_str(key, [('le', _format_value(bound))])} {n}"
+            for bound, n in zip(self.buckets, bucket_counts)
+        ]
+        lines.append(f"{self.name}_bucket{self._label_str(key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{self._label_str(key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{self._label_str(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.type_name}.")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Pipeline stages: scrape, chunk, embed, milvus_insert, milvus_search, route
+STAGE_LATENCY = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Latency of each ingestion and RAG pipeline stage.",
+    ["stage"],
+)
+GENERATION_LATENCY = registry.histogram(
+    "llm_generation_duration_seconds",
+    "Total latency of a chat generation call.",
+    ["provider", "model", "mode"],
+)
+TIME_TO_FIRST_TOKEN = registry.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from the start of a streaming generation to its first non-empty chunk.",
+    ["provider", "model"],
+)
+TOKENS_PER_SECOND = registry.histogram(
+    "llm_tokens_per_second",
+    "Generation throughput in (approximate) output tokens per second.",
+    ["provider", "model"],
+    buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+GENERATED_TOKENS = registry.counter(
+    "llm_generated_tokens_total",
+    "Approximate number of output tokens generated.",
+    ["provider", "model"],
+)
+GENERATION_ERRORS = registry.counter(
+    "llm_generation_errors_total",
+    "Number of chat generation calls that raised an error.",
+    ["provider", "model"],
+)
+LLM_STREAMS_CANCELLED = registry.counter(
+    "llm_streams_cancelled_total",
+    "Streaming generations closed early because the client went away or cancelled.",
+    ["provider", "model"],
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and result (hit or miss).",
+    ["cache", "result"],
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "requests_in_flight",
+    "Number of requests currently being processed, by endpoint.",
+    ["endpoint"],
+)
+COALESCED_REQUESTS = registry.counter(
+    "chat_requests_coalesced_total",
+    "Chat requests served by joining an identical in-flight request, by endpoint.",
+    ["endpoint"],
+)
+LLM_FAILOVERS = registry.counter(
+    "llm_failovers_total",
+    "Chat generations answered by a fallback model instead of the requested one.",
+    ["model", "fallback"],
+)
+LLM_HEDGED_REQUESTS = registry.counter(
+    "llm_hedged_requests_total",
+    "Backup requests fired because the current attempt exceeded the hedge threshold.",
+    ["model"],
+)
+CIRCUIT_BREAKER_STATE = registry.gauge(
+    "llm_circuit_breaker_state",
+    "Circuit breaker state per model: 0 closed, 0.5 half-open, 1 open.",
+    ["model"],
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "llm_admission_queue_depth",
+    "Chat requests waiting for a concurrency slot, by model.",
+    ["model"],
+)
+ADMISSION_WAIT = registry.histogram(
+    "llm_admission_wait_seconds",
+    "Time a chat request waited in the admission queue before it was admitted.",
+    ["model"],
+)
+ADMISSION_REJECTIONS = registry.counter(
+    "llm_admission_rejections_total",
+    "Chat requests rejected by admission control, by reason (queue_full or timeout).",
+    ["model", "reason"],
+)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Observes the duration of a pipeline stage. Usable as a context manager or decorator."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Counts a cache lookup so that hit rates can be derived from /metrics."""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for providers whose blocking APIs we don't read usage from."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def observe_generation(provider: str, model: str, elapsed: float, tokens: int, mode: str = "blocking"):
+    """Records latency and throughput of a finished generation."""
+    GENERATION_LATENCY.labels(provider=provider, model=model, mode=mode).observe(elapsed)
+    if tokens:
+        GENERATED_TOKENS.labels(provider=provider, model=model).inc(tokens)
+        if elapsed > 0:
+            TOKENS_PER_SECOND.labels(provider=provider, model=model).observe(tokens / elapsed)
+
+
+def instrument_stream(stream: Iterable[str], provider: str, model: str) -> Generator[str, None, None]:
+    """
+    Wraps a token stream and records time-to-first-token, total latency and
+    tokens/sec once it is exhausted. Each non-empty chunk counts as one token.
+    """
+    start = time.perf_counter()
+    tokens = 0
+    try:
+        for chunk in stream:
+            if chunk:
+                if tokens == 0:
+                    TIME_TO_FIRST_TOKEN.labels(provider=provider, model=model).observe(time.perf_counter() - start)
+                tokens += 1
+            yield chunk
+    except GeneratorExit:
+        if is_cancelled():
+            LLM_STREAMS_CANCELLED.labels(provider=provider, model=model).inc()
+        raise
+    except Exception:
+        # An interrupted read surfaces as a transport error; it is not the provider's fault
+        if is_cancelled():
+            LLM_STREAMS_CANCELLED.labels(provider=provider, model=model).inc()
+        else:
+            GENERATION_ERRORS.labels(provider=provider, model=model).inc()
+        raise
+    finally:
+        observe_generation(provider, model, time.perf_counter() - start, tokens, mode="stream")
+
+
+async def ainstrument_stream(stream: AsyncIterable[str], provider: str, model: str) -> AsyncGenerator[str, None]:
+    """Async counterpart of instrument_stream."""
+    start = time.perf_counter()
+    tokens = 0
+    try:
+        async for chunk in stream:
+            if chunk:
+                if tokens == 0:
+                    TIME_TO_FIRST_TOKEN.labels(provider=provider, model=model).observe(time.perf_counter() - start)
+                tokens += 1
+            yield chunk
+    except (GeneratorExit, asyncio.CancelledError):
+        # The consumer closed the stream or its task was cancelled, as on a client disconnect
+        LLM_STREAMS_CANCELLED.labels(provider=provider, model=model).inc()
+        raise
+    except Exception:
+        if is_cancelled():
+            LLM_STREAMS_CANCELLED.labels(provider=provider, model=model).inc()
+        else:
+            GENERATION_ERRORS.labels(provider=provider, model=model).inc()
+        raise
+    finally:
+        observe_generation(provider, model, time.perf_counter() - start, tokens, mode="stream")
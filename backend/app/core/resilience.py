@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Dict
+
+from app.core.metrics import CIRCUIT_BREAKER_STATE
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the backend's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-backend circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls are
+    rejected for `reset_timeout` seconds. It then lets a single trial call through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    _state_values = {CLOSED: 0.0, HALF_OPEN: 0.5, OPEN: 1.0}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def _set_state(self, state: str):
+        self._state = state
+        CIRCUIT_BREAKER_STATE.labels(model=self.name).set(self._state_values[state])
+
+    def allow_request(self) -> bool:
+        """Returns True if a call may be made now. In half-open state only one trial is admitted."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def release_trial(self):
+        """
+        Frees the half-open trial slot without an outcome, for a call that was admitted
+        but abandoned (cancelled, or closed before it produced a result). Every admitted
+        call must end in record_success, record_failure or this.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set_state(self.OPEN)
+
+    def attempt(self) -> "BreakerAttempt":
+        """Wraps one admitted call, so its caller can give up on it at a deadline."""
+        return BreakerAttempt(self)
+
+
+class BreakerAttempt:
+    """
+    The outcome of one admitted call. A call that cannot be interrupted is abandoned at
+    its deadline, which counts as a failure; whatever it reports afterwards is ignored,
+    so a model that always answers too late still trips its breaker.
+    """
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self.abandoned = False
+
+    def abandon(self):
+        with self._lock:
+            if self.abandoned:
+                return
+            self.abandoned = True
+            self.breaker.record_failure()
+
+    def _report(self, outcome: Callable[[], None]):
+        with self._lock:
+            if not self.abandoned:
+                outcome()
+
+    def record_success(self):
+        self._report(self.breaker.record_success)
+
+    def record_failure(self):
+        self._report(self.breaker.record_failure)
+
+    def release_trial(self):
+        self._report(self.breaker.release_trial)
+
+
+class CircuitBreakerRegistry:
+    """Lazily creates one breaker per backend name."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+                self._breakers[name] = breaker
+            return breaker
@@ -0,0 +1,244 @@
+import threading
+from typing import Any, Callable, Dict, Generator, Hashable, Iterator, Optional, Tuple
+
+from app.core.cancellation import Cancelled, CancellationToken, cancellation_scope, current_cancellation
+
+# Markers used inside StreamFlight
+_PULL = object()
+_END = object()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it runs wait for and share its result
+    (or exception). Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared) where shared is True if another caller's result was reused."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class StreamFlight:
+    """
+    One in-flight stream shared by several subscribers.
+
+    Items are appended to a buffer that every subscriber replays from the start,
+    so late joiners see the whole stream. There is no dedicated producer thread:
+    whichever subscriber runs out of buffered items pulls the next one from the
+    source, so the stream keeps going as long as anyone is listening. When the
+    last subscriber leaves before the end, the source is closed.
+
+    The source runs under the flight's own cancellation token rather than the
+    token of whichever subscriber happens to pull, so one client going away does
+    not cut the stream short for the others; the token fires once all have left.
+    """
+
+    def __init__(self, on_finish: Callable[["StreamFlight"], None]):
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._source: Optional[Iterator] = None
+        self._cleanup: Optional[Callable[[], None]] = None
+        self._driving = False
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._subscribers = 0
+        self._finished = False
+        self._on_finish = on_finish
+        self._cancellation = CancellationToken()
+
+    def _add_subscriber(self) -> bool:
+        with self._cond:
+            if self._done:
+                return False
+            self._subscribers += 1
+            return True
+
+    def start(self, source: Iterator, cleanup: Optional[Callable[[], None]] = None):
+        """Attaches the source (by the leader). `cleanup` runs once the stream ends or is abandoned."""
+        with self._cond:
+            self._source = source
+            self._cleanup = cleanup
+            self._cond.notify_all()
+
+    def abort(self, error: BaseException):
+        """Fails the flight before it was started, e.g. when the leader was not admitted."""
+        with self._cond:
+            self._error = error
+            self._done = True
+            self._cond.notify_all()
+        self._finish()
+
+    def _finish(self):
+        with self._cond:
+            if self._finished:
+                return
+            self._finished = True
+            # A subscriber may be inside next(source); it releases the source when that returns
+            release = not self._driving
+        self._on_finish(self)
+        self._cancellation.cancel()
+        if release:
+            self._release()
+
+    def _release(self):
+        close = getattr(self._source, "close", None)
+        if close:
+            close()
+        if self._cleanup:
+            self._cleanup()
+
+    def _pull(self):
+        error = None
+        try:
+            with cancellation_scope(self._cancellation):
+                item = next(self._source, _END)
+        except BaseException as e:
+            item, error = _END, e
+        with self._cond:
+            self._driving = False
+            if error is not None:
+                self._error = error
+                self._done = True
+            elif item is _END:
+                self._done = True
+            else:
+                self._buffer.append(item)
+            finished = self._finished
+            self._cond.notify_all()
+        if finished:
+            # The flight was abandoned while this pull was running
+            self._release()
+        elif item is _END:
+            self._finish()
+
+    def _leave(self):
+        with self._cond:
+            self._subscribers -= 1
+            abandoned = self._subscribers == 0 and not self._done
+            if abandoned:
+                self._done = True
+        if abandoned:
+            self._finish()
+
+    def subscribe(self) -> "Subscription":
+        return Subscription(self)
+
+
+class Subscription:
+    """A subscriber's view of a StreamFlight. Iterate it; close() is idempotent."""
+
+    def __init__(self, flight: StreamFlight):
+        self._flight = flight
+        self._closed = False
+        self._cancelled = False
+
+    def __iter__(self) -> Generator[Any, None, None]:
+        flight = self._flight
+        index = 0
+        cancellation = current_cancellation()
+        unregister = cancellation.on_cancel(self._cancel) if cancellation is not None else None
+        try:
+            while True:
+                with flight._cond:
+                    while True:
+                        if self._cancelled:
+                            raise Cancelled("The subscriber was cancelled.")
+                        if index < len(flight._buffer):
+                            item = flight._buffer[index]
+                            index += 1
+                            break
+                        if flight._done:
+                            if flight._error is not None:
+                                raise flight._error
+                            return
+                        if flight._source is not None and not flight._driving:
+                            flight._driving = True
+                            item = _PULL
+                            break
+                        flight._cond.wait()
+                if item is _PULL:
+                    flight._pull()
+                    continue
+                yield item
+        finally:
+            if unregister is not None:
+                unregister()
+            self.close()
+
+    def _cancel(self):
+        # Runs on the cancelling thread: wake this subscriber and leave the flight
+        with self._flight._cond:
+            self._cancelled = True
+            self._flight._cond.notify_all()
+        self.close()
+
+    def close(self):
+        with self._flight._cond:
+            if self._closed:
+                return
+            self._closed = True
+        self._flight._leave()
+
+
+class StreamCoalescer:
+    """Registry of in-flight StreamFlights by key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, StreamFlight] = {}
+
+    def join(self, key: Hashable) -> Tuple[StreamFlight, Subscription, bool]:
+        """
+        Subscribes to the flight for `key`, creating it if needed. Returns
+        (flight, subscription, leader); the leader must call flight.start() or flight.abort().
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight._add_subscriber():
+                return flight, flight.subscribe(), False
+            flight = StreamFlight(lambda f, key=key: self._remove(key, f))
+            flight._add_subscriber()
+            self._flights[key] = flight
+            return flight, flight.subscribe(), True
+
+    def _remove(self, key: Hashable, flight: StreamFlight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def __len__(self) -> int:
+        return len(self._flights)
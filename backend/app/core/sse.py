@@ -0,0 +1,316 @@
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.cancellation import CancellationToken, cancellation_scope
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+
+
+def format_event(data: str, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Splits a "<stream id>:<sequence>" event id, or returns None if it is not one of ours."""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class TooManyStreams(RuntimeError):
+    """Raised when the registry already runs its maximum number of producer threads."""
+
+
+class EventStream:
+    """
+    One server-sent event stream.
+
+    A producer thread drains `source` into a buffer of numbered events, independently
+    of the HTTP response, so a client that reconnects with Last-Event-ID can resume
+    from the buffer. When no consumer has been attached for `grace` seconds the
+    stream is abandoned: its cancellation token fires, which interrupts a provider read
+    the producer is blocked in, and the producer closes the source. Finished streams stay resumable until the registry expires them.
+    """
+
+    def __init__(self, stream_id: str, source: Iterator[Event], grace: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.id = stream_id
+        self._source = source
+        self._grace = grace
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._events: List[Event] = []
+        self._done = False
+        self._cancelled = False
+        self._cancellation = CancellationToken()
+        self._consumers = 0
+        self._grace_timer: Optional[threading.Timer] = None
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self.finished_at: Optional[float] = None
+        self.cancelled_at: Optional[float] = None
+
+    def start(self):
+        with self._cond:
+            # A client that never starts reading abandons the stream
+            if not self._consumers:
+                self._schedule_abandon()
+        ctx = contextvars.copy_context()
+        threading.Thread(target=ctx.run, args=(self._produce,), daemon=True,
+                         name=f"sse-{self.id[:8]}").start()
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def _produce(self):
+        try:
+            with cancellation_scope(self._cancellation):
+                for event in self._source:
+                    with self._cond:
+                        if self._cancelled:
+                            break
+                        self._events.append(event)
+                        self._wake()
+        except Exception as e:
+            if self._cancelled:
+                logger.info(f"Event stream {self.id} stopped after cancellation: {e}")
+            else:
+                logger.error(f"Event stream {self.id} failed: {e}", exc_info=True)
+        finally:
+            close = getattr(self._source, "close", None)
+            if close:
+                close()
+            with self._cond:
+                if self._cancelled:
+                    # Tells a late resume that the answer is incomplete
+                    self._events.append({"type": "error", "content": "The stream was cancelled after the client disconnected."})
+                self._done = True
+                self.finished_at = self._clock()
+                self._wake()
+                if self._grace_timer:
+                    self._grace_timer.cancel()
+
+    def _wake(self):
+        # Called with the lock held
+        self._cond.notify_all()
+        for loop, flag in self._waiters:
+            try:
+                loop.call_soon_threadsafe(flag.set)
+            except RuntimeError:
+                pass  # The consumer's loop has already shut down
+
+    def attach(self):
+        with self._cond:
+            self._consumers += 1
+            if self._grace_timer:
+                self._grace_timer.cancel()
+                self._grace_timer = None
+
+    def detach(self):
+        with self._cond:
+            self._consumers -= 1
+            if self._consumers == 0 and not self._done:
+                self._schedule_abandon()
+
+    def _schedule_abandon(self):
+        self._grace_timer = threading.Timer(self._grace, self._abandon)
+        self._grace_timer.daemon = True
+        self._grace_timer.start()
+
+    def _abandon(self):
+        with self._cond:
+            if self._consumers or self._done:
+                return
+            self._cancelled = True
+            self.cancelled_at = self._clock()
+        logger.info(f"Event stream {self.id} abandoned by its client, cancelling generation")
+        self._cancellation.cancel()
+
+    def cancel(self):
+        """Stops the stream even though consumers are attached."""
+        with self._cond:
+            if self._done:
+                return
+            self._cancelled = True
+            self.cancelled_at = self._clock()
+        self._cancellation.cancel()
+
+    def events_after(self, seq: int) -> Tuple[List[Tuple[int, Event]], bool]:
+        """Returns the buffered (sequence, event) pairs after `seq` and whether the stream has ended."""
+        with self._cond:
+            return [(i + 1, e) for i, e in enumerate(self._events[seq:], start=seq)], self._done
+
+    async def wait(self, seq: int, timeout: float) -> Tuple[List[Tuple[int, Event]], bool]:
+        """Waits up to `timeout` seconds for events after `seq` without blocking the event loop."""
+        flag = asyncio.Event()
+        with self._cond:
+            if len(self._events) > seq or self._done:
+                return self.events_after(seq)
+            waiter = (asyncio.get_running_loop(), flag)
+            self._waiters.append(waiter)
+        try:
+            with anyio.move_on_after(timeout):
+                await flag.wait()
+        finally:
+            with self._cond:
+                self._waiters.remove(waiter)
+        return self.events_after(seq)
+
+
+class EventStreamRegistry:
+    """
+    Live and recently finished event streams by id, for Last-Event-ID resumption.
+
+    At most `max_streams` producer threads run at once; open() raises TooManyStreams
+    beyond that. A stream is forgotten `ttl` seconds after it finished, or after it was
+    cancelled if its producer is stuck in a read that ignores the cancellation. Such a
+    stream still counts against `max_streams` until its thread returns.
+    """
+
+    def __init__(self, ttl: float, grace: float, clock: Callable[[], float] = time.monotonic,
+                 max_streams: Optional[int] = None):
+        self.ttl = ttl
+        self.grace = grace
+        self.max_streams = max_streams
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._streams: Dict[str, EventStream] = {}
+        self._producing: Set[EventStream] = set()
+
+    def open(self, source: Iterator[Event]) -> EventStream:
+        stream = EventStream(uuid.uuid4().hex, source, self.grace, self._clock)
+        with self._lock:
+            self._expire()
+            if self.max_streams is not None and len(self._producing) >= self.max_streams:
+                raise TooManyStreams(f"Too many active streams ({self.max_streams}); try again later.")
+            self._streams[stream.id] = stream
+            self._producing.add(stream)
+        stream.start()
+        return stream
+
+    def get(self, stream_id: str) -> Optional[EventStream]:
+        with self._lock:
+            self._expire()
+            return self._streams.get(stream_id)
+
+    def _expire(self):
+        now = self._clock()
+        self._producing = {s for s in self._producing if not s.done}
+        for stream_id, stream in list(self._streams.items()):
+            if stream.finished_at is not None:
+                if now - stream.finished_at > self.ttl:
+                    del self._streams[stream_id]
+            elif stream.cancelled_at is not None and now - stream.cancelled_at > self.ttl:
+                logger.warning(f"Event stream {stream_id} has not stopped {self.ttl:.0f}s after it was cancelled")
+                del self._streams[stream_id]
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+
+def _coalesce(batch: List[Tuple[int, Event]], max_chars: int) -> List[Tuple[int, Event]]:
+    """Merges runs of content events into one event carrying the id of the last one merged."""
+    frames: List[Tuple[int, Event]] = []
+    for seq, event in batch:
+        if (event.get("type") == "content" and frames and frames[-1][1].get("type") == "content"
+                and len(frames[-1][1]["content"]) + len(event["content"]) <= max_chars):
+            frames[-1] = (seq, {"type": "content", "content": frames[-1][1]["content"] + event["content"]})
+        else:
+            frames.append((seq, event))
+    return frames
+
+
+async def sse_frames(stream: EventStream, after: int = 0) -> AsyncGenerator[str, None]:
+    """
+    Renders a stream as SSE frames starting after event `after`. Content events that
+    arrive within SSE_COALESCE_MAX_DELAY_MS of each other are sent as one frame, and
+    a heartbeat comment is sent whenever nothing happened for SSE_HEARTBEAT_SECONDS.
+    """
+    delay = settings.SSE_COALESCE_MAX_DELAY_MS / 1000
+    stream.attach()
+    try:
+        yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+        seq = after
+        while True:
+            batch, done = await stream.wait(seq, settings.SSE_HEARTBEAT_SECONDS)
+            if not batch:
+                if done:
+                    return
+                yield ": heartbeat\n\n"
+                continue
+            # Hold a trailing token briefly so the ones right behind it share its frame
+            deadline = time.monotonic() + delay
+            while (not done and batch[-1][1].get("type") == "content"
+                   and sum(len(e.get("content", "")) for _, e in batch) < settings.SSE_COALESCE_MAX_CHARS):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                more, done = await stream.wait(batch[-1][0], remaining)
+                batch.extend(more)
+            for frame_seq, event in _coalesce(batch, settings.SSE_COALESCE_MAX_CHARS):
+                yield format_event(json.dumps(event), f"{stream.id}:{frame_seq}")
+            seq = batch[-1][0]
+    finally:
+        stream.detach()
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    text/event-stream response that notices a client disconnect right away, regardless
+    of the ASGI spec version, and always closes its body iterator.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content, headers: Optional[Dict[str, str]] = None, **kwargs):
+        headers = {"Cache-Control": "no-cache", "Connection": "keep-alive",
+                   # Keep reverse proxies such as nginx from buffering the stream
+                   "X-Accel-Buffering": "no", **(headers or {})}
+        super().__init__(content, headers=headers, media_type=self.media_type, **kwargs)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            async with anyio.create_task_group() as task_group:
+                async def stream():
+                    try:
+                        await self.stream_response(send)
+                    except OSError:
+                        pass
+                    task_group.cancel_scope.cancel()
+
+                task_group.start_soon(stream)
+                await self.listen_for_disconnect(receive)
+                task_group.cancel_scope.cancel()
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose:
+                await aclose()
+        if self.background is not None:
+            await self.background()
+
+
+# Chat streams, resumable by Last-Event-ID
+event_streams = EventStreamRegistry(settings.SSE_RESUME_TTL_SECONDS, settings.SSE_DISCONNECT_GRACE_SECONDS,
+                                    max_streams=settings.SSE_MAX_STREAMS)
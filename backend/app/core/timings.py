@@ -0,0 +1,85 @@
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Iterable, List, Optional
+
+from app.core.metrics import estimate_tokens
+
+# Stages reported in the per-request breakdown, in pipeline order.
+STAGES = ("routing", "embedding", "search", "prompt_build", "time_to_first_token", "generation")
+
+
+class StageTimings:
+    """
+    Collects stage durations and token counts for a single chat request.
+    It is threaded through the RAG state so that every node can record into it.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.stages_ms: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, stage: str, seconds: float):
+        """Adds a duration to a stage (stages hit more than once are summed)."""
+        self.stages_ms[stage] = self.stages_ms.get(stage, 0.0) + seconds * 1000
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count_prompt(self, query: str, context: str, conversation_history: Optional[List[Dict[str, str]]] = None):
+        """Approximates the prompt size sent to the generation model."""
+        history_text = "".join(msg.get("content", "") for msg in conversation_history or [])
+        self.prompt_tokens += estimate_tokens(query) + estimate_tokens(context) + estimate_tokens(history_text)
+
+    def track_generation(self, answer: str):
+        """Records the output size of a blocking generation."""
+        self.completion_tokens += estimate_tokens(answer)
+
+    def track_stream(self, stream: Iterable[str]) -> Generator[str, None, None]:
+        """
+        Wraps a token stream, recording time-to-first-token, generation time and token
+        count. Tokens are estimated from the streamed text as for a blocking answer, so
+        both modes report comparable counts whatever the provider's chunk size.
+        """
+        start = time.perf_counter()
+        chunks: List[str] = []
+        try:
+            for chunk in stream:
+                if chunk:
+                    if not chunks:
+                        self.record("time_to_first_token", time.perf_counter() - start)
+                    chunks.append(chunk)
+                yield chunk
+        finally:
+            self.record("generation", time.perf_counter() - start)
+            self.completion_tokens += estimate_tokens("".join(chunks))
+
+    def as_dict(self) -> Dict[str, Any]:
+        breakdown: Dict[str, Any] = {
+            f"{stage}_ms": round(self.stages_ms[stage], 2) for stage in STAGES if stage in self.stages_ms
+        }
+        breakdown["total_ms"] = round((time.perf_counter() - self._start) * 1000, 2)
+        breakdown["prompt_tokens"] = self.prompt_tokens
+        breakdown["completion_tokens"] = self.completion_tokens
+        return breakdown
+
+
+def timed_node(stage: str):
+    """Decorates a LangGraph node so its duration is recorded into the state's timings."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, state):
+            timings = state.get("timings")
+            if timings is None:
+                return func(self, state)
+            with timings.stage(stage):
+                return func(self, state)
+        return wrapper
+    return decorator
@@ -0,0 +1,215 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Iterable, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """A single timed operation. Field names follow the OTLP JSON span encoding."""
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+        self.status = "UNSET"
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.status = "ERROR"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time_unix_nano is None:
+            return None
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1_000_000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_time_unix_nano,
+            "endTimeUnixNano": self.end_time_unix_nano,
+            "durationMs": self.duration_ms,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class SpanExporter:
+    """Receives finished spans. Subclass it to ship spans elsewhere (e.g. an OTLP collector)."""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class NoopSpanExporter(SpanExporter):
+    def export(self, span: Span):
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps the most recent spans in a ring buffer so they can be queried offline."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._lock = threading.Lock()
+        self._spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends spans as JSON lines to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+
+    def set_exporter(self, exporter: SpanExporter):
+        self.exporter.shutdown()
+        self.exporter = exporter
+
+    def _new_span(self, name: str, attributes: Optional[Dict[str, Any]]) -> Span:
+        parent = _current_span.get()
+        if parent is None:
+            return Span(name, secrets.token_hex(16), None, attributes)
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def _end_span(self, span: Span):
+        span.end_time_unix_nano = time.time_ns()
+        if span.status == "UNSET":
+            span.status = "OK"
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Failed to export span '{span.name}': {e}")
+
+    @contextmanager
+    def _activate(self, span: Span):
+        # set() instead of reset(token): generators may resume in a different
+        # context (e.g. Starlette iterating a sync stream in a thread pool).
+        previous = _current_span.get()
+        _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.set(previous)
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        """Starts a child of the current span (or a new trace) for the duration of the block."""
+        span = self._new_span(name, attributes)
+        try:
+            with self._activate(span):
+                yield span
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            self._end_span(span)
+
+    def traced(self, name: str, **attributes):
+        """Decorator form of start_span."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.start_span(name, attributes):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def trace_stream(self, stream: Iterable, name: str,
+                     attributes: Optional[Dict[str, Any]] = None) -> Generator[Any, None, None]:
+        """
+        Wraps a generator in a span that lasts until it is exhausted or closed.
+        The span is re-activated around every step so nested spans get the right parent.
+        """
+        span = self._new_span(name, attributes)
+        iterator = iter(stream)
+        items = 0
+        try:
+            while True:
+                with self._activate(span):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                items += 1
+                yield item
+        except GeneratorExit:
+            span.set_attribute("cancelled", True)
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+            raise
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.set_attribute("items", items)
+            self._end_span(span)
+
+
+def create_exporter(kind: str, path: str) -> SpanExporter:
+    """Builds the exporter selected by TRACE_EXPORTER ("memory", "file" or "none")."""
+    if kind == "file":
+        return FileSpanExporter(path)
+    if kind == "none":
+        return NoopSpanExporter()
+    if kind != "memory":
+        logger.warning(f"Unknown TRACE_EXPORTER '{kind}', falling back to in-memory exporter.")
+    return InMemorySpanExporter(settings.TRACE_MEMORY_MAX_SPANS)
+
+
+tracer = Tracer(create_exporter(settings.TRACE_EXPORTER, settings.TRACE_FILE))
@@ -1,21 +1,40 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api.v1.endpoints import scrape, chat, contexts, models
+from fastapi.responses import Response
+from app.api.v1.endpoints import scrape, chat, chat_ws, contexts, models, traces
 from app.core.config import settings
+from app.core.metrics import registry, CONTENT_TYPE_LATEST
+from app.services.html_extraction import html_extractor
+from app.services.model_catalog import model_catalog
+from app.services.multi_llm_service import multi_llm_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the model catalog so the model picker is served from memory
+    await model_catalog.refresh()
+    yield
+    await model_catalog.aclose()
+    if multi_llm_service:
+        await multi_llm_service.aclose()
+    html_extractor.shutdown()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for scraping websites, managing a vector database, and interacting with a RAG-based chat.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Include API routers
 app.include_router(scrape.router, prefix=settings.API_V1_STR, tags=["Ingestion"])
 app.include_router(chat.router, prefix=settings.API_V1_STR, tags=["Chat"])
+app.include_router(chat_ws.router, prefix=settings.API_V1_STR, tags=["Chat"])
 app.include_router(contexts.router, prefix=settings.API_V1_STR, tags=["Contexts"])
 app.include_router(models.router, prefix=settings.API_V1_STR, tags=["Models"])
+app.include_router(traces.router, prefix=settings.API_V1_STR, tags=["Observability"])
 
 @app.get("/")
 def read_root():
@@ -25,3 +44,7 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Exposes pipeline metrics in the Prometheus text format."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE_LATEST)
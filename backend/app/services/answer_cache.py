@@ -0,0 +1,149 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class CachedAnswer:
+    __slots__ = ("embedding", "context_url", "model", "top_k", "answer", "sources", "method", "created_at",
+                 "similarity")
+
+    def __init__(self, embedding: np.ndarray, context_url: str, model: str, answer: str,
+                 sources: List[Dict[str, Any]], method: str, created_at: float, top_k: Optional[int] = None):
+        self.embedding = embedding
+        self.context_url = context_url
+        self.model = model
+        self.top_k = top_k
+        self.answer = answer
+        self.sources = sources
+        self.method = method
+        self.created_at = created_at
+        self.similarity = 1.0
+
+
+class SemanticAnswerCache:
+    """
+    Caches RAG answers by query embedding.
+
+    A lookup hits when a cached query for the same context_url, model and top_k has a
+    cosine similarity of at least `threshold` with the new query, so paraphrases
+    share an answer. Entries expire after `ttl` seconds, the least recently used
+    entry is evicted beyond `max_entries`, and all entries of a context are
+    dropped when it is re-ingested or deleted.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._lru: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, str, Optional[int]], Dict[int, CachedAnswer]] = {}
+        # Bumped on invalidation so answers computed from the old content are not stored:
+        # per context, and globally (the epoch) for contexts not seen yet
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not vector.size or norm == 0:
+            return None
+        return vector / norm
+
+    def generation(self, context_url: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(context_url, 0)
+
+    def lookup(self, embedding: List[float], context_url: str, model: str,
+               top_k: Optional[int] = None) -> Optional[CachedAnswer]:
+        """Returns the most similar live entry above the threshold, or None."""
+        vector = self._normalize(embedding)
+        entry = None
+        if vector is not None:
+            with self._lock:
+                bucket = self._buckets.get((context_url, model, top_k))
+                if bucket:
+                    self._expire(bucket)
+                if bucket:
+                    ids = list(bucket)
+                    similarities = np.stack([bucket[i].embedding for i in ids]) @ vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        entry = bucket[ids[best]]
+                        entry.similarity = float(similarities[best])
+                        self._lru.move_to_end(ids[best])
+        record_cache_lookup("semantic_answer", entry is not None)
+        return entry
+
+    def put(self, embedding: List[float], context_url: str, model: str, answer: str,
+            sources: List[Dict[str, Any]], method: str, generation: Optional[Tuple[int, int]] = None,
+            top_k: Optional[int] = None):
+        """
+        Stores an answer. Pass the generation() read before the answer was computed;
+        the entry is dropped if the context was invalidated in the meantime.
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(context_url, 0)):
+                return
+            entry_id = next(self._ids)
+            entry = CachedAnswer(vector, context_url, model, answer, sources, method, self._clock(), top_k)
+            self._lru[entry_id] = entry
+            self._buckets.setdefault((context_url, model, top_k), {})[entry_id] = entry
+            while len(self._lru) > self.max_entries:
+                old_id, old = self._lru.popitem(last=False)
+                self._drop_from_bucket(old_id, old)
+
+    def invalidate(self, context_url: Optional[str] = None):
+        """Drops all entries of a context (or everything when no context is given)."""
+        with self._lock:
+            if context_url is None:
+                self._epoch += 1
+                self._lru.clear()
+                self._buckets.clear()
+                return
+            self._generations[context_url] = self._generations.get(context_url, 0) + 1
+            for key in [key for key in self._buckets if key[0] == context_url]:
+                for entry_id in self._buckets.pop(key):
+                    self._lru.pop(entry_id, None)
+        logger.info(f"Invalidated cached answers for context '{context_url}'")
+
+    def _expire(self, bucket: Dict[int, CachedAnswer]):
+        now = self._clock()
+        for entry_id in [i for i, e in bucket.items() if now - e.created_at > self.ttl]:
+            del bucket[entry_id]
+            self._lru.pop(entry_id, None)
+
+    def _drop_from_bucket(self, entry_id: int, entry: CachedAnswer):
+        key = (entry.context_url, entry.model, entry.top_k)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(entry_id, None)
+            if not bucket:
+                del self._buckets[key]
+
+
+answer_cache = SemanticAnswerCache(
+    settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    settings.ANSWER_CACHE_MAX_ENTRIES,
+    settings.ANSWER_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,509 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from app.services.html_extraction import extract_text, parse_html
+
+logger = logging.getLogger(__name__)
+
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+                       "param", "source", "track", "wbr"})
+HEADING_TAGS = frozenset({"h1", "h2", "h3", "h4", "h5", "h6"})
+# Elements that start a new block when rendering; everything else is inline
+BLOCK_TAGS = frozenset({"address", "article", "blockquote", "body", "dd", "details", "div", "dl", "dt",
+                        "fieldset", "figcaption", "figure", "form", "header", "hr", "html", "li", "main",
+                        "ol", "p", "pre", "section", "summary", "table", "tbody", "td", "tfoot", "th",
+                        "thead", "tr", "ul"}) | HEADING_TAGS
+# Never part of the article, wherever they appear
+DROP_TAGS = frozenset({"script", "style", "noscript", "template", "iframe", "svg", "canvas", "object",
+                       "embed", "button", "select", "input", "textarea", "nav", "aside", "footer", "head",
+                       "title", "dialog", "menu"})
+_BOILERPLATE_ROLES = frozenset({"navigation", "banner", "contentinfo", "complementary", "dialog",
+                                "alertdialog", "search", "menu", "menubar"})
+
+# Readability's heuristics, plus consent banners
+_UNLIKELY = re.compile(
+    r"-ad-|ai2html|banner|breadcrumb|combx|comment|community|consent|cookie|cover-wrap|disqus|extra|footer|"
+    r"gdpr|header|legends|menu|modal|nav|newsletter|pager|pagination|popup|promo|related|remark|replies|rss|"
+    r"share|shoutbox|sidebar|skyscraper|social|sponsor|subscribe|supplemental|tags|tool|widget", re.IGNORECASE)
+_MAYBE_CANDIDATE = re.compile(r"and|article|body|column|content|main|shadow", re.IGNORECASE)
+_POSITIVE = re.compile(r"article|body|content|entry|hentry|h-entry|main|page|post|text|blog|story", re.IGNORECASE)
+_NEGATIVE = re.compile(
+    r"-ad-|hidden|^hid$| hid$| hid |^hid |banner|combx|comment|com-|consent|contact|cookie|foot|footer|"
+    r"footnote|gdpr|masthead|media|meta|outbrain|promo|related|scroll|share|shoutbox|sidebar|skyscraper|"
+    r"sponsor|shopping|tags|tool|widget", re.IGNORECASE)
+_DISPLAY_NONE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+_CODE_LANGUAGE = re.compile(r"(?:language|lang)-([\w+#-]+)")
+_COMMAS = re.compile(r"[,、，]")
+_WHITESPACE = re.compile(r"[ \t\r\n\f\v]+")
+
+# Marks a <br> in collected inline text
+_BREAK = "\x00"
+
+# Container scores are derived from paragraphs of at least this many characters
+MIN_PARAGRAPH_CHARS = 25
+# Blocks of the article in which more of the text than this is link text are dropped
+MAX_LINK_DENSITY = 0.5
+# Repeats of text blocks up to this long ("Share this", "Read more") are dropped page-wide;
+# longer blocks and code are only deduplicated within a section
+MAX_BOILERPLATE_CHARS = 100
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, Optional[str]], parent: Optional["Node"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Union["Node", str]] = []
+        self.parent = parent
+
+    def elements(self) -> Iterator["Node"]:
+        return (child for child in self.children if isinstance(child, Node))
+
+
+def _iter_elements(node: Node) -> Iterator[Node]:
+    """All elements below `node` in document order, without recursion."""
+    stack = list(reversed(list(node.elements())))
+    while stack:
+        element = stack.pop()
+        yield element
+        stack.extend(reversed(list(element.elements())))
+
+
+# Tags implicitly closed by a start tag: tag -> (closed tags, tags that bound the search)
+_IMPLIED_END = {
+    "li": ({"li"}, {"ul", "ol"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "tr": ({"tr", "td", "th"}, {"table", "thead", "tbody", "tfoot"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "thead": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "tbody": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "tfoot": ({"thead", "tbody", "tfoot", "tr", "td", "th"}, {"table"}),
+    "option": ({"option"}, {"select"}),
+}
+_CLOSES_P = BLOCK_TAGS - {"li", "dd", "dt", "td", "th", "tr", "tbody", "thead", "tfoot", "body", "html"}
+
+
+class _TreeBuilder:
+    """
+    Parser target that builds a small element tree. lxml already balances the
+    events; for html.parser the common implied end tags (<p>, <li>, table cells)
+    are applied here.
+    """
+
+    def __init__(self):
+        self.root = Node("#root", {}, None)
+        self._stack = [self.root]
+
+    def start(self, tag: str, attrib=None):
+        tag = tag.lower()
+        if tag in _CLOSES_P and self._stack[-1].tag == "p":
+            self._stack.pop()
+        if tag in _IMPLIED_END:
+            closes, bounds = _IMPLIED_END[tag]
+            match = None
+            for i in range(len(self._stack) - 1, 0, -1):
+                if self._stack[i].tag in bounds:
+                    break
+                if self._stack[i].tag in closes:
+                    match = i
+            if match is not None:
+                del self._stack[match:]
+        node = Node(tag, dict(attrib or {}), self._stack[-1])
+        self._stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self._stack.append(node)
+
+    def end(self, tag: str):
+        tag = tag.lower()
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def data(self, data: str):
+        current = self._stack[-1]
+        if current.tag in ("script", "style"):
+            return
+        if current.children and isinstance(current.children[-1], str):
+            current.children[-1] += data
+        else:
+            current.children.append(data)
+
+    def comment(self, text: str):
+        pass
+
+    def close(self) -> Node:
+        return self.root
+
+
+@dataclass
+class Section:
+    """A run of blocks under one heading. `heading_path` lists the enclosing headings, outermost first."""
+    heading_path: List[str]
+    level: int = 0
+    anchor: Optional[str] = None
+    blocks: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self.blocks)
+
+    def render(self) -> str:
+        """The section as Markdown, starting with its own heading."""
+        if not self.level:
+            return self.text
+        return f"{'#' * self.level} {self.heading_path[-1]}\n\n{self.text}".rstrip()
+
+
+@dataclass
+class ExtractedPage:
+    """
+    An extracted document. HTML pages have a list of sections; streamed documents
+    (PDF, Markdown, text, JSON) have a generator that can be iterated once and
+    must be closed if it is not iterated to the end.
+    """
+    title: str
+    sections: Iterable[Section]
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(section.render() for section in self.sections)
+
+    def close(self):
+        if hasattr(self.sections, "close"):
+            self.sections.close()
+
+
+def page_from_text(text: str, title: str = "") -> ExtractedPage:
+    """Wraps plain text as a page with a single untitled section."""
+    return ExtractedPage(title, [Section([], blocks=[text])] if text else [])
+
+
+class _Measure(NamedTuple):
+    text: int
+    links: int
+    commas: int
+
+    @property
+    def link_density(self) -> float:
+        return self.links / self.text if self.text else 0.0
+
+
+def _measure(root: Node) -> Dict[int, _Measure]:
+    """Text length, link text length and comma count of every element, bottom-up."""
+    measures: Dict[int, _Measure] = {}
+    stack: List[Tuple[Node, bool]] = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.elements())
+            continue
+        text = links = commas = 0
+        for child in node.children:
+            if isinstance(child, str):
+                text += len(" ".join(child.split()))
+                commas += len(_COMMAS.findall(child))
+            else:
+                m = measures[id(child)]
+                text += m.text
+                commas += m.commas
+                links += m.text if child.tag == "a" else m.links
+        measures[id(node)] = _Measure(text, links, commas)
+    return measures
+
+
+def _is_boilerplate(node: Node) -> bool:
+    if node.tag in DROP_TAGS:
+        return True
+    attrs = node.attrs
+    if "hidden" in attrs or attrs.get("aria-hidden") == "true" or _DISPLAY_NONE.search(attrs.get("style") or ""):
+        return True
+    if (attrs.get("role") or "").lower() in _BOILERPLATE_ROLES:
+        return True
+    if node.tag == "header":
+        # Site headers go; an article header carrying the title stays
+        return not any(e.tag in ("h1", "h2") for e in _iter_elements(node))
+    if node.tag in ("html", "body", "article", "main"):
+        return False
+    match = f"{attrs.get('class') or ''} {attrs.get('id') or ''}"
+    return bool(_UNLIKELY.search(match)) and not _MAYBE_CANDIDATE.search(match)
+
+
+def _clean(root: Node):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        kept = []
+        for child in node.children:
+            if isinstance(child, Node):
+                if _is_boilerplate(child):
+                    continue
+                stack.append(child)
+            kept.append(child)
+        node.children = kept
+
+
+def _class_weight(node: Node) -> int:
+    weight = 0
+    for value in (node.attrs.get("class"), node.attrs.get("id")):
+        if value:
+            if _NEGATIVE.search(value):
+                weight -= 25
+            if _POSITIVE.search(value):
+                weight += 25
+    return weight
+
+
+def _initial_score(node: Node) -> float:
+    tag_weight = {"article": 10, "main": 10, "div": 5, "pre": 3, "td": 3, "blockquote": 3, "form": -3,
+                  "ol": -3, "ul": -3, "dl": -3, "dd": -3, "dt": -3, "li": -3, "address": -3, "th": -5}
+    return tag_weight.get(node.tag, -5 if node.tag in HEADING_TAGS else 0) + _class_weight(node)
+
+
+def _is_scorable(node: Node) -> bool:
+    if node.tag in ("p", "pre", "td", "blockquote"):
+        return True
+    # A div holding only text and inline elements is a paragraph in all but name
+    return node.tag == "div" and not any(e.tag in BLOCK_TAGS for e in node.elements())
+
+
+def _main_nodes(root: Node, measures: Dict[int, _Measure]) -> List[Node]:
+    """
+    The top-scoring container and the siblings that look like part of it. Every
+    paragraph adds to the score of its parent (fully), grandparent (half) and
+    great-grandparent (a sixth); scores are then scaled down by link density.
+    """
+    body = next((e for e in _iter_elements(root) if e.tag == "body"), root)
+    scores: Dict[int, float] = {}
+    nodes: Dict[int, Node] = {}
+    for node in _iter_elements(body):
+        m = measures[id(node)]
+        if not _is_scorable(node) or m.text < MIN_PARAGRAPH_CHARS:
+            continue
+        score = 1 + m.commas + min(m.text // 100, 3)
+        ancestor, level = node.parent, 0
+        while ancestor is not None and ancestor is not root and level < 3:
+            key = id(ancestor)
+            if key not in scores:
+                scores[key] = _initial_score(ancestor)
+                nodes[key] = ancestor
+            scores[key] += score / (1, 2, 6)[level]
+            ancestor, level = ancestor.parent, level + 1
+    if not scores:
+        return [body]
+    for key in scores:
+        scores[key] *= 1 - measures[key].link_density
+
+    top = nodes[max(scores, key=scores.get)]
+    if top.parent is None or top is body:
+        return [top]
+    threshold = max(10.0, scores[id(top)] * 0.2)
+    selected = []
+    for sibling in top.parent.elements():
+        m = measures[id(sibling)]
+        if sibling is top or scores.get(id(sibling), float("-inf")) >= threshold:
+            selected.append(sibling)
+        elif sibling.tag == "p" and ((m.text > 80 and m.link_density < 0.25)
+                                     or (0 < m.text <= 80 and m.link_density == 0
+                                         and re.search(r"[.。!?！？]", _inline_text(sibling)))):
+            selected.append(sibling)
+    return selected
+
+
+def _inline_text(node: Node) -> str:
+    parts = []
+    for child in node.children:
+        if isinstance(child, str):
+            parts.append(child)
+        elif child.tag == "br":
+            parts.append(_BREAK)
+        elif child.tag in BLOCK_TAGS:
+            parts.append(f" {_inline_text(child)} ")
+        else:
+            parts.append(_inline_text(child))
+    return "".join(parts)
+
+
+def _collapse(text: str) -> str:
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in text.split(_BREAK))
+    return "\n".join(line for line in lines if line)
+
+
+def _raw_text(node: Node) -> str:
+    return "".join(child if isinstance(child, str) else ("\n" if child.tag == "br" else _raw_text(child))
+                   for child in node.children)
+
+
+def _anchor(heading: Node) -> Optional[str]:
+    if heading.attrs.get("id"):
+        return heading.attrs["id"]
+    for element in _iter_elements(heading):
+        if element.tag == "a" and (element.attrs.get("id") or element.attrs.get("name")):
+            return element.attrs.get("id") or element.attrs.get("name")
+    parent = heading.parent
+    if parent is not None and parent.attrs.get("id") and next(parent.elements(), None) is heading:
+        return parent.attrs["id"]
+    return None
+
+
+class _Renderer:
+    """Walks the main content in document order and cuts it into sections at each heading."""
+
+    def __init__(self, measures: Dict[int, _Measure]):
+        self._measures = measures
+        self._headings: List[Tuple[int, str]] = []
+        self._inline: List[str] = []
+        self._seen = set()
+        self.sections = [Section([])]
+
+    def _add_block(self, block: str):
+        if not block:
+            return
+        blocks = self.sections[-1].blocks
+        if len(block) <= MAX_BOILERPLATE_CHARS and not block.startswith("```"):
+            # Short repeated lines are boilerplate wherever they appear
+            if block in self._seen:
+                return
+            self._seen.add(block)
+        elif block in blocks:
+            return
+        blocks.append(block)
+
+    def _flush(self):
+        if self._inline:
+            self._add_block(_collapse("".join(self._inline)))
+            self._inline = []
+
+    def render(self, node: Node):
+        for child in node.children:
+            if isinstance(child, str):
+                self._inline.append(child)
+            elif child.tag == "br":
+                self._inline.append(_BREAK)
+            elif child.tag not in BLOCK_TAGS:
+                self._inline.append(_inline_text(child))
+            else:
+                self._flush()
+                self._block(child)
+        self._flush()
+
+    def _block(self, node: Node):
+        if node.tag in HEADING_TAGS:
+            self._heading(node)
+        elif node.tag == "pre":
+            self._pre(node)
+        elif self._measures[id(node)].link_density > MAX_LINK_DENSITY:
+            return  # Menus, tag clouds and link lists that survived cleaning
+        elif node.tag in ("ul", "ol"):
+            self._add_block("\n".join(self._list(node, 0)))
+        elif node.tag == "table":
+            self._table(node)
+        elif node.tag == "blockquote":
+            self._add_block("\n".join(f"> {line}" for line in _collapse(_inline_text(node)).split("\n")))
+        else:
+            self.render(node)
+
+    def _heading(self, node: Node):
+        title = _collapse(_inline_text(node)).replace("\n", " ")
+        if not title:
+            return
+        level = int(node.tag[1])
+        while self._headings and self._headings[-1][0] >= level:
+            self._headings.pop()
+        self._headings.append((level, title))
+        self.sections.append(Section([t for _, t in self._headings], level, _anchor(node)))
+
+    def _pre(self, node: Node):
+        code = _raw_text(node).strip("\n")
+        if not code.strip():
+            return
+        classes = " ".join(n.attrs.get("class") or "" for n in [node, *node.elements()])
+        language = _CODE_LANGUAGE.search(classes)
+        self._add_block(f"```{language.group(1) if language else ''}\n{code}\n```")
+
+    def _list(self, node: Node, depth: int) -> List[str]:
+        lines = []
+        number = 0
+        for item in node.elements():
+            if item.tag != "li":
+                continue
+            number += 1
+            marker = f"{number}." if node.tag == "ol" else "-"
+            inline, nested = [], []
+            for child in item.children:
+                if isinstance(child, Node) and child.tag in ("ul", "ol"):
+                    nested.extend(self._list(child, depth + 1))
+                elif isinstance(child, Node):
+                    inline.append(_BREAK if child.tag == "br" else f" {_inline_text(child)} ")
+                else:
+                    inline.append(child)
+            text = _collapse("".join(inline)).replace("\n", " ")
+            if text:
+                lines.append(f"{'  ' * depth}{marker} {text}")
+            lines.extend(nested)
+        return lines
+
+    def _table(self, table: Node):
+        rows = []
+        stack = list(reversed(list(table.elements())))
+        while stack:
+            element = stack.pop()
+            if element.tag == "tr":
+                cells = [_collapse(_inline_text(c)).replace("\n", " ").replace("|", "\\|")
+                         for c in element.elements() if c.tag in ("td", "th")]
+                if any(cells):
+                    rows.append(cells)
+            elif element.tag in ("thead", "tbody", "tfoot"):
+                stack.extend(reversed(list(element.elements())))
+        width = max((len(r) for r in rows), default=0)
+        if len(rows) < 2 or width < 2:
+            # A layout table: its cells are ordinary content
+            self.render(table)
+            return
+        caption = next((c for c in table.elements() if c.tag == "caption"), None)
+        if caption is not None:
+            self._add_block(_collapse(_inline_text(caption)))
+        lines = []
+        for i, row in enumerate(rows):
+            lines.append("| " + " | ".join(row + [""] * (width - len(row))) + " |")
+            if i == 0:
+                lines.append("|" + " --- |" * width)
+        self._add_block("\n".join(lines))
+
+    def finish(self) -> List[Section]:
+        self._flush()
+        return [section for section in self.sections if section.blocks]
+
+
+def extract_main_content(document: bytes, encoding: Optional[str] = None, parser: str = "auto") -> ExtractedPage:
+    """
+    Extracts the main content of an HTML page, readability-style: boilerplate
+    (navigation, cookie banners, sidebars, hidden elements) is removed, the
+    container with the best paragraph score is kept, and it is rendered as Markdown
+    sections that preserve headings, lists, tables and code blocks.
+    """
+    root = parse_html(_TreeBuilder, document, encoding, parser)
+    title_node = next((e for e in _iter_elements(root) if e.tag == "title"), None)
+    title = _collapse(_inline_text(title_node)) if title_node is not None else ""
+    try:
+        _clean(root)
+        measures = _measure(root)
+        renderer = _Renderer(measures)
+        for node in _main_nodes(root, measures):
+            if node.tag in BLOCK_TAGS:
+                renderer._block(node)
+            else:
+                renderer.render(node)
+        sections = renderer.finish()
+    except RecursionError:
+        logger.warning("Document is nested too deeply for main-content extraction, using plain text")
+        sections = []
+    if not sections:
+        return page_from_text(extract_text(document, encoding, parser), title)
+    return ExtractedPage(title, sections)
@@ -0,0 +1,375 @@
+import contextvars
+import gzip
+import hashlib
+import io
+import logging
+import posixpath
+import queue
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, quote, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import requests
+
+from app.core.config import settings
+from app.services.content_extraction import ExtractedPage
+from app.services.scraping_service import HEADERS, declared_charset, extract_page_and_links
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+# Query parameters that only track where a visitor came from
+_TRACKING_PARAMS = re.compile(r"utm_\w+|fbclid|gclid|dclid|msclkid|mc_cid|mc_eid|_ga|_hsenc|_hsmi|ref_src",
+                              re.IGNORECASE)
+# Links to these are not fetched: they are never HTML
+_SKIPPED_EXTENSIONS = frozenset({
+    ".7z", ".avi", ".bmp", ".css", ".csv", ".doc", ".docx", ".exe", ".gif", ".gz", ".ico", ".jpeg", ".jpg",
+    ".js", ".mov", ".mp3", ".mp4", ".pdf", ".png", ".ppt", ".pptx", ".rar", ".svg", ".tar", ".tgz", ".wav",
+    ".webm", ".webp", ".woff", ".woff2", ".xls", ".xlsx", ".zip",
+})
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+# robots.txt Crawl-delay is honoured up to this many seconds
+MAX_CRAWL_DELAY_SECONDS = 10.0
+# Sitemap files (including those listed by sitemap indexes) read per crawl
+MAX_SITEMAPS = 10
+REQUEST_TIMEOUT_SECONDS = 15
+
+
+def canonicalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Resolves `url` against `base` and normalizes it so that spellings of the same
+    page compare equal: lowercase scheme and host, no default port, user info or
+    fragment, dot segments resolved, tracking parameters dropped and the query
+    sorted. Returns None for anything that is not an http(s) URL.
+    """
+    url = url.strip()
+    if base:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = host if port in (None, _DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+
+    path = parts.path or "/"
+    normalized = posixpath.normpath(path)
+    if normalized.startswith("//"):
+        normalized = "/" + normalized.lstrip("/")
+    if path.endswith("/") and normalized != "/":
+        normalized += "/"
+
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+              if not _TRACKING_PARAMS.fullmatch(k)]
+    query = urlencode(sorted(params), quote_via=quote)
+    return urlunsplit((scheme, netloc, normalized, query, ""))
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class BudgetExceeded(Exception):
+    """The crawl's byte budget ran out while downloading."""
+
+
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    page: ExtractedPage
+
+
+class Crawler:
+    """
+    Breadth-first crawl of one site, starting at a seed URL.
+
+    Only links with the seed's origin are followed. robots.txt (including its
+    Crawl-delay) and <meta name="robots"> are respected, sitemap.xml seeds the
+    frontier, URLs are canonicalized so each page is fetched once, and pages
+    whose extracted text was already seen under another URL are skipped.
+    The crawl stops at whichever of the depth, page and byte budgets runs out first.
+    """
+
+    def __init__(self, seed_url: str, max_depth: int, max_pages: int, max_bytes: int,
+                 use_sitemap: bool = True, delay: float = 0.0, session: Optional[requests.Session] = None):
+        seed = canonicalize_url(seed_url)
+        if seed is None:
+            raise ValueError(f"Not an http(s) URL: {seed_url}")
+        self.seed = seed
+        self.origin = _origin(seed)
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.use_sitemap = use_sitemap
+        self.delay = delay
+        self.session = session or requests.Session()
+        self.session.headers.update(HEADERS)
+
+        self.pages = 0
+        self.skipped = 0
+        self.bytes_downloaded = 0
+        self.stop_reason: Optional[str] = None
+        self._seen: Set[str] = set()
+        self._content_hashes: Set[str] = set()
+        self._frontier: deque = deque()
+        self._robots: Optional[RobotFileParser] = None
+        self._last_request = 0.0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Makes crawl() return before its next request."""
+        self._stopped.set()
+
+    # --- fetching ---
+
+    def _wait_politely(self):
+        delay = self.delay
+        if self._robots is not None:
+            delay = max(delay, min(float(self._robots.crawl_delay(HEADERS["User-Agent"]) or 0),
+                                   MAX_CRAWL_DELAY_SECONDS))
+        wait = self._last_request + delay - time.monotonic()
+        if wait > 0:
+            self._stopped.wait(wait)
+        self._last_request = time.monotonic()
+
+    def _download(self, url: str) -> Tuple[requests.Response, bytes]:
+        """GETs a URL, counting the body against the byte budget as it arrives."""
+        self._wait_politely()
+        with self.session.get(url, timeout=REQUEST_TIMEOUT_SECONDS, stream=True) as response:
+            chunks = []
+            for chunk in response.iter_content(64 * 1024):
+                self.bytes_downloaded += len(chunk)
+                if self.bytes_downloaded > self.max_bytes:
+                    raise BudgetExceeded(url)
+                chunks.append(chunk)
+            return response, b"".join(chunks)
+
+    def _load_robots(self):
+        robots = RobotFileParser(f"{self.origin}/robots.txt")
+        try:
+            response, body = self._download(robots.url)
+        except requests.RequestException as e:
+            logger.warning(f"Could not fetch {robots.url}, crawling without it: {e}")
+            robots.allow_all = True
+        else:
+            if response.status_code in (401, 403):
+                robots.disallow_all = True
+            elif response.status_code >= 400:
+                robots.allow_all = True
+            else:
+                robots.parse(body.decode("utf-8", "replace").splitlines())
+        self._robots = robots
+
+    def _allowed(self, url: str) -> bool:
+        return self._robots is None or self._robots.can_fetch(HEADERS["User-Agent"], url)
+
+    # --- frontier ---
+
+    def _enqueue(self, url: Optional[str], depth: int):
+        if url is None or url in self._seen or depth > self.max_depth:
+            return
+        if _origin(url) != self.origin:
+            return
+        if posixpath.splitext(urlsplit(url).path)[1].lower() in _SKIPPED_EXTENSIONS:
+            return
+        self._seen.add(url)
+        self._frontier.append((url, depth))
+
+    def _sitemap_urls(self) -> Iterator[str]:
+        sitemaps = deque((self._robots.site_maps() if self._robots is not None else None)
+                         or [f"{self.origin}/sitemap.xml"])
+        read = 0
+        while sitemaps and read < MAX_SITEMAPS and not self._stopped.is_set():
+            url = sitemaps.popleft()
+            read += 1
+            try:
+                response, body = self._download(url)
+                if response.status_code >= 400:
+                    continue
+                if body[:2] == b"\x1f\x8b":
+                    # Read at most what is left of the byte budget: compressed sitemaps can be huge
+                    body = gzip.GzipFile(fileobj=io.BytesIO(body)).read(self.max_bytes - self.bytes_downloaded + 1)
+                root = ElementTree.fromstring(body)
+            except (requests.RequestException, ElementTree.ParseError, OSError, EOFError) as e:
+                logger.warning(f"Could not read sitemap {url}: {e}")
+                continue
+            is_index = root.tag.endswith("sitemapindex")
+            for element in root.iter():
+                if element.tag.endswith("loc") and element.text:
+                    if is_index:
+                        sitemaps.append(element.text.strip())
+                    else:
+                        yield element.text.strip()
+
+    # --- crawl ---
+
+    def _process(self, url: str, depth: int) -> Optional[CrawledPage]:
+        response, body = self._download(url)
+        if response.status_code >= 400:
+            logger.info(f"Skipping {url}: HTTP {response.status_code}")
+            return None
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in _HTML_TYPES:
+            logger.info(f"Skipping {url}: {content_type}")
+            return None
+
+        # After redirects, the page may live somewhere else
+        final_url = canonicalize_url(response.url) or url
+        if final_url != url:
+            if _origin(final_url) != self.origin:
+                if depth > 0:
+                    logger.info(f"Skipping {url}: redirects off-site to {final_url}")
+                    return None
+                # The seed moved (http -> https, example.com -> www.example.com): crawl where it lives
+                logger.info(f"{url} redirects to {final_url}, crawling {_origin(final_url)}")
+                self.origin = _origin(final_url)
+                self._load_robots()
+                if not self._allowed(final_url):
+                    logger.info(f"Skipping {final_url}: disallowed by robots.txt")
+                    return None
+            self._seen.add(final_url)
+
+        page, links = extract_page_and_links(body, declared_charset(response))
+        base = canonicalize_url(links.base, final_url) if links.base else final_url
+        if links.follow and depth < self.max_depth:
+            for link in links.links:
+                self._enqueue(canonicalize_url(link, base), depth + 1)
+
+        if not links.index:
+            logger.info(f"Skipping {url}: noindex")
+            return None
+        canonical = canonicalize_url(links.canonical, base) if links.canonical else None
+        if canonical and _origin(canonical) == self.origin:
+            self._seen.add(canonical)
+            final_url = canonical
+        text = page.text
+        if not text:
+            return None
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if digest in self._content_hashes:
+            logger.info(f"Skipping {url}: same content as an earlier page")
+            return None
+        self._content_hashes.add(digest)
+        return CrawledPage(final_url, depth, page)
+
+    def crawl(self) -> Iterator[CrawledPage]:
+        """Yields the pages of the site as they are fetched and extracted."""
+        self._load_robots()
+        self._enqueue(self.seed, 0)
+        # Read once the seed is fetched, since a redirect of the seed decides which origin is crawled
+        sitemap_pending = self.use_sitemap and self.max_depth > 0
+
+        try:
+            while self._frontier:
+                if self._stopped.is_set():
+                    self.stop_reason = "stopped"
+                    return
+                if self.pages >= self.max_pages:
+                    self.stop_reason = "max_pages"
+                    return
+                url, depth = self._frontier.popleft()
+                crawled = self._crawl_one(url, depth)
+                if sitemap_pending:
+                    sitemap_pending = False
+                    for sitemap_url in self._sitemap_urls():
+                        self._enqueue(canonicalize_url(sitemap_url), 1)
+                    logger.info(f"Crawling {self.seed}: {len(self._frontier)} URLs queued from the seed and sitemap")
+                if crawled is None:
+                    self.skipped += 1
+                    continue
+                self.pages += 1
+                yield crawled
+            self.stop_reason = "exhausted"
+        except BudgetExceeded as e:
+            logger.info(f"Byte budget of {self.max_bytes} bytes exhausted while fetching {e}")
+            self.stop_reason = "max_bytes"
+
+    def _crawl_one(self, url: str, depth: int) -> Optional[CrawledPage]:
+        if not self._allowed(url):
+            logger.info(f"Skipping {url}: disallowed by robots.txt")
+            return None
+        try:
+            return self._process(url, depth)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            return None
+
+    def stream(self, prefetch: int) -> Iterator[CrawledPage]:
+        """
+        Runs crawl() in a background thread that stays up to `prefetch` pages ahead,
+        so fetching and parsing overlap with whatever the caller does with each page.
+        Closing the returned generator stops the crawl.
+        """
+        if prefetch <= 0:
+            yield from self.crawl()
+            return
+        pages: queue.Queue = queue.Queue(maxsize=prefetch)
+        done = object()
+        errors: List[BaseException] = []
+
+        def produce():
+            pages_crawled = self.crawl()
+            try:
+                for crawled in pages_crawled:
+                    while not self._stopped.is_set():
+                        try:
+                            pages.put(crawled, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if self._stopped.is_set():
+                        return
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                pages_crawled.close()
+                while True:
+                    try:
+                        pages.put(done, timeout=0.1)
+                        break
+                    except queue.Full:
+                        if self._stopped.is_set():
+                            return
+
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(produce,), name="crawler", daemon=True)
+        thread.start()
+        try:
+            while True:
+                crawled = pages.get()
+                if crawled is done:
+                    break
+                yield crawled
+            if errors:
+                raise errors[0]
+        finally:
+            self.stop()
+            thread.join()
+            if self.stop_reason is None:
+                self.stop_reason = "stopped"
+
+
+def crawl_limits(max_depth: Optional[int], max_pages: Optional[int],
+                 max_bytes: Optional[int]) -> Dict[str, int]:
+    """Budgets for a crawl request: the requested ones, never above the configured maxima."""
+    limits = {"max_depth": settings.CRAWL_MAX_DEPTH, "max_pages": settings.CRAWL_MAX_PAGES,
+              "max_bytes": settings.CRAWL_MAX_BYTES}
+    for name, requested in (("max_depth", max_depth), ("max_pages", max_pages), ("max_bytes", max_bytes)):
+        if requested is not None:
+            limits[name] = min(requested, limits[name])
+    return limits
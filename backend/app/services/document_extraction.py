@@ -0,0 +1,440 @@
+import codecs
+import io
+import itertools
+import json
+import logging
+import posixpath
+import re
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+from urllib.parse import unquote, urlsplit
+
+from app.services.content_extraction import ExtractedPage, Section
+
+try:
+    # Optional: PDF support
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+# Streamed documents are cut into sections of about this many characters, at paragraph breaks when possible
+SECTION_CHARS = 8000
+# Longest line read at once; longer lines are split
+MAX_LINE_CHARS = 64 * 1024
+JSON_READ_CHARS = 64 * 1024
+
+_CONTENT_TYPES = {
+    "text/html": "html",
+    "application/xhtml+xml": "html",
+    "application/pdf": "pdf",
+    "text/markdown": "markdown",
+    "text/x-markdown": "markdown",
+    "text/plain": "text",
+    "application/json": "json",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json-seq": "jsonl",
+}
+_EXTENSIONS = {
+    ".html": "html", ".htm": "html", ".xhtml": "html",
+    ".pdf": "pdf",
+    ".md": "markdown", ".markdown": "markdown",
+    ".txt": "text", ".text": "text", ".log": "text", ".csv": "text", ".rst": "text",
+    ".json": "json",
+    ".jsonl": "jsonl", ".ndjson": "jsonl",
+}
+# Servers commonly send these for any file they do not know
+_GENERIC_TYPES = frozenset({"", "text/plain", "application/octet-stream", "binary/octet-stream"})
+
+
+def detect_document_type(content_type: str, url: str, head: bytes) -> Optional[str]:
+    """
+    Decides how a download is extracted: "html", "pdf", "markdown", "text", "json"
+    or "jsonl", from its Content-Type, then its file extension, then its first bytes.
+    Returns None for anything else.
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    extension = posixpath.splitext(urlsplit(url).path)[1].lower()
+    if media_type not in _GENERIC_TYPES:
+        if media_type in _CONTENT_TYPES:
+            return _CONTENT_TYPES[media_type]
+        if media_type.endswith("+json"):
+            return "json"
+        if media_type.startswith("text/"):
+            return _EXTENSIONS.get(extension, "text")
+        if not head.startswith(b"%PDF-"):
+            return None
+    if extension in _EXTENSIONS:
+        return _EXTENSIONS[extension]
+    stripped = head.lstrip().lower()
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if stripped.startswith((b"<!doctype html", b"<html")) or b"<body" in stripped:
+        return "html"
+    if media_type == "text/plain":
+        return "text"
+    return None
+
+
+def _text_encoding(stream: BinaryIO, declared: Optional[str]) -> str:
+    head = stream.read(4)
+    stream.seek(0)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if declared:
+        try:
+            return codecs.lookup(declared).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _open_text(stream: BinaryIO, charset: Optional[str]) -> TextIO:
+    return io.TextIOWrapper(stream, encoding=_text_encoding(stream, charset), errors="replace", newline=None)
+
+
+def _lines(text: TextIO) -> Iterator[str]:
+    while True:
+        line = text.readline(MAX_LINE_CHARS)
+        if not line:
+            return
+        yield line.rstrip("\n")
+
+
+def _paragraph_sections(lines: Iterator[str], heading_path: List[str], level: int = 0,
+                        anchor: Optional[str] = None) -> Iterator[Section]:
+    """Groups lines into sections of about SECTION_CHARS, cutting at blank lines."""
+    pending: List[str] = []
+    size = 0
+    for line in lines:
+        if not line.strip() and size >= SECTION_CHARS or size >= 4 * SECTION_CHARS:
+            text = "\n".join(pending).strip()
+            if text:
+                yield Section(heading_path, level, anchor, [text])
+            pending, size = [], 0
+        pending.append(line)
+        size += len(line) + 1
+    text = "\n".join(pending).strip()
+    if text:
+        yield Section(heading_path, level, anchor, [text])
+
+
+# --- plain text ---
+
+def iter_text_sections(stream: BinaryIO, charset: Optional[str] = None) -> Iterator[Section]:
+    """Plain text as untitled sections of about SECTION_CHARS characters."""
+    yield from _paragraph_sections(_lines(_open_text(stream, charset)), [])
+
+
+# --- Markdown ---
+
+_ATX_HEADING = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_SETEXT_UNDERLINE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_SLUG_STRIP = re.compile(r"[^\w\- ]")
+
+
+def _slugify(heading: str, used: Dict[str, int]) -> str:
+    """GitHub-style heading anchor: lowercase, punctuation dropped, spaces to hyphens, numbered when repeated."""
+    slug = _SLUG_STRIP.sub("", heading.strip().lower()).replace(" ", "-")
+    count = used.get(slug, 0)
+    used[slug] = count + 1
+    return f"{slug}-{count}" if count else slug
+
+
+class _MarkdownSplitter:
+    def __init__(self):
+        self.path: List[Tuple[int, str]] = []
+        self.level = 0
+        self.anchor: Optional[str] = None
+        self.used: Dict[str, int] = {}
+        self.body: List[str] = []
+        self.size = 0
+
+    def add(self, line: str):
+        self.body.append(line)
+        self.size += len(line) + 1
+
+    def flush(self) -> Iterator[Section]:
+        """The body so far, as sections under the current heading."""
+        heading_path = [title for _, title in self.path]
+        yield from _paragraph_sections(iter(self.body), heading_path, self.level, self.anchor)
+        self.body, self.size = [], 0
+
+    def heading(self, level: int, title: str) -> Iterator[Section]:
+        yield from self.flush()
+        while self.path and self.path[-1][0] >= level:
+            self.path.pop()
+        self.path.append((level, title))
+        self.level, self.anchor = level, _slugify(title, self.used)
+
+
+def iter_markdown_sections(stream: BinaryIO, charset: Optional[str] = None) -> Iterator[Section]:
+    """
+    Markdown split at its ATX (#) and setext (===, ---) headings, with heading
+    paths and GitHub-style anchors. Section bodies stay Markdown; headings inside
+    fenced code blocks and YAML front matter are ignored. A long section is emitted
+    in parts as it is read, each under the same heading.
+    """
+    lines = _lines(_open_text(stream, charset))
+    splitter = _MarkdownSplitter()
+    fence: Optional[str] = None
+
+    first = next(lines, None)
+    if first is not None and first.strip() == "---":
+        # Front matter: skip to its closing line
+        for line in lines:
+            if line.strip() in ("---", "..."):
+                break
+    elif first is not None:
+        lines = itertools.chain([first], lines)
+
+    for line in lines:
+        body = splitter.body
+        if fence is not None:
+            splitter.add(line)
+            if line.strip().startswith(fence):
+                fence = None
+            elif splitter.size >= 4 * SECTION_CHARS:
+                yield from splitter.flush()
+            continue
+        fence_match = _FENCE.match(line)
+        heading = _ATX_HEADING.match(line)
+        if fence_match:
+            fence = fence_match.group(1)
+            splitter.add(line)
+        elif heading and (heading.group(2) or "").strip():
+            yield from splitter.heading(len(heading.group(1)), heading.group(2).strip())
+        elif _SETEXT_UNDERLINE.match(line) and body and body[-1].strip() and (len(body) == 1 or not body[-2].strip()):
+            title = body.pop().strip()
+            yield from splitter.heading(1 if line.strip()[0] == "=" else 2, title)
+        else:
+            splitter.add(line)
+            if (not line.strip() and splitter.size >= SECTION_CHARS) or splitter.size >= 4 * SECTION_CHARS:
+                yield from splitter.flush()
+    yield from splitter.flush()
+
+
+# --- PDF ---
+
+def _outline_pages(reader: Any) -> List[Tuple[int, List[str]]]:
+    """(first page, heading path) for each bookmark, in page order."""
+    entries: List[Tuple[int, List[str]]] = []
+
+    def walk(items: list, parents: List[str]):
+        last: List[str] = parents
+        for item in items:
+            if isinstance(item, list):
+                walk(item, last)
+                continue
+            try:
+                page = reader.get_destination_page_number(item)
+            except Exception:
+                continue
+            if page is None or page < 0:
+                continue
+            last = parents + [str(item.title).strip()]
+            entries.append((page, last))
+
+    try:
+        walk(reader.outline, [])
+    except Exception as e:
+        logger.warning(f"Could not read the PDF outline: {e}")
+    entries.sort(key=lambda entry: entry[0])
+    return entries
+
+
+def iter_pdf_sections(reader: Any) -> Iterator[Section]:
+    """
+    One section per page of a pypdf PdfReader, extracted as the pages are reached.
+    Bookmarks give pages their heading path; the anchor is the page's #page=N fragment.
+    """
+    outline = _outline_pages(reader)
+    heading_path: List[str] = []
+    next_entry = 0
+    for number, page in enumerate(reader.pages):
+        while next_entry < len(outline) and outline[next_entry][0] <= number:
+            heading_path = outline[next_entry][1]
+            next_entry += 1
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            logger.warning(f"Could not extract text from PDF page {number + 1}: {e}")
+            continue
+        text = "\n".join(line.rstrip() for line in text.splitlines()).strip()
+        if text:
+            yield Section(heading_path, 0, f"page={number + 1}", [text])
+
+
+# --- JSON ---
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _JSONStream:
+    """
+    Reads the members of a top-level JSON array or object one at a time, so only
+    the largest member, not the whole document, is in memory. Uses the standard
+    library decoder on a sliding window of the text.
+    """
+
+    def __init__(self, text: TextIO):
+        self._text = text
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size: int = JSON_READ_CHARS):
+        chunk = self._text.read(size)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos:self._pos + 1]
+            self._fill()
+
+    def _expect(self, *chars: str) -> str:
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON, found {char!r}")
+        self._pos += 1
+        return char
+
+    def _value(self) -> Any:
+        self._peek()
+        size = JSON_READ_CHARS
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the end of the window may continue in the next read
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Read more, growing the read size so a large member is decoded in linear time
+            self._fill(size)
+            size *= 2
+
+    def members(self) -> Iterator[Tuple[Optional[str], Any]]:
+        """(key, value) for an object, (None, item) for an array, (None, document) for anything else."""
+        opening = self._peek()
+        if opening not in ("[", "{"):
+            yield None, self._value()
+            return
+        self._pos += 1
+        closing = "]" if opening == "[" else "}"
+        if self._peek() == closing:
+            return
+        while True:
+            key = None
+            if opening == "{":
+                key = self._value()
+                self._expect(":")
+            yield key, self._value()
+            if self._expect(",", closing) == closing:
+                return
+
+
+def _json_scalar(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _json_lines(value: Any, indent: int = 0) -> Iterator[str]:
+    """A JSON value as indented "key: value" lines, which embed better than raw JSON."""
+    pad = "  " * indent
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (dict, list)) and item:
+                yield f"{pad}{key}:"
+                yield from _json_lines(item, indent + 1)
+            else:
+                yield f"{pad}{key}: {_json_scalar(item)}"
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, (dict, list)) and item:
+                yield f"{pad}-"
+                yield from _json_lines(item, indent + 1)
+            else:
+                yield f"{pad}- {_json_scalar(item)}"
+    else:
+        yield f"{pad}{_json_scalar(value)}"
+
+
+def _json_section(key: Optional[str], value: Any) -> Iterator[Section]:
+    if key is None:
+        return _paragraph_sections(_json_lines(value), [])
+    return _paragraph_sections(_json_lines(value), [key], level=1)
+
+
+def iter_json_sections(stream: BinaryIO, charset: Optional[str] = None) -> Iterator[Section]:
+    """A JSON document, one member of its top-level array or object at a time."""
+    for key, value in _JSONStream(_open_text(stream, charset)).members():
+        yield from _json_section(key, value)
+
+
+def iter_jsonl_sections(stream: BinaryIO, charset: Optional[str] = None) -> Iterator[Section]:
+    """JSON Lines: one record per line. Lines that are not JSON are kept as text."""
+    for line in _open_text(stream, charset):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError:
+            yield Section([], blocks=[line])
+            continue
+        yield from _json_section(None, value)
+
+
+# --- dispatch ---
+
+_EXTRACTORS: Dict[str, Callable[..., Iterator[Section]]] = {
+    "markdown": iter_markdown_sections,
+    "text": iter_text_sections,
+    "json": iter_json_sections,
+    "jsonl": iter_jsonl_sections,
+}
+
+
+def _closing(sections: Iterator[Section], stream: BinaryIO) -> Iterator[Section]:
+    try:
+        yield from sections
+    finally:
+        stream.close()
+
+
+def _file_name(url: str) -> str:
+    return unquote(posixpath.basename(urlsplit(url).path))
+
+
+def extract_document(stream: BinaryIO, document_type: str, url: str,
+                     charset: Optional[str] = None) -> ExtractedPage:
+    """
+    Extracts a downloaded non-HTML document. Its sections are a generator that reads
+    `stream` as it is iterated and closes it at the end, so a large document is never
+    held in memory as a whole; they can be iterated once.
+    """
+    title = _file_name(url)
+    if document_type == "pdf":
+        if PdfReader is None:
+            raise RuntimeError("PDF support requires pypdf (pip install pypdf)")
+        # pypdf reads the cross-reference table now and each page's objects when the page is extracted
+        reader = PdfReader(stream)
+        if reader.metadata and reader.metadata.title:
+            title = str(reader.metadata.title)
+        sections = iter_pdf_sections(reader)
+    elif document_type in _EXTRACTORS:
+        sections = _EXTRACTORS[document_type](stream, charset)
+    else:
+        raise ValueError(f"Unsupported document type: {document_type}")
+    return ExtractedPage(title, _closing(sections, stream))
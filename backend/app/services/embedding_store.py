@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so one process per directory
+    fcntl = None
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+_DIGEST_SIZE = 32  # sha256
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class _ModelEmbeddings:
+    """
+    Embeddings of one model on disk:
+
+      meta.json    {"model": ..., "dim": ...}
+      vectors.f32  row-major float32 matrix, one row per embedding (memory-mapped for reads)
+      keys.bin     sha256 digest of each row's text, in row order (the index)
+
+    Both data files are append-only. Several processes (server workers) may share the
+    directory: appends and tail repairs hold an exclusive lock on `.lock`, and a writer
+    first picks up the rows other processes appended, so vector N always belongs to key N.
+    A row is written before its key, so after a crash at most a trailing vector without a
+    key is left, and it is truncated on load.
+    """
+
+    def __init__(self, directory: str, model: str):
+        self.directory = directory
+        self.model = model
+        self.dim: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._map: Optional[np.memmap] = None
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._keys_path = os.path.join(directory, "keys.bin")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock_path = os.path.join(directory, ".lock")
+        with self._file_lock():
+            self._load()
+        if self._rows:
+            logger.info(f"Loaded {self._rows} cached embeddings for model '{self.model}'")
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Indexes the rows appended since the last call; the file lock must be held."""
+        if not all(os.path.exists(p) for p in (self._meta_path, self._vectors_path, self._keys_path)):
+            return
+        if self.dim is None:
+            with open(self._meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._rows * _DIGEST_SIZE)
+            keys = f.read()
+        vector_rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        rows = min(self._rows + len(keys) // _DIGEST_SIZE, vector_rows)
+        for i in range(rows - self._rows):
+            self._index[keys[i * _DIGEST_SIZE:(i + 1) * _DIGEST_SIZE]] = self._rows + i
+        self._rows = rows
+        if os.path.getsize(self._vectors_path) != rows * self.dim * 4 or \
+                os.path.getsize(self._keys_path) != rows * _DIGEST_SIZE:
+            # Drop the partially written tail so new rows line up with their keys again
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(rows * self.dim * 4)
+            with open(self._keys_path, "r+b") as f:
+                f.truncate(rows * _DIGEST_SIZE)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        row = self._index.get(digest)
+        if row is None:
+            return None
+        if self._map is None or self._map.shape[0] <= row:
+            # The file grew since it was mapped
+            self._map = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return self._map[row]
+
+    def put(self, digest: bytes, embedding: List[float]):
+        if digest in self._index:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._file_lock():
+            # Rows other processes appended since our last look
+            self._load()
+            if digest in self._index:
+                return
+            if self.dim is None:
+                self.dim = int(vector.shape[0])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+            elif vector.shape[0] != self.dim:
+                logger.warning(f"Not caching embedding of dimension {vector.shape[0]} for model "
+                               f"'{self.model}' (expected {self.dim})")
+                return
+            with open(self._vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(digest)
+            self._index[digest] = self._rows
+            self._rows += 1
+
+
+class EmbeddingStore:
+    """
+    Disk-backed embedding cache keyed by (embedding model, sha256(text)).
+    Re-ingesting or rebuilding a collection reads vectors from disk instead of
+    calling the embedding model again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelEmbeddings] = {}
+
+    def _model(self, model: str) -> _ModelEmbeddings:
+        store = self._models.get(model)
+        if store is None:
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            store = _ModelEmbeddings(os.path.join(self.directory, safe_name), model)
+            self._models[model] = store
+        return store
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        digest = text_digest(text)
+        with self._lock:
+            vector = self._model(model).get(digest)
+            return vector.tolist() if vector is not None else None
+
+    def get_many(self, model: str, digests: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Stored embeddings by text digest, None where there is none."""
+        with self._lock:
+            store = self._model(model)
+            return [store.get(digest) for digest in digests]
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        if not embedding:
+            return
+        digest = text_digest(text)
+        with self._lock:
+            self._model(model).put(digest, embedding)
+
+    def get_or_compute(self, model: str, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Returns the stored embedding for the text, computing and storing it on a miss."""
+        embedding = self.get(model, text)
+        record_cache_lookup("embedding_store", embedding is not None)
+        if embedding is None:
+            embedding = compute(text)
+            self.put(model, text, embedding)
+        return embedding
+
+    def count(self, model: str) -> int:
+        with self._lock:
+            return len(self._model(model))
+
+
+# Singleton instance
+embedding_store = EmbeddingStore(settings.EMBEDDING_STORE_DIR) if settings.EMBEDDING_STORE_ENABLED else None
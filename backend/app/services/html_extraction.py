@@ -0,0 +1,266 @@
+import codecs
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from app.core.config import settings
+
+try:
+    # Optional: a C parser several times faster than html.parser on large pages
+    from lxml import etree
+except ImportError:
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# Elements whose content is never page text. Void elements such as <meta> have no content to skip.
+BOILERPLATE_TAGS = frozenset({"script", "style", "head", "title", "header", "footer", "nav", "aside"})
+
+# Documents are decoded and fed to the parser in pieces of this many bytes
+FEED_CHUNK_BYTES = 64 * 1024
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+
+
+class _TextCollector:
+    """
+    Parser target that collects text without building a tree. Each run of text
+    between two tags becomes one stripped line, like BeautifulSoup's
+    get_text(separator="\\n", strip=True), and text inside boilerplate elements
+    is dropped. Memory use is bounded by the extracted text, not the markup.
+    """
+
+    def __init__(self):
+        self._skip_depth = 0
+        self._pending: List[str] = []
+        self._lines: List[str] = []
+
+    def _flush(self):
+        if self._pending:
+            text = "".join(self._pending).strip()
+            self._pending = []
+            if text and not self._skip_depth:
+                self._lines.append(text)
+
+    def start(self, tag: str, attrib=None):
+        self._flush()
+        if tag.lower() in BOILERPLATE_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag: str):
+        self._flush()
+        if tag.lower() in BOILERPLATE_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data: str):
+        if not self._skip_depth:
+            self._pending.append(data)
+
+    def comment(self, text: str):
+        pass
+
+    def close(self) -> str:
+        self._flush()
+        return "\n".join(self._lines)
+
+
+@dataclass
+class PageLinks:
+    """Links found in a document, as written (relative URLs are not resolved)."""
+    links: List[str] = field(default_factory=list)
+    base: Optional[str] = None
+    canonical: Optional[str] = None
+    # <meta name="robots"> directives
+    index: bool = True
+    follow: bool = True
+
+
+class _LinkCollector:
+    """Parser target that collects followable links, <base>, rel=canonical and robots directives."""
+
+    def __init__(self):
+        self._result = PageLinks()
+
+    def start(self, tag: str, attrib=None):
+        tag = tag.lower()
+        if tag not in ("a", "area", "link", "base", "meta"):
+            return
+        attrs = {key.lower(): value or "" for key, value in dict(attrib or {}).items()}
+        rel = attrs.get("rel", "").lower().split()
+        href = attrs.get("href", "").strip()
+        if tag in ("a", "area") and href and "nofollow" not in rel:
+            self._result.links.append(href)
+        elif tag == "link" and "canonical" in rel and href:
+            self._result.canonical = href
+        elif tag == "base" and href and self._result.base is None:
+            self._result.base = href
+        elif tag == "meta" and attrs.get("name", "").lower() == "robots":
+            directives = {d.strip() for d in attrs.get("content", "").lower().split(",")}
+            if directives & {"noindex", "none"}:
+                self._result.index = False
+            if directives & {"nofollow", "none"}:
+                self._result.follow = False
+
+    def end(self, tag: str):
+        pass
+
+    def data(self, data: str):
+        pass
+
+    def comment(self, text: str):
+        pass
+
+    def close(self) -> PageLinks:
+        return self._result
+
+
+class _StdlibParser(HTMLParser):
+    """Drives a parser target from the standard library's incremental html.parser."""
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, attrs)
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def close(self) -> str:
+        super().close()
+        return self.target.close()
+
+
+def detect_encoding(document: bytes, declared: Optional[str] = None) -> str:
+    """HTTP charset if given, else a byte order mark or <meta charset>, else UTF-8."""
+    candidates = [declared]
+    if document.startswith(codecs.BOM_UTF8):
+        candidates.append("utf-8-sig")
+    match = _META_CHARSET.search(document[:4096])
+    if match:
+        candidates.append(match.group(1).decode("ascii", "ignore"))
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            continue
+    return "utf-8"
+
+
+def _feed(parser, document: bytes, encoding: str):
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for start in range(0, len(document), FEED_CHUNK_BYTES):
+        text = decoder.decode(document[start:start + FEED_CHUNK_BYTES])
+        if text:
+            parser.feed(text)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        parser.feed(tail)
+    return parser.close()
+
+
+def _parse(target, document: bytes, encoding: str, parser: str):
+    if parser == "lxml":
+        return _feed(etree.HTMLParser(target=target, remove_comments=True, huge_tree=True), document, encoding)
+    return _feed(_StdlibParser(target), document, encoding)
+
+
+def parse_html(target_factory: Callable[[], Any], document: bytes, encoding: Optional[str] = None,
+               parser: str = "auto") -> Any:
+    """
+    Streams a document through a parser target (start/end/data/comment/close) and
+    returns what the target's close() returns. `parser` is "lxml", "html.parser" or
+    "auto" (lxml when installed); when lxml is unavailable or fails on the document,
+    it is parsed again with html.parser and a fresh target.
+    """
+    encoding = detect_encoding(document, encoding)
+    if parser in ("auto", "lxml") and etree is not None:
+        try:
+            return _parse(target_factory(), document, encoding, "lxml")
+        except Exception as e:
+            logger.warning(f"lxml failed to parse the document, falling back to html.parser: {e}")
+    elif parser == "lxml":
+        logger.warning("HTML_PARSER is 'lxml' but lxml is not installed, using html.parser")
+    return _parse(target_factory(), document, encoding, "html.parser")
+
+
+def extract_text(document: bytes, encoding: Optional[str] = None, parser: str = "auto") -> str:
+    """Extracts the text of an HTML document, without boilerplate elements."""
+    return parse_html(_TextCollector, document, encoding, parser)
+
+
+def extract_links(document: bytes, encoding: Optional[str] = None, parser: str = "auto") -> PageLinks:
+    """Collects the links of an HTML document, for crawling."""
+    return parse_html(_LinkCollector, document, encoding, parser)
+
+
+class HTMLExtractor:
+    """
+    Runs HTML extraction for large documents in a pool of worker processes, so parsing
+    multi-megabyte pages uses every core instead of holding the GIL in a request
+    thread. Small documents are parsed inline, where shipping them to a worker would
+    cost more than the parse. The pool is created on first use.
+    """
+
+    def __init__(self, workers: int, min_bytes: int, parser: str = "auto"):
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self.parser = parser
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs server and client threads is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def extract(self, document: bytes, encoding: Optional[str] = None,
+                extractor: Callable[[bytes, Optional[str], str], Any] = extract_text) -> Any:
+        """Runs `extractor(document, encoding, parser)`; it must be a module-level function so it can be pickled."""
+        if self.workers <= 0 or len(document) < self.min_bytes:
+            return extractor(document, encoding, self.parser)
+        pool = self._get_pool()
+        try:
+            return pool.submit(extractor, document, encoding, self.parser).result()
+        except BrokenProcessPool as e:
+            logger.error(f"HTML extraction pool is broken, parsing inline: {e}")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+            return extractor(document, encoding, self.parser)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _worker_count() -> int:
+    if settings.HTML_PARSE_WORKERS is not None:
+        return settings.HTML_PARSE_WORKERS
+    return min(4, os.cpu_count() or 1)
+
+
+html_extractor = HTMLExtractor(_worker_count(), settings.HTML_PARSE_POOL_MIN_BYTES, settings.HTML_PARSER)
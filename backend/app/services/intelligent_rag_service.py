@@ -1,14 +1,33 @@
 import logging
-from typing import Dict, Any, List, TypedDict
-from typing_extensions import Annotated
-import json
-from langgraph.graph import StateGraph, END, START
+import threading
+from typing import Dict, Any, List, Optional, Tuple, TypedDict
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, END
 
+from .answer_cache import CachedAnswer, SemanticAnswerCache, answer_cache
 from .multi_llm_service import MultiLLMService
 from .vector_db_service import MilvusService
+from .rag_stages import (
+    Router, Retriever, Reranker, Generator,
+    LLMRouter, MilvusRetriever, PassthroughReranker, LLMGenerator,
+)
+from app.core.cancellation import is_cancelled
+from app.core.config import settings
+from app.core.metrics import time_stage
+from app.core.timings import StageTimings, timed_node
+from app.core.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+
+def _log_generation_error(message: str, error: Exception):
+    # クライアントの切断による中断はエラーとして扱わない
+    if is_cancelled():
+        logger.info(f"クライアントの切断により生成を中止しました: {error}")
+    else:
+        logger.error(f"{message}: {error}")
+
+
 # LangGraphで使用する状態を定義
 class RAGState(TypedDict):
     query: str
@@ -21,114 +40,101 @@ class RAGState(TypedDict):
     answer: str
     sources: List[Dict[str, Any]]
     method: str
+    timings: StageTimings
+    streaming: bool
+    cancel_event: threading.Event
+    query_embedding: Optional[List[float]]
 
 class IntelligentRAGService:
-    def __init__(self, multi_llm_service: MultiLLMService, milvus_service: MilvusService):
+    """
+    ルーター、リトリーバー、リランカー、ジェネレーターを差し替え可能なステージとして
+    組み合わせるRAGエンジン。ブロッキング・ストリーミングの両方で同じグラフを実行し、
+    ストリーミング時はノードがLangGraphのcustomストリームにイベントを書き込む。
+    """
+
+    def __init__(self, multi_llm_service: MultiLLMService, milvus_service: MilvusService,
+                 router: Optional[Router] = None, retriever: Optional[Retriever] = None,
+                 reranker: Optional[Reranker] = None, generator: Optional[Generator] = None,
+                 answer_cache: Optional[SemanticAnswerCache] = None):
         self.multi_llm = multi_llm_service
         self.milvus = milvus_service
+        self.router = router or LLMRouter(multi_llm_service)
+        self.retriever = retriever or MilvusRetriever(multi_llm_service, milvus_service)
+        self.reranker = reranker or PassthroughReranker()
+        self.generator = generator or LLMGenerator(multi_llm_service)
+        self.answer_cache = answer_cache
+        if answer_cache is not None:
+            # コンテキストの再取り込み・削除時にキャッシュ済みの回答を破棄する
+            milvus_service.add_change_listener(answer_cache.invalidate)
         self.workflow = self._create_workflow()
-        
+
     def _create_workflow(self):
         """LangGraphワークフローを作成"""
         workflow = StateGraph(RAGState)
-        
+
         # ノードを定義
-        workflow.add_node("route_query", self._route_query)
-        workflow.add_node("perform_rag", self._perform_rag)
-        workflow.add_node("direct_answer", self._direct_answer)
-        
+        workflow.add_node("route_query", tracer.traced("rag.route_query")(self._route_query))
+        workflow.add_node("retrieve", tracer.traced("rag.retrieve")(self._retrieve))
+        workflow.add_node("rerank", tracer.traced("rag.rerank")(self._rerank))
+        workflow.add_node("generate", tracer.traced("rag.generate")(self._generate))
+        workflow.add_node("direct_answer", tracer.traced("rag.direct_answer")(self._direct_answer))
+
         # エッジを定義
         workflow.set_entry_point("route_query")
-        
+
         # 条件分岐エッジ
         workflow.add_conditional_edges(
             "route_query",
             self._decide_next_step,
             {
-                "rag": "perform_rag",
+                "rag": "retrieve",
                 "direct": "direct_answer"
             }
         )
-        
+        workflow.add_conditional_edges(
+            "retrieve",
+            self._after_retrieve,
+            {
+                "rerank": "rerank",
+                "end": END
+            }
+        )
+        workflow.add_edge("rerank", "generate")
+
         # 終了エッジ
-        workflow.add_edge("perform_rag", END)
+        workflow.add_edge("generate", END)
         workflow.add_edge("direct_answer", END)
-        
+
         return workflow.compile()
-        
+
     def _decide_next_step(self, state: RAGState) -> str:
         """RAGルーティングの結果に基づいて次のステップを決定"""
         return "rag" if state.get("requires_rag", True) else "direct"
-    
-    def _route_query(self, state: RAGState) -> RAGState:
-        """クエリを分析してRAGが必要かどうか判断"""
-        query = state["query"]
-        context_url = state["context_url"]
-        model = state["model"]
-        conversation_history = state.get("conversation_history", [])
-        
-        # RAG判定用のプロンプト
-        routing_prompt = f"""あなたは質問を分析して、RAG（検索拡張生成）が必要かどうかを判断するエキスパートです。
-
-与えられた質問について、提供されたURLのコンテンツから情報を検索する必要があるかどうかを判断してください。
-
-コンテキストURL: {context_url}
-
-質問: {query}
 
-判断基準:
-- URLのコンテンツに関する具体的な情報が必要な場合 → RAGが必要
-- 文書の内容についての質問 → RAGが必要  
-- 翻訳のみの要求 → RAGは不要
-- 一般的な質問（URLコンテンツに関係ない） → RAGは不要
-- 前回の会話の続きで新しい情報が不要 → RAGは不要
+    def _after_retrieve(self, state: RAGState) -> str:
+        """検索に失敗した場合はエラー回答のまま終了"""
+        return "end" if state.get("method") == "rag_error" else "rerank"
 
-ただし、このアプリケーションは与えられたURLのコンテンツについて答えることが主な目的なので、迷った場合は積極的にRAGを使用してください。
-
-以下のJSON形式で回答してください:
-{{"requires_rag": true/false, "reasoning": "判断理由"}}"""
-        
+    @time_stage("route")
+    @timed_node("routing")
+    def _route_query(self, state: RAGState) -> RAGState:
+        """クエリを分析してRAGが必要かどうか判断"""
         try:
-            # LLMでRAG必要性を判断
-            messages = [
-                {"role": "system", "content": routing_prompt},
-                {"role": "user", "content": query}
-            ]
-            
-            # 会話履歴がある場合は追加コンテキストとして提供
-            if conversation_history:
-                context_msg = f"前回の会話履歴:\n"
-                for msg in conversation_history[-3:]:  # 直近3件のみ
-                    context_msg += f"{msg['role']}: {msg['content']}\n"
-                messages.insert(1, {"role": "system", "content": context_msg})
-            
-            response = self.multi_llm.generate_chat_response(
-                query=query,
-                context=routing_prompt,
-                model=model,
-                conversation_history=[]
+            requires_rag, reasoning = self.router.route(
+                query=state["query"],
+                context_url=state["context_url"],
+                model=state["model"],
+                conversation_history=state.get("conversation_history", [])
             )
-            
-            # JSON形式の回答をパース
-            content = response.strip()
-            if content.startswith('```json'):
-                content = content[7:-3].strip()
-            elif content.startswith('```'):
-                content = content[3:-3].strip()
-                
-            result = json.loads(content)
-            requires_rag = result.get("requires_rag", True)  # デフォルトはRAGを使用
-            reasoning = result.get("reasoning", "判断できませんでした")
-            
             logger.info(f"RAG判定結果: {requires_rag}, 理由: {reasoning}")
-            
+
             # 状態を更新して返す
             return {
                 **state,
                 "requires_rag": requires_rag,
                 "routing_reasoning": reasoning
             }
-            
+
         except Exception as e:
             logger.error(f"RAG判定でエラー: {e}")
             # エラーの場合はRAGを使用する（安全側に倒す）
@@ -137,116 +143,248 @@ class IntelligentRAGService:
                 "requires_rag": True,
                 "routing_reasoning": f"判定エラーのためRAGを使用: {str(e)}"
             }
-    
-    def _perform_rag(self, state: RAGState) -> RAGState:
-        """RAGを実行して回答を生成"""
+
+    def _retrieve(self, state: RAGState) -> RAGState:
+        """関連コンテンツを検索"""
+        try:
+            sources = self.retriever.retrieve(
+                query=state["query"],
+                context_url=state["context_url"],
+                top_k=state.get("top_k", 3),
+                timings=state["timings"],
+                query_embedding=state.get("query_embedding")
+            )
+            return {**state, "sources": sources, "method": "rag"}
+        except Exception as e:
+            logger.error(f"RAG実行でエラー: {e}")
+            answer = f"RAGでの回答生成に失敗しました: {str(e)}"
+            self._emit(state, {"type": "error", "content": answer})
+            return {
+                **state,
+                "answer": answer,
+                "sources": [],
+                "method": "rag_error"
+            }
+
+    def _rerank(self, state: RAGState) -> RAGState:
+        """検索結果をリランク"""
+        try:
+            sources = self.reranker.rerank(state["query"], state.get("sources", []))
+            return {**state, "sources": sources}
+        except Exception as e:
+            # リランクに失敗しても検索結果の順序のまま続行する
+            logger.error(f"リランクでエラー: {e}")
+            return state
+
+    def _generate(self, state: RAGState) -> RAGState:
+        """検索結果をコンテキストとして回答を生成"""
         query = state["query"]
         context_url = state["context_url"]
-        model = state["model"]
         conversation_history = state.get("conversation_history", [])
-        top_k = state.get("top_k", 3)
-        
+        sources = state.get("sources", [])
+        timings = state["timings"]
+
+        # ソース情報を先に送信
+        self._emit(state, {"type": "sources", "sources": sources, "method": "rag"})
+
+        if not sources:
+            answer = self._not_found_message(context_url)
+            self._emit(state, {"type": "content", "content": answer})
+            return {
+                **state,
+                "answer": answer,
+                "sources": [],
+                "method": "rag"
+            }
+
         try:
-            # 1. クエリをエンベディング
-            query_embedding = self.multi_llm.generate_embedding(query)
-            if not query_embedding:
-                raise Exception("クエリのエンベディング生成に失敗")
-            
-            # 2. 関連コンテンツを検索
-            search_results = self.milvus.search(
-                query_embedding=query_embedding,
-                context_url=context_url,
-                top_k=top_k
-            )
-            
-            if not search_results:
-                return {
-                    **state,
-                    "answer": f"{context_url}のコンテンツから関連する情報を見つけることができませんでした。",
-                    "sources": [],
-                    "method": "rag"
-                }
-            
-            # 3. コンテキストを構築
-            context = "\n\n".join([f"ソースURL: {res['url']}\n内容: {res['text']}" for res in search_results])
-            
-            # 4. LLMで回答を生成（RAGコンテキスト付き）
-            answer = self.multi_llm.generate_chat_response(
-                query=query,
-                context=context,
-                model=model,
-                conversation_history=conversation_history
-            )
-            
+            # コンテキストを構築
+            with timings.stage("prompt_build"):
+                context = self.generator.build_context(sources)
+                timings.count_prompt(query, context, conversation_history)
+
+            # LLMで回答を生成（RAGコンテキスト付き）
+            answer = self._generate_answer(state, context)
+
             return {
                 **state,
                 "answer": answer,
-                "sources": search_results,
+                "sources": sources,
                 "method": "rag"
             }
-            
+
         except Exception as e:
-            logger.error(f"RAG実行でエラー: {e}")
+            _log_generation_error("RAG実行でエラー", e)
+            answer = f"RAGでの回答生成に失敗しました: {str(e)}"
+            self._emit(state, {"type": "error", "content": answer})
             return {
                 **state,
-                "answer": f"RAGでの回答生成に失敗しました: {str(e)}",
+                "answer": answer,
                 "sources": [],
                 "method": "rag_error"
             }
-    
+
     def _direct_answer(self, state: RAGState) -> RAGState:
         """RAGなしで直接回答を生成"""
         query = state["query"]
-        model = state["model"]
         conversation_history = state.get("conversation_history", [])
-        context_url = state["context_url"]
-        
+        timings = state["timings"]
+
         try:
+            # ソース情報（RAGなし）を送信
+            self._emit(state, {"type": "sources", "sources": [], "method": "direct"})
+
             # RAGなしでLLMが回答を生成
-            no_rag_context = f"""あなたは親切なアシスタントです。ユーザーの質問に答えてください。
+            no_rag_context = self._no_rag_context(state["context_url"])
+            timings.count_prompt(query, no_rag_context, conversation_history)
 
-注意: このアプリケーションは通常 {context_url} のコンテンツに基づいて答えることを目的としていますが、
-この質問にはそのコンテンツの検索は不要と判断されました。
+            answer = self._generate_answer(state, no_rag_context)
 
-質問に適切に答えてください。もし質問が {context_url} の具体的な内容について聞いている場合は、
-コンテンツを検索する必要があることを伝えてください。"""
-            
-            answer = self.multi_llm.generate_chat_response(
-                query=query,
-                context=no_rag_context,
-                model=model,
-                conversation_history=conversation_history
-            )
-            
             return {
                 **state,
                 "answer": answer,
                 "sources": [],
                 "method": "direct"
             }
-            
+
         except Exception as e:
-            logger.error(f"直接回答でエラー: {e}")
+            _log_generation_error("直接回答でエラー", e)
+            self._emit(state, {"type": "error", "content": f"回答生成に失敗しました: {str(e)}"})
             return {
                 **state,
                 "answer": f"回答生成に失敗しました: {str(e)}",
                 "sources": [],
                 "method": "direct_error"
             }
-    
-    def process_query(self, query: str, context_url: str, model: str, conversation_history: List[Dict[str, str]] = None, top_k: int = 3) -> Dict[str, Any]:
-        """クエリを処理してインテリジェントにRAGを適用"""
-        initial_state = {
+
+    def _emit(self, state: RAGState, event: Dict[str, Any]):
+        """ストリーミング実行時のみイベントをcustomストリームに書き込む"""
+        if state.get("streaming"):
+            get_stream_writer()(event)
+
+    def _generate_answer(self, state: RAGState, context: str) -> str:
+        """
+        ジェネレーターで回答を生成する。ストリーミング時はトークンを逐次書き込み、
+        キャンセルされたらプロバイダーのストリームを閉じて生成を打ち切る。
+        """
+        query = state["query"]
+        model = state["model"]
+        conversation_history = state.get("conversation_history", [])
+        timings = state["timings"]
+
+        if not state.get("streaming"):
+            with timings.stage("generation"):
+                answer = self.generator.generate(query, context, model, conversation_history)
+            timings.track_generation(answer)
+            return answer
+
+        writer = get_stream_writer()
+        cancel_event = state.get("cancel_event")
+        parts = []
+        stream = timings.track_stream(self.generator.generate_stream(query, context, model, conversation_history))
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("ストリームがキャンセルされたため生成を中断します")
+                    break
+                if chunk:
+                    parts.append(chunk)
+                    writer({"type": "content", "content": chunk})
+        finally:
+            stream.close()
+        return "".join(parts)
+
+    @staticmethod
+    def _not_found_message(context_url: str) -> str:
+        return f"{context_url}のコンテンツから関連する情報を見つけることができませんでした。"
+
+    @staticmethod
+    def _no_rag_context(context_url: str) -> str:
+        return f"""あなたは親切なアシスタントです。ユーザーの質問に答えてください。
+
+注意: このアプリケーションは通常 {context_url} のコンテンツに基づいて答えることを目的としていますが、
+この質問にはそのコンテンツの検索は不要と判断されました。
+
+質問に適切に答えてください。もし質問が {context_url} の具体的な内容について聞いている場合は、
+コンテンツを検索する必要があることを伝えてください。"""
+
+    def _check_answer_cache(self, state: RAGState) -> Tuple[Optional[CachedAnswer], Optional[int]]:
+        """
+        クエリをエンベディングして意味的に近いキャッシュ済みの回答を探す。
+        計算したエンベディングは検索ステージで再利用する。会話履歴がある場合は
+        回答が文脈に依存するためキャッシュを使わない。
+        戻り値は (ヒットしたエントリ, 保存時に使う世代番号)。
+        """
+        if self.answer_cache is None or state.get("conversation_history"):
+            return None, None
+        try:
+            with state["timings"].stage("embedding"):
+                state["query_embedding"] = self.multi_llm.generate_embedding(state["query"])
+        except Exception as e:
+            logger.warning(f"回答キャッシュ照合用のエンベディング生成に失敗: {e}")
+            return None, None
+
+        generation = self.answer_cache.generation(state["context_url"])
+        cached = self.answer_cache.lookup(state["query_embedding"], state["context_url"], state["model"],
+                                          top_k=state["top_k"])
+        if cached is not None:
+            logger.info(f"キャッシュ済みの回答を使用 (類似度: {cached.similarity:.3f})")
+        return cached, generation
+
+    def _store_answer(self, state: RAGState, answer: str, sources: List[Dict[str, Any]],
+                      method: str, generation: Optional[int]):
+        """
+        正常に生成できた回答だけをキャッシュに保存する。エラーや中断で終わった
+        生成（method が rag/direct 以外、またはキャンセル済み）は保存しない。
+        """
+        if generation is None or not answer or method not in ("rag", "direct"):
+            return
+        if state["cancel_event"].is_set():
+            return
+        self.answer_cache.put(
+            state["query_embedding"], state["context_url"], state["model"],
+            answer, sources, method, generation=generation, top_k=state["top_k"]
+        )
+
+    @staticmethod
+    def _cached_result(cached: CachedAnswer) -> Dict[str, Any]:
+        return {
+            "answer": cached.answer,
+            "sources": cached.sources,
+            "method": cached.method,
+            "requires_rag": cached.method == "rag",
+            "routing_reasoning": "類似の質問に対するキャッシュ済みの回答を使用",
+            "cached": True
+        }
+
+    def _initial_state(self, query: str, context_url: str, model: str, conversation_history: List[Dict[str, str]],
+                       top_k: int, timings: Optional[StageTimings], streaming: bool = False) -> RAGState:
+        return {
             "query": query,
             "context_url": context_url,
             "model": model,
             "conversation_history": conversation_history or [],
-            "top_k": top_k
+            "top_k": top_k,
+            "timings": timings or StageTimings(),
+            "streaming": streaming,
+            "cancel_event": threading.Event(),
+            "query_embedding": None
         }
-        
+
+    def process_query(self, query: str, context_url: str, model: str, conversation_history: List[Dict[str, str]] = None, top_k: int = 3, timings: StageTimings = None) -> Dict[str, Any]:
+        """クエリを処理してインテリジェントにRAGを適用"""
+        initial_state = self._initial_state(query, context_url, model, conversation_history, top_k, timings)
+
         try:
             # ワークフローを実行
-            final_state = self.workflow.invoke(initial_state)
+            with tracer.start_span("rag.process_query", {"context_url": context_url, "model": model}) as span:
+                cached, generation = self._check_answer_cache(initial_state)
+                span.set_attribute("cache_hit", cached is not None)
+                if cached is not None:
+                    return self._cached_result(cached)
+                final_state = self.workflow.invoke(initial_state)
+            self._store_answer(initial_state, final_state.get("answer", ""), final_state.get("sources", []),
+                               final_state.get("method", ""), generation)
             return final_state
         except Exception as e:
             logger.error(f"ワークフロー実行でエラー: {e}")
@@ -257,140 +395,50 @@ class IntelligentRAGService:
                 "requires_rag": True,
                 "routing_reasoning": f"エラー: {str(e)}"
             }
-    
-    def process_query_stream(self, query: str, context_url: str, model: str, conversation_history: List[Dict[str, str]] = None, top_k: int = 3):
+
+    def process_query_stream(self, query: str, context_url: str, model: str, conversation_history: List[Dict[str, str]] = None, top_k: int = 3, timings: StageTimings = None):
         """ストリーミング対応のクエリ処理"""
-        # まずRAG判定を実行
-        initial_state = {
-            "query": query,
-            "context_url": context_url,
-            "model": model,
-            "conversation_history": conversation_history or [],
-            "top_k": top_k
-        }
-        
-        try:
-            # ルーティング判定を実行
-            routing_state = self._route_query(initial_state)
-            requires_rag = routing_state.get("requires_rag", True)
-            
-            if requires_rag:
-                # RAGでストリーミング回答を生成
-                yield from self._perform_rag_stream(routing_state)
-            else:
-                # 直接ストリーミング回答を生成
-                yield from self._direct_answer_stream(routing_state)
-                
-        except Exception as e:
-            logger.error(f"ストリーミング処理でエラー: {e}")
-            yield {
-                "type": "error",
-                "content": f"処理中にエラーが発生しました: {str(e)}"
-            }
-    
-    def _perform_rag_stream(self, state: Dict[str, Any]):
-        """RAGでストリーミング回答を生成"""
-        query = state["query"]
-        context_url = state["context_url"]
-        model = state["model"]
-        conversation_history = state.get("conversation_history", [])
-        top_k = state.get("top_k", 3)
-        
-        try:
-            # 1. エンベディングと検索
-            query_embedding = self.multi_llm.generate_embedding(query)
-            if not query_embedding:
-                yield {"type": "error", "content": "クエリのエンベディング生成に失敗"}
-                return
-                
-            search_results = self.milvus.search(
-                query_embedding=query_embedding,
-                context_url=context_url,
-                top_k=top_k
-            )
-            
-            # ソース情報を先に送信
-            sources_data = {
-                "type": "sources",
-                "sources": search_results,
-                "method": "rag"
-            }
-            yield sources_data
-            
-            if not search_results:
-                yield {
-                    "type": "content",
-                    "content": f"{context_url}のコンテンツから関連する情報を見つけることができませんでした。"
-                }
-                return
-            
-            # 2. コンテキスト構築とストリーミング回答
-            context = "\n\n".join([f"ソースURL: {res['url']}\n内容: {res['text']}" for res in search_results])
-            
-            # ストリーミング回答を生成
-            for chunk in self.multi_llm.generate_chat_response_stream(
-                query=query,
-                context=context,
-                model=model,
-                conversation_history=conversation_history
-            ):
-                if chunk:
-                    yield {
-                        "type": "content",
-                        "content": chunk
-                    }
-                    
-        except Exception as e:
-            logger.error(f"RAGストリーミングでエラー: {e}")
-            yield {
-                "type": "error", 
-                "content": f"RAGでの回答生成に失敗しました: {str(e)}"
-            }
-    
-    def _direct_answer_stream(self, state: Dict[str, Any]):
-        """RAGなしでストリーミング回答を生成"""
-        query = state["query"]
-        context_url = state["context_url"]
-        model = state["model"]
-        conversation_history = state.get("conversation_history", [])
-        
-        try:
-            # ソース情報（RAGなし）を送信
-            sources_data = {
-                "type": "sources",
-                "sources": [],
-                "method": "direct"
-            }
-            yield sources_data
-            
-            # RAGなしのコンテキスト
-            no_rag_context = f"""あなたは親切なアシスタントです。ユーザーの質問に答えてください。
+        return tracer.trace_stream(
+            self._process_query_stream(query, context_url, model, conversation_history, top_k, timings),
+            "rag.process_query_stream",
+            {"context_url": context_url, "model": model}
+        )
 
-注意: このアプリケーションは通常 {context_url} のコンテンツに基づいて答えることを目的としていますが、
-この質問にはそのコンテンツの検索は不要と判断されました。
+    def _process_query_stream(self, query: str, context_url: str, model: str, conversation_history: List[Dict[str, str]] = None, top_k: int = 3, timings: StageTimings = None):
+        state = self._initial_state(query, context_url, model, conversation_history, top_k, timings, streaming=True)
 
-質問に適切に答えてください。もし質問が {context_url} の具体的な内容について聞いている場合は、
-コンテンツを検索する必要があることを伝えてください。"""
-            
-            # ストリーミング回答を生成
-            for chunk in self.multi_llm.generate_chat_response_stream(
-                query=query,
-                context=no_rag_context,
-                model=model,
-                conversation_history=conversation_history
-            ):
-                if chunk:
-                    yield {
-                        "type": "content",
-                        "content": chunk
-                    }
-                    
+        cached, generation = self._check_answer_cache(state)
+        if cached is not None:
+            yield {"type": "sources", "sources": cached.sources, "method": cached.method, "cached": True}
+            yield {"type": "content", "content": cached.answer}
+            return
+
+        # ブロッキング時と同じグラフを実行し、ノードが書き込むイベントをそのまま流す
+        events = self.workflow.stream(state, stream_mode="custom")
+        parts, sources, method = [], [], ""
+
+        try:
+            # yield fromだとclose()が先にグラフへ伝播してしまうため明示的にループする
+            for event in events:
+                if event.get("type") == "sources":
+                    sources, method = event.get("sources", []), event.get("method", "")
+                elif event.get("type") == "content":
+                    parts.append(event.get("content", ""))
+                elif event.get("type") == "error":
+                    method = "error"
+                yield event
+            # 最後まで生成できた場合のみキャッシュに保存
+            self._store_answer(state, "".join(parts), sources, method, generation)
         except Exception as e:
-            logger.error(f"直接回答ストリーミングでエラー: {e}")
+            _log_generation_error("ストリーミング処理でエラー", e)
             yield {
                 "type": "error",
-                "content": f"回答生成に失敗しました: {str(e)}"
+                "content": f"処理中にエラーが発生しました: {str(e)}"
             }
+        finally:
+            # 途中で閉じられた場合は実行中のノードに生成の中断を知らせる
+            state["cancel_event"].set()
+            events.close()
 
 
 # サービスインスタンス管理
@@ -401,9 +449,12 @@ def get_intelligent_rag_service():
     if intelligent_rag_service is None:
         from .multi_llm_service import get_multi_llm_service
         from .vector_db_service import get_milvus_service
-        
+
         multi_llm = get_multi_llm_service()
         milvus = get_milvus_service()
-        intelligent_rag_service = IntelligentRAGService(multi_llm, milvus)
-    
-    return intelligent_rag_service
\ No newline at end of file
+        intelligent_rag_service = IntelligentRAGService(
+            multi_llm, milvus,
+            answer_cache=answer_cache if settings.ANSWER_CACHE_ENABLED else None
+        )
+
+    return intelligent_rag_service
@@ -0,0 +1,294 @@
+import logging
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
+
+import anthropic
+import google.generativeai as genai
+import httpx
+import ollama
+import openai
+
+from app.core.cancellation import httpx_event_hooks, on_cancel
+from app.core.config import settings, Settings, ModelProvider
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+def _pool_limits(limits_cls: type = httpx.Limits):
+    # The OpenAI/Anthropic SDKs may bundle their own httpx build, so the caller
+    # passes the Limits class matching the client it constructs.
+    return limits_cls(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+def split_system_message(messages: Messages) -> Tuple[str, Messages]:
+    """Separates the system prompt from the conversation turns."""
+    system_message = ""
+    conversation = []
+    for msg in messages:
+        if msg["role"] == "system":
+            system_message = msg["content"]
+        else:
+            conversation.append(msg)
+    return system_message, conversation
+
+
+class ProviderAdapter:
+    """
+    Chat completion backend for one provider.
+
+    Adapters own long-lived pooled clients and are created once per process.
+    Subclasses implement the sync methods and, where the SDK supports it, the
+    async ones; messages use the OpenAI-style role/content format.
+    """
+
+    provider: ModelProvider
+
+    def generate(self, model: str, messages: Messages) -> str:
+        raise NotImplementedError
+
+    def generate_stream(self, model: str, messages: Messages) -> Generator[str, None, None]:
+        raise NotImplementedError
+
+    async def agenerate(self, model: str, messages: Messages) -> str:
+        raise NotImplementedError
+
+    async def agenerate_stream(self, model: str, messages: Messages) -> AsyncGenerator[str, None]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def aclose(self):
+        pass
+
+
+class OllamaAdapter(ProviderAdapter):
+    provider = ModelProvider.OLLAMA
+
+    def __init__(self, host: str):
+        # The event hooks let a cancelled request interrupt a blocked stream read
+        self.client = ollama.Client(host=host, limits=_pool_limits(), event_hooks=httpx_event_hooks())
+        self.async_client = ollama.AsyncClient(host=host, limits=_pool_limits())
+
+    @staticmethod
+    def _model_name(model: str) -> str:
+        # Ensure model name has :latest tag if not present
+        return model if ':' in model else f"{model}:latest"
+
+    def generate(self, model: str, messages: Messages) -> str:
+        response = self.client.chat(model=self._model_name(model), messages=messages)
+        return response['message']['content']
+
+    def generate_stream(self, model: str, messages: Messages) -> Generator[str, None, None]:
+        stream = self.client.chat(model=self._model_name(model), messages=messages, stream=True)
+        try:
+            for chunk in stream:
+                if chunk['message']['content']:
+                    yield chunk['message']['content']
+        finally:
+            # Closes the HTTP response now rather than when the generator is collected
+            stream.close()
+
+    async def agenerate(self, model: str, messages: Messages) -> str:
+        response = await self.async_client.chat(model=self._model_name(model), messages=messages)
+        return response['message']['content']
+
+    async def agenerate_stream(self, model: str, messages: Messages) -> AsyncGenerator[str, None]:
+        stream = await self.async_client.chat(model=self._model_name(model), messages=messages, stream=True)
+        async for chunk in stream:
+            if chunk['message']['content']:
+                yield chunk['message']['content']
+
+    async def aclose(self):
+        await self.async_client.close()
+
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI, or any server speaking the OpenAI chat completions API (vLLM, llama.cpp server, ...)."""
+
+    provider = ModelProvider.OPENAI
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, provider: Optional[ModelProvider] = None):
+        if provider is not None:
+            self.provider = provider
+        limits = _pool_limits(type(openai.DEFAULT_CONNECTION_LIMITS))
+        self.client = openai.OpenAI(
+            api_key=api_key, base_url=base_url,
+            http_client=openai.DefaultHttpxClient(limits=limits, event_hooks=httpx_event_hooks())
+        )
+        self.async_client = openai.AsyncOpenAI(
+            api_key=api_key, base_url=base_url, http_client=openai.DefaultAsyncHttpxClient(limits=limits)
+        )
+
+    def generate(self, model: str, messages: Messages) -> str:
+        response = self.client.chat.completions.create(model=model, messages=messages)
+        return response.choices[0].message.content
+
+    def generate_stream(self, model: str, messages: Messages) -> Generator[str, None, None]:
+        stream = self.client.chat.completions.create(model=model, messages=messages, stream=True)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+    async def agenerate(self, model: str, messages: Messages) -> str:
+        response = await self.async_client.chat.completions.create(model=model, messages=messages)
+        return response.choices[0].message.content
+
+    async def agenerate_stream(self, model: str, messages: Messages) -> AsyncGenerator[str, None]:
+        stream = await self.async_client.chat.completions.create(model=model, messages=messages, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        await self.async_client.close()
+
+
+class AnthropicAdapter(ProviderAdapter):
+    provider = ModelProvider.ANTHROPIC
+    max_tokens = 4096
+
+    def __init__(self, api_key: str):
+        limits = _pool_limits(type(anthropic.DEFAULT_CONNECTION_LIMITS))
+        self.client = anthropic.Anthropic(
+            api_key=api_key, http_client=anthropic.DefaultHttpxClient(limits=limits, event_hooks=httpx_event_hooks())
+        )
+        self.async_client = anthropic.AsyncAnthropic(
+            api_key=api_key, http_client=anthropic.DefaultAsyncHttpxClient(limits=limits)
+        )
+
+    def generate(self, model: str, messages: Messages) -> str:
+        # Anthropic requires system message to be separate
+        system_message, conversation = split_system_message(messages)
+        response = self.client.messages.create(
+            model=model, max_tokens=self.max_tokens, system=system_message, messages=conversation
+        )
+        return response.content[0].text
+
+    def generate_stream(self, model: str, messages: Messages) -> Generator[str, None, None]:
+        system_message, conversation = split_system_message(messages)
+        with self.client.messages.stream(
+            model=model, max_tokens=self.max_tokens, system=system_message, messages=conversation
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+
+    async def agenerate(self, model: str, messages: Messages) -> str:
+        system_message, conversation = split_system_message(messages)
+        response = await self.async_client.messages.create(
+            model=model, max_tokens=self.max_tokens, system=system_message, messages=conversation
+        )
+        return response.content[0].text
+
+    async def agenerate_stream(self, model: str, messages: Messages) -> AsyncGenerator[str, None]:
+        system_message, conversation = split_system_message(messages)
+        async with self.async_client.messages.stream(
+            model=model, max_tokens=self.max_tokens, system=system_message, messages=conversation
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    async def aclose(self):
+        await self.async_client.close()
+
+
+def to_google_contents(messages: Messages) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Converts OpenAI-style messages to Gemini `contents`. The whole history is sent
+    in a single request; consecutive turns of the same role are merged because
+    Gemini expects user and model turns to alternate.
+    """
+    system_message, conversation = split_system_message(messages)
+    contents: List[Dict[str, Any]] = []
+    for msg in conversation:
+        role = "model" if msg["role"] == "assistant" else "user"
+        if contents and contents[-1]["role"] == role:
+            contents[-1]["parts"].append(msg["content"])
+        else:
+            contents.append({"role": role, "parts": [msg["content"]]})
+    return system_message, contents
+
+
+class GoogleAdapter(ProviderAdapter):
+    provider = ModelProvider.GOOGLE
+
+    def __init__(self, api_key: str):
+        # genai keeps one process-wide transport; GenerativeModel is a thin wrapper over it
+        genai.configure(api_key=api_key)
+
+    def _model(self, model: str, system_message: str) -> "genai.GenerativeModel":
+        # Not cached: the system instruction can only be set on construction and carries the
+        # retrieved context, so it differs almost every call. Construction is cheap, as the
+        # model fetches the process-wide default clients (and their channels) on first use.
+        return genai.GenerativeModel(model, system_instruction=system_message or None)
+
+    def generate(self, model: str, messages: Messages) -> str:
+        system_message, contents = to_google_contents(messages)
+        return self._model(model, system_message).generate_content(contents).text
+
+    def generate_stream(self, model: str, messages: Messages) -> Generator[str, None, None]:
+        system_message, contents = to_google_contents(messages)
+        response = self._model(model, system_message).generate_content(contents, stream=True)
+        # Gemini streams over gRPC rather than httpx; cancelling the call unblocks the read
+        cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+        unregister = on_cancel(cancel) if cancel else (lambda: None)
+        try:
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except GeneratorExit:
+            if cancel:
+                cancel()
+            raise
+        finally:
+            unregister()
+
+    async def agenerate(self, model: str, messages: Messages) -> str:
+        system_message, contents = to_google_contents(messages)
+        response = await self._model(model, system_message).generate_content_async(contents)
+        return response.text
+
+    async def agenerate_stream(self, model: str, messages: Messages) -> AsyncGenerator[str, None]:
+        system_message, contents = to_google_contents(messages)
+        response = await self._model(model, system_message).generate_content_async(contents, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+# Factories keyed by provider. Each returns an adapter, or None when the provider is not configured.
+_adapter_factories: Dict[ModelProvider, Callable[[Settings], Optional[ProviderAdapter]]] = {
+    ModelProvider.OLLAMA: lambda s: OllamaAdapter(s.OLLAMA_HOST),
+    ModelProvider.OPENAI: lambda s: OpenAIAdapter(s.OPENAI_API_KEY) if s.OPENAI_API_KEY else None,
+    ModelProvider.ANTHROPIC: lambda s: AnthropicAdapter(s.ANTHROPIC_API_KEY) if s.ANTHROPIC_API_KEY else None,
+    ModelProvider.GOOGLE: lambda s: GoogleAdapter(s.GOOGLE_API_KEY) if s.GOOGLE_API_KEY else None,
+    ModelProvider.OPENAI_COMPATIBLE: lambda s: OpenAIAdapter(
+        s.OPENAI_COMPATIBLE_API_KEY or "not-needed", s.OPENAI_COMPATIBLE_BASE_URL, ModelProvider.OPENAI_COMPATIBLE
+    ) if s.OPENAI_COMPATIBLE_BASE_URL else None,
+}
+
+
+def register_provider_adapter(provider: ModelProvider,
+                              factory: Callable[[Settings], Optional[ProviderAdapter]]):
+    """Registers (or replaces) the adapter factory used for a provider."""
+    _adapter_factories[provider] = factory
+
+
+def create_provider_adapters(config: Settings = settings) -> Dict[ModelProvider, ProviderAdapter]:
+    """Instantiates an adapter for every configured provider."""
+    adapters = {}
+    for provider, factory in _adapter_factories.items():
+        try:
+            adapter = factory(config)
+        except Exception as e:
+            logger.error(f"Failed to initialize {provider.value} adapter: {e}")
+            continue
+        if adapter is not None:
+            adapters[provider] = adapter
+            logger.info(f"{provider.value} adapter initialized")
+    return adapters
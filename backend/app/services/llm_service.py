@@ -2,7 +2,11 @@ import ollama
 import os
 import logging
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List
+
+from app.core.metrics import time_stage
+from app.core.tracing import tracer
+from app.services.embedding_store import embedding_store
 
 load_dotenv()
 
@@ -23,6 +27,10 @@ logger.info(f"Using generation model: {GENERATION_MODEL}")
 logger.info(f"Using embedding model: {EMBEDDING_MODEL}")
 
 class OllamaService:
+    """
+    Ollama client used for ingestion-time embeddings and for pulling required models.
+    Chat generation goes through MultiLLMService.
+    """
     def __init__(self, host: str = OLLAMA_HOST):
         logger.info(f"Initializing OllamaService with host: {host}")
         self.client = ollama.Client(host=host)
@@ -68,11 +76,18 @@ class OllamaService:
             logger.error(f"Failed to connect to Ollama or pull models: {e}", exc_info=True)
             raise RuntimeError(f"Could not initialize Ollama models. Is Ollama running at {OLLAMA_HOST}?") from e
 
+    @time_stage("embed")
     def generate_embedding(self, text: str) -> List[float]:
-        """Generates an embedding for the given text."""
+        """Generates an embedding for the given text, reusing one stored on disk if available."""
         if not text.strip():
             logger.warning("Attempted to generate embedding for empty text.")
             return []
+        if embedding_store is not None:
+            return embedding_store.get_or_compute(EMBEDDING_MODEL, text, self._embed)
+        return self._embed(text)
+
+    @tracer.traced("llm.embed", provider="ollama")
+    def _embed(self, text: str) -> List[float]:
         try:
             response = self.client.embeddings(model=EMBEDDING_MODEL, prompt=text)
             return response["embedding"]
@@ -80,106 +95,6 @@ class OllamaService:
             logger.error(f"Error generating embedding: {e}", exc_info=True)
             raise
 
-    def generate_chat_response(self, query: str, context: str, conversation_history: List[Dict[str, str]] = None) -> str:
-        """Generates a chat response using a query, context, and conversation history."""
-        if not query:
-            return "Please provide a query."
-
-        # Build messages array with conversation history
-        messages = []
-        
-        # Add system message with context
-        system_prompt = f"""You are a helpful assistant. Answer questions based on the provided context and previous conversation history.
-        
-        Context:
-        ---
-        {context}
-        ---
-        
-        Instructions:
-        - Use the context to answer questions accurately
-        - Maintain conversation continuity by referencing previous messages when relevant
-        - If the answer is not found in the context, say "I could not find an answer in the provided context."
-        - Be conversational and remember what was discussed earlier"""
-        
-        messages.append({"role": "system", "content": system_prompt})
-        
-        # Add conversation history
-        if conversation_history:
-            for msg in conversation_history:
-                # Convert "bot" to "assistant" for Ollama compatibility
-                role = "assistant" if msg["role"] == "bot" else msg["role"]
-                messages.append({"role": role, "content": msg["content"]})
-        
-        # Add current user query
-        messages.append({"role": "user", "content": query})
-
-        try:
-            # Ensure model name has :latest tag if not present
-            model_name = GENERATION_MODEL if ':' in GENERATION_MODEL else f"{GENERATION_MODEL}:latest"
-            
-            response = self.client.chat(
-                model=model_name,
-                messages=messages
-            )
-            return response['message']['content']
-        except Exception as e:
-            logger.error(f"Error generating chat response: {e}", exc_info=True)
-            raise
-
-    def generate_chat_response_stream(self, query: str, context: str, conversation_history: List[Dict[str, str]] = None):
-        """Generates a streaming chat response using a query, context, and conversation history."""
-        if not query:
-            yield "Please provide a query."
-            return
-
-        # Build messages array with conversation history
-        messages = []
-        
-        # Add system message with context
-        system_prompt = f"""You are a helpful assistant. Answer questions based on the provided context and previous conversation history.
-        
-        Context:
-        ---
-        {context}
-        ---
-        
-        Instructions:
-        - Use the context to answer questions accurately
-        - Maintain conversation continuity by referencing previous messages when relevant
-        - If the answer is not found in the context, say "I could not find an answer in the provided context."
-        - Be conversational and remember what was discussed earlier"""
-        
-        messages.append({"role": "system", "content": system_prompt})
-        
-        # Add conversation history
-        if conversation_history:
-            for msg in conversation_history:
-                # Convert "bot" to "assistant" for Ollama compatibility
-                role = "assistant" if msg["role"] == "bot" else msg["role"]
-                messages.append({"role": role, "content": msg["content"]})
-        
-        # Add current user query
-        messages.append({"role": "user", "content": query})
-
-        try:
-            # Ensure model name has :latest tag if not present
-            model_name = GENERATION_MODEL if ':' in GENERATION_MODEL else f"{GENERATION_MODEL}:latest"
-            
-            stream = self.client.chat(
-                model=model_name,
-                messages=messages,
-                stream=True
-            )
-            
-            for chunk in stream:
-                if chunk['message']['content']:
-                    yield chunk['message']['content']
-                    
-        except Exception as e:
-            logger.error(f"Error generating streaming chat response: {e}", exc_info=True)
-            yield f"Error: {str(e)}"
-
 # Dependency injection functions
 def get_ollama_service():
     if not ollama_service:
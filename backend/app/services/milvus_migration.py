@@ -0,0 +1,115 @@
+"""
+Copies the legacy collection into the current schema.
+
+    python -m app.services.milvus_migration [--batch-size 1000] [--embedding-model NAME] [--drop-legacy]
+
+Rows keep their url, page_url, text and embedding, so nothing is re-embedded. The metadata
+the legacy collection does not have is derived: chunk_index counts the chunks of each page
+in primary-key (insertion) order, content_hash is the hash of the text, ingested_at is 0 and
+embedding_model is the model the chunks were embedded with (EMBEDDING_MODEL by default).
+Headings and anchors stay empty until the page is ingested again. With TEXT_STORE_ENABLED
+the texts are moved to the text store instead of the new collection, and the embeddings are
+stored in the layout set by EMBEDDING_STORAGE and EMBEDDING_DIMENSIONS.
+"""
+import argparse
+import logging
+from collections import Counter, defaultdict
+from typing import Iterator, List, Optional
+
+from pymilvus import Collection, connections, utility
+
+from app.core.config import settings
+from app.services.text_store import TextStore, text_store
+from app.services.vector_db_service import (
+    EMBEDDING_STORAGE, LEGACY_COLLECTION_NAME, MILVUS_HOST, MILVUS_PORT, collection_name, content_hash,
+    create_collection,
+)
+from app.services.vector_storage import VectorStorage
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_batches(source: Collection, batch_size: int, output_fields: List[str]) -> Iterator[List[dict]]:
+    iterator = source.query_iterator(batch_size=batch_size, output_fields=output_fields)
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                return
+            yield batch
+    finally:
+        iterator.close()
+
+
+def migrate(source: Collection, target: Collection, embedding_model: str, batch_size: int = 1000,
+            texts: Optional[TextStore] = None, storage: VectorStorage = EMBEDDING_STORAGE) -> int:
+    """
+    Copies every row of `source` into `target`, with the texts in `texts` if given.
+    Returns the number of rows copied.
+    """
+    if target.num_entities:
+        raise RuntimeError(f"Collection '{target.name}' is not empty; refusing to migrate into it.")
+
+    has_page_url = any(field.name == "page_url" for field in source.schema.fields)
+    output_fields = ["url", "text", "embedding"] + (["page_url"] if has_page_url else [])
+    chunk_indexes = Counter()
+    copied = 0
+    for batch in _iter_batches(source, batch_size, output_fields):
+        rows = []
+        for row in batch:
+            url = row["url"]
+            page_key = (url, row.get("page_url") or url)
+            rows.append({
+                "url": url,
+                "page_url": page_key[1],
+                "chunk_index": chunk_indexes[page_key],
+                "heading": "",
+                "anchor": "",
+                "content_hash": content_hash(row["text"]),
+                "ingested_at": 0,
+                "embedding_model": embedding_model,
+                "text": "" if texts else row["text"],
+                "embedding": storage.encode(row["embedding"]),
+            })
+            chunk_indexes[page_key] += 1
+        mr = target.insert(rows)
+        if texts:
+            by_url = defaultdict(list)
+            for id_, row in zip(mr.primary_keys, batch):
+                by_url[row["url"]].append((id_, row["text"]))
+            for url, items in by_url.items():
+                texts.put_many(url, items)
+        copied += len(rows)
+        logger.info(f"Copied {copied} rows from '{source.name}' to '{target.name}'.")
+    target.flush()
+    return copied
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--embedding-model", default=settings.EMBEDDING_MODEL,
+                        help="Model the legacy chunks were embedded with")
+    parser.add_argument("--drop-legacy", action="store_true",
+                        help=f"Drop '{LEGACY_COLLECTION_NAME}' once its rows are copied")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    connections.connect("default", host=MILVUS_HOST, port=MILVUS_PORT)
+    if not utility.has_collection(LEGACY_COLLECTION_NAME):
+        print(f"No '{LEGACY_COLLECTION_NAME}' collection; nothing to migrate.")
+        return
+    source = Collection(LEGACY_COLLECTION_NAME)
+    source.load()
+    name = collection_name(EMBEDDING_STORAGE)
+    target = Collection(name) if utility.has_collection(name) else create_collection(name, EMBEDDING_STORAGE)
+
+    copied = migrate(source, target, args.embedding_model, args.batch_size, text_store)
+    print(f"Copied {copied} rows from '{LEGACY_COLLECTION_NAME}' to '{name}'.")
+    if args.drop_legacy:
+        utility.drop_collection(LEGACY_COLLECTION_NAME)
+        print(f"Dropped '{LEGACY_COLLECTION_NAME}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def format_model_name(model_name: str) -> str:
+    """Convert Ollama model name to display name."""
+    # Remove :latest suffix for cleaner display
+    name = model_name.replace(":latest", "")
+
+    # Create display names for known models
+    display_mapping = {
+        "gpt-oss": "GPT-OSS",
+        "mistral": "Mistral",
+        "gemma3:4b": "Gemma 3 4B",
+        "gemma3:1b": "Gemma 3 1B",
+        "gemma3:27b": "Gemma 3 27B",
+        "gemma3:12b": "Gemma 3 12B",
+        "deepseek-r1:8b": "DeepSeek R1 8B",
+        "qwen3:4b": "Qwen 3 4B",
+        "gpt-oss:20b": "GPT-OSS 20B",
+        "llama3.2": "Llama 3.2",
+    }
+
+    # Check for exact matches first
+    if name in display_mapping:
+        return display_mapping[name]
+
+    # Check for partial matches
+    for key, display in display_mapping.items():
+        if key in name:
+            return display
+
+    # Fall back to formatted version of the original name
+    return name.replace("-", " ").replace(":", " ").title()
+
+
+def _format_ollama_model(model: Dict[str, Any]) -> Dict[str, Any]:
+    model_name = model.get("name", "")
+    size_mb = model.get("size", 0) // (1024 * 1024)  # Convert to MB
+    display_name = format_model_name(model_name)
+
+    # Add size info to display name if available
+    if size_mb > 1024:
+        size_str = f" ({size_mb // 1024:.1f}GB)"
+    elif size_mb > 0:
+        size_str = f" ({size_mb}MB)"
+    else:
+        size_str = ""
+
+    return {
+        "name": model_name,
+        "display_name": f"{display_name}{size_str}",
+        "provider": "ollama",
+        "requires_api_key": False,
+        "context_length": 4096
+    }
+
+
+def _cloud_models() -> Dict[str, Dict[str, Any]]:
+    """Cloud models from settings (only those whose API keys are configured)."""
+    models = {}
+    for model_name, model_config in settings.available_models.items():
+        if model_config.provider.value != "ollama":  # Only add non-Ollama models from settings
+            models[model_name] = {
+                "name": model_config.name,
+                "display_name": model_config.display_name,
+                "provider": model_config.provider.value,
+                "requires_api_key": model_config.requires_api_key,
+                "context_length": model_config.context_length
+            }
+    return models
+
+
+class ModelCatalog:
+    """
+    In-memory catalog of selectable models.
+
+    Ollama's /api/tags is fetched through a shared pooled async client. Entries
+    younger than `ttl` are served directly; older ones are still served while a
+    single background refresh runs (stale-while-revalidate). The catalog is only
+    rebuilt when the fingerprint of the tag list changes, and that fingerprint is
+    exposed as an ETag for clients.
+    """
+
+    def __init__(self, host: str = settings.OLLAMA_HOST, ttl: float = settings.MODEL_CATALOG_TTL_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.host = host
+        self.ttl = ttl
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
+        self._models: Optional[Dict[str, Any]] = None
+        # Model names Ollama reported in the last successful fetch of /api/tags
+        self._ollama_names: Optional[frozenset] = None
+        self._fingerprint: Optional[str] = None
+        self._etag = ""
+        self._fetched_at = 0.0
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        # The client and lock belong to one event loop; recreate them if we are
+        # called from another (e.g. a test client that spins up a loop per request).
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                self._discard_client(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.host,
+                transport=self._transport,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+            self._lock = asyncio.Lock()
+            self._refresh_task = None
+            self._loop = loop
+        return self._client
+
+    def _discard_client(self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]):
+        """Closes a client of another event loop: on that loop if it still runs, else on this one."""
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+
+        async def close():
+            try:
+                await client.aclose()
+            except Exception as e:  # Its connections may belong to the closed loop
+                logger.debug(f"Error closing a stale model catalog client: {e}")
+        task = asyncio.get_running_loop().create_task(close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._models is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def get_models(self) -> Tuple[Dict[str, Any], str]:
+        """Returns the catalog and its ETag, refreshing in the background when stale."""
+        self._ensure_client()
+        record_cache_lookup("model_catalog", self.is_fresh)
+        if self._models is None:
+            await self.refresh()
+        elif not self.is_fresh and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.refresh())
+        return self._models, self._etag
+
+    async def refresh(self):
+        """Fetches /api/tags and rebuilds the catalog if the tag list changed."""
+        client = self._ensure_client()
+        async with self._lock:
+            try:
+                response = await client.get("/api/tags")
+                if response.status_code == 200:
+                    ollama_models = response.json().get("models", [])
+                else:
+                    logger.warning(f"Failed to fetch Ollama models: {response.status_code}")
+                    ollama_models = None
+            except Exception as e:
+                logger.warning(f"Error fetching Ollama models: {e}")
+                ollama_models = None
+
+            if ollama_models is None:
+                # Keep serving the last good catalog; retry after another TTL.
+                if self._models is None:
+                    self._rebuild([], fingerprint="unavailable")
+                self._fetched_at = time.monotonic()
+                return
+
+            fingerprint = hashlib.sha256(json.dumps(
+                sorted((m.get("name", ""), m.get("digest", ""), m.get("modified_at", "")) for m in ollama_models)
+            ).encode()).hexdigest()
+            if fingerprint != self._fingerprint:
+                self._rebuild(ollama_models, fingerprint)
+            self._fetched_at = time.monotonic()
+
+    def lists_ollama_model(self, name: str) -> Optional[bool]:
+        """Whether Ollama has the model pulled; None until /api/tags was fetched successfully."""
+        if self._ollama_names is None:
+            return None
+        return name in self._ollama_names or f"{name}:latest" in self._ollama_names
+
+    def _rebuild(self, ollama_models: List[Dict[str, Any]], fingerprint: str):
+        if fingerprint != "unavailable":
+            self._ollama_names = frozenset(model.get("name", "") for model in ollama_models)
+        models = {}
+        for model in ollama_models:
+            model_name = model.get("name", "")
+            if model_name and "embed" not in model_name.lower():  # Skip embedding models
+                models[model_name] = _format_ollama_model(model)
+        models.update(_cloud_models())
+
+        self._models = {"models": models, "default_model": settings.DEFAULT_GENERATION_MODEL}
+        self._fingerprint = fingerprint
+        self._etag = f'"{hashlib.sha256(json.dumps(self._models, sort_keys=True).encode()).hexdigest()[:32]}"'
+        logger.info(f"Model catalog rebuilt with {len(models)} models.")
+
+    def invalidate(self):
+        """Forces the next lookup to revalidate against Ollama."""
+        self._fetched_at = 0.0
+        self._fingerprint = None
+
+    async def pull_model(self, name: str) -> Dict[str, Any]:
+        """Pulls a model into Ollama and refreshes the catalog."""
+        client = self._ensure_client()
+        try:
+            response = await client.post("/api/pull", json={"model": name, "stream": False}, timeout=None)
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self.invalidate()
+            await self.refresh()
+
+    async def delete_model(self, name: str):
+        """Deletes a model from Ollama and refreshes the catalog."""
+        client = self._ensure_client()
+        try:
+            response = await client.request("DELETE", "/api/delete", json={"model": name})
+            response.raise_for_status()
+        finally:
+            self.invalidate()
+            await self.refresh()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+model_catalog = ModelCatalog()
+
+def get_model_catalog() -> ModelCatalog:
+    return model_catalog
@@ -1,13 +1,24 @@
-import ollama
-import openai
-import anthropic
-import google.generativeai as genai
+import asyncio
+import contextvars
 import os
+import time
 import logging
-from typing import List, Dict, Any, Generator
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Dict, Any, AsyncGenerator, Generator, Optional, Tuple
 from dotenv import load_dotenv
 
+from app.core.admission import admission
+from app.core.cancellation import current_cancellation, is_cancelled
 from app.core.config import settings, ModelProvider, ModelConfig
+from app.core.metrics import (
+    time_stage, observe_generation, instrument_stream, ainstrument_stream, estimate_tokens,
+    GENERATION_ERRORS, LLM_FAILOVERS, LLM_HEDGED_REQUESTS
+)
+from app.core.resilience import BreakerAttempt, CircuitBreakerRegistry, CircuitOpenError
+from app.core.tracing import tracer
+from .llm_providers import ProviderAdapter, create_provider_adapters
+from .model_catalog import get_model_catalog
 
 load_dotenv()
 
@@ -15,43 +26,29 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# (model name, its config, the adapter serving it)
+Candidate = Tuple[str, ModelConfig, ProviderAdapter]
+
+# Returned by next() on the first step of an empty stream
+_STREAM_END = object()
+# Ollama model names remembered beyond the settings registry
+MAX_DYNAMIC_MODELS = 64
+
 class MultiLLMService:
-    def __init__(self):
+    def __init__(self, adapters: Optional[Dict[ModelProvider, ProviderAdapter]] = None,
+                 breakers: Optional[CircuitBreakerRegistry] = None):
         logger.info("Initializing MultiLLMService")
-        self.ollama_client = None
-        self.openai_client = None
-        self.anthropic_client = None
-        
-        # Initialize Ollama client
-        try:
-            self.ollama_client = ollama.Client(host=settings.OLLAMA_HOST)
-            logger.info(f"Ollama client initialized with host: {settings.OLLAMA_HOST}")
-        except Exception as e:
-            logger.error(f"Failed to initialize Ollama client: {e}")
-        
-        # Initialize OpenAI client if API key is provided
-        if settings.OPENAI_API_KEY:
-            try:
-                self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-                logger.info("OpenAI client initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize OpenAI client: {e}")
-        
-        # Initialize Anthropic client if API key is provided
-        if settings.ANTHROPIC_API_KEY:
-            try:
-                self.anthropic_client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-                logger.info("Anthropic client initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize Anthropic client: {e}")
-        
-        # Initialize Google client if API key is provided
-        if settings.GOOGLE_API_KEY:
-            try:
-                genai.configure(api_key=settings.GOOGLE_API_KEY)
-                logger.info("Google Generative AI client initialized")
-            except Exception as e:
-                logger.error(f"Failed to initialize Google client: {e}")
+        # One adapter (with pooled clients) per configured provider
+        self.adapters = create_provider_adapters() if adapters is None else adapters
+        ollama_adapter = self.adapters.get(ModelProvider.OLLAMA)
+        self.ollama_client = ollama_adapter.client if ollama_adapter else None
+        # Ollama models discovered at runtime (not in the settings registry), least recently used first
+        self._dynamic_models: "OrderedDict[str, ModelConfig]" = OrderedDict()
+        # One circuit breaker per model, and a worker pool so attempts can be timed out and hedged
+        self.breakers = breakers or CircuitBreakerRegistry(
+            settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD, settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+        self._executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_CONNECTIONS, thread_name_prefix="llm")
 
     def get_available_models(self) -> Dict[str, Dict[str, Any]]:
         """Returns a dictionary of available models with their configurations."""
@@ -69,6 +66,8 @@ class MultiLLMService:
         
         return models
 
+    @time_stage("embed")
+    @tracer.traced("llm.embed", provider="ollama")
     def generate_embedding(self, text: str, model: str = None) -> List[float]:
         """Generates an embedding for the given text using Ollama."""
         if not text.strip():
@@ -88,65 +87,472 @@ class MultiLLMService:
 
     def generate_chat_response(self, query: str, context: str, model: str, 
                              conversation_history: List[Dict[str, str]] = None) -> str:
-        """Generates a chat response using the specified model and provider."""
+        """
+        Generates a chat response using the specified model and provider.
+        Falls back along the model's MODEL_FALLBACKS chain when a model errors or times out.
+        """
         if not query:
             return "Please provide a query."
 
-        # Get model configuration
-        available_models = settings.available_models
-        if model not in available_models:
-            raise ValueError(f"Model '{model}' is not available.")
-        
-        model_config = available_models[model]
-        
-        # Build messages array
+        chain = self._failover_chain(model)
         messages = self._build_messages(query, context, conversation_history)
-        
-        # Route to appropriate provider
-        if model_config.provider == ModelProvider.OLLAMA:
-            return self._generate_ollama_response(model, messages)
-        elif model_config.provider == ModelProvider.OPENAI:
-            return self._generate_openai_response(model, messages)
-        elif model_config.provider == ModelProvider.ANTHROPIC:
-            return self._generate_anthropic_response(model, messages)
-        elif model_config.provider == ModelProvider.GOOGLE:
-            return self._generate_google_response(model, messages)
-        else:
-            raise ValueError(f"Unsupported provider: {model_config.provider}")
+        return self._run_with_failover(model, chain, messages)
 
     def generate_chat_response_stream(self, query: str, context: str, model: str,
                                     conversation_history: List[Dict[str, str]] = None) -> Generator[str, None, None]:
-        """Generates a streaming chat response using the specified model and provider."""
+        """
+        Generates a streaming chat response using the specified model and provider.
+        Fails over to the next model in the chain until one produces its first token.
+        Failures are raised, never yielded as content, so callers cannot mistake them
+        for an answer.
+        """
         if not query:
             yield "Please provide a query."
             return
 
-        # Get model configuration
-        available_models = settings.available_models
-        if model not in available_models:
-            yield f"Error: Model '{model}' is not available."
-            return
-        
-        model_config = available_models[model]
-        
+        chain = self._failover_chain(model)
         # Build messages array
         messages = self._build_messages(query, context, conversation_history)
         
-        # Route to appropriate provider
         try:
-            if model_config.provider == ModelProvider.OLLAMA:
-                yield from self._generate_ollama_response_stream(model, messages)
-            elif model_config.provider == ModelProvider.OPENAI:
-                yield from self._generate_openai_response_stream(model, messages)
-            elif model_config.provider == ModelProvider.ANTHROPIC:
-                yield from self._generate_anthropic_response_stream(model, messages)
-            elif model_config.provider == ModelProvider.GOOGLE:
-                yield from self._generate_google_response_stream(model, messages)
+            yield from self._stream_with_failover(model, chain, messages)
+        except Exception as e:
+            if is_cancelled():
+                logger.info(f"Streaming response for '{model}' cancelled by the client")
             else:
-                yield f"Error: Unsupported provider: {model_config.provider}"
+                logger.error(f"Error generating streaming response: {e}", exc_info=True)
+            raise
+
+    async def agenerate_chat_response(self, query: str, context: str, model: str,
+                                      conversation_history: List[Dict[str, str]] = None) -> str:
+        """Async variant of generate_chat_response using the providers' async clients."""
+        if not query:
+            return "Please provide a query."
+
+        chain = self._failover_chain(model)
+        messages = self._build_messages(query, context, conversation_history)
+        return await self._arun_with_failover(model, chain, messages)
+
+    async def agenerate_chat_response_stream(self, query: str, context: str, model: str,
+                                             conversation_history: List[Dict[str, str]] = None) -> AsyncGenerator[str, None]:
+        """Async variant of generate_chat_response_stream using the providers' async clients."""
+        if not query:
+            yield "Please provide a query."
+            return
+
+        chain = self._failover_chain(model)
+        messages = self._build_messages(query, context, conversation_history)
+
+        try:
+            async for chunk in self._astream_with_failover(model, chain, messages):
+                yield chunk
         except Exception as e:
             logger.error(f"Error generating streaming response: {e}", exc_info=True)
-            yield f"Error: {str(e)}"
+            raise
+
+    # --- Failover ---------------------------------------------------------
+
+    def _failover_chain(self, model: str) -> List[Candidate]:
+        """Resolves the requested model followed by its configured fallbacks."""
+        fallbacks = settings.MODEL_FALLBACKS.get(model, settings.MODEL_FALLBACKS.get("*", []))
+        chain = []
+        first_error = None
+        for name in dict.fromkeys([model, *fallbacks]):
+            try:
+                model_config = self._get_model_config(name)
+                chain.append((name, model_config, self._get_adapter(model_config)))
+            except (ValueError, RuntimeError) as e:
+                logger.warning(f"Skipping model '{name}' in failover chain: {e}")
+                first_error = first_error or e
+        if not chain:
+            raise first_error
+        return chain
+
+    @staticmethod
+    def _failover_error(requested: str, errors: List[Exception]) -> Exception:
+        if len(errors) == 1:
+            return errors[0]
+        summary = "; ".join(str(e) for e in errors)
+        return RuntimeError(f"All models for '{requested}' failed: {summary}")
+
+    def _generate_once(self, name: str, model_config: ModelConfig, adapter: ProviderAdapter,
+                       messages: List[Dict[str, str]], attempt: BreakerAttempt) -> str:
+        provider = model_config.provider.value
+        start = time.perf_counter()
+        try:
+            with tracer.start_span("llm.generate", {"provider": provider, "model": name}):
+                answer = adapter.generate(name, messages)
+        except Exception:
+            GENERATION_ERRORS.labels(provider=provider, model=name).inc()
+            attempt.record_failure()
+            raise
+        attempt.record_success()
+        observe_generation(provider, name, time.perf_counter() - start, estimate_tokens(answer))
+        return answer
+
+    def _run_with_failover(self, requested: str, chain: List[Candidate],
+                           messages: List[Dict[str, str]]) -> str:
+        """
+        Runs attempts on the worker pool so they can be timed out and hedged. The next
+        candidate is started when the current one fails or times out, or - in hedged
+        mode - when it has not answered within LLM_HEDGE_AFTER_SECONDS. The first
+        successful answer wins. A provider call cannot be interrupted, so attempts that
+        timed out or lost the race keep their worker until the provider returns. A timeout
+        counts as a failure and whatever that attempt reports later is ignored; a lost
+        race still reports its outcome, but its answer is dropped. The pool has
+        LLM_MAX_CONNECTIONS workers, so such stragglers delay later attempts rather than
+        add threads. Attempts still queued when another wins are cancelled.
+        """
+        timeout = settings.LLM_REQUEST_TIMEOUT_SECONDS
+        hedge_after = settings.LLM_HEDGE_AFTER_SECONDS
+        remaining = iter(chain)
+        pending: Dict[Future, Tuple[str, BreakerAttempt, float]] = {}
+        errors: List[Exception] = []
+        last_launch = 0.0
+
+        def launch() -> bool:
+            nonlocal last_launch
+            for name, model_config, adapter in remaining:
+                breaker = self.breakers.get(name)
+                if not breaker.allow_request():
+                    errors.append(CircuitOpenError(f"Circuit for model '{name}' is open."))
+                    continue
+                attempt = breaker.attempt()
+                context = contextvars.copy_context()
+                future = self._executor.submit(
+                    context.run, self._generate_once, name, model_config, adapter, messages, attempt
+                )
+                last_launch = time.monotonic()
+                pending[future] = (name, attempt, last_launch + timeout)
+                return True
+            return False
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            wait_timeout = min(deadline for _, _, deadline in pending.values()) - now
+            can_hedge = hedge_after is not None and len(pending) == 1
+            if can_hedge:
+                wait_timeout = min(wait_timeout, last_launch + hedge_after - now)
+            done, _ = wait(pending, timeout=max(wait_timeout, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, _, _ = pending.pop(future)
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    logger.warning(f"Model '{name}' failed: {e}")
+                    errors.append(e)
+                    continue
+                for other, (_, other_attempt, _) in pending.items():
+                    if other.cancel():
+                        # Never started, so it will never report to its breaker
+                        other_attempt.release_trial()
+                if name != requested:
+                    LLM_FAILOVERS.labels(model=requested, fallback=name).inc()
+                return answer
+
+            now = time.monotonic()
+            for future, (name, attempt, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[future]
+                    attempt.abandon()
+                    errors.append(TimeoutError(f"Model '{name}' did not answer within {timeout}s."))
+
+            if not pending:
+                launch()
+            elif can_hedge and not done and now - last_launch >= hedge_after:
+                if launch():
+                    LLM_HEDGED_REQUESTS.labels(model=requested).inc()
+
+        raise self._failover_error(requested, errors)
+
+    def _stream_once(self, name: str, model_config: ModelConfig, adapter: ProviderAdapter,
+                     messages: List[Dict[str, str]], attempt: BreakerAttempt) -> Generator[str, None, None]:
+        provider = model_config.provider.value
+        stream = adapter.generate_stream(name, messages)
+        stream = tracer.trace_stream(stream, "llm.generate_stream", {"provider": provider, "model": name})
+        started = False
+        try:
+            for chunk in instrument_stream(stream, provider, name):
+                if not started:
+                    started = True
+                    attempt.record_success()
+                yield chunk
+            if not started:
+                # An empty answer is still a successful call
+                attempt.record_success()
+        except GeneratorExit:
+            if not started:
+                attempt.release_trial()
+            raise
+        except Exception:
+            if is_cancelled():
+                # Not the model's fault, but the admitted call ends here without an outcome
+                attempt.release_trial()
+            else:
+                attempt.record_failure()
+            raise
+
+    def _stream_with_failover(self, requested: str, chain: List[Candidate],
+                              messages: List[Dict[str, str]]) -> Generator[str, None, None]:
+        """
+        Streaming counterpart of _run_with_failover. Candidates race for the first
+        chunk (bounded by LLM_FIRST_TOKEN_TIMEOUT_SECONDS); once a stream has
+        produced output it is committed to, and the other streams are closed.
+        Once the request is cancelled no further candidates are tried.
+        """
+        cancellation = current_cancellation()
+        timeout = settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS
+        hedge_after = settings.LLM_HEDGE_AFTER_SECONDS
+        remaining = iter(chain)
+        pending: Dict[Future, Tuple[str, BreakerAttempt, Generator[str, None, None], float]] = {}
+        errors: List[Exception] = []
+        last_launch = 0.0
+
+        def launch() -> bool:
+            nonlocal last_launch
+            for name, model_config, adapter in remaining:
+                if cancellation is not None and cancellation.cancelled:
+                    return False
+                breaker = self.breakers.get(name)
+                if not breaker.allow_request():
+                    errors.append(CircuitOpenError(f"Circuit for model '{name}' is open."))
+                    continue
+                attempt = breaker.attempt()
+                stream = self._stream_once(name, model_config, adapter, messages, attempt)
+                context = contextvars.copy_context()
+                future = self._executor.submit(context.run, next, stream, _STREAM_END)
+                last_launch = time.monotonic()
+                pending[future] = (name, attempt, stream, last_launch + timeout)
+                return True
+            return False
+
+        def discard(attempt: BreakerAttempt, future: Future, stream: Generator[str, None, None]):
+            if future.cancel():
+                # Never started: its breaker admitted a call that will not report
+                attempt.release_trial()
+                stream.close()
+                return
+            # The stream may still be running on a worker; close it once that step returns.
+            future.add_done_callback(lambda _: stream.close())
+
+        launch()
+        winner = None
+        while pending and winner is None:
+            now = time.monotonic()
+            wait_timeout = min(deadline for _, _, _, deadline in pending.values()) - now
+            can_hedge = hedge_after is not None and len(pending) == 1
+            if can_hedge:
+                wait_timeout = min(wait_timeout, last_launch + hedge_after - now)
+            done, _ = wait(pending, timeout=max(wait_timeout, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, _, stream, _ = pending.pop(future)
+                try:
+                    first = future.result()
+                except Exception as e:
+                    logger.warning(f"Model '{name}' failed before streaming: {e}")
+                    errors.append(e)
+                    continue
+                winner = (name, stream, first)
+                break
+
+            if winner is not None:
+                break
+
+            now = time.monotonic()
+            for future, (name, attempt, stream, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[future]
+                    attempt.abandon()
+                    discard(attempt, future, stream)
+                    errors.append(TimeoutError(f"Model '{name}' produced no output within {timeout}s."))
+
+            if not pending:
+                launch()
+            elif can_hedge and not done and now - last_launch >= hedge_after:
+                if launch():
+                    LLM_HEDGED_REQUESTS.labels(model=requested).inc()
+
+        for future, (_, attempt, stream, _) in pending.items():
+            discard(attempt, future, stream)
+
+        if winner is None:
+            if cancellation is not None:
+                cancellation.raise_if_cancelled()
+            raise self._failover_error(requested, errors)
+
+        name, stream, first = winner
+        if name != requested:
+            LLM_FAILOVERS.labels(model=requested, fallback=name).inc()
+        try:
+            if first is not _STREAM_END:
+                yield first
+                yield from stream
+        finally:
+            stream.close()
+
+    async def _agenerate_once(self, name: str, model_config: ModelConfig, adapter: ProviderAdapter,
+                              messages: List[Dict[str, str]], attempt: BreakerAttempt) -> str:
+        provider = model_config.provider.value
+        start = time.perf_counter()
+        try:
+            with tracer.start_span("llm.generate", {"provider": provider, "model": name}):
+                answer = await adapter.agenerate(name, messages)
+        except Exception:
+            GENERATION_ERRORS.labels(provider=provider, model=name).inc()
+            attempt.record_failure()
+            raise
+        attempt.record_success()
+        observe_generation(provider, name, time.perf_counter() - start, estimate_tokens(answer))
+        return answer
+
+    async def _arun_with_failover(self, requested: str, chain: List[Candidate],
+                                  messages: List[Dict[str, str]]) -> str:
+        """
+        Async counterpart of _run_with_failover. Abandoned attempts are cancelled, and
+        their trial slot in the circuit breaker released, since they never report.
+        """
+        timeout = settings.LLM_REQUEST_TIMEOUT_SECONDS
+        hedge_after = settings.LLM_HEDGE_AFTER_SECONDS
+        remaining = iter(chain)
+        pending: Dict[asyncio.Task, Tuple[str, BreakerAttempt]] = {}
+        errors: List[Exception] = []
+        last_launch = 0.0
+
+        def launch() -> bool:
+            nonlocal last_launch
+            for name, model_config, adapter in remaining:
+                breaker = self.breakers.get(name)
+                if not breaker.allow_request():
+                    errors.append(CircuitOpenError(f"Circuit for model '{name}' is open."))
+                    continue
+                attempt = breaker.attempt()
+                call = self._agenerate_once(name, model_config, adapter, messages, attempt)
+                pending[asyncio.ensure_future(asyncio.wait_for(call, timeout))] = (name, attempt)
+                last_launch = time.monotonic()
+                return True
+            return False
+
+        launch()
+        try:
+            while pending:
+                can_hedge = hedge_after is not None and len(pending) == 1
+                wait_timeout = max(last_launch + hedge_after - time.monotonic(), 0) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    name, attempt = pending.pop(task)
+                    try:
+                        answer = task.result()
+                    except asyncio.TimeoutError:
+                        attempt.abandon()
+                        errors.append(TimeoutError(f"Model '{name}' did not answer within {timeout}s."))
+                        continue
+                    except Exception as e:
+                        logger.warning(f"Model '{name}' failed: {e}")
+                        errors.append(e)
+                        continue
+                    if name != requested:
+                        LLM_FAILOVERS.labels(model=requested, fallback=name).inc()
+                    return answer
+
+                if not pending:
+                    launch()
+                elif can_hedge and not done:
+                    if launch():
+                        LLM_HEDGED_REQUESTS.labels(model=requested).inc()
+        finally:
+            for task, (_, attempt) in pending.items():
+                if task.cancel():
+                    attempt.release_trial()
+
+        raise self._failover_error(requested, errors)
+
+    async def _astream_with_failover(self, requested: str, chain: List[Candidate],
+                                     messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+        """Async streaming failover: tries candidates in order until one produces its first chunk."""
+        timeout = settings.LLM_FIRST_TOKEN_TIMEOUT_SECONDS
+        errors: List[Exception] = []
+        for name, model_config, adapter in chain:
+            breaker = self.breakers.get(name)
+            if not breaker.allow_request():
+                errors.append(CircuitOpenError(f"Circuit for model '{name}' is open."))
+                continue
+            attempt = breaker.attempt()
+
+            provider = model_config.provider.value
+            stream = ainstrument_stream(adapter.agenerate_stream(name, messages), provider, name)
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), timeout)
+            except StopAsyncIteration:
+                attempt.record_success()
+                return
+            except asyncio.CancelledError:
+                attempt.release_trial()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"Model '{name}' produced no output within {timeout}s.")
+                    attempt.abandon()
+                else:
+                    attempt.record_failure()
+                logger.warning(f"Model '{name}' failed before streaming: {e}")
+                errors.append(e)
+                await stream.aclose()
+                continue
+
+            attempt.record_success()
+            if name != requested:
+                LLM_FAILOVERS.labels(model=requested, fallback=name).inc()
+            try:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+
+        raise self._failover_error(requested, errors)
+
+    async def aclose(self):
+        """Closes the providers' async clients."""
+        for adapter in self.adapters.values():
+            try:
+                await adapter.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close {adapter.provider.value} adapter: {e}")
+
+    def check_model(self, model: str):
+        """Raises ValueError (or RuntimeError) unless some model of `model`'s failover chain can serve it."""
+        self._failover_chain(model)
+
+    def _get_adapter(self, model_config: ModelConfig) -> ProviderAdapter:
+        adapter = self.adapters.get(model_config.provider)
+        if adapter is None:
+            raise RuntimeError(f"{model_config.provider.value} provider is not configured.")
+        return adapter
+
+    def _get_model_config(self, model: str) -> ModelConfig:
+        """Looks up a model, treating names missing from settings as locally pulled Ollama models."""
+        model_config = settings.available_models.get(model)
+        if model_config is not None:
+            return model_config
+        model_config = self._dynamic_models.get(model)
+        if model_config is not None:
+            self._dynamic_models.move_to_end(model)
+            return model_config
+        # The model picker lists everything Ollama has pulled (/api/tags),
+        # which is wider than the static list in settings. Names are client-supplied,
+        # so only those the catalog lists are accepted (all of them until it has loaded).
+        if self.ollama_client and get_model_catalog().lists_ollama_model(model) is not False:
+            model_config = ModelConfig(model, model, ModelProvider.OLLAMA)
+            self._dynamic_models[model] = model_config
+            if len(self._dynamic_models) > MAX_DYNAMIC_MODELS:
+                self._dynamic_models.popitem(last=False)
+            return model_config
+        raise ValueError(f"Model '{model}' is not available.")
 
     def _build_messages(self, query: str, context: str, conversation_history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
         """Builds the messages array for the chat request."""
@@ -180,164 +586,6 @@ class MultiLLMService:
         
         return messages
 
-    def _generate_ollama_response(self, model: str, messages: List[Dict[str, str]]) -> str:
-        """Generates response using Ollama."""
-        if not self.ollama_client:
-            raise RuntimeError("Ollama client is not available.")
-        
-        # Ensure model name has :latest tag if not present
-        model_name = model if ':' in model else f"{model}:latest"
-        
-        response = self.ollama_client.chat(model=model_name, messages=messages)
-        return response['message']['content']
-
-    def _generate_ollama_response_stream(self, model: str, messages: List[Dict[str, str]]) -> Generator[str, None, None]:
-        """Generates streaming response using Ollama."""
-        if not self.ollama_client:
-            yield "Error: Ollama client is not available."
-            return
-        
-        # Ensure model name has :latest tag if not present
-        model_name = model if ':' in model else f"{model}:latest"
-        
-        stream = self.ollama_client.chat(model=model_name, messages=messages, stream=True)
-        
-        for chunk in stream:
-            if chunk['message']['content']:
-                yield chunk['message']['content']
-
-    def _generate_openai_response(self, model: str, messages: List[Dict[str, str]]) -> str:
-        """Generates response using OpenAI."""
-        if not self.openai_client:
-            raise RuntimeError("OpenAI client is not available.")
-        
-        response = self.openai_client.chat.completions.create(
-            model=model,
-            messages=messages
-        )
-        return response.choices[0].message.content
-
-    def _generate_openai_response_stream(self, model: str, messages: List[Dict[str, str]]) -> Generator[str, None, None]:
-        """Generates streaming response using OpenAI."""
-        if not self.openai_client:
-            yield "Error: OpenAI client is not available."
-            return
-        
-        stream = self.openai_client.chat.completions.create(
-            model=model,
-            messages=messages,
-            stream=True
-        )
-        
-        for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                yield chunk.choices[0].delta.content
-
-    def _generate_anthropic_response(self, model: str, messages: List[Dict[str, str]]) -> str:
-        """Generates response using Anthropic."""
-        if not self.anthropic_client:
-            raise RuntimeError("Anthropic client is not available.")
-        
-        # Anthropic requires system message to be separate
-        system_message = ""
-        conversation_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                conversation_messages.append(msg)
-        
-        response = self.anthropic_client.messages.create(
-            model=model,
-            max_tokens=4096,
-            system=system_message,
-            messages=conversation_messages
-        )
-        return response.content[0].text
-
-    def _generate_anthropic_response_stream(self, model: str, messages: List[Dict[str, str]]) -> Generator[str, None, None]:
-        """Generates streaming response using Anthropic."""
-        if not self.anthropic_client:
-            yield "Error: Anthropic client is not available."
-            return
-        
-        # Anthropic requires system message to be separate
-        system_message = ""
-        conversation_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                conversation_messages.append(msg)
-        
-        with self.anthropic_client.messages.stream(
-            model=model,
-            max_tokens=4096,
-            system=system_message,
-            messages=conversation_messages
-        ) as stream:
-            for text in stream.text_stream:
-                yield text
-
-    def _generate_google_response(self, model: str, messages: List[Dict[str, str]]) -> str:
-        """Generates response using Google Generative AI."""
-        try:
-            model_instance = genai.GenerativeModel(model)
-            
-            # Convert messages to Google format
-            chat = model_instance.start_chat(history=[])
-            
-            # Add conversation history
-            for msg in messages[1:]:  # Skip system message for now
-                if msg["role"] == "user":
-                    response = chat.send_message(msg["content"])
-                elif msg["role"] == "assistant":
-                    # For assistant messages, we need to add them to history
-                    chat.history.append({
-                        'role': 'user',
-                        'parts': [msg["content"]]
-                    })
-            
-            # Get the last user message
-            last_user_message = messages[-1]["content"]
-            response = chat.send_message(last_user_message)
-            
-            return response.text
-        except Exception as e:
-            logger.error(f"Error with Google Generative AI: {e}")
-            raise
-
-    def _generate_google_response_stream(self, model: str, messages: List[Dict[str, str]]) -> Generator[str, None, None]:
-        """Generates streaming response using Google Generative AI."""
-        try:
-            model_instance = genai.GenerativeModel(model)
-            
-            # Convert messages to Google format
-            chat = model_instance.start_chat(history=[])
-            
-            # Add conversation history
-            for msg in messages[1:-1]:  # Skip system message and last user message
-                if msg["role"] == "user":
-                    chat.send_message(msg["content"])
-                elif msg["role"] == "assistant":
-                    chat.history.append({
-                        'role': 'model',
-                        'parts': [msg["content"]]
-                    })
-            
-            # Get the last user message and stream response
-            last_user_message = messages[-1]["content"]
-            response = chat.send_message(last_user_message, stream=True)
-            
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
-        except Exception as e:
-            logger.error(f"Error with Google Generative AI streaming: {e}")
-            yield f"Error: {str(e)}"
-
 
 # Dependency injection functions
 def get_multi_llm_service():
@@ -351,6 +599,8 @@ def get_multi_llm_service():
 # Singleton instance
 try:
     multi_llm_service = MultiLLMService()
+    # Admission controllers are only created for models this service can serve
+    admission.validate = multi_llm_service.check_model
 except Exception as e:
     logger.error(f"Could not create MultiLLMService instance: {e}")
     multi_llm_service = None
\ No newline at end of file
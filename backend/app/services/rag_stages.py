@@ -0,0 +1,172 @@
+import json
+import logging
+from typing import Any, Dict, Generator as TypingGenerator, List, Optional, Tuple
+
+from .multi_llm_service import MultiLLMService
+from .vector_db_service import MilvusService
+from app.core.config import settings
+from app.core.timings import StageTimings
+
+logger = logging.getLogger(__name__)
+
+# RAGエンジンの各ステージ（ルーター、リトリーバー、リランカー、ジェネレーター）の
+# 基底クラスとデフォルト実装。IntelligentRAGServiceに差し替え可能な形で渡す。
+
+
+class Router:
+    """クエリにRAGが必要かどうかを判断するステージ"""
+
+    def route(self, query: str, context_url: str, model: str,
+              conversation_history: List[Dict[str, str]]) -> Tuple[bool, str]:
+        raise NotImplementedError
+
+
+class AlwaysRAGRouter(Router):
+    """LLM呼び出しを省略して常にRAGを使用する（最速のルーター）"""
+
+    def route(self, query: str, context_url: str, model: str,
+              conversation_history: List[Dict[str, str]]) -> Tuple[bool, str]:
+        return True, "常にRAGを使用する設定"
+
+
+class LLMRouter(Router):
+    """LLMにRAG必要性を判断させるルーター"""
+
+    def __init__(self, multi_llm_service: MultiLLMService):
+        self.multi_llm = multi_llm_service
+
+    def route(self, query: str, context_url: str, model: str,
+              conversation_history: List[Dict[str, str]]) -> Tuple[bool, str]:
+        # RAG判定用のプロンプト
+        routing_prompt = f"""あなたは質問を分析して、RAG（検索拡張生成）が必要かどうかを判断するエキスパートです。
+
+与えられた質問について、提供されたURLのコンテンツから情報を検索する必要があるかどうかを判断してください。
+
+コンテキストURL: {context_url}
+
+質問: {query}
+
+判断基準:
+- URLのコンテンツに関する具体的な情報が必要な場合 → RAGが必要
+- 文書の内容についての質問 → RAGが必要
+- 翻訳のみの要求 → RAGは不要
+- 一般的な質問（URLコンテンツに関係ない） → RAGは不要
+- 前回の会話の続きで新しい情報が不要 → RAGは不要
+
+ただし、このアプリケーションは与えられたURLのコンテンツについて答えることが主な目的なので、迷った場合は積極的にRAGを使用してください。
+
+以下のJSON形式で回答してください:
+{{"requires_rag": true/false, "reasoning": "判断理由"}}"""
+
+        response = self.multi_llm.generate_chat_response(
+            query=query,
+            context=routing_prompt,
+            model=model,
+            conversation_history=[]
+        )
+
+        # JSON形式の回答をパース
+        content = response.strip()
+        if content.startswith('```json'):
+            content = content[7:-3].strip()
+        elif content.startswith('```'):
+            content = content[3:-3].strip()
+
+        result = json.loads(content)
+        requires_rag = result.get("requires_rag", True)  # デフォルトはRAGを使用
+        reasoning = result.get("reasoning", "判断できませんでした")
+        return requires_rag, reasoning
+
+
+class Retriever:
+    """クエリに関連するチャンクを取得するステージ"""
+
+    def retrieve(self, query: str, context_url: str, top_k: int,
+                 timings: StageTimings, query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class MilvusRetriever(Retriever):
+    """クエリをエンベディングしてMilvusでベクトル検索するリトリーバー"""
+
+    def __init__(self, multi_llm_service: MultiLLMService, milvus_service: MilvusService,
+                 nprobe: Optional[int] = None):
+        self.multi_llm = multi_llm_service
+        self.milvus = milvus_service
+        # 未指定ならMILVUS_NPROBEを使う（評価ツールでの比較用）
+        self.nprobe = nprobe
+
+    def retrieve(self, query: str, context_url: str, top_k: int,
+                 timings: StageTimings, query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        # 1. クエリをエンベディング（回答キャッシュの照合で計算済みなら再利用）
+        if query_embedding is None:
+            with timings.stage("embedding"):
+                query_embedding = self.multi_llm.generate_embedding(query)
+        if not query_embedding:
+            raise Exception("クエリのエンベディング生成に失敗")
+
+        # 2. 関連コンテンツを検索
+        with timings.stage("search"):
+            return self.milvus.search(
+                query_embedding=query_embedding,
+                context_url=context_url,
+                top_k=top_k,
+                nprobe=self.nprobe,
+                # クエリと同じモデルでエンベディングされたチャンクだけを検索する
+                embedding_model=settings.EMBEDDING_MODEL
+            )
+
+
+class Reranker:
+    """検索結果を並べ替え・絞り込むステージ"""
+
+    def rerank(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class PassthroughReranker(Reranker):
+    """検索結果をそのまま返す（デフォルト）"""
+
+    def rerank(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return results
+
+
+class Generator:
+    """コンテキストから回答を生成するステージ"""
+
+    def build_context(self, sources: List[Dict[str, Any]]) -> str:
+        # クロールしたサイトではチャンクごとの元ページを示す
+        return "\n\n".join([f"ソースURL: {res.get('page_url') or res['url']}\n内容: {res['text']}" for res in sources])
+
+    def generate(self, query: str, context: str, model: str,
+                 conversation_history: List[Dict[str, str]]) -> str:
+        raise NotImplementedError
+
+    def generate_stream(self, query: str, context: str, model: str,
+                        conversation_history: List[Dict[str, str]]) -> TypingGenerator[str, None, None]:
+        raise NotImplementedError
+
+
+class LLMGenerator(Generator):
+    """MultiLLMServiceで選択されたモデルを使って回答を生成する"""
+
+    def __init__(self, multi_llm_service: MultiLLMService):
+        self.multi_llm = multi_llm_service
+
+    def generate(self, query: str, context: str, model: str,
+                 conversation_history: List[Dict[str, str]]) -> str:
+        return self.multi_llm.generate_chat_response(
+            query=query,
+            context=context,
+            model=model,
+            conversation_history=conversation_history
+        )
+
+    def generate_stream(self, query: str, context: str, model: str,
+                        conversation_history: List[Dict[str, str]]) -> TypingGenerator[str, None, None]:
+        return self.multi_llm.generate_chat_response_stream(
+            query=query,
+            context=context,
+            model=model,
+            conversation_history=conversation_history
+        )
@@ -1,44 +1,125 @@
 import requests
-from bs4 import BeautifulSoup
 import logging
+import tempfile
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import time_stage
+from app.services.content_extraction import ExtractedPage, extract_main_content, page_from_text
+from app.services.document_extraction import detect_document_type, extract_document
+from app.services.html_extraction import PageLinks, extract_links, extract_text, html_extractor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def scrape_url(url: str) -> str:
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def declared_charset(response: requests.Response) -> Optional[str]:
+    # requests assumes ISO-8859-1 for text/* without a charset; only trust an explicit one
+    content_type = response.headers.get("content-type", "")
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def _extract_full_text(document: bytes, encoding: Optional[str], parser: str) -> ExtractedPage:
+    return page_from_text(extract_text(document, encoding, parser))
+
+
+def _extract_with_links(document: bytes, encoding: Optional[str], parser: str,
+                        extractor: Callable[..., ExtractedPage]) -> Tuple[ExtractedPage, PageLinks]:
+    return extractor(document, encoding, parser), extract_links(document, encoding, parser)
+
+
+def _page_extractor() -> Callable[..., ExtractedPage]:
+    return extract_main_content if settings.CONTENT_EXTRACTION == "main" else _extract_full_text
+
+
+def extract_page(document: bytes, charset: Optional[str] = None) -> ExtractedPage:
+    """Extracts a fetched HTML document as configured by CONTENT_EXTRACTION. Large pages are parsed in a worker process."""
+    with time_stage("parse"):
+        return html_extractor.extract(document, charset, _page_extractor())
+
+
+def extract_page_and_links(document: bytes, charset: Optional[str] = None) -> Tuple[ExtractedPage, PageLinks]:
+    """Like extract_page, and also collects the document's links, in the same worker call."""
+    with time_stage("parse"):
+        return html_extractor.extract(document, charset, partial(_extract_with_links, extractor=_page_extractor()))
+
+
+class DocumentTooLarge(Exception):
+    """The download exceeded SCRAPE_MAX_DOCUMENT_BYTES."""
+
+
+def _spool(response: requests.Response) -> tempfile.SpooledTemporaryFile:
+    """Streams a response body into a file that moves from memory to disk once it is large."""
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.SCRAPE_SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > settings.SCRAPE_MAX_DOCUMENT_BYTES:
+                raise DocumentTooLarge(f"{response.url} is larger than {settings.SCRAPE_MAX_DOCUMENT_BYTES} bytes")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def scrape_page(url: str) -> Optional[ExtractedPage]:
     """
-    Scrapes a single URL and returns the extracted text content.
+    Scrapes a single URL and returns its content as sections.
+
+    The extractor is chosen from the Content-Type (then the file extension and the
+    first bytes): HTML, PDF, Markdown, plain text, JSON or JSON Lines. For HTML,
+    CONTENT_EXTRACTION="main" (the default) keeps only the main content, structured
+    by its headings, and "full" keeps all text outside boilerplate elements. Other
+    documents are downloaded to a spooled temporary file and their sections are
+    extracted lazily while the returned page is iterated, so memory stays bounded.
 
     Args:
         url: The URL to scrape.
 
     Returns:
-        The extracted text content, or an empty string if scraping fails.
+        The extracted page, or None if scraping fails or the content type is not supported.
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, timeout=15, headers=headers)
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
-
-        # Use html.parser for basic parsing
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Remove script, style, head, title, and meta tags
-        for element in soup(["script", "style", "head", "title", "meta", "header", "footer", "nav", "aside"]):
-            element.decompose()
-
-        # Get text and clean it up
-        text = soup.get_text(separator='\n', strip=True)
+        with requests.get(url, timeout=15, headers=HEADERS, stream=True) as response:
+            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+            spool = _spool(response)
+        charset = declared_charset(response)
+        document_type = detect_document_type(response.headers.get("content-type", ""), url, spool.read(1024))
+        spool.seek(0)
 
-        logger.info(f"Successfully scraped URL: {url}")
-        return text
+        if document_type == "html":
+            with spool:
+                page = extract_page(spool.read(), charset)
+            logger.info(f"Successfully scraped URL: {url} ({len(page.sections)} sections)")
+            return page
+        if document_type is None:
+            spool.close()
+            logger.warning(f"Unsupported content type for URL {url}: {response.headers.get('content-type')}")
+            return None
+        try:
+            page = extract_document(spool, document_type, url, charset)
+        except BaseException:
+            spool.close()
+            raise
+        logger.info(f"Successfully opened URL: {url} as {document_type}")
+        return page
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching URL {url}: {e}")
-        return ""
+        return None
     except Exception as e:
         logger.error(f"An unexpected error occurred while scraping {url}: {e}")
-        return ""
+        return None
@@ -0,0 +1,115 @@
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, Tuple
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # zlib is used instead
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of parameters per statement (999 before 3.32)
+_BATCH = 500
+
+
+class TextStore:
+    """
+    Chunk texts kept outside Milvus, in one SQLite file keyed by the chunk's Milvus id.
+    Each text is compressed on its own (zstd when installed, zlib otherwise), so fetching
+    the hits of a search reads and decompresses only those texts.
+    """
+
+    def __init__(self, path: str, level: int = 3):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets the workers of a multi-process server read while one of them writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks "
+                         "(id INTEGER PRIMARY KEY, url TEXT NOT NULL, codec TEXT NOT NULL, data BLOB NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_url ON chunks (url)")
+        if zstandard is not None:
+            self._codec = "zstd"
+            self._compressor = zstandard.ZstdCompressor(level=level)
+            self._decompressor = zstandard.ZstdDecompressor()
+        else:
+            self._codec = "zlib"
+
+    def _compress(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if self._codec == "zstd":
+            return self._compressor.compress(data)
+        return zlib.compress(data, min(max(self.level, 1), 9))
+
+    def _decompress(self, codec: str, data: bytes) -> str:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("The text store holds zstd-compressed texts; install zstandard to read them.")
+            return self._decompressor.decompress(data).decode("utf-8")
+        return zlib.decompress(data).decode("utf-8")
+
+    def put_many(self, url: str, texts: Iterable[Tuple[int, str]]):
+        """Stores (id, text) pairs of the context `url`, replacing texts already stored under those ids."""
+        with self._lock:
+            rows = [(int(id_), url, self._codec, self._compress(text)) for id_, text in texts]
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.executemany("INSERT OR REPLACE INTO chunks (id, url, codec, data) VALUES (?, ?, ?, ?)", rows)
+
+    def put(self, id_: int, url: str, text: str):
+        self.put_many(url, [(id_, text)])
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, str]:
+        """Texts of the given ids; ids without a stored text are missing from the result."""
+        ids = [int(id_) for id_ in ids]
+        texts = {}
+        with self._lock:
+            for start in range(0, len(ids), _BATCH):
+                batch = ids[start:start + _BATCH]
+                rows = self._db.execute(f"SELECT id, codec, data FROM chunks WHERE id IN ({','.join('?' * len(batch))})",
+                                        batch).fetchall()
+                for id_, codec, data in rows:
+                    texts[id_] = self._decompress(codec, data)
+        return texts
+
+    def delete(self, ids: Iterable[int]) -> int:
+        ids = [int(id_) for id_ in ids]
+        deleted = 0
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN")
+                for start in range(0, len(ids), _BATCH):
+                    batch = ids[start:start + _BATCH]
+                    deleted += self._db.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})",
+                                                batch).rowcount
+        return deleted
+
+    def delete_context(self, url: str) -> int:
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN")
+                return self._db.execute("DELETE FROM chunks WHERE url = ?", (url,)).rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Singleton instance
+text_store = TextStore(settings.TEXT_STORE_PATH, settings.TEXT_STORE_COMPRESSION_LEVEL) \
+    if settings.TEXT_STORE_ENABLED else None
@@ -1,5 +1,7 @@
+import json
 import os
 import re
+import time
 import logging
 from pymilvus import (
     connections,
@@ -10,7 +12,13 @@ from pymilvus import (
     Collection,
 )
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+from app.core.metrics import time_stage
+from app.core.tracing import tracer
+from app.services.embedding_store import EmbeddingStore, embedding_store, text_digest
+from app.services.text_store import TextStore, text_store
+from app.services.vector_storage import VectorStorage
 
 load_dotenv()
 
@@ -20,55 +28,171 @@ logger = logging.getLogger(__name__)
 
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
 MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
-COLLECTION_NAME = "web_content_partitioned"
+COLLECTION_NAME = "web_content_v2"
+# Collection of earlier versions (url, text and embedding only). It is still served when it is
+# the only one, until `python -m app.services.milvus_migration` copies it to COLLECTION_NAME.
+LEGACY_COLLECTION_NAME = "web_content_partitioned"
 EMBEDDING_DIM = 1024  # Dimension for mxbai-embed-large
+# How embeddings are stored (float32, float16, int8 or binary) and how many of their leading
+# dimensions are kept. Every layout other than full float32 uses a collection of its own.
+EMBEDDING_STORAGE = VectorStorage(os.getenv("EMBEDDING_STORAGE", "float32"),
+                                  int(os.getenv("EMBEDDING_DIMENSIONS", EMBEDDING_DIM)), EMBEDDING_DIM,
+                                  int(os.getenv("BINARY_RESCORE_FACTOR", "10")))
+# IVF clusters probed per search: higher is more accurate and slower (nlist is 128)
+MILVUS_NPROBE = int(os.getenv("MILVUS_NPROBE", "10"))
+# Scalar indexes on the fields used in filter expressions, so filters do not scan the collection
+SCALAR_INDEXES = {
+    "url": "INVERTED",
+    "page_url": "INVERTED",
+    "content_hash": "INVERTED",
+    "embedding_model": "INVERTED",
+    "chunk_index": "STL_SORT",
+    "ingested_at": "STL_SORT",
+}
+# INVERTED scalar indexes and FLOAT16_VECTOR fields need Milvus 2.4 or later
+MIN_MILVUS_VERSION = (2, 4)
+
+
+def content_hash(text: str) -> str:
+    return text_digest(text).hex()
+
+
+def _quote(value: str) -> str:
+    """A string literal for a Milvus filter expression."""
+    return json.dumps(value)
+
+
+def build_schema(storage: VectorStorage = EMBEDDING_STORAGE) -> CollectionSchema:
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        # The context: the ingested URL, or the seed of a crawled site
+        FieldSchema(name="url", dtype=DataType.VARCHAR, max_length=2048),
+        # The page a chunk comes from; differs from the context URL for crawled sites
+        FieldSchema(name="page_url", dtype=DataType.VARCHAR, max_length=2048),
+        FieldSchema(name="chunk_index", dtype=DataType.INT64),
+        # Heading path of the section the chunk starts in ("Guide > Setup") and its anchor
+        FieldSchema(name="heading", dtype=DataType.VARCHAR, max_length=2048),
+        FieldSchema(name="anchor", dtype=DataType.VARCHAR, max_length=512),
+        # sha256 of text, hex: finds unchanged chunks without reading text
+        FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="ingested_at", dtype=DataType.INT64),  # Unix seconds; 0 for migrated chunks
+        FieldSchema(name="embedding_model", dtype=DataType.VARCHAR, max_length=256),
+        # Empty when the texts are kept in the TextStore (TEXT_STORE_ENABLED)
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+        FieldSchema(name="embedding", dtype=storage.field_dtype(), dim=storage.dim)
+    ]
+    # A collection can have at most one partition key field.
+    return CollectionSchema(
+        fields,
+        description="Collection for partitioned web page content",
+        partition_key_field="url"
+    )
+
+
+def _parse_version(version: str) -> Optional[Tuple[int, int]]:
+    match = re.match(r"v?(\d+)\.(\d+)", version or "")
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def collection_name(storage: VectorStorage = EMBEDDING_STORAGE) -> str:
+    return COLLECTION_NAME + storage.suffix
+
+
+def create_collection(name: str = COLLECTION_NAME, storage: VectorStorage = EMBEDDING_STORAGE) -> Collection:
+    """
+    Creates a collection with the current schema, its vector index and its scalar indexes.
+    The collection is dropped again if an index cannot be created, so a later start does not
+    find it half indexed. INVERTED indexes need Milvus 2.4 or later.
+    """
+    collection = Collection(name, build_schema(storage), num_partitions=64)  # Pre-allocate partitions
+    try:
+        logger.info(f"Creating {storage.mode} index for the embedding field...")
+        collection.create_index(field_name="embedding", index_params=storage.index_params())
+        for field_name, index_type in SCALAR_INDEXES.items():
+            collection.create_index(field_name=field_name, index_params={"index_type": index_type},
+                                    index_name=f"{field_name}_index")
+    except Exception:
+        logger.error(f"Failed to index collection '{name}'; dropping it.")
+        collection.drop()
+        raise
+    logger.info("Indexes created successfully.")
+    return collection
+
+
+class UnsupportedMilvusVersion(RuntimeError):
+    pass
+
 
 class MilvusService:
-    def __init__(self, host=MILVUS_HOST, port=MILVUS_PORT):
+    def __init__(self, host=MILVUS_HOST, port=MILVUS_PORT, text_store: Optional[TextStore] = None,
+                 storage: VectorStorage = EMBEDDING_STORAGE, embeddings: Optional[EmbeddingStore] = None):
         self.host = host
         self.port = port
         self.collection = None
+        self.storage = storage
+        # Float embeddings of the chunks, used to rescore binary search candidates
+        self.embeddings = embeddings
+        # Where new chunk texts go instead of the collection's text field, if set
+        self.text_store = text_store
+        # Fields of the collection in use; a legacy collection lacks the chunk metadata
+        self.fields = frozenset()
+        # Called with the URL whenever a context's data is inserted or deleted
+        self._change_listeners: List[Callable[[str], None]] = []
         try:
             logger.info(f"Connecting to Milvus at {self.host}:{self.port}")
             connections.connect("default", host=self.host, port=self.port)
             logger.info("Successfully connected to Milvus.")
             self._initialize_collection()
+        except UnsupportedMilvusVersion:
+            raise
         except Exception as e:
             logger.error(f"Failed to connect to Milvus: {e}", exc_info=True)
             raise RuntimeError("Could not connect to Milvus. Is it running?") from e
 
     def _initialize_collection(self):
         """Checks if the collection exists and creates it if it doesn't."""
-        if utility.has_collection(COLLECTION_NAME):
-            logger.info(f"Collection '{COLLECTION_NAME}' already exists.")
-            self.collection = Collection(COLLECTION_NAME)
+        name = collection_name(self.storage)
+        if utility.has_collection(name):
+            logger.info(f"Collection '{name}' already exists.")
+            self.collection = Collection(name)
+        elif self.storage.is_default and utility.has_collection(LEGACY_COLLECTION_NAME):
+            logger.warning(f"Using the legacy collection '{LEGACY_COLLECTION_NAME}'. Chunk metadata, dedupe and "
+                           f"stale-chunk cleanup need a migration: python -m app.services.milvus_migration")
+            self.collection = Collection(LEGACY_COLLECTION_NAME)
         else:
-            logger.info(f"Collection '{COLLECTION_NAME}' not found. Creating it now.")
-            fields = [
-                FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-                FieldSchema(name="url", dtype=DataType.VARCHAR, max_length=2048),
-                FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM)
-            ]
-            # A collection can have at most one partition key field.
-            schema = CollectionSchema(
-                fields,
-                description="Collection for partitioned web page content",
-                partition_key_field="url"
-            )
-            self.collection = Collection(COLLECTION_NAME, schema, num_partitions=64) # Pre-allocate partitions
-
-            logger.info("Creating index for the embedding field...")
-            index_params = {
-                "metric_type": "L2",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128}
-            }
-            self.collection.create_index(field_name="embedding", index_params=index_params)
-            logger.info("Index created successfully.")
+            logger.info(f"Collection '{name}' not found. Creating it now.")
+            self._check_server_version()
+            self.collection = create_collection(name, self.storage)
 
+        self.fields = frozenset(field.name for field in self.collection.schema.fields)
         self.collection.load()
-        logger.info(f"Collection '{COLLECTION_NAME}' loaded into memory.")
+        logger.info(f"Collection '{self.collection.name}' loaded into memory.")
+
+    def _check_server_version(self):
+        """Fails with a clear error before creating a collection the server cannot index."""
+        version = utility.get_server_version()
+        parsed = _parse_version(version)
+        if parsed is not None and parsed < MIN_MILVUS_VERSION:
+            required = ".".join(map(str, MIN_MILVUS_VERSION))
+            raise UnsupportedMilvusVersion(
+                f"Milvus {version} is too old: the collection's scalar indexes and the '{self.storage.mode}' "
+                f"embedding storage need Milvus {required} or later.")
+
+    @property
+    def has_chunk_metadata(self) -> bool:
+        return "content_hash" in self.fields
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        """Registers a callback invoked with the context URL after its data changes."""
+        self._change_listeners.append(listener)
+
+    def notify_change(self, url: str):
+        """Invokes the change listeners; batch writers call it once after inserting with notify=False."""
+        for listener in self._change_listeners:
+            try:
+                listener(url)
+            except Exception as e:
+                logger.error(f"Context change listener failed for '{url}': {e}", exc_info=True)
 
     def list_contexts(self) -> List[str]:
         """Lists all unique URLs (contexts) that have been ingested."""
@@ -76,7 +200,8 @@ class MilvusService:
             # Query for distinct url values
             # Note: This might be slow on very large datasets without proper indexing on the 'url' field.
             # For this app's scale, it's acceptable.
-            results = self.collection.query(expr="id >= 0", output_fields=["url"])
+            with tracer.start_span("milvus.query", {"collection": self.collection.name}):
+                results = self.collection.query(expr="id >= 0", output_fields=["url"])
             unique_urls = sorted(list(set([res['url'] for res in results])))
             logger.info(f"Found {len(unique_urls)} unique contexts.")
             return unique_urls
@@ -84,62 +209,174 @@ class MilvusService:
             logger.error(f"Failed to list contexts from Milvus: {e}", exc_info=True)
             return []
 
-    def insert_data(self, url: str, text: str, embedding: list[float]) -> int:
-        """Inserts scraped data and its embedding into the correct partition."""
+    @time_stage("milvus_insert")
+    def insert_data(self, url: str, text: str, embedding: list[float], page_url: Optional[str] = None,
+                    chunk_index: int = 0, heading: str = "", anchor: Optional[str] = None,
+                    embedding_model: str = "", ingested_at: Optional[int] = None, notify: bool = True) -> int:
+        """
+        Inserts scraped data and its embedding into the correct partition. `url` is the
+        context; `page_url` is the page the text comes from, when it is not the context URL
+        itself. The chunk metadata is dropped for a legacy collection, which cannot store it.
+        With notify=False the change listeners are left for the caller to invoke once.
+        With a text store, the text is stored there under the new row's id.
+        """
         if not self.collection:
             logger.error("Collection is not initialized. Cannot insert data.")
             return 0
 
         # Data is automatically routed to the partition corresponding to the 'url' value.
-        data = [[url], [text], [embedding]]
+        row = {
+            "url": url,
+            "page_url": page_url or url,
+            "chunk_index": chunk_index,
+            "heading": heading,
+            "anchor": anchor or "",
+            "content_hash": content_hash(text),
+            "ingested_at": int(time.time()) if ingested_at is None else ingested_at,
+            "embedding_model": embedding_model,
+            "text": "" if self.text_store else text,
+            "embedding": self.storage.encode(embedding),
+        }
+        data = [{name: value for name, value in row.items() if name in self.fields}]
         try:
-            mr = self.collection.insert(data)
-            self.collection.flush()
+            with tracer.start_span("milvus.insert", {"collection": self.collection.name, "url": url}):
+                mr = self.collection.insert(data)
+            if self.text_store:
+                try:
+                    self.text_store.put_many(url, zip(mr.primary_keys, [text]))
+                except Exception:
+                    # A row without its text would be dropped from search results anyway
+                    self.collection.delete(f"id in {json.dumps(list(mr.primary_keys))}")
+                    raise
+            with tracer.start_span("milvus.flush", {"collection": self.collection.name}):
+                self.collection.flush()
             logger.info(f"Successfully inserted data for URL: {url} into its partition. Primary keys: {mr.primary_keys}")
+            if notify:
+                self.notify_change(url)
             return mr.insert_count
         except Exception as e:
             logger.error(f"Failed to insert data into Milvus: {e}", exc_info=True)
             return 0
 
-    def search(self, query_embedding: List[float], context_url: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Searches for similar vectors within a specific URL's partition."""
+    def page_chunks(self, url: str, page_url: str) -> List[Dict[str, Any]]:
+        """
+        id, chunk_index, content_hash and embedding_model of the stored chunks of one page,
+        read through the scalar indexes. Empty for a legacy collection. Query errors are
+        raised: an ingest that took the page for new would duplicate its chunks.
+        """
+        if not self.collection or not self.has_chunk_metadata:
+            return []
+        expr = f"url == {_quote(url)} and page_url == {_quote(page_url)}"
+        with tracer.start_span("milvus.query", {"collection": self.collection.name, "url": url}):
+            return self.collection.query(expr=expr,
+                                         output_fields=["id", "chunk_index", "content_hash", "embedding_model"])
+
+    def delete_chunks(self, url: str, ids: List[int], notify: bool = True) -> int:
+        """Deletes chunks of the context `url` by primary key. Returns the number deleted."""
+        if not self.collection or not ids:
+            return 0
+        try:
+            with tracer.start_span("milvus.delete", {"collection": self.collection.name, "url": url}):
+                result = self.collection.delete(f"id in {json.dumps(list(ids))}")
+            if self.text_store:
+                self.text_store.delete(ids)
+            with tracer.start_span("milvus.flush", {"collection": self.collection.name}):
+                self.collection.flush()
+            logger.info(f"Deleted {result.delete_count} stale chunks of context '{url}'.")
+            if notify:
+                self.notify_change(url)
+            return result.delete_count
+        except Exception as e:
+            logger.error(f"Failed to delete chunks of context '{url}' from Milvus: {e}", exc_info=True)
+            return 0
+
+    @time_stage("milvus_search")
+    def search(self, query_embedding: List[float], context_url: str, top_k: int = 3,
+               nprobe: Optional[int] = None, page_urls: Optional[List[str]] = None,
+               embedding_model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Searches for similar vectors within a specific URL's partition. `nprobe` overrides
+        MILVUS_NPROBE; `page_urls` restricts a crawled context to some of its pages and
+        `embedding_model` to the chunks embedded by that model. Texts kept in the text
+        store are fetched from it for all hits at once.
+        """
         if not self.collection:
             logger.error("Collection is not initialized. Cannot perform search.")
             return []
 
-        search_params = {
-            "metric_type": "L2",
-            "params": {"nprobe": 10},
-        }
+        search_params = self.storage.search_params(nprobe or MILVUS_NPROBE)
 
         # Use an expression to filter by the partition key field 'url'
-        expr = f'url == "{context_url}"'
+        expr = f"url == {_quote(context_url)}"
+        if page_urls is not None:
+            if "page_url" in self.fields:
+                expr += f" and page_url in {json.dumps(list(page_urls))}"
+            elif context_url not in page_urls:
+                # Without the field every chunk belongs to the page of its context URL
+                return []
+        if embedding_model is not None and "embedding_model" in self.fields:
+            expr += f" and embedding_model == {_quote(embedding_model)}"
+        output_fields = [name for name in ("text", "url", "page_url", "heading", "anchor") if name in self.fields]
+        if self.storage.mode == "binary":
+            # For rescoring: the stored bits, and the keys of the float embeddings in the embedding cache
+            output_fields += [name for name in ("embedding", "content_hash", "embedding_model") if name in self.fields]
 
         try:
-            results = self.collection.search(
-                data=[query_embedding],
-                anns_field="embedding",
-                param=search_params,
-                limit=top_k,
-                expr=expr,
-                output_fields=["text", "url"]
-            )
-
-            hits = results[0]
+            with tracer.start_span("milvus.search", {"collection": self.collection.name, "url": context_url, "top_k": top_k}):
+                results = self.collection.search(
+                    data=[self.storage.encode(query_embedding)],
+                    anns_field="embedding",
+                    param=search_params,
+                    limit=self.storage.search_limit(top_k),
+                    expr=expr,
+                    output_fields=output_fields
+                )
+
+            hits = list(results[0])
+            distances = [hit.distance for hit in hits]
+            if self.storage.mode == "binary" and hits:
+                # Rank the Hamming candidates by their distance to the float query
+                distances = self.storage.rescore(query_embedding, [hit.entity.get('embedding') for hit in hits],
+                                                 self._cached_embeddings(hits))
+                order = sorted(range(len(hits)), key=lambda i: distances[i])[:top_k]
+                hits, distances = [hits[i] for i in order], [float(distances[i]) for i in order]
             logger.info(f"Search in context '{context_url}' found {len(hits)} results.")
+            texts = {hit.id: hit.entity.get('text') for hit in hits}
+            if self.text_store and not all(texts.values()):
+                with tracer.start_span("text_store.get", {"count": len(hits)}):
+                    texts.update(self.text_store.get_many([id_ for id_, text in texts.items() if not text]))
 
             return [
                 {
-                    "distance": hit.distance,
-                    "text": hit.entity.get('text'),
-                    "url": hit.entity.get('url')
+                    "distance": distance,
+                    "text": texts[hit.id],
+                    "url": hit.entity.get('url'),
+                    "page_url": hit.entity.get('page_url') or hit.entity.get('url'),
+                    "heading": hit.entity.get('heading') or None,
+                    "anchor": hit.entity.get('anchor') or None
                 }
-                for hit in hits
+                for hit, distance in zip(hits, distances)
+                if texts[hit.id]
             ]
         except Exception as e:
             logger.error(f"Failed to search in Milvus with context '{context_url}': {e}", exc_info=True)
             return []
 
+    def _cached_embeddings(self, hits) -> Optional[List[Optional[Any]]]:
+        """Float embeddings of the hits from the embedding cache, by (embedding_model, content_hash)."""
+        if not self.embeddings or "content_hash" not in self.fields:
+            return None
+        floats: List[Optional[Any]] = [None] * len(hits)
+        by_model: Dict[str, List[int]] = {}
+        for i, hit in enumerate(hits):
+            if hit.entity.get('content_hash') and hit.entity.get('embedding_model'):
+                by_model.setdefault(hit.entity.get('embedding_model'), []).append(i)
+        for model, rows in by_model.items():
+            digests = [bytes.fromhex(hits[i].entity.get('content_hash')) for i in rows]
+            for i, vector in zip(rows, self.embeddings.get_many(model, digests)):
+                floats[i] = vector
+        return floats
+
     def delete_context(self, context_url: str) -> bool:
         """Deletes all data for a specific URL (context) from the collection."""
         if not self.collection:
@@ -148,10 +385,15 @@ class MilvusService:
 
         try:
             # Delete all entities with the specified URL
-            expr = f'url == "{context_url}"'
-            result = self.collection.delete(expr)
-            self.collection.flush()
+            expr = f"url == {_quote(context_url)}"
+            with tracer.start_span("milvus.delete", {"collection": self.collection.name, "url": context_url}):
+                result = self.collection.delete(expr)
+            with tracer.start_span("milvus.flush", {"collection": self.collection.name}):
+                self.collection.flush()
+            if self.text_store:
+                self.text_store.delete_context(context_url)
             logger.info(f"Successfully deleted context '{context_url}'. Deleted count: {result.delete_count}")
+            self.notify_change(context_url)
             return True
         except Exception as e:
             logger.error(f"Failed to delete context '{context_url}' from Milvus: {e}", exc_info=True)
@@ -165,7 +407,7 @@ def get_milvus_service():
 
 # Singleton instance
 try:
-    milvus_service = MilvusService()
+    milvus_service = MilvusService(text_store=text_store, embeddings=embedding_store)
 except RuntimeError as e:
     logger.error(f"Could not create MilvusService instance: {e}")
     milvus_service = None
@@ -0,0 +1,154 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymilvus import DataType
+
+# How embeddings are stored, with the Milvus field type, index and metric of each mode:
+#   float32  FLOAT_VECTOR    IVF_FLAT      L2       4 bytes per dimension
+#   float16  FLOAT16_VECTOR  IVF_FLAT      L2       2 bytes per dimension
+#   int8     FLOAT_VECTOR    IVF_SQ8       L2       1 byte per dimension in the index (scalar quantization)
+#   binary   BINARY_VECTOR   BIN_IVF_FLAT  HAMMING  1 bit per dimension; candidates are rescored
+MODES = ("float32", "float16", "int8", "binary")
+NLIST = 128
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norm == 0, 1, norm)
+
+
+def _as_bytes(value: Any) -> bytes:
+    # pymilvus returns a binary vector output field as bytes or as a one-element list of bytes
+    return bytes(value[0]) if isinstance(value, list) else bytes(value)
+
+
+class VectorStorage:
+    """
+    Storage layout of the embedding field: the number type of each dimension and how
+    many dimensions are kept. `dim` below the model's dimension truncates embeddings
+    Matryoshka-style (the leading dimensions, re-normalized), which suits models trained
+    for it such as mxbai-embed-large. Binary vectors are searched by Hamming distance for
+    `rescore_factor` times as many candidates, which are then ranked by their float distance
+    to the query (see rescore).
+    """
+
+    def __init__(self, mode: str = "float32", dim: int = 1024, model_dim: int = 1024, rescore_factor: int = 10):
+        if mode not in MODES:
+            raise ValueError(f"Unknown embedding storage '{mode}', expected one of {', '.join(MODES)}")
+        if not 0 < dim <= model_dim:
+            raise ValueError(f"Embedding dimensions must be between 1 and {model_dim}, got {dim}")
+        if mode == "binary" and dim % 8:
+            raise ValueError(f"Binary embeddings need a multiple of 8 dimensions, got {dim}")
+        self.mode = mode
+        self.dim = dim
+        self.model_dim = model_dim
+        self.rescore_factor = max(1, rescore_factor)
+
+    @property
+    def is_default(self) -> bool:
+        return self.mode == "float32" and self.dim == self.model_dim
+
+    @property
+    def suffix(self) -> str:
+        """Collection name suffix: each layout lives in its own collection."""
+        return "" if self.is_default else f"_{self.mode}_{self.dim}"
+
+    @property
+    def bytes_per_vector(self) -> float:
+        return self.dim * {"float32": 4, "float16": 2, "int8": 1, "binary": 1 / 8}[self.mode]
+
+    @property
+    def metric_type(self) -> str:
+        return "HAMMING" if self.mode == "binary" else "L2"
+
+    def field_dtype(self) -> DataType:
+        return {"float32": DataType.FLOAT_VECTOR, "float16": DataType.FLOAT16_VECTOR,
+                "int8": DataType.FLOAT_VECTOR, "binary": DataType.BINARY_VECTOR}[self.mode]
+
+    def index_params(self) -> Dict[str, Any]:
+        index_type = {"float32": "IVF_FLAT", "float16": "IVF_FLAT", "int8": "IVF_SQ8", "binary": "BIN_IVF_FLAT"}
+        return {"metric_type": self.metric_type, "index_type": index_type[self.mode], "params": {"nlist": NLIST}}
+
+    def search_params(self, nprobe: int) -> Dict[str, Any]:
+        return {"metric_type": self.metric_type, "params": {"nprobe": nprobe}}
+
+    def search_limit(self, top_k: int) -> int:
+        return top_k * self.rescore_factor if self.mode == "binary" else top_k
+
+    def prepare(self, embedding: Sequence[float]) -> np.ndarray:
+        """The embedding (or matrix of embeddings) as float32, truncated to `dim` dimensions."""
+        vectors = np.asarray(embedding, dtype=np.float32)
+        if vectors.shape[-1] < self.dim:
+            raise ValueError(f"Embedding has {vectors.shape[-1]} dimensions, expected at least {self.dim}")
+        if vectors.shape[-1] > self.dim:
+            vectors = _unit(vectors[..., :self.dim])
+        return vectors
+
+    def encode(self, embedding: Sequence[float]) -> Any:
+        """The value of the embedding field for an insert or a search query."""
+        vector = self.prepare(embedding)
+        if self.mode == "float16":
+            return vector.astype(np.float16)
+        if self.mode == "binary":
+            return np.packbits(vector > 0).tobytes()
+        # int8 vectors are quantized by the IVF_SQ8 index, which Milvus trains on the data
+        return vector.tolist()
+
+    def rescore(self, query: Sequence[float], stored: List[Any],
+                floats: Optional[Sequence[Optional[Sequence[float]]]] = None) -> np.ndarray:
+        """
+        L2 distances between the unit query and the unit binary candidates `stored`: their
+        float embeddings where `floats` has them (the embedding cache keeps them on disk),
+        otherwise their sign vectors, which rank far less precisely.
+        """
+        signs = np.unpackbits(np.frombuffer(b"".join(_as_bytes(v) for v in stored), dtype=np.uint8))
+        candidates = signs.reshape(len(stored), self.dim).astype(np.float32) * 2 - 1
+        candidates /= np.sqrt(self.dim)
+        if isinstance(floats, np.ndarray):
+            candidates = _unit(self.prepare(floats))
+        elif floats is not None:
+            for i, vector in enumerate(floats):
+                if vector is not None:
+                    candidates[i] = _unit(self.prepare(vector))
+        return ((_unit(self.prepare(query)) - candidates) ** 2).sum(axis=1)
+
+    def simulate(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Prepared float32 `vectors` as this layout stores them: packed sign bits for binary,
+        otherwise float32 values after the float16 or 8-bit round trip.
+        """
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1)
+        if self.mode == "float16":
+            return vectors.astype(np.float16).astype(np.float32)
+        if self.mode == "int8":
+            # Per-dimension 8-bit codes over the range of the data, as IVF_SQ8 encodes them
+            low, high = vectors.min(axis=0), vectors.max(axis=0)
+            scale = np.where(high > low, (high - low) / 255, 1)
+            return (np.round((vectors - low) / scale) * scale + low).astype(np.float32)
+        return vectors
+
+    def scan(self, stored: np.ndarray, query: Sequence[float], limit: int,
+             floats: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Brute-force search of vectors returned by `simulate`, without an IVF index: the rows
+        of the `limit` nearest vectors and their distances. Binary candidates are rescored
+        with the rows of `floats` if given.
+        """
+        query = self.prepare(query)
+        if self.mode == "binary":
+            hamming = _POPCOUNT[stored ^ np.packbits(query > 0)].sum(axis=1)
+            candidates = np.argsort(hamming, kind="stable")[:self.search_limit(limit)]
+            distances = self.rescore(query, [row.tobytes() for row in stored[candidates]],
+                                     floats[candidates] if floats is not None else None)
+            order = np.argsort(distances, kind="stable")[:limit]
+            return candidates[order], distances[order]
+        distances = ((stored - query) ** 2).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:limit]
+        return order, distances[order]
+
+    def exact_search(self, vectors: np.ndarray, query: Sequence[float],
+                     limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """`scan` of prepared float32 `vectors`, stored the way this layout stores them."""
+        return self.scan(self.simulate(vectors), query, limit, vectors)
@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for the RAG pipeline.
+
+The app is served by uvicorn and driven over real HTTP, while Ollama, an
+OpenAI-compatible provider and the scraped website are replaced by local fake
+servers with configurable latency, and Milvus by an in-process vector store.
+Run `python -m benchmarks.run --help` from the backend directory.
+"""
@@ -0,0 +1,81 @@
+"""
+Compares two benchmark result files.
+
+    python -m benchmarks.compare baseline.json current.json [--fail-above 10]
+
+Prints every numeric metric side by side. With --fail-above, exits non-zero when
+a latency grows, or a throughput or retrieval quality metric drops, by more than
+that percentage.
+"""
+import argparse
+import json
+import re
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Metrics where larger is better: throughput and retrieval quality
+_HIGHER_IS_BETTER = ("_per_sec", "_rps")
+_QUALITY = re.compile(r"(^|\.)(mrr|recall_at_\d+|ndcg_at_\d+)$")
+
+
+def flatten(results: Any, prefix: str = "") -> Dict[str, float]:
+    """Flattens nested results to dotted keys. List rows are keyed by their "concurrency"."""
+    flat: Dict[str, float] = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for i, row in enumerate(results):
+            label = f"c{row['concurrency']}" if isinstance(row, dict) and "concurrency" in row else str(i)
+            flat.update(flatten(row, f"{prefix}{label}."))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        flat[prefix.rstrip(".")] = float(results)
+    return flat
+
+
+def regression(key: str, old: float, new: float) -> Optional[float]:
+    """Percentage by which `new` is worse than `old` (negative when better), None if not comparable."""
+    higher_is_better = key.endswith(_HIGHER_IS_BETTER) or bool(_QUALITY.search(key))
+    if not (higher_is_better or key.endswith("_ms")) or old == 0:
+        return None
+    change = (new - old) / old * 100
+    return -change if higher_is_better else change
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[Tuple[str, Optional[float], Optional[float], Optional[float]]]:
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    rows = []
+    for key in sorted(set(old_flat) | set(new_flat)):
+        a, b = old_flat.get(key), new_flat.get(key)
+        rows.append((key, a, b, regression(key, a, b) if a is not None and b is not None else None))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--fail-above", type=float, help="Fail on regressions larger than this percentage")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"baseline {old['meta'].get('git_commit')}  ->  current {new['meta'].get('git_commit')}")
+    failures = []
+    for key, a, b, worse in compare(old, new):
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        marker = "" if worse is None else f"{worse:+.1f}% {'worse' if worse > 0 else 'better'}"
+        print(f"{key:60} {fmt(a):>14} {fmt(b):>14}  {marker}")
+        if args.fail_above is not None and worse is not None and worse > args.fail_above:
+            failures.append(key)
+
+    if failures:
+        print(f"\n{len(failures)} metric(s) regressed by more than {args.fail_above}%: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """
+    Deterministic hashed bag-of-words embedding. Texts sharing words get similar
+    vectors, so retrieval over the fake index still returns sensible passages.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        bucket = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[bucket % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+
+class LatencyProfile:
+    """
+    Timing of a fake backend.
+
+    first_token_ms   delay before the first token (or before an embedding is returned)
+    tokens_per_sec   generation speed after the first token
+    completion_tokens  number of tokens in every completion
+    """
+
+    def __init__(self, first_token_ms: float = 200.0, tokens_per_sec: float = 50.0,
+                 completion_tokens: int = 64, embed_ms: float = 20.0):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.embed_ms = embed_ms
+
+    def tokens(self, prompt: str) -> Iterator[str]:
+        """Yields the completion for a prompt, paced like a real model."""
+        time.sleep(self.first_token_ms / 1000)
+        if "requires_rag" in prompt:
+            # The router asks for a JSON verdict
+            yield '{"requires_rag": true, "reasoning": "benchmark"}'
+            return
+        interval = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        for i in range(self.completion_tokens):
+            if i:
+                time.sleep(interval)
+            yield f"token{i} "
+
+    def embed(self):
+        time.sleep(self.embed_ms / 1000)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> Dict[str, Any]:
+        return json.loads(self.raw_body) if self.raw_body else {}
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: Any, status: int = 200):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send_chunks(self, chunks: Iterator[bytes], content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _route(self, method: str):
+        # Always drain the body so the keep-alive connection stays in sync
+        length = int(self.headers.get("Content-Length") or 0)
+        self.raw_body = self.rfile.read(length) if length else b""
+        handler = self.server.routes.get((method, self.path.split("?")[0]))
+        if handler is None:
+            for (route_method, prefix), candidate in self.server.routes.items():
+                if route_method == method and prefix.endswith("/") and self.path.startswith(prefix):
+                    handler = candidate
+                    break
+        if handler is None:
+            self._send_json({"error": f"no route for {method} {self.path}"}, 404)
+            return
+        with self.server.lock:
+            self.server.requests += 1
+        handler(self)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, routes: Dict[tuple, Callable[[_Handler], None]]):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.routes = routes
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.disconnects = 0
+
+    def handle_error(self, request, client_address):
+        # A client that hangs up mid-stream (a cancelled generation) is expected
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            with self.lock:
+                self.disconnects += 1
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeServer:
+    """A threaded local HTTP server; use as a context manager or call start()/stop()."""
+
+    def __init__(self):
+        self._server = _Server(self.routes())
+        self._thread: Optional[threading.Thread] = None
+
+    def routes(self) -> Dict[tuple, Callable[[_Handler], None]]:
+        raise NotImplementedError
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        return self._server.requests
+
+    @property
+    def disconnect_count(self) -> int:
+        """Requests whose client closed the connection before the response was complete."""
+        return self._server.disconnects
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True,
+                                        name=type(self).__name__)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _prompt(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeOllamaServer(FakeServer):
+    """Speaks the subset of the Ollama API used by the app: tags, pull, embeddings and chat."""
+
+    def __init__(self, profile: LatencyProfile, models: List[str], embedding_dim: int = 1024):
+        self.profile = profile
+        self.models = models
+        self.embedding_dim = embedding_dim
+        super().__init__()
+
+    def routes(self):
+        return {
+            ("GET", "/api/tags"): self._tags,
+            ("POST", "/api/pull"): lambda h: h._send_json({"status": "success"}),
+            ("POST", "/api/embeddings"): self._embeddings,
+            ("POST", "/api/embed"): self._embed,
+            ("POST", "/api/chat"): self._chat,
+        }
+
+    def _tags(self, h: _Handler):
+        h._send_json({"models": [
+            {"name": name, "model": name, "modified_at": _now(), "size": 0, "digest": "", "details": {}}
+            for name in self.models
+        ]})
+
+    def _embeddings(self, h: _Handler):
+        body = h._body()
+        self.profile.embed()
+        h._send_json({"embedding": fake_embedding(body.get("prompt", ""), self.embedding_dim)})
+
+    def _embed(self, h: _Handler):
+        body = h._body()
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        self.profile.embed()
+        h._send_json({"model": body.get("model"),
+                      "embeddings": [fake_embedding(text, self.embedding_dim) for text in inputs]})
+
+    def _chat(self, h: _Handler):
+        body = h._body()
+        model = body.get("model", "")
+        tokens = self.profile.tokens(_prompt(body.get("messages", [])))
+
+        def message(content: str, done: bool) -> Dict[str, Any]:
+            payload = {"model": model, "created_at": _now(),
+                       "message": {"role": "assistant", "content": content}, "done": done}
+            if done:
+                payload["done_reason"] = "stop"
+            return payload
+
+        if body.get("stream", True):
+            lines = (json.dumps(message(token, False)).encode("utf-8") + b"\n" for token in tokens)
+            h._send_chunks(_then(lines, json.dumps(message("", True)).encode("utf-8") + b"\n"),
+                           "application/x-ndjson")
+        else:
+            h._send_json(message("".join(tokens), True))
+
+
+class FakeOpenAIServer(FakeServer):
+    """An OpenAI-compatible /v1/chat/completions endpoint (plain and SSE streaming)."""
+
+    def __init__(self, profile: LatencyProfile, models: List[str]):
+        self.profile = profile
+        self.models = models
+        super().__init__()
+
+    def routes(self):
+        return {
+            ("GET", "/v1/models"): lambda h: h._send_json(
+                {"object": "list", "data": [{"id": m, "object": "model", "created": 0, "owned_by": "bench"}
+                                            for m in self.models]}),
+            ("POST", "/v1/chat/completions"): self._completions,
+        }
+
+    def _completions(self, h: _Handler):
+        body = h._body()
+        model = body.get("model", "")
+        tokens = self.profile.tokens(_prompt(body.get("messages", [])))
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": model}
+
+        if body.get("stream"):
+            def events():
+                for token in tokens:
+                    chunk = dict(base, object="chat.completion.chunk",
+                                 choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                    yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                done = dict(base, object="chat.completion.chunk",
+                            choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                yield f"data: {json.dumps(done)}\n\n".encode("utf-8")
+                yield b"data: [DONE]\n\n"
+            h._send_chunks(events(), "text/event-stream")
+        else:
+            content = "".join(tokens)
+            h._send_json(dict(base, object="chat.completion", choices=[{
+                "index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop",
+            }], usage={"prompt_tokens": 0, "completion_tokens": self.profile.completion_tokens,
+                       "total_tokens": self.profile.completion_tokens}))
+
+
+class FakeSiteServer(FakeServer):
+    """Serves generated HTML articles at /page/<n> for the ingestion benchmark."""
+
+    def __init__(self, page_chars: int = 20000, latency_ms: float = 10.0):
+        self.page_chars = page_chars
+        self.latency_ms = latency_ms
+        super().__init__()
+
+    def routes(self):
+        return {("GET", "/page/"): self._page}
+
+    def page_url(self, n: int) -> str:
+        return f"{self.url}/page/{n}"
+
+    def _page(self, h: _Handler):
+        time.sleep(self.latency_ms / 1000)
+        n = h.path.rsplit("/", 1)[-1]
+        h._send(200, article_html(n, self.page_chars).encode("utf-8"), "text/html; charset=utf-8")
+
+
+def article_html(seed: str, chars: int) -> str:
+    """A page with navigation chrome and `chars` characters of paragraph text."""
+    paragraphs = []
+    size = 0
+    i = 0
+    while size < chars:
+        sentence = (f"Section {i} of article {seed} discusses topic{i % 17} and subject{(i * 7) % 23}. "
+                    f"It explains how component{i % 11} interacts with module{(i * 3) % 13} in detail. ")
+        paragraphs.append(f"<p>{sentence * 3}</p>")
+        size += len(sentence) * 3
+        i += 1
+    return (f"<html><head><title>Article {seed}</title><style>p {{}}</style></head><body>"
+            f"<nav><a href='/'>Home</a></nav><article><h1>Article {seed}</h1>{''.join(paragraphs)}</article>"
+            f"<footer>footer</footer></body></html>")
+
+
+def _then(items: Iterator[bytes], last: bytes) -> Iterator[bytes]:
+    yield from items
+    yield last
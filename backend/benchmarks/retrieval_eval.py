@@ -0,0 +1,253 @@
+"""
+Evaluates retrieval quality and latency on a labeled question set.
+
+The dataset is JSON Lines, one case per line:
+
+    {"context_url": "https://...", "question": "...", "relevant": "passage text"}
+
+`relevant` may also be a list of passages. A retrieved chunk counts as a hit for a
+passage when it contains the passage (whitespace and case insensitive), so labels
+do not depend on how the page was chunked.
+
+    cd backend
+    python -m benchmarks.retrieval_eval cases.jsonl --nprobe 4,10,32 -o retrieval.json
+    python -m benchmarks.retrieval_eval cases.jsonl --retriever mypackage.module:make_retriever
+
+Results use the same layout as benchmarks.run, so benchmarks.compare can diff them.
+"""
+import argparse
+import importlib
+import json
+import logging
+import math
+import re
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.core.timings import StageTimings
+from app.services.rag_stages import Retriever
+from benchmarks.run import SCHEMA_VERSION, _git_commit, summarize
+
+logger = logging.getLogger(__name__)
+
+_SPACE = re.compile(r"\s+")
+
+
+class EvalCase:
+    __slots__ = ("context_url", "question", "relevant")
+
+    def __init__(self, context_url: str, question: str, relevant: List[str]):
+        self.context_url = context_url
+        self.question = question
+        self.relevant = relevant
+
+
+def load_dataset(path: str) -> List[EvalCase]:
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            relevant = row["relevant"]
+            relevant = [relevant] if isinstance(relevant, str) else list(relevant)
+            if not relevant:
+                raise ValueError(f"{path}:{line_no}: no relevant passage")
+            cases.append(EvalCase(row["context_url"], row["question"], relevant))
+    return cases
+
+
+def _normalize(text: str) -> str:
+    return _SPACE.sub(" ", text).strip().lower()
+
+
+def relevance(hits: List[Dict[str, Any]], passages: List[str]) -> List[int]:
+    """
+    For each hit, the index of the first not-yet-matched passage it contains, or -1.
+    Each passage is credited once, so duplicate chunks do not inflate recall.
+    """
+    wanted = [_normalize(p) for p in passages]
+    matched = set()
+    result = []
+    for hit in hits:
+        text = _normalize(hit.get("text") or "")
+        found = next((i for i, p in enumerate(wanted) if i not in matched and p in text), -1)
+        if found >= 0:
+            matched.add(found)
+        result.append(found)
+    return result
+
+
+def recall_at(matches: List[int], relevant_count: int, k: int) -> float:
+    return sum(1 for m in matches[:k] if m >= 0) / relevant_count
+
+
+def reciprocal_rank(matches: List[int]) -> float:
+    return next((1.0 / (rank + 1) for rank, m in enumerate(matches) if m >= 0), 0.0)
+
+
+def ndcg_at(matches: List[int], relevant_count: int, k: int) -> float:
+    """Binary-gain nDCG@k."""
+    dcg = sum(1.0 / math.log2(rank + 2) for rank, m in enumerate(matches[:k]) if m >= 0)
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(relevant_count, k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def _max_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def evaluate(cases: Sequence[EvalCase], retriever: Retriever, ks: Sequence[int] = (1, 3, 5, 10),
+             embeddings: Optional[List[Optional[List[float]]]] = None,
+             trace_memory: bool = False) -> Dict[str, Any]:
+    """
+    Runs every case through the retriever at top_k=max(ks) and returns the aggregate
+    metrics and a per-query breakdown. Precomputed query embeddings can be passed so
+    that latency covers only the search.
+    """
+    top_k = max(ks)
+    queries = []
+    for i, case in enumerate(cases):
+        embedding = embeddings[i] if embeddings else None
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            hits = retriever.retrieve(case.question, case.context_url, top_k, StageTimings(),
+                                      query_embedding=embedding)
+            error = None
+        except Exception as e:
+            logger.error(f"Retrieval failed for '{case.question}': {e}")
+            hits, error = [], str(e)
+        latency_ms = (time.perf_counter() - start) * 1000
+        peak_kib = None
+        if trace_memory:
+            peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+        matches = relevance(hits, case.relevant)
+        record = {
+            "question": case.question,
+            "context_url": case.context_url,
+            "latency_ms": round(latency_ms, 3),
+            "reciprocal_rank": reciprocal_rank(matches),
+            "first_relevant_rank": next((r + 1 for r, m in enumerate(matches) if m >= 0), None),
+            **{f"recall_at_{k}": recall_at(matches, len(case.relevant), k) for k in ks},
+            **{f"ndcg_at_{k}": ndcg_at(matches, len(case.relevant), k) for k in ks},
+        }
+        if peak_kib is not None:
+            record["peak_traced_kib"] = round(peak_kib, 1)
+        if error:
+            record["error"] = error
+        queries.append(record)
+
+    def mean(key: str) -> Optional[float]:
+        values = [q[key] for q in queries if q.get(key) is not None]
+        return round(sum(values) / len(values), 4) if values else None
+
+    aggregate = {
+        "queries": len(queries),
+        "errors": sum(1 for q in queries if "error" in q),
+        "mrr": mean("reciprocal_rank"),
+        **{f"recall_at_{k}": mean(f"recall_at_{k}") for k in ks},
+        **{f"ndcg_at_{k}": mean(f"ndcg_at_{k}") for k in ks},
+        "latency": summarize([q["latency_ms"] for q in queries]),
+        "max_rss_mib": round(_max_rss_mib(), 1),
+    }
+    if trace_memory:
+        aggregate["mean_peak_traced_kib"] = mean("peak_traced_kib")
+    return {"aggregate": aggregate, "queries": queries}
+
+
+def embed_questions(cases: Sequence[EvalCase], embed: Callable[[str], List[float]]):
+    """Embeds each distinct question once. Returns (embeddings, latency summary)."""
+    cache: Dict[str, List[float]] = {}
+    latencies = []
+    for case in cases:
+        if case.question not in cache:
+            start = time.perf_counter()
+            cache[case.question] = embed(case.question)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return [cache[case.question] for case in cases], summarize(latencies)
+
+
+def _load_factory(spec: str) -> Retriever:
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError("--retriever must be 'milvus' or 'module.path:factory'")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+def run(args) -> Dict[str, Any]:
+    cases = load_dataset(args.dataset)
+    results: Dict[str, Any] = {}
+    queries: Dict[str, Any] = {}
+
+    if args.retriever == "milvus":
+        from app.services.multi_llm_service import get_multi_llm_service
+        from app.services.rag_stages import MilvusRetriever
+        from app.services.vector_db_service import get_milvus_service
+
+        multi_llm = get_multi_llm_service()
+        milvus = get_milvus_service()
+        embeddings, embed_latency = embed_questions(cases, multi_llm.generate_embedding)
+        results["embedding"] = {"latency": embed_latency}
+        for nprobe in args.nprobe:
+            report = evaluate(cases, MilvusRetriever(multi_llm, milvus, nprobe=nprobe), args.k,
+                              embeddings=embeddings, trace_memory=args.trace_memory)
+            results[f"nprobe_{nprobe}"] = report["aggregate"]
+            queries[f"nprobe_{nprobe}"] = report["queries"]
+            logger.info(f"nprobe={nprobe}: mrr={report['aggregate']['mrr']} "
+                        f"p95={report['aggregate']['latency']['p95_ms']}ms")
+    else:
+        report = evaluate(cases, _load_factory(args.retriever), args.k, trace_memory=args.trace_memory)
+        results["retriever"] = report["aggregate"]
+        queries["retriever"] = report["queries"]
+
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "parameters": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "results": results,
+        "queries": queries,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    int_list = lambda s: [int(x) for x in s.split(",")]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", help="JSON Lines file of {context_url, question, relevant}")
+    parser.add_argument("--output", "-o", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--retriever", default="milvus",
+                        help="'milvus' (default) or 'module.path:factory' returning a Retriever")
+    parser.add_argument("--k", type=int_list, default=[1, 3, 5, 10], help="Cutoffs for recall@k and nDCG@k")
+    parser.add_argument("--nprobe", type=int_list, default=[10], help="Milvus nprobe values to compare")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record per-query peak Python allocations (slows queries down)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        logger.info(f"Wrote retrieval evaluation to {args.output}")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Runs the offline benchmark suite and writes the results as JSON.
+
+    cd backend
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import FakeOllamaServer, FakeOpenAIServer, FakeSiteServer, LatencyProfile
+from benchmarks.vector_store import InMemoryVectorStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+OPENAI_MODEL = "bench-openai"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in 0..100), None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(samples_ms),
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else None,
+        **{f"p{q}_ms": round(percentile(samples_ms, q), 3) if samples_ms else None for q in (50, 90, 95, 99)},
+        "max_ms": round(max(samples_ms), 3) if samples_ms else None,
+    }
+
+
+def _run_concurrently(concurrency: int, jobs: List[Callable[[], Any]]) -> List[Any]:
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return [f.result() for f in [pool.submit(job) for job in jobs]]
+
+
+class AppServer:
+    """Serves the FastAPI app with uvicorn on an ephemeral port in a background thread."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self._sock.getsockname()[1]}"
+        self._server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [self._sock]}, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Benchmark app server did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(10)
+
+
+def configure_environment(args, ollama: FakeOllamaServer, openai_server: FakeOpenAIServer):
+    """Points the app at the fake backends. Caches and coalescing are off so every request does full work."""
+    os.environ.update({
+        "OLLAMA_HOST": ollama.url,
+        "OPENAI_COMPATIBLE_BASE_URL": f"{openai_server.url}/v1",
+        "OPENAI_COMPATIBLE_API_KEY": "bench",
+        "OPENAI_COMPATIBLE_MODELS": OPENAI_MODEL,
+        "ANSWER_CACHE_ENABLED": "false",
+        "EMBEDDING_STORE_ENABLED": "false",
+        "CHAT_COALESCING_ENABLED": "false",
+        "DEFAULT_MODEL_CONCURRENCY": str(args.model_concurrency),
+    })
+
+
+def build_app(ollama_url: str, store: InMemoryVectorStore):
+    """Imports the app and wires it to the fake backends and the in-process vector store."""
+    from app.core.config import reload_settings
+    reload_settings()
+
+    from app.api.v1.endpoints import scrape
+    from app.main import app
+    from app.services import intelligent_rag_service as rag_module
+    from app.services.llm_service import OllamaService
+    from app.services.multi_llm_service import MultiLLMService
+
+    ollama = OllamaService(host=ollama_url)
+    app.dependency_overrides[scrape.get_ollama_service] = lambda: ollama
+    app.dependency_overrides[scrape.get_milvus_service] = lambda: store
+    rag_module.intelligent_rag_service = rag_module.IntelligentRAGService(MultiLLMService(), store)
+    return app
+
+
+def bench_ingestion(client: httpx.Client, site: FakeSiteServer, pages: int, concurrency: int) -> Dict[str, Any]:
+    latencies, chunks, chars, errors = [], [], [], 0
+
+    def ingest(n: int):
+        start = time.perf_counter()
+        response = client.post("/api/v1/process-url", json={"url": site.page_url(n)})
+        return (time.perf_counter() - start) * 1000, response
+
+    start = time.perf_counter()
+    for elapsed_ms, response in _run_concurrently(concurrency, [lambda n=n: ingest(n) for n in range(pages)]):
+        if response.status_code != 200:
+            errors += 1
+            continue
+        body = response.json()
+        latencies.append(elapsed_ms)
+        chunks.append(body["milvus_insert_count"])
+        chars.append(body["text_length"])
+    wall = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "pages_per_sec": round(len(latencies) / wall, 3),
+        "chunks_per_sec": round(sum(chunks) / wall, 3),
+        "chars_per_sec": round(sum(chars) / wall, 1),
+        "latency": summarize(latencies),
+    }
+
+
+def _question(i: int) -> str:
+    # Distinct questions so nothing is served from a cache
+    return f"What does section {i} say about topic{i % 17} and component{i % 11}?"
+
+
+def _chat(client: httpx.Client, context_url: str, model: str, i: int):
+    start = time.perf_counter()
+    response = client.post("/api/v1/chat", json={"query": _question(i), "context_url": context_url, "model": model})
+    return (time.perf_counter() - start) * 1000, response.status_code == 200
+
+
+def _chat_stream(client: httpx.Client, context_url: str, model: str, i: int):
+    """Returns (time to first content event, total time, ok) in milliseconds."""
+    payload = {"query": _question(i), "context_url": context_url, "model": model}
+    start = time.perf_counter()
+    first_token = None
+    ok = False
+    with client.stream("POST", "/api/v1/chat-stream", json=payload) as response:
+        if response.status_code != 200:
+            return None, (time.perf_counter() - start) * 1000, False
+        for line in response.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("type") == "content" and first_token is None:
+                first_token = (time.perf_counter() - start) * 1000
+            elif event.get("type") == "error":
+                break
+            elif event.get("type") == "end":
+                ok = True
+    return first_token, (time.perf_counter() - start) * 1000, ok
+
+
+def bench_chat(client: httpx.Client, context_url: str, model: str, requests: int) -> Dict[str, Any]:
+    results = [_chat(client, context_url, model, i) for i in range(requests)]
+    return {"errors": sum(not ok for _, ok in results),
+            "latency": summarize([ms for ms, ok in results if ok])}
+
+
+def bench_chat_stream(client: httpx.Client, context_url: str, model: str, requests: int) -> Dict[str, Any]:
+    results = [_chat_stream(client, context_url, model, i) for i in range(requests)]
+    return {
+        "errors": sum(not ok for _, _, ok in results),
+        "time_to_first_token": summarize([ttft for ttft, _, ok in results if ok and ttft is not None]),
+        "total": summarize([total for _, total, ok in results if ok]),
+    }
+
+
+def bench_scaling(client: httpx.Client, context_url: str, model: str, levels: List[int],
+                  requests_per_user: int) -> List[Dict[str, Any]]:
+    """Runs N concurrent users issuing /chat-stream requests back to back for each N."""
+    rows = []
+    for users in levels:
+        def user(u: int):
+            return [_chat_stream(client, context_url, model, u * requests_per_user + i)
+                    for i in range(requests_per_user)]
+
+        start = time.perf_counter()
+        results = [r for batch in _run_concurrently(users, [lambda u=u: user(u) for u in range(users)]) for r in batch]
+        wall = time.perf_counter() - start
+        ok = [r for r in results if r[2]]
+        rows.append({
+            "concurrency": users,
+            "requests": len(results),
+            "errors": len(results) - len(ok),
+            "throughput_rps": round(len(ok) / wall, 3),
+            "time_to_first_token": summarize([ttft for ttft, _, _ in ok if ttft is not None]),
+            "total": summarize([total for _, total, _ in ok]),
+        })
+        logger.info(f"scaling: {users} users -> {rows[-1]['throughput_rps']} req/s")
+    return rows
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    profile = LatencyProfile(args.first_token_ms, args.tokens_per_sec, args.completion_tokens, args.embed_ms)
+    from app.core.config import settings
+    ollama_models = [settings.EMBEDDING_MODEL, args.ollama_model]
+
+    with FakeOllamaServer(profile, ollama_models, args.embedding_dim) as ollama, \
+            FakeOpenAIServer(profile, [OPENAI_MODEL]) as openai_server, \
+            FakeSiteServer(args.page_chars, args.site_latency_ms) as site:
+        configure_environment(args, ollama, openai_server)
+        app = build_app(ollama.url, InMemoryVectorStore())
+
+        with AppServer(app) as server, httpx.Client(
+                base_url=server.url, timeout=args.timeout,
+                limits=httpx.Limits(max_connections=max(args.concurrency + [args.ingest_concurrency]))) as client:
+            results: Dict[str, Any] = {"ingestion": bench_ingestion(client, site, args.pages, args.ingest_concurrency)}
+            context_url = site.page_url(0)
+            models = {"ollama": args.ollama_model, "openai_compatible": OPENAI_MODEL}
+            results["chat"] = {name: bench_chat(client, context_url, model, args.requests)
+                               for name, model in models.items()}
+            results["chat_stream"] = {name: bench_chat_stream(client, context_url, model, args.requests)
+                                      for name, model in models.items()}
+            results["scaling"] = bench_scaling(client, context_url, args.ollama_model, args.concurrency,
+                                               args.requests_per_user)
+            results["backend_requests"] = {"ollama": ollama.request_count, "openai_compatible": openai_server.request_count}
+
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmarks against local fake backends.")
+    parser.add_argument("--output", "-o", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--pages", type=int, default=8, help="Pages ingested through /process-url")
+    parser.add_argument("--page-chars", type=int, default=120000, help="Text size of each fake page")
+    parser.add_argument("--ingest-concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20, help="Sequential requests per model for /chat and /chat-stream")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4, 8, 16],
+                        help="Comma-separated concurrent user counts for the scaling run")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="Fake model latency before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Fake model generation speed")
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--embed-ms", type=float, default=20.0, help="Fake embedding latency")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--site-latency-ms", type=float, default=10.0)
+    parser.add_argument("--ollama-model", default="gpt-oss:20b")
+    parser.add_argument("--model-concurrency", type=int, default=4, help="DEFAULT_MODEL_CONCURRENCY for the app")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        logger.info(f"Wrote benchmark results to {args.output}")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
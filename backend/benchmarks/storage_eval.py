@@ -0,0 +1,163 @@
+"""
+Compares embedding storage layouts: recall against exact float32 search, scan latency
+and vector memory.
+
+    cd backend
+    python -m benchmarks.storage_eval --modes float32,float16,int8,binary --dims 1024,512,256 -o storage.json
+    python -m benchmarks.storage_eval --vectors embedding_cache/mxbai-embed-large
+
+The corpus is either the embeddings cached at ingestion (--vectors, the directory of one
+model in EMBEDDING_STORE_DIR) or synthetic clustered vectors whose variance decays over
+the dimensions, like those of a Matryoshka-trained model. Queries are corpus vectors with
+noise added; the ground truth is the exact top-k of the full float32 vectors. Binary layouts
+are reported twice: rescored with the float vectors, as MilvusService does with the
+embedding cache, and with their sign bits only (`_sign_rescore`), its fallback.
+
+recall_at_k is the share of that ground truth found by a layout. Scans are brute force
+in numpy, so latency compares layouts relative to each other; float16 and int8 vectors are
+decoded to float32 for the scan and only save memory here. For Milvus latency, set
+EMBEDDING_STORAGE / EMBEDDING_DIMENSIONS, ingest, and run benchmarks.retrieval_eval.
+
+Results use the same layout as benchmarks.run, so benchmarks.compare can diff them.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.vector_storage import MODES, VectorStorage
+from benchmarks.run import SCHEMA_VERSION, _git_commit, summarize
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_corpus(count: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Leading dimensions carry most of the variance, as in Matryoshka-trained models
+    scale = (1 / np.sqrt(np.arange(1, dim + 1))).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32) * scale
+    corpus = centers[rng.integers(clusters, size=count)] + \
+        0.5 * rng.standard_normal((count, dim), dtype=np.float32) * scale
+    return corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+
+
+def load_cached_vectors(directory: str, limit: Optional[int] = None) -> np.ndarray:
+    """Vectors of one model in the ingestion embedding cache (see embedding_store)."""
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        dim = json.load(f)["dim"]
+    vectors = np.fromfile(os.path.join(directory, "vectors.f32"), dtype=np.float32)
+    vectors = vectors[:len(vectors) // dim * dim].reshape(-1, dim)
+    return vectors[:limit] if limit else vectors
+
+
+def make_queries(corpus: np.ndarray, count: int, noise: float, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = corpus[rng.choice(len(corpus), size=min(count, len(corpus)), replace=False)]
+    spread = corpus.std(axis=0)
+    queries = queries + noise * rng.standard_normal(queries.shape, dtype=np.float32) * spread
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True) * np.linalg.norm(corpus, axis=1).mean()
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, storage: VectorStorage, truth: np.ndarray,
+             ks: Sequence[int], float_rescore: bool = True) -> Dict[str, Any]:
+    """
+    Recall@k against `truth` (the exact top max(ks) rows per query), scan latency and memory.
+    Binary candidates are rescored with the float vectors, or with their sign bits only.
+    """
+    prepared = storage.prepare(corpus)
+    stored = storage.simulate(prepared)
+    floats = prepared if float_rescore else None
+    top_k = max(ks)
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows, _ = storage.scan(stored, query, top_k, floats)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for k in ks:
+            recalls[k].append(len(set(rows[:k].tolist()) & set(expected[:k].tolist())) / k)
+    return {
+        "mode": storage.mode,
+        "dim": storage.dim,
+        "bytes_per_vector": storage.bytes_per_vector,
+        "vector_gib_per_million": round(storage.bytes_per_vector * 1e6 / 2 ** 30, 3),
+        **{f"recall_at_{k}": round(float(np.mean(recalls[k])), 4) for k in ks},
+        "latency": summarize(latencies),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    if args.vectors:
+        corpus = load_cached_vectors(args.vectors, args.corpus_size)
+    else:
+        corpus = synthetic_corpus(args.corpus_size or 20000, args.model_dim)
+    model_dim = corpus.shape[1]
+    queries = make_queries(corpus, args.queries, args.noise)
+    exact = VectorStorage("float32", model_dim, model_dim)
+    truth = np.stack([exact.scan(corpus, query, max(args.k))[0] for query in queries])
+    logger.info(f"Corpus of {len(corpus)} vectors of {model_dim} dimensions, {len(queries)} queries")
+
+    results = {}
+    for dim in args.dims:
+        for mode in args.modes:
+            if dim > model_dim or (mode == "binary" and dim % 8):
+                continue
+            storage = VectorStorage(mode, dim, model_dim, args.rescore_factor)
+            variants = {f"{mode}_{dim}": True}
+            if mode == "binary":
+                variants[f"{mode}_{dim}_sign_rescore"] = False
+            for name, float_rescore in variants.items():
+                report = evaluate(corpus, queries, storage, truth, args.k, float_rescore)
+                results[name] = report
+                logger.info(f"{name}: recall@{max(args.k)}={report[f'recall_at_{max(args.k)}']} "
+                            f"p50={report['latency']['p50_ms']}ms {report['vector_gib_per_million']} GiB/1M")
+
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "parameters": {k: v for k, v in vars(args).items() if k != "output"},
+            "corpus_size": len(corpus),
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    int_list = lambda s: [int(x) for x in s.split(",")]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", "-o", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--vectors", help="Embedding cache directory of one model (default: synthetic vectors)")
+    parser.add_argument("--corpus-size", type=int, help="Vectors in the corpus (default: 20000 synthetic, all cached)")
+    parser.add_argument("--model-dim", type=int, default=1024, help="Dimensions of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3, help="Query noise relative to the corpus spread")
+    parser.add_argument("--modes", type=lambda s: s.split(","), default=list(MODES))
+    parser.add_argument("--dims", type=int_list, default=[1024, 512, 256])
+    parser.add_argument("--rescore-factor", type=int, default=10, help="Binary candidates per result to rescore")
+    parser.add_argument("--k", type=int_list, default=[1, 5, 10], help="Cutoffs for recall@k")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        logger.info(f"Wrote storage evaluation to {args.output}")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.metrics import time_stage
+from app.services.vector_db_service import content_hash
+from app.services.vector_storage import VectorStorage
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryVectorStore:
+    """
+    Stand-in for MilvusService with the same interface, backed by numpy.
+    Search is an exact scan per context with squared L2 distances, which is what
+    Milvus reports for the "L2" metric. With a `storage` layout, vectors are truncated,
+    quantized and scored the way that layout stores them.
+    """
+
+    def __init__(self, storage: Optional[VectorStorage] = None):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._texts: Dict[str, List[str]] = {}
+        self._pages: Dict[str, List[str]] = {}
+        # Per-row chunk metadata, parallel to _texts
+        self._meta: Dict[str, List[Dict[str, Any]]] = {}
+        self._ids = itertools.count(1)
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._change_listeners: List[Callable[[str], None]] = []
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        self._change_listeners.append(listener)
+
+    def notify_change(self, url: str):
+        for listener in self._change_listeners:
+            listener(url)
+
+    def list_contexts(self) -> List[str]:
+        with self._lock:
+            return sorted(self._texts)
+
+    @time_stage("milvus_insert")
+    def insert_data(self, url: str, text: str, embedding: List[float], page_url: Optional[str] = None,
+                    chunk_index: int = 0, heading: str = "", anchor: Optional[str] = None,
+                    embedding_model: str = "", ingested_at: Optional[int] = None, notify: bool = True) -> int:
+        vector = (self.storage.prepare(embedding) if self.storage else np.asarray(embedding, dtype=np.float32))[None, :]
+        meta = {"id": next(self._ids), "chunk_index": chunk_index, "heading": heading, "anchor": anchor or "",
+                "content_hash": content_hash(text), "embedding_model": embedding_model,
+                "ingested_at": int(time.time()) if ingested_at is None else ingested_at}
+        with self._lock:
+            self._texts.setdefault(url, []).append(text)
+            self._pages.setdefault(url, []).append(page_url or url)
+            self._meta.setdefault(url, []).append(meta)
+            existing = self._vectors.get(url)
+            self._vectors[url] = vector if existing is None else np.vstack([existing, vector])
+        if notify:
+            self.notify_change(url)
+        return 1
+
+    def page_chunks(self, url: str, page_url: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{key: meta[key] for key in ("id", "chunk_index", "content_hash", "embedding_model")}
+                    for meta, page in zip(self._meta.get(url, []), self._pages.get(url, [])) if page == page_url]
+
+    def delete_chunks(self, url: str, ids: List[int], notify: bool = True) -> int:
+        ids = set(ids)
+        with self._lock:
+            metas = self._meta.get(url, [])
+            keep = [i for i, meta in enumerate(metas) if meta["id"] not in ids]
+            deleted = len(metas) - len(keep)
+            if deleted:
+                self._texts[url] = [self._texts[url][i] for i in keep]
+                self._pages[url] = [self._pages[url][i] for i in keep]
+                self._meta[url] = [metas[i] for i in keep]
+                self._vectors[url] = self._vectors[url][keep]
+        if deleted and notify:
+            self.notify_change(url)
+        return deleted
+
+    @time_stage("milvus_search")
+    def search(self, query_embedding: List[float], context_url: str, top_k: int = 3,
+               nprobe: Optional[int] = None, page_urls: Optional[List[str]] = None,
+               embedding_model: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Exact scan, so nprobe has no effect
+        with self._lock:
+            vectors = self._vectors.get(context_url)
+            texts = self._texts.get(context_url, [])
+            pages = self._pages.get(context_url, [])
+            metas = self._meta.get(context_url, [])
+        if vectors is None:
+            return []
+        # Filters apply before the search, as Milvus filter expressions do
+        mask = np.ones(len(texts), dtype=bool)
+        if page_urls is not None:
+            allowed = set(page_urls)
+            mask &= [page in allowed for page in pages]
+        if embedding_model is not None:
+            mask &= [meta["embedding_model"] == embedding_model for meta in metas]
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+        if self.storage:
+            order, distances = self.storage.exact_search(vectors[rows], query_embedding, top_k)
+        else:
+            distances = ((vectors[rows] - np.asarray(query_embedding, dtype=np.float32)) ** 2).sum(axis=1)
+            order = np.argsort(distances, kind="stable")[:top_k]
+            distances = distances[order]
+        return [{"distance": float(distance), "text": texts[i], "url": context_url, "page_url": pages[i],
+                 "heading": metas[i]["heading"] or None, "anchor": metas[i]["anchor"] or None}
+                for i, distance in zip(rows[order], distances)]
+
+    def delete_context(self, context_url: str) -> bool:
+        with self._lock:
+            self._texts.pop(context_url, None)
+            self._pages.pop(context_url, None)
+            self._meta.pop(context_url, None)
+            self._vectors.pop(context_url, None)
+        self.notify_change(context_url)
+        return True
+
+    def count(self, context_url: str) -> int:
+        with self._lock:
+            return len(self._texts.get(context_url, []))
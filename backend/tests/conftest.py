@@ -40,6 +40,8 @@ def mock_milvus_service():
         "https://test.com"
     ]
     mock_service.ingest_url.return_value = {"message": "URL processed successfully"}
+    mock_service.page_chunks.return_value = []
+    mock_service.delete_chunks.side_effect = lambda url, ids, notify=True: len(ids)
     return mock_service
 
 
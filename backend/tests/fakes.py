@@ -0,0 +1,46 @@
+import itertools
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.vector_db_service import content_hash
+
+
+class FakeVectorStore:
+    """In-memory stand-in for the chunk bookkeeping of MilvusService used by ingestion."""
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._change_listeners: List[Callable[[str], None]] = []
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        self._change_listeners.append(listener)
+
+    def notify_change(self, url: str):
+        for listener in self._change_listeners:
+            listener(url)
+
+    def insert_data(self, url: str, text: str, embedding: List[float], page_url: Optional[str] = None,
+                    chunk_index: int = 0, heading: str = "", anchor: Optional[str] = None,
+                    embedding_model: str = "", ingested_at: Optional[int] = None, notify: bool = True) -> int:
+        self.rows.append({"id": next(self._ids), "url": url, "page_url": page_url or url, "text": text,
+                          "chunk_index": chunk_index, "content_hash": content_hash(text),
+                          "embedding_model": embedding_model})
+        if notify:
+            self.notify_change(url)
+        return 1
+
+    def page_chunks(self, url: str, page_url: str) -> List[Dict[str, Any]]:
+        return [{key: row[key] for key in ("id", "chunk_index", "content_hash", "embedding_model")}
+                for row in self.rows if row["url"] == url and row["page_url"] == page_url]
+
+    def delete_chunks(self, url: str, ids: List[int], notify: bool = True) -> int:
+        ids = set(ids)
+        before = len(self.rows)
+        self.rows = [row for row in self.rows if not (row["url"] == url and row["id"] in ids)]
+        deleted = before - len(self.rows)
+        if deleted and notify:
+            self.notify_change(url)
+        return deleted
+
+    def count(self, context_url: str) -> int:
+        return sum(row["url"] == context_url for row in self.rows)
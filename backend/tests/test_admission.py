@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.core.admission import AdmissionController, AdmissionRegistry, AdmissionRejected
+
+
+def start_waiter(controller, client_id, admitted, errors):
+    def run():
+        try:
+            ticket = controller.acquire(client_id)
+        except AdmissionRejected as e:
+            errors.append(e)
+            return
+        admitted.append(client_id)
+        ticket.release()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_depth(controller, depth):
+    deadline = time.monotonic() + 2
+    while controller.queue_depth != depth and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert controller.queue_depth == depth
+
+
+class TestAdmissionController:
+    """Test cases for per-model admission control."""
+
+    def test_limits_concurrency(self):
+        """Test that requests beyond the limit wait until a slot is released."""
+        controller = AdmissionController("m", max_concurrency=1, max_queue=4, queue_timeout=2)
+        ticket = controller.acquire("a")
+        admitted, errors = [], []
+        thread = start_waiter(controller, "b", admitted, errors)
+        wait_for_depth(controller, 1)
+        assert admitted == []
+
+        ticket.release()
+        thread.join(2)
+        assert admitted == ["b"]
+        assert controller.in_flight == 0
+
+    def test_queue_full_is_rejected_with_429(self):
+        """Test that a full queue rejects immediately with a retry hint and position."""
+        controller = AdmissionController("m", max_concurrency=1, max_queue=1, queue_timeout=2)
+        ticket = controller.acquire("a")
+        admitted, errors = [], []
+        thread = start_waiter(controller, "b", admitted, errors)
+        wait_for_depth(controller, 1)
+
+        with pytest.raises(AdmissionRejected) as exc:
+            controller.acquire("c")
+        assert exc.value.status_code == 429
+        assert exc.value.queue_position == 2
+        assert exc.value.retry_after >= 1
+
+        ticket.release()
+        thread.join(2)
+
+    def test_queue_timeout_is_rejected_with_503(self):
+        """Test that a request waiting longer than the queue timeout gets a 503."""
+        controller = AdmissionController("m", max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        ticket = controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as exc:
+            controller.acquire("b")
+        assert exc.value.status_code == 503
+        assert exc.value.queue_position == 1
+        assert controller.queue_depth == 0
+        ticket.release()
+
+    def test_slots_are_shared_fairly_between_clients(self):
+        """Test that a client with many queued requests cannot starve another client."""
+        controller = AdmissionController("m", max_concurrency=1, max_queue=10, queue_timeout=2)
+        ticket = controller.acquire("busy")
+        admitted, errors = [], []
+        threads = []
+        for _ in range(3):
+            threads.append(start_waiter(controller, "busy", admitted, errors))
+            wait_for_depth(controller, len(threads))
+        threads.append(start_waiter(controller, "other", admitted, errors))
+        wait_for_depth(controller, 4)
+
+        ticket.release()
+        for thread in threads:
+            thread.join(2)
+        assert admitted.index("other") <= 1
+        assert errors == []
+
+    def test_async_wait_is_admitted_and_cancellable(self):
+        """Test that acquire_async waits on the loop, gets a freed slot, and leaves the queue when cancelled."""
+        controller = AdmissionController("m", max_concurrency=1, max_queue=4, queue_timeout=2)
+
+        async def run():
+            ticket = await controller.acquire_async("a")
+            waiting = asyncio.ensure_future(controller.acquire_async("b"))
+            cancelled = asyncio.ensure_future(controller.acquire_async("c"))
+            await asyncio.sleep(0.01)
+            assert controller.queue_depth == 2
+            cancelled.cancel()
+            await asyncio.sleep(0.01)
+            assert controller.queue_depth == 1
+            ticket.release()
+            (await waiting).release()
+
+        asyncio.run(run())
+        assert controller.in_flight == 0
+        assert controller.queue_depth == 0
+
+    def test_blocking_waiters_are_capped(self):
+        """Test that requests beyond the shared cap of thread-holding waiters are rejected at once."""
+        controller = AdmissionController("m", max_concurrency=1, max_queue=10, queue_timeout=2,
+                                         blocking_waiters=threading.Semaphore(1))
+        ticket = controller.acquire("a")
+        admitted, errors = [], []
+        thread = start_waiter(controller, "b", admitted, errors)
+        wait_for_depth(controller, 1)
+
+        with pytest.raises(AdmissionRejected) as exc:
+            controller.acquire("c")
+        assert exc.value.status_code == 429
+        assert controller.queue_depth == 1
+        ticket.release()
+        thread.join(2)
+        assert admitted == ["b"]
+
+    def test_ticket_is_released_once(self):
+        """Test that concurrent releases of one ticket free a single slot."""
+        controller = AdmissionController("m", max_concurrency=2, max_queue=4, queue_timeout=2)
+        ticket = controller.acquire("a")
+        controller.acquire("b")
+        threads = [threading.Thread(target=ticket.release) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert controller.in_flight == 1
+
+    def test_registry_validates_model_names(self):
+        """Test that no controller is created for a model the validator rejects."""
+        def validate(model):
+            if model != "known":
+                raise ValueError(f"Model '{model}' is not available.")
+        registry = AdmissionRegistry(validate)
+        assert registry.get("known") is registry.get("known")
+        with pytest.raises(ValueError):
+            registry.get("made-up")
+        assert list(registry._controllers) == ["known"]
+
+
+class TestChatAdmission:
+    """Test cases for admission control on the chat endpoints."""
+
+    def test_chat_overloaded_returns_retry_after(self, client):
+        """Test that the chat endpoint turns a rejection into a 429 with Retry-After."""
+        rejection = AdmissionRejected("Too many requests", 429, retry_after=7, queue_position=33)
+        with patch("app.api.v1.endpoints.chat.admission") as admission:
+            admission.get.return_value.acquire.side_effect = rejection
+            response = client.post("/api/v1/chat", json={"query": "q", "context_url": "https://example.com"})
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
+        assert response.headers["X-Queue-Position"] == "33"
+        assert response.json()["detail"]["queue_position"] == 33
+
+    def test_chat_stream_releases_slot(self, client):
+        """Test that the streaming endpoint releases its slot when the stream ends."""
+        with patch("app.api.v1.endpoints.chat.admission") as admission, \
+                patch("app.api.v1.endpoints.chat.get_intelligent_rag_service") as get_rag:
+            get_rag.return_value.process_query_stream.return_value = iter([{"type": "content", "content": "hi"}])
+            response = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": "https://example.com"})
+
+        assert response.status_code == 200
+        ticket = admission.get.return_value.acquire.return_value
+        assert ticket.release.called
+
+    def test_chat_unknown_model_returns_400(self, client):
+        """Test that an unknown model is rejected before it gets an admission queue."""
+        with patch("app.api.v1.endpoints.chat.admission") as admission:
+            admission.get.side_effect = ValueError("Model 'made-up' is not available.")
+            response = client.post("/api/v1/chat", json={"query": "q", "context_url": "https://example.com",
+                                                          "model": "made-up"})
+        assert response.status_code == 400
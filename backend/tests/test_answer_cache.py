@@ -0,0 +1,145 @@
+import pytest
+from unittest.mock import Mock
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.intelligent_rag_service import IntelligentRAGService
+from app.services.rag_stages import AlwaysRAGRouter
+
+URL = "https://example.com"
+
+
+class TestSemanticAnswerCache:
+    """Test cases for the embedding-keyed answer cache."""
+
+    def test_similar_query_hits(self):
+        """Test that a paraphrase above the cosine threshold is served from the cache."""
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.put([1.0, 0.0, 0.0], URL, "m", "answer", [], "rag")
+
+        hit = cache.lookup([0.99, 0.05, 0.0], URL, "m")
+        assert hit is not None
+        assert hit.answer == "answer"
+        assert hit.similarity > 0.95
+
+    def test_dissimilar_query_or_other_scope_misses(self):
+        """Test that different questions, contexts and models do not share answers."""
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.put([1.0, 0.0, 0.0], URL, "m", "answer", [], "rag")
+
+        assert cache.lookup([0.0, 1.0, 0.0], URL, "m") is None
+        assert cache.lookup([1.0, 0.0, 0.0], "https://other.com", "m") is None
+        assert cache.lookup([1.0, 0.0, 0.0], URL, "other-model") is None
+
+    def test_top_k_is_part_of_the_key(self):
+        """Test that answers built from a different number of sources are not shared."""
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.put([1.0, 0.0], URL, "m", "answer", [], "rag", top_k=3)
+
+        assert cache.lookup([1.0, 0.0], URL, "m", top_k=10) is None
+        assert cache.lookup([1.0, 0.0], URL, "m", top_k=3).answer == "answer"
+
+    def test_ttl_expiry(self):
+        """Test that entries older than the TTL are not served."""
+        now = [0.0]
+        cache = SemanticAnswerCache(ttl=10, clock=lambda: now[0])
+        cache.put([1.0, 0.0], URL, "m", "answer", [], "rag")
+        now[0] = 11
+        assert cache.lookup([1.0, 0.0], URL, "m") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = SemanticAnswerCache(max_entries=2)
+        cache.put([1.0, 0.0, 0.0], URL, "m", "a", [], "rag")
+        cache.put([0.0, 1.0, 0.0], URL, "m", "b", [], "rag")
+        assert cache.lookup([1.0, 0.0, 0.0], URL, "m").answer == "a"
+        cache.put([0.0, 0.0, 1.0], URL, "m", "c", [], "rag")
+
+        assert cache.lookup([0.0, 1.0, 0.0], URL, "m") is None
+        assert cache.lookup([1.0, 0.0, 0.0], URL, "m").answer == "a"
+
+    def test_invalidation_drops_context_and_stale_puts(self):
+        """Test that invalidating a context drops its entries and rejects answers computed before."""
+        cache = SemanticAnswerCache()
+        cache.put([1.0, 0.0], URL, "m", "answer", [], "rag")
+        generation = cache.generation(URL)
+        cache.invalidate(URL)
+
+        assert cache.lookup([1.0, 0.0], URL, "m") is None
+        cache.put([1.0, 0.0], URL, "m", "stale", [], "rag", generation=generation)
+        assert cache.lookup([1.0, 0.0], URL, "m") is None
+
+    def test_global_invalidation_rejects_puts_for_unseen_contexts(self):
+        """Test that an answer computed before a global invalidation is not stored, even for a new context."""
+        cache = SemanticAnswerCache()
+        generation = cache.generation(URL)
+        cache.invalidate()
+
+        cache.put([1.0, 0.0], URL, "m", "stale", [], "rag", generation=generation)
+        assert cache.lookup([1.0, 0.0], URL, "m") is None
+        cache.put([1.0, 0.0], URL, "m", "fresh", [], "rag", generation=cache.generation(URL))
+        assert cache.lookup([1.0, 0.0], URL, "m").answer == "fresh"
+
+
+class TestRAGAnswerCache:
+    """Test cases for the answer cache in the RAG engine."""
+
+    @pytest.fixture
+    def engine(self, mock_milvus_service):
+        multi_llm = Mock()
+        multi_llm.generate_embedding.side_effect = lambda text: [1.0, 0.0] if "AI" in text else [0.0, 1.0]
+        multi_llm.generate_chat_response.return_value = "Generated answer"
+        multi_llm.generate_chat_response_stream.side_effect = lambda **kwargs: iter(["Generated", " answer"])
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service, router=AlwaysRAGRouter(),
+                                       answer_cache=SemanticAnswerCache())
+        return engine, multi_llm
+
+    def test_paraphrase_reuses_answer(self, engine, mock_milvus_service):
+        """Test that the second similar query skips retrieval and generation."""
+        engine, multi_llm = engine
+        first = engine.process_query("What is AI?", URL, "m")
+        second = engine.process_query("Tell me about AI", URL, "m")
+
+        assert second["answer"] == first["answer"]
+        assert second["cached"] is True
+        assert multi_llm.generate_chat_response.call_count == 1
+        assert mock_milvus_service.search.call_count == 1
+        # The embedding computed for the cache lookup is reused by retrieval
+        assert multi_llm.generate_embedding.call_count == 2
+
+    def test_stream_is_cached(self, engine):
+        """Test that a completed stream is cached and replayed."""
+        engine, multi_llm = engine
+        list(engine.process_query_stream("What is AI?", URL, "m"))
+        events = list(engine.process_query_stream("What is AI?", URL, "m"))
+
+        assert events[0]["cached"] is True
+        assert events[1] == {"type": "content", "content": "Generated answer"}
+        assert multi_llm.generate_chat_response_stream.call_count == 1
+
+    def test_conversation_history_bypasses_cache(self, engine):
+        """Test that follow-up questions are not answered from the cache."""
+        engine, multi_llm = engine
+        history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+        engine.process_query("What is AI?", URL, "m", conversation_history=history)
+        engine.process_query("What is AI?", URL, "m", conversation_history=history)
+        assert multi_llm.generate_chat_response.call_count == 2
+
+    def test_reingest_invalidates(self, engine, mock_milvus_service):
+        """Test that the engine subscribes the cache to context changes."""
+        engine, _ = engine
+        engine.process_query("What is AI?", URL, "m")
+        listener = mock_milvus_service.add_change_listener.call_args[0][0]
+        listener(URL)
+        assert len(engine.answer_cache) == 0
+
+    def test_failed_stream_is_not_cached(self, engine):
+        """Test that a provider failure is reported as an error event and never cached."""
+        engine, multi_llm = engine
+
+        def failing(**kwargs):
+            yield "partial"
+            raise RuntimeError("provider down")
+        multi_llm.generate_chat_response_stream.side_effect = failing
+        events = list(engine.process_query_stream("What is AI?", URL, "m"))
+        assert events[-1]["type"] == "error"
+        assert len(engine.answer_cache) == 0
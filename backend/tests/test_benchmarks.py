@@ -0,0 +1,142 @@
+import json
+import math
+import ollama
+import openai
+import pytest
+from app.services.rag_stages import Retriever
+from benchmarks.compare import compare, flatten
+from benchmarks.fakes import FakeOllamaServer, FakeOpenAIServer, LatencyProfile, fake_embedding
+from benchmarks.retrieval_eval import evaluate, load_dataset, ndcg_at, recall_at, reciprocal_rank, relevance
+from benchmarks.run import percentile, summarize
+from benchmarks.vector_store import InMemoryVectorStore
+
+FAST = LatencyProfile(first_token_ms=0, tokens_per_sec=0, completion_tokens=3, embed_ms=0)
+
+
+class TestBenchmarkStandIns:
+    """Test cases for the fake backends used by the benchmark suite."""
+
+    def test_fake_ollama_speaks_the_client_protocol(self):
+        """Test that the real Ollama client can list, embed and chat against the fake server."""
+        with FakeOllamaServer(FAST, ["bench-model"], embedding_dim=8) as server:
+            client = ollama.Client(host=server.url)
+            assert [m.model for m in client.list().models] == ["bench-model"]
+            assert len(client.embeddings(model="bench-model", prompt="hello")["embedding"]) == 8
+            chunks = [c["message"]["content"] for c in
+                      client.chat(model="bench-model", messages=[{"role": "user", "content": "hi"}], stream=True)]
+            assert "".join(chunks) == "token0 token1 token2 "
+
+    def test_fake_openai_streams_completions(self):
+        """Test that the OpenAI SDK can stream from the fake compatible server."""
+        with FakeOpenAIServer(FAST, ["bench-openai"]) as server:
+            client = openai.OpenAI(base_url=f"{server.url}/v1", api_key="bench")
+            stream = client.chat.completions.create(model="bench-openai", stream=True,
+                                                    messages=[{"role": "user", "content": "hi"}])
+            assert "".join(c.choices[0].delta.content or "" for c in stream) == "token0 token1 token2 "
+
+    def test_router_prompt_gets_json_verdict(self):
+        """Test that the routing prompt is answered with parseable JSON."""
+        assert "".join(FAST.tokens('reply with {"requires_rag": ...}')).startswith('{"requires_rag": true')
+
+    def test_in_memory_store_ranks_by_l2(self):
+        """Test that search stays within the context and returns the nearest passages first."""
+        store = InMemoryVectorStore()
+        for text in ["apples and pears", "rockets and planets", "apples only"]:
+            store.insert_data("https://a.com", text, fake_embedding(text, 64))
+        store.insert_data("https://b.com", "apples", fake_embedding("apples", 64))
+
+        hits = store.search(fake_embedding("apples", 64), "https://a.com", top_k=2)
+        assert [h["text"] for h in hits] == ["apples only", "apples and pears"]
+        assert store.list_contexts() == ["https://a.com", "https://b.com"]
+
+
+class TestBenchmarkReports:
+    """Test cases for result summaries and comparisons."""
+
+    def test_percentiles(self):
+        """Test interpolated percentiles and empty summaries."""
+        assert percentile([1, 2, 3, 4], 50) == pytest.approx(2.5)
+        assert summarize([])["p95_ms"] is None
+        assert summarize([10.0])["p99_ms"] == 10.0
+
+    def test_compare_flags_regressions(self):
+        """Test that slower latencies and lower throughput count as regressions."""
+        old = {"results": {"chat": {"latency": {"p95_ms": 100.0}}, "scaling": [{"concurrency": 4, "throughput_rps": 10.0}]}}
+        new = {"results": {"chat": {"latency": {"p95_ms": 120.0}}, "scaling": [{"concurrency": 4, "throughput_rps": 12.0}]}}
+
+        assert set(flatten(old["results"])) == {"chat.latency.p95_ms", "scaling.c4.concurrency", "scaling.c4.throughput_rps"}
+        rows = {key: worse for key, _, _, worse in compare(old, new)}
+        assert rows["chat.latency.p95_ms"] == pytest.approx(20.0)
+        assert rows["scaling.c4.throughput_rps"] == pytest.approx(-20.0)
+        assert rows["scaling.c4.concurrency"] is None
+
+
+class TestRetrievalEvaluation:
+    """Test cases for the retrieval quality metrics."""
+
+    def test_metrics_for_a_ranked_list(self):
+        """Test recall@k, reciprocal rank and nDCG against hand-computed values."""
+        hits = [{"text": "noise"}, {"text": "The  Answer is here"}, {"text": "second passage"}]
+        matches = relevance(hits, ["the answer", "second passage", "missing"])
+
+        assert matches == [-1, 0, 1]
+        assert recall_at(matches, 3, 1) == 0.0
+        assert recall_at(matches, 3, 3) == pytest.approx(2 / 3)
+        assert reciprocal_rank(matches) == 0.5
+        ideal = 1 + 1 / math.log2(3) + 0.5
+        assert ndcg_at(matches, 3, 3) == pytest.approx((1 / math.log2(3) + 0.5) / ideal)
+
+    def test_duplicate_chunks_are_credited_once(self):
+        """Test that the same passage found twice counts as one relevant hit."""
+        matches = relevance([{"text": "answer"}, {"text": "answer again"}], ["answer"])
+        assert matches == [0, -1]
+        assert recall_at(matches, 1, 2) == 1.0
+
+    def test_evaluate_runs_any_retriever(self, tmp_path):
+        """Test an end-to-end evaluation over the in-memory store with a custom retriever."""
+        store = InMemoryVectorStore()
+        for text in ["apples grow on trees", "rockets fly to planets"]:
+            store.insert_data("https://a.com", text, fake_embedding(text, 64))
+
+        class StoreRetriever(Retriever):
+            def retrieve(self, query, context_url, top_k, timings, query_embedding=None):
+                return store.search(fake_embedding(query, 64), context_url, top_k)
+
+        dataset = tmp_path / "cases.jsonl"
+        dataset.write_text(
+            json.dumps({"context_url": "https://a.com", "question": "where do apples grow", "relevant": "apples grow"}) + "\n"
+            + json.dumps({"context_url": "https://a.com", "question": "rockets planets", "relevant": ["fly to planets"]}) + "\n"
+        )
+        report = evaluate(load_dataset(str(dataset)), StoreRetriever(), ks=(1, 2), trace_memory=True)
+
+        aggregate = report["aggregate"]
+        assert aggregate["queries"] == 2
+        assert aggregate["mrr"] == 1.0
+        assert aggregate["recall_at_1"] == 1.0
+        assert aggregate["latency"]["count"] == 2
+        assert report["queries"][0]["peak_traced_kib"] >= 0
+
+    def test_compare_treats_quality_as_higher_is_better(self):
+        """Test that a drop in recall is reported as a regression."""
+        old = {"results": {"nprobe_10": {"recall_at_5": 0.8, "mrr": 0.5}}}
+        new = {"results": {"nprobe_10": {"recall_at_5": 0.6, "mrr": 0.5}}}
+        rows = {key: worse for key, _, _, worse in compare(old, new)}
+        assert rows["nprobe_10.recall_at_5"] == pytest.approx(25.0)
+        assert rows["nprobe_10.mrr"] == 0.0
+
+
+class TestStorageEvaluation:
+    """Test cases for the embedding storage layout report."""
+
+    def test_report_covers_each_layout(self):
+        """Test that every mode and dimension is reported, with exact float32 as the reference."""
+        from benchmarks.storage_eval import parse_args, run
+        args = parse_args(["--corpus-size", "500", "--model-dim", "64", "--queries", "20", "--dims", "64,32",
+                           "--k", "1,5"])
+        results = run(args)["results"]
+        assert set(results) == {f"{mode}_{dim}" for mode in ("float32", "float16", "int8", "binary")
+                                for dim in (64, 32)} | {"binary_64_sign_rescore", "binary_32_sign_rescore"}
+        assert results["float32_64"]["recall_at_5"] == 1.0
+        assert results["float16_64"]["recall_at_5"] > 0.9
+        assert results["binary_64"]["recall_at_5"] >= results["binary_64_sign_rescore"]["recall_at_5"]
+        assert results["binary_32"]["bytes_per_vector"] == 4
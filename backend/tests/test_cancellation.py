@@ -0,0 +1,105 @@
+import threading
+import time
+from app.core.cancellation import CancellationToken, cancellation_scope, current_cancellation
+from app.core.metrics import LLM_STREAMS_CANCELLED, instrument_stream
+from app.core.singleflight import StreamCoalescer
+from app.core.sse import EventStream
+from app.services.llm_providers import OllamaAdapter
+from benchmarks.fakes import FakeOllamaServer, LatencyProfile
+
+# One token every 2 seconds: a stream that is still running when the test cancels it
+SLOW = LatencyProfile(first_token_ms=0, tokens_per_sec=0.5, completion_tokens=50, embed_ms=0)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+class TestCancellationToken:
+    """Test cases for the per-request cancellation token."""
+
+    def test_callbacks_run_once(self):
+        """Test that callbacks run on cancel, late ones immediately, and unregistered ones never."""
+        token = CancellationToken()
+        calls = []
+        token.on_cancel(lambda: calls.append("a"))
+        token.on_cancel(lambda: calls.append("b"))()
+        token.cancel()
+        token.cancel()
+        token.on_cancel(lambda: calls.append("late"))
+        assert calls == ["a", "late"]
+        assert token.cancelled
+
+    def test_scope_sets_the_current_token(self):
+        """Test that the token is only current inside its scope."""
+        token = CancellationToken()
+        with cancellation_scope(token):
+            assert current_cancellation() is token
+        assert current_cancellation() is None
+
+
+class TestProviderStreamCancellation:
+    """Test cases for closing provider streams when the client goes away."""
+
+    def test_cancel_interrupts_a_blocked_provider_read(self):
+        """Test that cancelling an event stream closes the Ollama response without waiting for the next token."""
+        cancelled = LLM_STREAMS_CANCELLED.labels(provider="ollama", model="slow")
+        before = cancelled.value
+        with FakeOllamaServer(SLOW, ["slow"], embedding_dim=8) as server:
+            adapter = OllamaAdapter(server.url)
+
+            def source():
+                for chunk in instrument_stream(adapter.generate_stream("slow", [{"role": "user", "content": "hi"}]),
+                                               "ollama", "slow"):
+                    yield {"type": "content", "content": chunk}
+
+            stream = EventStream("s", source(), grace=60)
+            stream.attach()
+            stream.start()
+            wait_until(lambda: stream.events_after(0)[0])
+            started = time.monotonic()
+            stream.cancel()
+            wait_until(lambda: stream.done)
+
+            assert time.monotonic() - started < 1
+            assert stream.events_after(0)[0][-1][1]["type"] == "error"
+            wait_until(lambda: server.disconnect_count == 1, timeout=5)
+        assert cancelled.value == before + 1
+
+    def test_shared_stream_survives_until_the_last_subscriber_cancels(self):
+        """Test that a coalesced generation is cancelled only once every subscriber has gone."""
+        closed = threading.Event()
+        tokens = []
+
+        def source():
+            try:
+                while True:
+                    tokens.append(current_cancellation())
+                    yield {"type": "content", "content": "x"}
+                    time.sleep(0.01)
+            finally:
+                closed.set()
+
+        flights = StreamCoalescer()
+        flight, first, _ = flights.join("key")
+        _, second, _ = flights.join("key")
+        flight.start(source())
+        streams = [EventStream(name, iter(sub), grace=60) for name, sub in [("a", first), ("b", second)]]
+        for stream in streams:
+            stream.attach()
+            stream.start()
+
+        streams[0].cancel()
+        wait_until(lambda: streams[0].done)
+        count = len(streams[1].events_after(0)[0])
+        wait_until(lambda: len(streams[1].events_after(0)[0]) > count)
+        assert not closed.is_set()
+
+        streams[1].cancel()
+        assert closed.wait(2)
+        wait_until(lambda: streams[1].done)
+        assert tokens[0].cancelled
+        assert len(flights) == 0
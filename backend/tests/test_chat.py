@@ -1,3 +1,4 @@
+import json
 import pytest
 from unittest.mock import patch, Mock
 from fastapi.testclient import TestClient
@@ -117,4 +118,53 @@ class TestChatEndpoint:
             # Verify that top_k=5 was passed to the search
             mock_milvus_service.search.assert_called_once()
             call_args = mock_milvus_service.search.call_args
-            assert call_args[1]['top_k'] == 5
\ No newline at end of file
+            assert call_args[1]['top_k'] == 5
+
+    def test_chat_debug_timings(self, client):
+        """Test that debug_timings adds a per-stage breakdown to the response."""
+        def process_query(query, context_url, model, conversation_history, top_k, timings):
+            timings.record("routing", 0.01)
+            timings.record("search", 0.02)
+            timings.track_generation("An answer")
+            return {"answer": "An answer", "sources": []}
+
+        rag_service = Mock()
+        rag_service.process_query.side_effect = process_query
+
+        with patch('app.api.v1.endpoints.chat.get_intelligent_rag_service', return_value=rag_service):
+            response = client.post("/api/v1/chat", json={
+                "query": "What is AI?",
+                "context_url": "https://example.com",
+                "debug_timings": True
+            })
+
+            assert response.status_code == 200
+            timings = response.json()["timings"]
+            assert timings["routing_ms"] == 10.0
+            assert timings["search_ms"] == 20.0
+            assert timings["completion_tokens"] > 0
+            assert timings["total_ms"] >= 0
+
+    def test_chat_stream_debug_timings(self, client):
+        """Test that the stream ends with a timings event when debug_timings is set."""
+        def process_query_stream(query, context_url, model, conversation_history, top_k, timings):
+            yield {"type": "sources", "sources": [], "method": "direct"}
+            yield from ({"type": "content", "content": c} for c in timings.track_stream(["Hello", " there", " friend"]))
+
+        rag_service = Mock()
+        rag_service.process_query_stream.side_effect = process_query_stream
+
+        with patch('app.api.v1.endpoints.chat.get_intelligent_rag_service', return_value=rag_service):
+            response = client.post("/api/v1/chat-stream", json={
+                "query": "Hi",
+                "context_url": "https://example.com",
+                "debug_timings": True
+            })
+
+            events = [json.loads(line[6:]) for line in response.text.splitlines() if line.startswith("data: ")]
+            # Back-to-back tokens are coalesced into one frame
+            assert [e["type"] for e in events] == ["sources", "content", "timings", "end"]
+            assert events[1]["content"] == "Hello there friend"
+            # Estimated from the text like a blocking answer, not one token per chunk
+            assert events[2]["timings"]["completion_tokens"] == 4
+            assert "time_to_first_token_ms" in events[2]["timings"]
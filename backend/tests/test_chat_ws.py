@@ -0,0 +1,148 @@
+import threading
+import pytest
+from unittest.mock import patch
+from app.core.admission import AdmissionRegistry
+from app.core.sse import EventStreamRegistry
+
+URL = "https://example.com"
+
+
+def receive_until(ws, request_id, terminal=("end", "cancelled", "error")):
+    """Collects the messages of one request until its terminal event."""
+    events = []
+    while True:
+        message = ws.receive_json()
+        if message.get("request_id") != request_id:
+            continue
+        events.append(message)
+        if message["type"] in terminal:
+            return events
+
+
+class TestChatWebSocket:
+    """Test cases for the multiplexed WebSocket chat endpoint."""
+
+    @pytest.fixture
+    def rag(self):
+        with patch("app.api.v1.endpoints.chat_ws.get_intelligent_rag_service") as get_rag, \
+                patch("app.api.v1.endpoints.chat_ws.admission", AdmissionRegistry()):
+            yield get_rag.return_value
+
+    def test_answers_and_keeps_history(self, client, rag):
+        """Test that answers stream back and the next message gets the server-side history."""
+        rag.process_query_stream.side_effect = lambda **kwargs: iter(
+            [{"type": "sources", "sources": []}, {"type": "content", "content": "Hi"}, {"type": "content", "content": "!"}])
+
+        with client.websocket_connect("/api/v1/chat-ws") as ws:
+            ws.send_json({"type": "chat", "conversation_id": "c1", "request_id": "r1", "query": "Hello", "context_url": URL})
+            events = receive_until(ws, "r1")
+            ws.send_json({"type": "chat", "conversation_id": "c1", "request_id": "r2", "query": "Again"})
+            receive_until(ws, "r2")
+
+        assert [e["type"] for e in events] == ["sources", "content", "content", "end"]
+        assert all(e["conversation_id"] == "c1" for e in events)
+        second = rag.process_query_stream.call_args_list[1].kwargs
+        assert second["context_url"] == URL
+        assert second["conversation_history"] == [{"role": "user", "content": "Hello"},
+                                                  {"role": "assistant", "content": "Hi!"}]
+
+    def test_conversations_are_multiplexed(self, client, rag):
+        """Test that two conversations stream at the same time on one connection."""
+        gate = threading.Event()
+
+        def stream(query, **kwargs):
+            if query == "slow":
+                gate.wait(2)
+            yield {"type": "content", "content": query}
+
+        rag.process_query_stream.side_effect = stream
+        with client.websocket_connect("/api/v1/chat-ws") as ws:
+            ws.send_json({"type": "chat", "conversation_id": "a", "request_id": "slow", "query": "slow", "context_url": URL})
+            ws.send_json({"type": "chat", "conversation_id": "b", "request_id": "fast", "query": "fast",
+                          "context_url": "https://other.com"})
+            fast = receive_until(ws, "fast")
+            gate.set()
+            slow = receive_until(ws, "slow")
+
+        assert fast[0]["content"] == "fast" and slow[0]["content"] == "slow"
+        assert rag.process_query_stream.call_args_list[1].kwargs["context_url"] == "https://other.com"
+
+    def test_cancel_mid_stream(self, client, rag):
+        """Test that a cancel stops the answer and does not add it to the history."""
+        closed = threading.Event()
+
+        def endless(**kwargs):
+            try:
+                while not closed.is_set():
+                    yield {"type": "content", "content": "x"}
+                    closed.wait(0.01)
+            finally:
+                closed.set()
+
+        rag.process_query_stream.side_effect = endless
+        with client.websocket_connect("/api/v1/chat-ws") as ws:
+            ws.send_json({"type": "chat", "conversation_id": "c", "request_id": "r", "query": "q", "context_url": URL})
+            assert ws.receive_json()["type"] == "content"
+            ws.send_json({"type": "cancel", "request_id": "r"})
+            events = receive_until(ws, "r")
+
+            assert events[-1]["type"] == "cancelled"
+            assert closed.wait(2)
+            rag.process_query_stream.side_effect = lambda **kwargs: iter([])
+            ws.send_json({"type": "chat", "conversation_id": "c", "request_id": "r2", "query": "next"})
+            receive_until(ws, "r2")
+
+        assert rag.process_query_stream.call_args.kwargs["conversation_history"] == []
+
+    def test_invalid_messages(self, client, rag):
+        """Test that malformed messages and a missing context are reported without closing the socket."""
+        with client.websocket_connect("/api/v1/chat-ws") as ws:
+            ws.send_json({"type": "chat", "request_id": "r"})
+            assert ws.receive_json()["type"] == "error"
+            ws.send_json({"type": "chat", "conversation_id": "c", "request_id": "r", "query": "q"})
+            assert "context_url" in ws.receive_json()["content"]
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+
+    def test_malformed_frame_keeps_the_connection(self, client, rag):
+        """Test that a frame that is not JSON is reported and later messages are still answered."""
+        rag.process_query_stream.side_effect = lambda **kwargs: iter([{"type": "content", "content": "ok"}])
+        with client.websocket_connect("/api/v1/chat-ws") as ws:
+            ws.send_text("{not json")
+            assert ws.receive_json()["type"] == "error"
+            ws.send_json({"type": "chat", "conversation_id": "c", "request_id": "r", "query": "q", "context_url": URL})
+            events = receive_until(ws, "r")
+
+        assert [e["type"] for e in events] == ["content", "end"]
+
+    def test_streams_count_against_the_registry_limit(self, client, rag):
+        """Test that answers are refused with an error frame once SSE_MAX_STREAMS producers run."""
+        rag.process_query_stream.side_effect = lambda **kwargs: iter([{"type": "content", "content": "ok"}])
+        with patch("app.api.v1.endpoints.chat_ws.event_streams", EventStreamRegistry(60, 1, max_streams=0)), \
+                client.websocket_connect("/api/v1/chat-ws") as ws:
+            for request_id in ("r1", "r2"):
+                ws.send_json({"type": "chat", "conversation_id": request_id, "request_id": request_id, "query": "q",
+                              "context_url": URL})
+                events = receive_until(ws, request_id)
+                assert events == [{"type": "error", "conversation_id": request_id, "request_id": request_id,
+                                   "content": "Too many active streams (0); try again later."}]
+
+        rag.process_query_stream.assert_not_called()
+
+    def test_conversations_per_connection_are_bounded(self, client, rag):
+        """Test that the least recently used idle conversation is evicted beyond the limit."""
+        rag.process_query_stream.side_effect = lambda **kwargs: iter([{"type": "content", "content": "ok"}])
+        with patch("app.api.v1.endpoints.chat_ws.settings.WS_MAX_CONVERSATIONS", 2), \
+                client.websocket_connect("/api/v1/chat-ws") as ws:
+            for cid in ("a", "b"):
+                ws.send_json({"type": "chat", "conversation_id": cid, "request_id": cid, "query": "q",
+                              "context_url": URL})
+                receive_until(ws, cid)
+            ws.send_json({"type": "chat", "conversation_id": "a", "request_id": "a2", "query": "q"})
+            receive_until(ws, "a2")
+            ws.send_json({"type": "chat", "conversation_id": "c", "request_id": "c", "query": "q", "context_url": URL})
+            receive_until(ws, "c")
+            ws.send_json({"type": "chat", "conversation_id": "b", "request_id": "b2", "query": "q"})
+            events = receive_until(ws, "b2")
+
+        assert "context_url" in events[-1]["content"]
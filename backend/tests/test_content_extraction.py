@@ -0,0 +1,74 @@
+import pytest
+from app.services.content_extraction import extract_main_content
+
+PAGE = b"""<!DOCTYPE html><html><head><title>Guide | Site</title></head><body>
+<div id="cookie-banner" class="cookie-consent">We use cookies to improve your experience, please accept them all today.</div>
+<header><nav><a href="/">Home</a> <a href="/docs">Docs</a></nav></header>
+<div class="sidebar"><ul><li><a href="/a">Related article one with a long title</a></li>
+<li><a href="/b">Related article two with a long title</a></li></ul></div>
+<article class="post-content">
+<h1>Install guide</h1>
+<p>This guide explains how to install the tool, configure it, and run it on your machine.</p>
+<h2 id="setup">Setup</h2>
+<p>First, install the dependencies with the package manager, then verify the installation.</p>
+<ul><li>Python 3.11</li><li>Milvus<ul><li>standalone</li></ul></li></ul>
+<pre><code class="language-bash">pip install -r requirements.txt
+uvicorn app.main:app</code></pre>
+<h3>Options</h3>
+<table><tr><th>Name</th><th>Default</th></tr><tr><td>PORT</td><td>8000</td></tr></table>
+<p>Each option can be set in the environment, or in a .env file next to the backend.</p>
+</article>
+<footer>Copyright 2026, all rights reserved, example company and friends.</footer>
+</body></html>"""
+
+
+class TestExtractMainContent:
+    """Test cases for the readability-style main-content extraction."""
+
+    def test_boilerplate_is_removed(self):
+        """Test that the cookie banner, navigation, sidebar and footer are not part of the content."""
+        page = extract_main_content(PAGE, parser="html.parser")
+        assert page.title == "Guide | Site"
+        for boilerplate in ("cookies", "Home", "Related article", "Copyright"):
+            assert boilerplate not in page.text
+        assert page.text.startswith("# Install guide\n\nThis guide explains")
+
+    def test_sections_keep_heading_path_and_anchor(self):
+        """Test that each heading starts a section that knows its enclosing headings."""
+        sections = extract_main_content(PAGE, parser="html.parser").sections
+        assert [(s.heading_path, s.level, s.anchor) for s in sections] == [
+            (["Install guide"], 1, None),
+            (["Install guide", "Setup"], 2, "setup"),
+            (["Install guide", "Setup", "Options"], 3, None),
+        ]
+
+    def test_structure_is_rendered_as_markdown(self):
+        """Test that lists, code blocks and tables survive as Markdown."""
+        setup, options = extract_main_content(PAGE, parser="html.parser").sections[1:]
+        assert "- Python 3.11\n- Milvus\n  - standalone" in setup.text
+        assert "```bash\npip install -r requirements.txt\nuvicorn app.main:app\n```" in setup.text
+        assert "| Name | Default |\n| --- | --- |\n| PORT | 8000 |" in options.text
+
+    def test_only_boilerplate_repeats_are_dropped_page_wide(self):
+        """Test that short repeated lines are kept once, while repeated paragraphs and code in other sections stay."""
+        paragraph = "Restart the service after changing any of these settings, otherwise they are ignored."
+        html = f"""<html><body><article>
+        <h2>Linux</h2><p>{paragraph}</p><p>Share this page</p><pre><code>make install</code></pre>
+        <h2>macOS</h2><p>{paragraph}</p><p>Share this page</p><pre><code>make install</code></pre>
+        <p>{paragraph} {paragraph}</p><p>{paragraph} {paragraph}</p>
+        </article></body></html>""".encode()
+        linux, macos = extract_main_content(html, parser="html.parser").sections
+        assert linux.text.count("Share this page") == 1 and "Share this page" not in macos.text
+        assert paragraph in macos.text and "make install" in macos.text
+        assert macos.text.count(f"{paragraph} {paragraph}") == 1
+
+    def test_lxml_matches_html_parser(self):
+        """Test that both parser backends build the same page."""
+        pytest.importorskip("lxml")
+        assert extract_main_content(PAGE, parser="lxml") == extract_main_content(PAGE, parser="html.parser")
+
+    def test_falls_back_to_plain_text(self):
+        """Test that a page whose only text is link-dense falls back to its plain text."""
+        page = extract_main_content(b"<html><body><div><a href='/a'>Only</a> <a href='/b'>links</a></div></body></html>")
+        assert page.text == "Only\nlinks"
+        assert page.sections[0].heading_path == []
@@ -0,0 +1,154 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import pytest
+from app.services.crawler import Crawler, canonicalize_url
+
+PARAGRAPH = "<p>{} has enough text in this paragraph to count as the main content, really.</p>"
+
+
+def html(title, *links, head=""):
+    anchors = "".join(f"<a href='{href}'>{href}</a> " for href in links)
+    return (f"<html><head><title>{title}</title>{head}</head><body><article><h1>{title}</h1>"
+            f"{PARAGRAPH.format(title)}</article><div>{anchors}</div></body></html>")
+
+
+SITE = {
+    "/robots.txt": ("text/plain", "User-agent: *\nDisallow: /private\n"),
+    "/sitemap.xml": ("application/xml", "<urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>"
+                                        "<url><loc>{origin}/from-sitemap</loc></url></urlset>"),
+    "/": ("text/html", html("Home", "/a", "a?utm_source=x#top", "/private/secret", "https://elsewhere.example/",
+                            "/image.png", "/noindex", "/copy")),
+    "/a": ("text/html", html("Page A", "/a/deep", "/", "/redirect")),
+    "/a/deep": ("text/html", html("Deep", "/a/deeper")),
+    "/a/deeper": ("text/html", html("Deeper")),
+    "/private/secret": ("text/html", html("Secret")),
+    "/from-sitemap": ("text/html", html("From sitemap")),
+    "/noindex": ("text/html", html("Hidden", "/linked-from-noindex", head="<meta name='robots' content='noindex'>")),
+    "/linked-from-noindex": ("text/html", html("Linked from noindex")),
+    "/copy": ("text/html", html("Home", "/a")),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/redirect":
+            self.send_response(301)
+            self.send_header("Location", "/a")
+            self.end_headers()
+            return
+        if self.path not in SITE:
+            self.send_error(404)
+            return
+        content_type, body = SITE[self.path]
+        body = body.replace("{origin}", self.server.origin).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.requests = []
+    server.origin = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def crawled_paths(site, **kwargs):
+    options = {"max_depth": 3, "max_pages": 100, "max_bytes": 10 ** 6, **kwargs}
+    crawler = Crawler(site.origin + "/", **options)
+    return [page.url[len(site.origin):] for page in crawler.crawl()], crawler
+
+
+class TestCanonicalizeUrl:
+    """Test cases for URL canonicalization."""
+
+    def test_spellings_of_the_same_page_are_equal(self):
+        """Test that case, default ports, dot segments, fragments and tracking parameters are normalized."""
+        assert canonicalize_url("HTTP://Example.COM:80/a/./b/../c?b=2&a=1&utm_source=x#frag") == \
+            "http://example.com/a/c?a=1&b=2"
+        assert canonicalize_url("https://example.com") == "https://example.com/"
+        assert canonicalize_url("https://example.com:8443/dir/") == "https://example.com:8443/dir/"
+        assert canonicalize_url("../up", "https://example.com/a/b/page") == "https://example.com/a/up"
+
+    def test_non_http_urls_are_rejected(self):
+        """Test that mailto, javascript and relative URLs without a base are not crawlable."""
+        assert canonicalize_url("mailto:someone@example.com") is None
+        assert canonicalize_url("javascript:void(0)") is None
+        assert canonicalize_url("/relative") is None
+
+
+class TestCrawler:
+    """Test cases for the site crawler."""
+
+    def test_crawl_follows_same_origin_links_breadth_first(self, site):
+        """Test robots.txt, sitemap, dedupe, noindex and off-site handling in one crawl."""
+        paths, crawler = crawled_paths(site)
+        assert paths == ["/", "/a", "/from-sitemap", "/a/deep", "/linked-from-noindex", "/a/deeper"]
+        assert "/private/secret" not in site.requests
+        assert "/image.png" not in site.requests
+        # /copy has the same text as the home page; /redirect lands on /a
+        assert crawler.skipped == 4
+        assert crawler.stop_reason == "exhausted"
+
+    def test_budgets(self, site):
+        """Test that the depth, page and byte budgets each stop the crawl."""
+        paths, _ = crawled_paths(site, max_depth=0)
+        assert paths == ["/"]
+        assert "/sitemap.xml" not in site.requests
+
+        paths, crawler = crawled_paths(site, max_pages=2)
+        assert paths == ["/", "/a"]
+        assert crawler.stop_reason == "max_pages"
+
+        paths, crawler = crawled_paths(site, max_bytes=1500)
+        assert crawler.stop_reason == "max_bytes"
+        assert crawler.bytes_downloaded > 1500
+        assert len(paths) < 6
+
+    def test_stream_stops_when_closed(self, site):
+        """Test that closing the prefetching stream stops the background crawl."""
+        crawler = Crawler(site.origin, max_depth=3, max_pages=100, max_bytes=10 ** 6)
+        pages = crawler.stream(prefetch=1)
+        assert next(pages).url == site.origin + "/"
+        pages.close()
+        assert crawler.pages < 6
+        assert crawler.stop_reason == "stopped"
+
+
+class TestCrawlEndpoint:
+    """Test cases for the crawl endpoint."""
+
+    def test_crawl_stores_pages_under_one_context(self, client, site, mock_ollama_service, mock_milvus_service):
+        """Test that every crawled page is stored under the seed URL with its own page URL."""
+        mock_milvus_service.insert_data.return_value = 1
+        with patch('app.api.v1.endpoints.scrape.ollama_service', mock_ollama_service), \
+             patch('app.api.v1.endpoints.scrape.milvus_service', mock_milvus_service):
+            response = client.post("/api/v1/crawl", json={"url": site.origin, "max_pages": 3})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["url"] == site.origin + "/"
+        assert data["pages_crawled"] == 3
+        assert data["stop_reason"] == "max_pages"
+        calls = mock_milvus_service.insert_data.call_args_list
+        assert {call.kwargs["url"] for call in calls} == {site.origin + "/"}
+        assert [call.kwargs["page_url"][len(site.origin):] for call in calls] == ["/", "/a", "/from-sitemap"]
+
+    def test_crawl_rejects_non_http_urls(self, client, mock_ollama_service, mock_milvus_service):
+        """Test that a seed that is not an http(s) URL is a bad request."""
+        with patch('app.api.v1.endpoints.scrape.ollama_service', mock_ollama_service), \
+             patch('app.api.v1.endpoints.scrape.milvus_service', mock_milvus_service):
+            response = client.post("/api/v1/crawl", json={"url": "ftp://example.com/"})
+        assert response.status_code == 400
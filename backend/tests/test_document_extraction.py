@@ -0,0 +1,151 @@
+import io
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services import document_extraction
+from app.services.document_extraction import (
+    detect_document_type, extract_document, iter_json_sections, iter_jsonl_sections, iter_markdown_sections,
+    iter_text_sections,
+)
+from app.services.scraping_service import scrape_page
+
+
+def make_pdf(pages, title=None, outline=()):
+    """A PDF with one line of text per page, built by hand and bookmarked with pypdf."""
+    pypdf = pytest.importorskip("pypdf")
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                   b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(len(pages))), len(pages)),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode()
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+    writer = pypdf.PdfWriter(clone_from=pypdf.PdfReader(io.BytesIO(out.getvalue())))
+    if title:
+        writer.add_metadata({"/Title": title})
+    for name, page in outline:
+        writer.add_outline_item(name, page)
+    result = io.BytesIO()
+    writer.write(result)
+    return result.getvalue()
+
+
+class TestDetectDocumentType:
+    """Test cases for the content-type dispatch."""
+
+    def test_content_type_extension_and_sniffing(self):
+        """Test that the Content-Type wins, then the extension, then the first bytes."""
+        assert detect_document_type("application/pdf", "https://a/x", b"") == "pdf"
+        assert detect_document_type("text/html; charset=utf-8", "https://a/x.pdf", b"") == "html"
+        assert detect_document_type("application/ld+json", "https://a/x", b"") == "json"
+        assert detect_document_type("application/x-ndjson", "https://a/x", b"") == "jsonl"
+        assert detect_document_type("text/plain", "https://a/README.md", b"") == "markdown"
+        assert detect_document_type("text/plain", "https://a/notes", b"") == "text"
+        assert detect_document_type("application/octet-stream", "https://a/file", b"%PDF-1.7") == "pdf"
+        assert detect_document_type("", "https://a/", b"<!DOCTYPE html><html>") == "html"
+        assert detect_document_type("image/png", "https://a/x.png", b"\x89PNG") is None
+
+
+class TestStreamingExtractors:
+    """Test cases for the lazy PDF, Markdown, text and JSON extractors."""
+
+    def test_markdown_sections(self):
+        """Test heading paths, setext headings, anchors, fenced code and front matter."""
+        markdown = (b"---\ntitle: ignored\n---\nIntro.\n\n# Guide\nText.\n\n```sh\n# not a heading\n```\n\n"
+                    b"Setup\n-----\nSteps.\n\n## Setup\nAgain.\n")
+        sections = list(iter_markdown_sections(io.BytesIO(markdown)))
+        assert [(s.heading_path, s.level, s.anchor) for s in sections] == [
+            ([], 0, None),
+            (["Guide"], 1, "guide"),
+            (["Guide", "Setup"], 2, "setup"),
+            (["Guide", "Setup"], 2, "setup-1"),
+        ]
+        assert sections[0].text == "Intro."
+        assert sections[1].render() == "# Guide\n\nText.\n\n```sh\n# not a heading\n```"
+
+    def test_text_is_read_lazily(self):
+        """Test that plain text is cut at paragraph breaks and read only as far as it is consumed."""
+        paragraph = ("word " * 200 + "\n\n").encode()
+        stream = io.BytesIO(paragraph * 2000)
+        sections = iter_text_sections(stream, "utf-8")
+        first = next(sections)
+        assert document_extraction.SECTION_CHARS <= len(first.text) < 2 * document_extraction.SECTION_CHARS
+        assert stream.tell() < len(stream.getvalue()) / 10
+        assert sum(1 for _ in sections) > 100
+
+    def test_json_members_are_streamed(self):
+        """Test that top-level array items and object members are decoded one at a time."""
+        document = b'[{"name": "a", "tags": ["x", {"k": 1}]}, 12345, "text", {"empty": []}]'
+        with patch.object(document_extraction, "JSON_READ_CHARS", 3):
+            sections = list(iter_json_sections(io.BytesIO(document)))
+        assert [s.text for s in sections] == ["name: a\ntags:\n  - x\n  -\n    k: 1", "12345", "text", "empty: []"]
+
+        sections = list(iter_json_sections(io.BytesIO('{"first": {"v": "café"}, "second": [1, 2]}'.encode())))
+        assert [(s.heading_path, s.render()) for s in sections] == [
+            (["first"], "# first\n\nv: café"), (["second"], "# second\n\n- 1\n- 2")]
+
+        with pytest.raises(ValueError):
+            list(iter_json_sections(io.BytesIO(b'[1, 2 3]')))
+
+    def test_json_lines(self):
+        """Test that each JSON Lines record is a section and non-JSON lines are kept as text."""
+        sections = list(iter_jsonl_sections(io.BytesIO(b'{"a": 1}\nnot json\n\n[1]\n')))
+        assert [s.text for s in sections] == ["a: 1", "not json", "- 1"]
+
+    def test_pdf_pages_with_outline(self):
+        """Test that each PDF page is a section with a page anchor and the heading path of its bookmark."""
+        pdf = make_pdf(["First page text", "Second page text", "Third page text"], title="Manual",
+                       outline=[("Introduction", 0), ("Usage", 1)])
+        stream = io.BytesIO(pdf)
+        page = extract_document(stream, "pdf", "https://example.com/files/manual.pdf")
+        assert page.title == "Manual"
+        sections = list(page.sections)
+        assert [(s.heading_path, s.anchor, s.text) for s in sections] == [
+            (["Introduction"], "page=1", "First page text"),
+            (["Usage"], "page=2", "Second page text"),
+            (["Usage"], "page=3", "Third page text"),
+        ]
+        assert stream.closed
+
+
+class TestScrapePageDispatch:
+    """Test cases for scrape_page with non-HTML responses."""
+
+    def fake_response(self, body, content_type):
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.url = "https://example.com/doc"
+        response.headers = {"content-type": content_type}
+        response.iter_content.return_value = [body[i:i + 10] for i in range(0, len(body), 10)]
+        return response
+
+    def test_markdown_download_is_extracted_lazily(self):
+        """Test that a Markdown response becomes a lazily extracted page."""
+        response = self.fake_response(b"# Title\n\nBody text.\n", "text/markdown; charset=utf-8")
+        with patch("app.services.scraping_service.requests.get", return_value=response):
+            page = scrape_page("https://example.com/doc")
+        assert page.title == "doc"
+        assert page.text == "# Title\n\nBody text."
+
+    def test_oversized_and_unsupported_documents(self):
+        """Test that downloads above the size limit and unknown types are not extracted."""
+        response = self.fake_response(b"x" * 100, "text/plain")
+        with patch("app.services.scraping_service.requests.get", return_value=response), \
+             patch("app.services.scraping_service.settings.SCRAPE_MAX_DOCUMENT_BYTES", 50):
+            assert scrape_page("https://example.com/doc") is None
+
+        response = self.fake_response(b"\x89PNG....", "image/png")
+        with patch("app.services.scraping_service.requests.get", return_value=response):
+            assert scrape_page("https://example.com/doc") is None
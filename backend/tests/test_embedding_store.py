@@ -0,0 +1,82 @@
+import os
+import pytest
+from unittest.mock import Mock, patch
+from app.services.embedding_store import EmbeddingStore
+from app.services.llm_service import OllamaService
+
+
+class TestEmbeddingStore:
+    """Test cases for the disk-backed embedding store."""
+
+    def test_round_trip_survives_restart(self, tmp_path):
+        """Test that stored embeddings are read back by a new store on the same directory."""
+        store = EmbeddingStore(str(tmp_path))
+        store.put("nomic", "chunk one", [0.1, 0.2, 0.3])
+        store.put("nomic", "chunk two", [0.4, 0.5, 0.6])
+
+        reopened = EmbeddingStore(str(tmp_path))
+        assert reopened.count("nomic") == 2
+        assert reopened.get("nomic", "chunk two") == pytest.approx([0.4, 0.5, 0.6])
+        assert reopened.get("nomic", "unknown") is None
+
+    def test_get_or_compute_only_computes_misses(self, tmp_path):
+        """Test that a stored embedding is reused instead of being computed again."""
+        store = EmbeddingStore(str(tmp_path))
+        compute = Mock(return_value=[1.0, 2.0])
+
+        assert store.get_or_compute("nomic", "text", compute) == [1.0, 2.0]
+        assert store.get_or_compute("nomic", "text", compute) == pytest.approx([1.0, 2.0])
+        compute.assert_called_once_with("text")
+
+    def test_models_are_kept_apart(self, tmp_path):
+        """Test that the same text embedded by another model is a miss."""
+        store = EmbeddingStore(str(tmp_path))
+        store.put("nomic-embed-text:latest", "text", [1.0, 2.0])
+        assert store.get("mxbai/embed-large", "text") is None
+        assert store.get("nomic-embed-text:latest", "text") == pytest.approx([1.0, 2.0])
+
+    def test_dimension_mismatch_is_not_stored(self, tmp_path):
+        """Test that vectors of a different dimension are rejected for an existing model."""
+        store = EmbeddingStore(str(tmp_path))
+        store.put("nomic", "a", [1.0, 2.0])
+        store.put("nomic", "b", [1.0, 2.0, 3.0])
+        assert store.get("nomic", "b") is None
+        assert store.count("nomic") == 1
+
+    def test_partial_tail_is_dropped_on_load(self, tmp_path):
+        """Test that a vector written without its key (crash mid-put) is discarded."""
+        store = EmbeddingStore(str(tmp_path))
+        store.put("nomic", "a", [1.0, 2.0])
+        with open(os.path.join(str(tmp_path), "nomic", "vectors.f32"), "ab") as f:
+            f.write(b"\x00" * 8)
+
+        reopened = EmbeddingStore(str(tmp_path))
+        reopened.put("nomic", "b", [3.0, 4.0])
+        assert reopened.count("nomic") == 2
+        assert reopened.get("nomic", "b") == pytest.approx([3.0, 4.0])
+        assert EmbeddingStore(str(tmp_path)).get("nomic", "a") == pytest.approx([1.0, 2.0])
+
+    def test_stores_sharing_a_directory_keep_rows_aligned(self, tmp_path):
+        """Test that appends from two stores (server workers) on one directory stay matched to their keys."""
+        first, second = EmbeddingStore(str(tmp_path)), EmbeddingStore(str(tmp_path))
+        first.put("nomic", "a", [1.0, 1.0])
+        second.put("nomic", "b", [2.0, 2.0])
+        first.put("nomic", "c", [3.0, 3.0])
+
+        assert first.get("nomic", "c") == pytest.approx([3.0, 3.0])
+        assert first.count("nomic") == 3
+        reopened = EmbeddingStore(str(tmp_path))
+        for text, value in (("a", 1.0), ("b", 2.0), ("c", 3.0)):
+            assert reopened.get("nomic", text) == pytest.approx([value, value])
+
+    def test_ollama_service_consults_store(self, tmp_path):
+        """Test that re-embedding the same chunk does not call Ollama again."""
+        store = EmbeddingStore(str(tmp_path))
+        with patch("app.services.llm_service.ollama.Client") as client_cls, \
+                patch("app.services.llm_service.embedding_store", store), \
+                patch.object(OllamaService, "_ensure_models_are_available"):
+            client_cls.return_value.embeddings.return_value = {"embedding": [0.5, 0.5]}
+            service = OllamaService()
+            assert service.generate_embedding("chunk") == [0.5, 0.5]
+            assert service.generate_embedding("chunk") == pytest.approx([0.5, 0.5])
+            client_cls.return_value.embeddings.assert_called_once()
@@ -0,0 +1,90 @@
+import pytest
+from bs4 import BeautifulSoup
+from unittest.mock import Mock, patch
+from app.services import html_extraction
+from app.services.html_extraction import HTMLExtractor, detect_encoding, extract_links, extract_text
+
+PAGE = (
+    b"<!DOCTYPE html><html><head><title>Title</title><meta charset='utf-8'>"
+    b"<style>p { color: red }</style></head><body>"
+    b"<header><nav>Home <a href='/'>Menu</a></nav></header>"
+    b"<h1>Fish &amp; chips</h1><p>Hello <b>bold</b> world</p><!-- comment -->"
+    b"<script>var s = '<p>not text</p>';</script><aside>Related</aside>"
+    b"<ul><li>caf\xc3\xa9</li><li>two</li></ul>tail<br/>end<footer>Footer</footer></body></html>"
+)
+
+
+def beautifulsoup_text(document: bytes) -> str:
+    """The extraction the streaming parser replaces."""
+    soup = BeautifulSoup(document, "html.parser")
+    for element in soup(["script", "style", "head", "title", "meta", "header", "footer", "nav", "aside"]):
+        element.decompose()
+    return soup.get_text(separator="\n", strip=True)
+
+
+class TestExtractText:
+    """Test cases for the streaming HTML text extraction."""
+
+    def test_matches_beautifulsoup_output(self):
+        """Test that the streaming extractor produces the same text as the tree-based one."""
+        assert extract_text(PAGE, parser="html.parser") == beautifulsoup_text(PAGE)
+        assert extract_text(PAGE, parser="html.parser").split("\n") == [
+            "Fish & chips", "Hello", "bold", "world", "café", "two", "tail", "end"]
+
+    def test_documents_are_fed_incrementally(self):
+        """Test that splitting the input into tiny chunks, even inside characters, changes nothing."""
+        with patch.object(html_extraction, "FEED_CHUNK_BYTES", 3):
+            assert extract_text(PAGE, parser="html.parser") == beautifulsoup_text(PAGE)
+
+    def test_encoding_detection(self):
+        """Test that the HTTP charset wins over <meta charset> and that UTF-8 is the default."""
+        latin = "<meta charset=iso-8859-1><p>caf\xe9</p>".encode("latin-1")
+        assert detect_encoding(latin) == "iso8859-1"
+        assert extract_text(latin) == "café"
+        assert detect_encoding(latin, "utf-8") == "utf-8"
+        assert detect_encoding(b"<p>x</p>", "not-a-charset") == "utf-8"
+
+    def test_lxml_backend(self):
+        """Test that lxml, when installed, extracts the same text."""
+        pytest.importorskip("lxml")
+        assert extract_text(PAGE, parser="lxml") == beautifulsoup_text(PAGE)
+
+    def test_falls_back_to_html_parser(self):
+        """Test that a failing or missing lxml falls back to html.parser."""
+        broken = Mock()
+        broken.HTMLParser.side_effect = RuntimeError("boom")
+        with patch.object(html_extraction, "etree", broken):
+            assert extract_text(PAGE) == beautifulsoup_text(PAGE)
+        with patch.object(html_extraction, "etree", None):
+            assert extract_text(PAGE, parser="lxml") == beautifulsoup_text(PAGE)
+
+    def test_extract_links(self):
+        """Test that links, <base>, rel=canonical and robots directives are collected, without nofollow links."""
+        document = (b"<head><base href='/docs/'><link rel='canonical' href='/docs/page'>"
+                    b"<meta name='ROBOTS' content='noindex, follow'></head>"
+                    b"<body><a href='a'>A</a><a href='b' rel='nofollow'>B</a><a>none</a>"
+                    b"<map><area href='/c'></map></body>")
+        for parser in ("html.parser", "lxml"):
+            links = extract_links(document, parser=parser)
+            assert links.links == ["a", "/c"]
+            assert (links.base, links.canonical) == ("/docs/", "/docs/page")
+            assert (links.index, links.follow) == (False, True)
+
+
+class TestHTMLExtractor:
+    """Test cases for the process pool in front of the extractor."""
+
+    def test_small_documents_are_parsed_inline(self):
+        """Test that documents below the threshold never start the pool."""
+        extractor = HTMLExtractor(workers=2, min_bytes=len(PAGE) + 1)
+        assert extractor.extract(PAGE) == beautifulsoup_text(PAGE)
+        assert extractor._pool is None
+
+    def test_large_documents_go_to_the_pool(self):
+        """Test that a worker process parses large documents with the same result."""
+        extractor = HTMLExtractor(workers=1, min_bytes=10, parser="html.parser")
+        try:
+            assert extractor.extract(PAGE) == beautifulsoup_text(PAGE)
+            assert extractor._pool is not None
+        finally:
+            extractor.shutdown()
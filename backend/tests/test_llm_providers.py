@@ -0,0 +1,321 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import settings, ModelProvider
+from app.core.resilience import CircuitBreaker, CircuitBreakerRegistry
+from app.services.llm_providers import GoogleAdapter, OllamaAdapter, ProviderAdapter, to_google_contents
+from app.services.multi_llm_service import MultiLLMService
+
+
+class FakeAdapter(ProviderAdapter):
+    provider = ModelProvider.OLLAMA
+
+    def __init__(self):
+        self.client = Mock()
+        self.calls = []
+
+    def generate(self, model, messages):
+        self.calls.append((model, messages))
+        return "sync answer"
+
+    def generate_stream(self, model, messages):
+        yield from ["a", "b"]
+
+    async def agenerate(self, model, messages):
+        return "async answer"
+
+    async def agenerate_stream(self, model, messages):
+        for token in ["x", "y", "z"]:
+            yield token
+
+
+class TestGoogleHistory:
+    """Test cases for converting chat history to Gemini contents."""
+
+    def test_history_is_converted_without_replay(self):
+        """Test that roles are mapped and the system prompt is split out."""
+        messages = [
+            {"role": "system", "content": "context"},
+            {"role": "user", "content": "q1"},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "q2"},
+        ]
+        system, contents = to_google_contents(messages)
+        assert system == "context"
+        assert contents == [
+            {"role": "user", "parts": ["q1"]},
+            {"role": "model", "parts": ["a1"]},
+            {"role": "user", "parts": ["q2"]},
+        ]
+
+    def test_consecutive_turns_are_merged(self):
+        """Test that same-role turns are merged so roles alternate."""
+        _, contents = to_google_contents([
+            {"role": "user", "content": "q1"},
+            {"role": "user", "content": "q2"},
+        ])
+        assert contents == [{"role": "user", "parts": ["q1", "q2"]}]
+
+    def test_generate_makes_single_call(self):
+        """Test that the whole conversation is sent in one generate_content call."""
+        with patch("app.services.llm_providers.genai") as genai:
+            genai.GenerativeModel.return_value.generate_content.return_value.text = "answer"
+            adapter = GoogleAdapter("key")
+            answer = adapter.generate("gemini-pro", [
+                {"role": "system", "content": "context"},
+                {"role": "user", "content": "q1"},
+                {"role": "assistant", "content": "a1"},
+                {"role": "user", "content": "q2"},
+            ])
+
+        assert answer == "answer"
+        model = genai.GenerativeModel.return_value
+        assert model.generate_content.call_count == 1
+        assert len(model.generate_content.call_args[0][0]) == 3
+        genai.GenerativeModel.assert_called_once_with("gemini-pro", system_instruction="context")
+
+
+class TestMultiLLMServiceAdapters:
+    """Test cases for routing chat requests through provider adapters."""
+
+    def test_sync_and_stream_use_adapter(self):
+        """Test that blocking and streaming requests go to the model's adapter."""
+        adapter = FakeAdapter()
+        service = MultiLLMService(adapters={ModelProvider.OLLAMA: adapter})
+
+        assert service.generate_chat_response("hi", "ctx", "tinyllama") == "sync answer"
+        assert list(service.generate_chat_response_stream("hi", "ctx", "tinyllama")) == ["a", "b"]
+        assert adapter.calls[0][1][-1] == {"role": "user", "content": "hi"}
+
+    def test_async_variants(self):
+        """Test the async blocking and streaming variants."""
+        service = MultiLLMService(adapters={ModelProvider.OLLAMA: FakeAdapter()})
+
+        async def run():
+            answer = await service.agenerate_chat_response("hi", "ctx", "tinyllama")
+            tokens = [t async for t in service.agenerate_chat_response_stream("hi", "ctx", "tinyllama")]
+            return answer, tokens
+
+        assert asyncio.run(run()) == ("async answer", ["x", "y", "z"])
+
+    def test_ollama_adapter_closes_its_async_client(self):
+        """Test that shutting down closes the pooled async Ollama connections."""
+        adapter = OllamaAdapter("http://localhost:11434")
+        asyncio.run(adapter.aclose())
+        with pytest.raises(RuntimeError):
+            asyncio.run(adapter.agenerate("tinyllama", [{"role": "user", "content": "hi"}]))
+
+    def test_unconfigured_provider(self):
+        """Test that a model whose provider has no adapter fails clearly."""
+        service = MultiLLMService(adapters={ModelProvider.OLLAMA: FakeAdapter()})
+        with patch.object(service, "_get_model_config") as get_config:
+            get_config.return_value = Mock(provider=ModelProvider.OPENAI)
+            with pytest.raises(RuntimeError, match="openai provider is not configured"):
+                service.generate_chat_response("hi", "ctx", "gpt-4o")
+            with pytest.raises(RuntimeError, match="openai provider is not configured"):
+                list(service.generate_chat_response_stream("hi", "ctx", "gpt-4o"))
+
+
+    def test_unknown_models_are_validated_and_bounded(self):
+        """Test that client-supplied model names must be pulled in Ollama and are remembered in a bounded LRU."""
+        service = MultiLLMService(adapters={ModelProvider.OLLAMA: FakeAdapter()})
+        catalog = Mock()
+        catalog.lists_ollama_model.side_effect = lambda name: name.startswith("pulled-")
+        with patch("app.services.multi_llm_service.get_model_catalog", return_value=catalog), \
+             patch("app.services.multi_llm_service.MAX_DYNAMIC_MODELS", 2):
+            with pytest.raises(ValueError, match="not available"):
+                service._get_model_config("made-up-model")
+            for name in ("pulled-a", "pulled-b", "pulled-a", "pulled-c"):
+                assert service._get_model_config(name).provider == ModelProvider.OLLAMA
+        assert list(service._dynamic_models) == ["pulled-a", "pulled-c"]
+
+
+class ScriptedAdapter(ProviderAdapter):
+    """Adapter whose behaviour depends on the model name: 'broken' raises, 'slow' stalls."""
+    provider = ModelProvider.OLLAMA
+
+    def __init__(self):
+        self.client = Mock()
+        self.calls = []
+
+    def _behave(self, model):
+        self.calls.append(model)
+        if model.startswith("broken"):
+            raise ConnectionError(f"{model} is down")
+        if model.startswith("slow"):
+            time.sleep(0.5)
+
+    def generate(self, model, messages):
+        self._behave(model)
+        return f"answer from {model}"
+
+    def generate_stream(self, model, messages):
+        self._behave(model)
+        yield from [model, " done"]
+
+    async def agenerate(self, model, messages):
+        self.calls.append(model)
+        if model.startswith("slow"):
+            await asyncio.sleep(0.5)
+        return f"answer from {model}"
+
+
+@pytest.fixture
+def scripted():
+    adapter = ScriptedAdapter()
+    service = MultiLLMService(
+        adapters={ModelProvider.OLLAMA: adapter},
+        breakers=CircuitBreakerRegistry(failure_threshold=2, reset_timeout=60),
+    )
+    return service, adapter
+
+
+class TestFailover:
+    """Test cases for fallback chains, timeouts, circuit breakers and hedging."""
+
+    def test_falls_back_to_next_model(self, scripted):
+        """Test that an erroring model is skipped in favour of its fallback."""
+        service, adapter = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"broken-a": ["broken-b", "good"]}):
+            answer = service.generate_chat_response("hi", "ctx", "broken-a")
+        assert answer == "answer from good"
+        assert adapter.calls == ["broken-a", "broken-b", "good"]
+
+    def test_all_models_failing_raises(self, scripted):
+        """Test that the error lists every failed model when the chain is exhausted."""
+        service, _ = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"broken-a": ["broken-b"]}):
+            with pytest.raises(RuntimeError, match="All models for 'broken-a' failed"):
+                service.generate_chat_response("hi", "ctx", "broken-a")
+
+    def test_timeout_moves_to_fallback(self, scripted):
+        """Test that a stalled model is abandoned after the request timeout."""
+        service, _ = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"slow": ["good"]}), \
+                patch.object(settings, "LLM_REQUEST_TIMEOUT_SECONDS", 0.05):
+            start = time.perf_counter()
+            answer = service.generate_chat_response("hi", "ctx", "slow")
+        assert answer == "answer from good"
+        assert time.perf_counter() - start < 0.4
+
+    def test_circuit_opens_after_repeated_failures(self, scripted):
+        """Test that an open circuit skips the model without calling it."""
+        service, adapter = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"broken": ["good"]}):
+            for _ in range(3):
+                service.generate_chat_response("hi", "ctx", "broken")
+        assert adapter.calls.count("broken") == 2
+        assert service.breakers.get("broken").state == CircuitBreaker.OPEN
+
+    def test_hedged_request_returns_fastest(self, scripted):
+        """Test that a backup request is fired after the hedge threshold and wins."""
+        service, adapter = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"slow": ["good"]}), \
+                patch.object(settings, "LLM_HEDGE_AFTER_SECONDS", 0.05):
+            start = time.perf_counter()
+            answer = service.generate_chat_response("hi", "ctx", "slow")
+        assert answer == "answer from good"
+        assert time.perf_counter() - start < 0.4
+        assert adapter.calls == ["slow", "good"]
+
+    def test_stream_fails_over_before_first_token(self, scripted):
+        """Test that streaming switches models when the first one fails to start."""
+        service, _ = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"broken": ["good"]}):
+            tokens = list(service.generate_chat_response_stream("hi", "ctx", "broken"))
+        assert tokens == ["good", " done"]
+
+    def test_stream_hedging(self, scripted):
+        """Test that a hedged stream is served by whichever model starts first."""
+        service, _ = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"slow": ["good"]}), \
+                patch.object(settings, "LLM_HEDGE_AFTER_SECONDS", 0.05):
+            tokens = list(service.generate_chat_response_stream("hi", "ctx", "slow"))
+        assert tokens == ["good", " done"]
+
+    def test_async_hedging(self, scripted):
+        """Test hedging in the async path."""
+        service, _ = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"slow": ["good"]}), \
+                patch.object(settings, "LLM_HEDGE_AFTER_SECONDS", 0.05):
+            answer = asyncio.run(service.agenerate_chat_response("hi", "ctx", "slow"))
+        assert answer == "answer from good"
+
+
+    def test_abandoned_hedge_releases_its_trial(self, scripted):
+        """Test that a half-open trial cancelled by a faster hedge does not block the circuit for good."""
+        service, _ = scripted
+        now = [0.0]
+        breaker = CircuitBreaker("slow", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 11
+        service.breakers._breakers["slow"] = breaker
+        with patch.object(settings, "MODEL_FALLBACKS", {"slow": ["good"]}), \
+                patch.object(settings, "LLM_HEDGE_AFTER_SECONDS", 0.05):
+            answer = asyncio.run(service.agenerate_chat_response("hi", "ctx", "slow"))
+        assert answer == "answer from good"
+        assert breaker.allow_request()
+
+    def test_cancelled_stream_releases_its_trial(self, scripted):
+        """Test that a half-open trial stream cut short by the client neither fails nor blocks the circuit."""
+        from app.core.cancellation import CancellationToken, cancellation_scope
+        service, _ = scripted
+        now = [0.0]
+        breaker = CircuitBreaker("m", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 11
+        assert breaker.allow_request()
+
+        def interrupted(model, messages):
+            token.cancel()
+            raise ConnectionError("closed by cancellation")
+            yield
+        adapter = Mock(generate_stream=interrupted)
+        token = CancellationToken()
+        with cancellation_scope(token), pytest.raises(ConnectionError):
+            list(service._stream_once("m", Mock(provider=ModelProvider.OLLAMA), adapter, [], breaker.attempt()))
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+
+    def test_late_answers_do_not_close_the_circuit(self, scripted):
+        """Test that a model answering only after its deadline still trips its breaker."""
+        service, _ = scripted
+        with patch.object(settings, "MODEL_FALLBACKS", {"slow": ["good"]}), \
+                patch.object(settings, "LLM_REQUEST_TIMEOUT_SECONDS", 0.05), \
+                patch.object(settings, "LLM_FIRST_TOKEN_TIMEOUT_SECONDS", 0.05):
+            assert service.generate_chat_response("hi", "ctx", "slow") == "answer from good"
+            assert list(service.generate_chat_response_stream("hi", "ctx", "slow")) == ["good", " done"]
+            # Let both stragglers return their late answers
+            time.sleep(0.6)
+        assert service.breakers.get("slow").state == CircuitBreaker.OPEN
+
+
+class TestCircuitBreaker:
+    """Test cases for the circuit breaker state machine."""
+
+    def test_half_open_admits_single_trial(self):
+        """Test that after the reset timeout one trial call decides the state."""
+        now = [0.0]
+        breaker = CircuitBreaker("m", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert not breaker.allow_request()
+
+        now[0] = 11
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow_request()
+
+    def test_released_trial_can_be_retried(self):
+        """Test that an abandoned half-open trial frees the slot for the next call."""
+        now = [0.0]
+        breaker = CircuitBreaker("m", failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 11
+        assert breaker.allow_request()
+        breaker.release_trial()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.core.metrics import (
+    GENERATION_ERRORS, LLM_STREAMS_CANCELLED, MetricsRegistry, ainstrument_stream, instrument_stream, registry,
+)
+
+
+class TestMetricsRegistry:
+    """Test cases for the Prometheus-style metrics registry."""
+
+    def test_counter_and_gauge_rendering(self):
+        """Test that counters and gauges render with their labels."""
+        reg = MetricsRegistry()
+        counter = reg.counter("test_requests_total", "Test requests.", ["result"])
+        gauge = reg.gauge("test_in_flight", "Test in-flight requests.")
+
+        counter.labels(result="hit").inc()
+        counter.labels(result="hit").inc(2)
+        gauge.labels().set(3)
+
+        output = reg.render()
+        assert "# TYPE test_requests_total counter" in output
+        assert 'test_requests_total{result="hit"} 3' in output
+        assert "test_in_flight 3" in output
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets, sum and count are rendered correctly."""
+        reg = MetricsRegistry()
+        histogram = reg.histogram("test_latency_seconds", "Test latency.", ["stage"], buckets=(0.1, 1.0))
+
+        histogram.labels(stage="embed").observe(0.05)
+        histogram.labels(stage="embed").observe(0.5)
+
+        output = reg.render()
+        assert 'test_latency_seconds_bucket{stage="embed",le="0.1"} 1' in output
+        assert 'test_latency_seconds_bucket{stage="embed",le="1"} 2' in output
+        assert 'test_latency_seconds_bucket{stage="embed",le="+Inf"} 2' in output
+        assert 'test_latency_seconds_count{stage="embed"} 2' in output
+
+    def test_wrong_labels_raise(self):
+        """Test that using undeclared labels is rejected."""
+        reg = MetricsRegistry()
+        counter = reg.counter("test_total", "Test.", ["cache"])
+        with pytest.raises(ValueError):
+            counter.labels(model="x")
+
+    def test_instrument_stream_records_first_token(self):
+        """Test that wrapping a stream records time-to-first-token and token counts."""
+        chunks = list(instrument_stream(iter(["", "Hello", " world"]), "ollama", "test-model"))
+
+        assert chunks == ["", "Hello", " world"]
+        output = registry.render()
+        assert 'llm_time_to_first_token_seconds_count{provider="ollama",model="test-model"} 1' in output
+        assert 'llm_generated_tokens_total{provider="ollama",model="test-model"} 2' in output
+
+    def test_cancelled_async_stream_is_not_an_error(self):
+        """Test that cancelling the task reading an async stream counts as a cancellation, not a provider error."""
+        cancelled = LLM_STREAMS_CANCELLED.labels(provider="ollama", model="async-model")
+        errors = GENERATION_ERRORS.labels(provider="ollama", model="async-model")
+        before = cancelled.value, errors.value
+
+        async def endless():
+            while True:
+                yield "x"
+                await asyncio.sleep(0.01)
+
+        async def consume():
+            async for _ in ainstrument_stream(endless(), "ollama", "async-model"):
+                pass
+
+        async def main():
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        assert (cancelled.value, errors.value) == (before[0] + 1, before[1])
+
+
+def test_metrics_endpoint(client):
+    """Test that /metrics is exposed in the Prometheus text format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE rag_stage_duration_seconds histogram" in response.text
@@ -0,0 +1,76 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from app.services.milvus_migration import migrate
+from app.services.vector_db_service import content_hash
+from app.services.vector_storage import VectorStorage
+
+STORAGE = VectorStorage(dim=1, model_dim=1)
+
+
+def legacy_collection(rows, batch_size):
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)] + [[]]
+    iterator = Mock()
+    iterator.next.side_effect = batches
+    source = Mock()
+    source.name = "web_content_partitioned"
+    source.schema.fields = [SimpleNamespace(name=name) for name in ("id", "url", "text", "embedding")]
+    source.query_iterator.return_value = iterator
+    return source, iterator
+
+
+class TestMigration:
+    """Test cases for copying the legacy collection into the current schema."""
+
+    def test_rows_are_copied_with_derived_metadata(self):
+        """Test that chunk indexes count per context and hashes are computed from the text."""
+        rows = [{"url": "https://a", "text": "one", "embedding": [0.1]},
+                {"url": "https://b", "text": "two", "embedding": [0.2]},
+                {"url": "https://a", "text": "three", "embedding": [0.3]}]
+        source, iterator = legacy_collection(rows, batch_size=2)
+        target = Mock(num_entities=0)
+
+        assert migrate(source, target, "mxbai-embed-large", batch_size=2, storage=STORAGE) == 3
+        inserted = [row for call in target.insert.call_args_list for row in call.args[0]]
+        assert [(r["url"], r["page_url"], r["chunk_index"]) for r in inserted] == [
+            ("https://a", "https://a", 0), ("https://b", "https://b", 0), ("https://a", "https://a", 1)]
+        assert inserted[2]["content_hash"] == content_hash("three")
+        assert {r["embedding_model"] for r in inserted} == {"mxbai-embed-large"}
+        assert source.query_iterator.call_args.kwargs["output_fields"] == ["url", "text", "embedding"]
+        iterator.close.assert_called_once()
+        target.flush.assert_called_once()
+
+    def test_chunk_indexes_count_per_page(self):
+        """Test that the pages of a crawled context each number their chunks from 0."""
+        rows = [{"url": "https://a", "page_url": "https://a/1", "text": "one", "embedding": [0.1]},
+                {"url": "https://a", "page_url": "https://a/2", "text": "two", "embedding": [0.2]},
+                {"url": "https://a", "page_url": "https://a/1", "text": "three", "embedding": [0.3]}]
+        source, _ = legacy_collection(rows, batch_size=10)
+        source.schema.fields.append(SimpleNamespace(name="page_url"))
+        target = Mock(num_entities=0)
+
+        migrate(source, target, "m", storage=STORAGE)
+        assert [(r["page_url"], r["chunk_index"]) for r in target.insert.call_args.args[0]] == [
+            ("https://a/1", 0), ("https://a/2", 0), ("https://a/1", 1)]
+
+    def test_non_empty_target_is_refused(self):
+        """Test that rows are never copied twice into the same collection."""
+        source, _ = legacy_collection([], batch_size=10)
+        with pytest.raises(RuntimeError):
+            migrate(source, Mock(num_entities=5), "m")
+        source.query_iterator.assert_not_called()
+
+    def test_texts_move_to_the_text_store(self, tmp_path):
+        """Test that with a text store the new rows get empty texts and the store gets them by new id."""
+        from app.services.text_store import TextStore
+        rows = [{"url": "https://a", "text": "one", "embedding": [0.1]},
+                {"url": "https://b", "text": "two", "embedding": [0.2]}]
+        source, _ = legacy_collection(rows, batch_size=10)
+        target = Mock(num_entities=0)
+        target.insert.return_value = SimpleNamespace(primary_keys=[11, 12])
+        texts = TextStore(str(tmp_path / "texts.sqlite3"))
+
+        migrate(source, target, "m", texts=texts, storage=STORAGE)
+        assert {row["text"] for row in target.insert.call_args.args[0]} == {""}
+        assert texts.get_many([11, 12]) == {11: "one", 12: "two"}
+        texts.close()
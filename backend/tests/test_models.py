@@ -0,0 +1,147 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+from app.core.config import Settings, ModelConfig, ModelProvider
+from app.services.model_catalog import ModelCatalog
+
+
+def make_transport(calls, models):
+    def handler(request):
+        calls.append((request.method, request.url.path))
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": list(models)})
+        if request.url.path in ("/api/pull", "/api/delete"):
+            return httpx.Response(200, json={"status": "success"})
+        return httpx.Response(404)
+    return httpx.MockTransport(handler)
+
+
+class TestModelCatalog:
+    """Test cases for the cached model catalog."""
+
+    def test_fresh_catalog_is_served_from_memory(self):
+        """Test that /api/tags is only called once while the catalog is fresh."""
+        calls = []
+        models = [{"name": "tinyllama:latest", "digest": "a", "size": 638 * 1024 * 1024}]
+        catalog = ModelCatalog(host="http://ollama", ttl=60, transport=make_transport(calls, models))
+
+        async def run():
+            first, etag1 = await catalog.get_models()
+            second, etag2 = await catalog.get_models()
+            return first, second, etag1, etag2
+
+        first, second, etag1, etag2 = asyncio.run(run())
+        assert "tinyllama:latest" in first["models"]
+        assert first is second
+        assert etag1 == etag2
+        assert calls.count(("GET", "/api/tags")) == 1
+
+    def test_stale_catalog_revalidates_in_background(self):
+        """Test that a stale catalog is served immediately and refreshed afterwards."""
+        calls = []
+        models = [{"name": "tinyllama:latest", "digest": "a"}]
+        catalog = ModelCatalog(host="http://ollama", ttl=0, transport=make_transport(calls, models))
+
+        async def run():
+            await catalog.get_models()
+            models.append({"name": "llama3.2:latest", "digest": "b"})
+            stale, _ = await catalog.get_models()
+            await catalog._refresh_task
+            fresh, _ = await catalog.get_models()
+            return stale, fresh
+
+        stale, fresh = asyncio.run(run())
+        assert "llama3.2:latest" not in stale["models"]
+        assert "llama3.2:latest" in catalog._models["models"]
+
+    def test_unchanged_tags_do_not_rebuild(self):
+        """Test that an identical tag list keeps the same catalog object."""
+        calls = []
+        catalog = ModelCatalog(host="http://ollama", ttl=60, transport=make_transport(calls, [{"name": "a:1", "digest": "x"}]))
+
+        async def run():
+            first, _ = await catalog.get_models()
+            await catalog.refresh()
+            second, _ = await catalog.get_models()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first is second
+
+    def test_delete_invalidates_catalog(self):
+        """Test that deleting a model refreshes the catalog."""
+        calls = []
+        models = [{"name": "tinyllama:latest", "digest": "a"}]
+        catalog = ModelCatalog(host="http://ollama", ttl=60, transport=make_transport(calls, models))
+
+        async def run():
+            await catalog.get_models()
+            models.clear()
+            await catalog.delete_model("tinyllama:latest")
+            return await catalog.get_models()
+
+        data, _ = asyncio.run(run())
+        assert "tinyllama:latest" not in data["models"]
+        assert ("DELETE", "/api/delete") in calls
+
+
+class TestModelRegistry:
+    """Test cases for the memoized model registry."""
+
+    def test_registry_is_memoized_and_read_only(self):
+        """Test that repeated lookups return the same immutable mapping."""
+        config = Settings(OPENAI_API_KEY="", ANTHROPIC_API_KEY="", GOOGLE_API_KEY="")
+        registry = config.available_models
+        assert config.available_models is registry
+        with pytest.raises(TypeError):
+            registry["new-model"] = ModelConfig("new-model", "New", ModelProvider.OLLAMA)
+        with pytest.raises(AttributeError):
+            next(iter(registry.values())).provider = ModelProvider.OPENAI
+
+    def test_registry_rebuilds_when_api_keys_change(self):
+        """Test that configuring an API key exposes that provider's models."""
+        config = Settings(OPENAI_API_KEY="", ANTHROPIC_API_KEY="", GOOGLE_API_KEY="")
+        before = config.available_models
+        assert "gpt-4o" not in before
+        config.OPENAI_API_KEY = "sk-test"
+        assert "gpt-4o" in config.available_models
+        assert config.available_models is not before
+
+
+    def test_client_of_a_previous_event_loop_is_closed(self):
+        """Test that a catalog used from a new event loop closes the client it made on the old one."""
+        catalog = ModelCatalog(host="http://ollama", ttl=60, transport=make_transport([], []))
+        asyncio.run(catalog.get_models())
+        old_client = catalog._client
+
+        asyncio.run(catalog.refresh())
+        assert catalog._client is not old_client
+        assert old_client.is_closed
+
+
+class TestModelsEndpoint:
+    """Test cases for the models endpoint."""
+
+    def test_models_etag_not_modified(self, client):
+        """Test that a matching If-None-Match returns 304."""
+        catalog = ModelCatalog(host="http://ollama", ttl=60, transport=make_transport([], [{"name": "tinyllama:latest"}]))
+
+        with patch('app.api.v1.endpoints.models.get_model_catalog', return_value=catalog):
+            response = client.get("/api/v1/models")
+            assert response.status_code == 200
+            assert "tinyllama:latest" in response.json()["models"]
+            etag = response.headers["etag"]
+
+            response = client.get("/api/v1/models", headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+    def test_model_management_is_disabled_by_default(self, client):
+        """Test that pulling and deleting models is refused unless MODEL_MANAGEMENT_ENABLED is set."""
+        catalog = ModelCatalog(host="http://ollama", ttl=60, transport=make_transport([], [{"name": "tinyllama:latest"}]))
+
+        with patch('app.api.v1.endpoints.models.get_model_catalog', return_value=catalog):
+            assert client.post("/api/v1/models/pull", json={"name": "tinyllama"}).status_code == 403
+            assert client.delete("/api/v1/models/tinyllama:latest").status_code == 403
+            with patch('app.api.v1.endpoints.models.settings.MODEL_MANAGEMENT_ENABLED', True):
+                assert client.delete("/api/v1/models/tinyllama:latest").status_code == 200
@@ -0,0 +1,123 @@
+import time
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import settings
+from app.core.metrics import estimate_tokens
+from app.core.timings import StageTimings
+from app.services.intelligent_rag_service import IntelligentRAGService
+from app.services.rag_stages import AlwaysRAGRouter, Reranker
+
+
+class ReverseReranker(Reranker):
+    def rerank(self, query, results):
+        return list(reversed(results))
+
+
+@pytest.fixture
+def multi_llm():
+    service = Mock()
+    service.generate_embedding.return_value = [0.1, 0.2, 0.3]
+    service.generate_chat_response.return_value = "Generated answer"
+    service.generate_chat_response_stream.return_value = iter(["Generated", " answer"])
+    return service
+
+
+class TestIntelligentRAGService:
+    """Test cases for the pluggable RAG engine."""
+
+    def test_process_query_uses_stages_and_model(self, multi_llm, mock_milvus_service):
+        """Test that the selected model and custom stages are used for the blocking path."""
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service,
+                                       router=AlwaysRAGRouter(), reranker=ReverseReranker())
+
+        result = engine.process_query("What is AI?", "https://example.com", "llama3.1:8b", top_k=2)
+
+        assert result["answer"] == "Generated answer"
+        assert result["method"] == "rag"
+        assert result["sources"][0]["text"] == "More test content from example.com"
+        assert multi_llm.generate_chat_response.call_args[1]["model"] == "llama3.1:8b"
+        assert mock_milvus_service.search.call_args[1]["top_k"] == 2
+        assert mock_milvus_service.search.call_args[1]["embedding_model"] == settings.EMBEDDING_MODEL
+
+    def test_direct_answer_skips_retrieval(self, multi_llm, mock_milvus_service):
+        """Test that the direct route never touches the retriever."""
+        router = Mock()
+        router.route.return_value = (False, "translation only")
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service, router=router)
+
+        result = engine.process_query("Translate hello", "https://example.com", "tinyllama")
+
+        assert result["method"] == "direct"
+        mock_milvus_service.search.assert_not_called()
+
+    def test_no_results_returns_not_found_message(self, multi_llm, mock_milvus_service):
+        """Test the answer when retrieval finds nothing."""
+        mock_milvus_service.search.return_value = []
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service, router=AlwaysRAGRouter())
+
+        result = engine.process_query("What is AI?", "https://example.com", "tinyllama")
+
+        assert "見つけることができませんでした" in result["answer"]
+        multi_llm.generate_chat_response.assert_not_called()
+
+    def test_process_query_stream_uses_same_stages(self, multi_llm, mock_milvus_service):
+        """Test that the streaming path runs retrieval, reranking and generation."""
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service,
+                                       router=AlwaysRAGRouter(), reranker=ReverseReranker())
+        timings = StageTimings()
+
+        chunks = list(engine.process_query_stream("What is AI?", "https://example.com", "tinyllama", timings=timings))
+
+        assert chunks[0]["type"] == "sources"
+        assert chunks[0]["sources"][0]["text"] == "More test content from example.com"
+        assert "".join(c["content"] for c in chunks[1:]) == "Generated answer"
+        assert multi_llm.generate_chat_response_stream.call_args[1]["model"] == "tinyllama"
+        assert timings.completion_tokens == estimate_tokens("Generated answer")
+
+
+    def test_stream_close_stops_generation(self, multi_llm, mock_milvus_service):
+        """Test that closing the stream early stops pulling tokens from the provider."""
+        pulled = []
+
+        def slow_tokens(**kwargs):
+            for i in range(100):
+                pulled.append(i)
+                time.sleep(0.01)
+                yield f"token{i} "
+
+        multi_llm.generate_chat_response_stream.side_effect = slow_tokens
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service, router=AlwaysRAGRouter())
+
+        stream = engine.process_query_stream("What is AI?", "https://example.com", "tinyllama")
+        assert next(stream)["type"] == "sources"
+        assert next(stream)["type"] == "content"
+        stream.close()
+
+        assert len(pulled) < 50
+
+    def test_stream_runs_through_graph_nodes(self, multi_llm, mock_milvus_service):
+        """Test that the streaming path executes the compiled graph's nodes."""
+        engine = IntelligentRAGService(multi_llm, mock_milvus_service, router=AlwaysRAGRouter())
+        engine._rerank = Mock(side_effect=lambda state: {**state, "sources": state["sources"][:1]})
+        engine.workflow = engine._create_workflow()
+
+        chunks = list(engine.process_query_stream("What is AI?", "https://example.com", "tinyllama"))
+
+        engine._rerank.assert_called_once()
+        assert len(chunks[0]["sources"]) == 1
+
+
+def test_chat_endpoint_honors_model(client):
+    """Test that the chat endpoint forwards the requested model to the engine."""
+    rag_service = Mock()
+    rag_service.process_query.return_value = {"answer": "ok", "sources": []}
+
+    with patch('app.api.v1.endpoints.chat.get_intelligent_rag_service', return_value=rag_service):
+        response = client.post("/api/v1/chat", json={
+            "query": "What is AI?",
+            "context_url": "https://example.com",
+            "model": "qwen2.5:7b"
+        })
+
+    assert response.status_code == 200
+    assert rag_service.process_query.call_args[1]["model"] == "qwen2.5:7b"
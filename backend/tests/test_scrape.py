@@ -2,6 +2,8 @@ import pytest
 from unittest.mock import patch, Mock
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.content_extraction import page_from_text
+from tests.fakes import FakeVectorStore
 
 
 class TestScrapeEndpoint:
@@ -11,7 +13,7 @@ class TestScrapeEndpoint:
         """Test successful URL scraping and processing."""
         mock_milvus_service.insert_data.return_value = 1
         
-        with patch('app.api.v1.endpoints.scrape.scrape_url', return_value="This is scraped content"), \
+        with patch('app.api.v1.endpoints.scrape.scrape_page', return_value=page_from_text("This is scraped content")), \
              patch('app.api.v1.endpoints.scrape.get_ollama_service', return_value=mock_ollama_service), \
              patch('app.api.v1.endpoints.scrape.get_milvus_service', return_value=mock_milvus_service):
             
@@ -39,7 +41,7 @@ class TestScrapeEndpoint:
 
     def test_scrape_no_content(self, client, mock_ollama_service, mock_milvus_service):
         """Test scraping when no content is found."""
-        with patch('app.api.v1.endpoints.scrape.scrape_url', return_value=""), \
+        with patch('app.api.v1.endpoints.scrape.scrape_page', return_value=None), \
              patch('app.api.v1.endpoints.scrape.get_ollama_service', return_value=mock_ollama_service), \
              patch('app.api.v1.endpoints.scrape.get_milvus_service', return_value=mock_milvus_service):
             
@@ -53,7 +55,7 @@ class TestScrapeEndpoint:
 
     def test_scrape_scraping_failure(self, client, mock_ollama_service, mock_milvus_service):
         """Test scraping when scraping service fails."""
-        with patch('app.api.v1.endpoints.scrape.scrape_url', side_effect=Exception("Network error")), \
+        with patch('app.api.v1.endpoints.scrape.scrape_page', side_effect=Exception("Network error")), \
              patch('app.api.v1.endpoints.scrape.get_ollama_service', return_value=mock_ollama_service), \
              patch('app.api.v1.endpoints.scrape.get_milvus_service', return_value=mock_milvus_service):
             
@@ -69,7 +71,7 @@ class TestScrapeEndpoint:
         """Test scraping when embedding generation fails."""
         mock_ollama_service.generate_embedding.side_effect = Exception("Embedding service down")
         
-        with patch('app.api.v1.endpoints.scrape.scrape_url', return_value="Test content"), \
+        with patch('app.api.v1.endpoints.scrape.scrape_page', return_value=page_from_text("Test content")), \
              patch('app.api.v1.endpoints.scrape.get_ollama_service', return_value=mock_ollama_service), \
              patch('app.api.v1.endpoints.scrape.get_milvus_service', return_value=mock_milvus_service):
             
@@ -85,7 +87,7 @@ class TestScrapeEndpoint:
         """Test scraping when Milvus insertion fails."""
         mock_milvus_service.insert_data.side_effect = Exception("Database connection error")
         
-        with patch('app.api.v1.endpoints.scrape.scrape_url', return_value="Test content"), \
+        with patch('app.api.v1.endpoints.scrape.scrape_page', return_value=page_from_text("Test content")), \
              patch('app.api.v1.endpoints.scrape.get_ollama_service', return_value=mock_ollama_service), \
              patch('app.api.v1.endpoints.scrape.get_milvus_service', return_value=mock_milvus_service):
             
@@ -131,4 +133,92 @@ class TestScrapeEndpoint:
             
             assert response.status_code == 503
             data = response.json()
-            assert "Milvus service is not available" in data["detail"]
\ No newline at end of file
+            assert "Milvus service is not available" in data["detail"]
+
+class TestChunkPage:
+    """Test cases for section-aware chunking."""
+
+    def test_sections_are_packed_and_split_along_headings(self):
+        """Test that small sections share a chunk and oversized ones repeat their heading path."""
+        from app.api.v1.endpoints.scrape import chunk_page
+        from app.services.content_extraction import ExtractedPage, Section
+        page = ExtractedPage("t", [
+            Section(["A"], 1, "a", ["intro"]),
+            Section(["A", "B"], 2, None, ["short"]),
+            Section(["A", "C"], 2, "c", ["x" * 60]),
+        ])
+        chunks = chunk_page(page, max_size=40, overlap=0)
+        assert chunks[0].text == "# A\n\nintro\n\n## B\n\nshort"
+        assert (chunks[0].heading_path, chunks[0].anchor) == (["A"], "a")
+        assert [c.heading_path for c in chunks[1:]] == [["A", "C"]] * (len(chunks) - 1)
+        assert all(c.text.startswith("A > C\n\n") for c in chunks[2:])
+
+
+class TestReingest:
+    """Test cases for re-ingesting a page that is already stored."""
+
+    def ingest(self, client, store, text):
+        from app.api.v1.endpoints.scrape import chunk_sections
+        ollama = Mock()
+        ollama.generate_embedding.side_effect = lambda chunk: [float(len(chunk)), 1.0]
+        with patch('app.api.v1.endpoints.scrape.scrape_page', return_value=page_from_text(text)), \
+             patch('app.api.v1.endpoints.scrape.chunk_sections', lambda sections: chunk_sections(sections, 20, 0)), \
+             patch('app.api.v1.endpoints.scrape.ollama_service', ollama), \
+             patch('app.api.v1.endpoints.scrape.milvus_service', store):
+            response = client.post("/api/v1/process-url", json={"url": "https://example.com"})
+        return response, ollama
+
+    def test_unchanged_chunks_are_kept_and_stale_ones_deleted(self, client):
+        """Test that only changed chunks are embedded and chunks the page no longer has are deleted."""
+        store = FakeVectorStore()
+        response, _ = self.ingest(client, store, "first paragraph\n\nsecond paragraph\n\nthird paragraph")
+        assert response.json()["milvus_insert_count"] == 3
+
+        response, ollama = self.ingest(client, store, "first paragraph\n\nsecond changed")
+        data = response.json()
+        assert (data["milvus_insert_count"], data["unchanged_chunks"], data["deleted_chunks"]) == (1, 1, 2)
+        assert [call.args[0] for call in ollama.generate_embedding.call_args_list] == ["second changed"]
+        assert store.count("https://example.com") == 2
+        assert sorted(c["chunk_index"] for c in store.page_chunks("https://example.com", "https://example.com")) \
+            == [0, 1]
+
+    def test_stale_chunks_survive_a_failed_reingest(self, client):
+        """Test that the previous version of a page is kept when a new chunk could not be stored."""
+        store = FakeVectorStore()
+        self.ingest(client, store, "first paragraph\n\nsecond paragraph")
+        with patch.object(store, "insert_data", return_value=0):
+            response, _ = self.ingest(client, store, "first paragraph\n\nother text here")
+        assert response.json()["deleted_chunks"] == 0
+        assert store.count("https://example.com") == 2
+
+    def test_ingest_notifies_listeners_once(self, client):
+        """Test that storing every chunk of a page invalidates the context's cached answers only once."""
+        store = FakeVectorStore()
+        listener = Mock()
+        store.add_change_listener(listener)
+        response, _ = self.ingest(client, store, "first paragraph\n\nsecond paragraph\n\nthird paragraph")
+        assert response.json()["milvus_insert_count"] == 3
+        listener.assert_called_once_with("https://example.com")
+
+        listener.reset_mock()
+        self.ingest(client, store, "first paragraph\n\nsecond paragraph\n\nthird paragraph")
+        listener.assert_not_called()
+
+    def test_ingest_records_the_chunk_stage(self, client):
+        """Test that chunking a streamed page is reported as one observation of the chunk stage."""
+        from app.core.metrics import STAGE_LATENCY
+        chunk_stage = STAGE_LATENCY.labels(stage="chunk")
+        before = chunk_stage.count
+        response, _ = self.ingest(client, FakeVectorStore(), "first paragraph\n\nsecond paragraph")
+        assert response.json()["milvus_insert_count"] == 2
+        assert chunk_stage.count == before + 1
+
+    def test_failed_chunk_lookup_aborts_the_ingest(self, client):
+        """Test that a page is not stored again when its stored chunks cannot be read."""
+        store = FakeVectorStore()
+        self.ingest(client, store, "first paragraph\n\nsecond paragraph")
+        with patch.object(store, "page_chunks", side_effect=RuntimeError("query failed")):
+            response, ollama = self.ingest(client, store, "first paragraph\n\nsecond paragraph")
+        assert response.status_code == 500
+        ollama.generate_embedding.assert_not_called()
+        assert store.count("https://example.com") == 2
@@ -0,0 +1,137 @@
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from app.core.singleflight import SingleFlight, StreamCoalescer
+
+
+class TestSingleFlight:
+    """Test cases for coalescing identical blocking calls."""
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test that callers arriving during a call reuse its result."""
+        flights = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(2)
+            return "answer"
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(flights.do, "key", work) for _ in range(3)]
+            time.sleep(0.05)
+            release.set()
+            results = [f.result(2) for f in futures]
+
+        assert len(calls) == 1
+        assert sorted(shared for _, shared in results) == [False, True, True]
+        assert all(result == "answer" for result, _ in results)
+
+    def test_errors_are_shared_and_not_cached(self):
+        """Test that followers see the leader's error and the next call runs again."""
+        flights = SingleFlight()
+        with pytest.raises(ValueError):
+            flights.do("key", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        assert flights.do("key", lambda: "ok") == ("ok", False)
+
+
+class TestStreamCoalescer:
+    """Test cases for fanning one stream out to several subscribers."""
+
+    def test_subscribers_share_one_source(self):
+        """Test that every subscriber receives every item from a single source."""
+        coalescer = StreamCoalescer()
+        pulled = []
+
+        def source():
+            for token in ["a", "b", "c"]:
+                pulled.append(token)
+                yield token
+
+        flight, first, leader = coalescer.join("key")
+        assert leader
+        flight.start(source())
+        _, second, leader2 = coalescer.join("key")
+        assert not leader2
+
+        assert list(first) == ["a", "b", "c"]
+        assert list(second) == ["a", "b", "c"]
+        assert pulled == ["a", "b", "c"]
+        assert len(coalescer) == 0
+
+    def test_stream_survives_leader_disconnect(self):
+        """Test that a follower keeps driving the stream after the leader leaves."""
+        coalescer = StreamCoalescer()
+        cleanup = []
+        flight, first, _ = coalescer.join("key")
+        flight.start(iter(["a", "b", "c"]), cleanup=lambda: cleanup.append(1))
+        _, second, _ = coalescer.join("key")
+
+        leader_stream = iter(first)
+        assert next(leader_stream) == "a"
+        leader_stream.close()
+
+        assert list(second) == ["a", "b", "c"]
+        assert cleanup == [1]
+
+    def test_last_subscriber_leaving_closes_source(self):
+        """Test that the source is closed once nobody is listening."""
+        coalescer = StreamCoalescer()
+        closed = []
+
+        def source():
+            try:
+                while True:
+                    yield "token"
+            finally:
+                closed.append(1)
+
+        flight, subscription, _ = coalescer.join("key")
+        flight.start(source())
+        stream = iter(subscription)
+        next(stream)
+        stream.close()
+
+        assert closed == [1]
+        _, _, leader = coalescer.join("key")
+        assert leader
+
+    def test_abort_fails_followers(self):
+        """Test that followers see the error when the leader could not start the stream."""
+        coalescer = StreamCoalescer()
+        flight, first, _ = coalescer.join("key")
+        _, second, _ = coalescer.join("key")
+        flight.abort(RuntimeError("rejected"))
+        with pytest.raises(RuntimeError, match="rejected"):
+            list(second)
+        first.close()
+
+
+class TestChatCoalescing:
+    """Test cases for coalescing on the chat endpoints."""
+
+    def test_identical_chat_requests_share_generation(self, client):
+        """Test that concurrent identical /chat requests run the RAG pipeline once."""
+        release = threading.Event()
+        calls = []
+
+        def slow_query(**kwargs):
+            calls.append(kwargs)
+            release.wait(2)
+            return {"answer": "shared", "sources": []}
+
+        payload = {"query": "same question", "context_url": "https://example.com"}
+        with patch("app.api.v1.endpoints.chat.get_intelligent_rag_service") as get_rag:
+            get_rag.return_value.process_query.side_effect = slow_query
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                futures = [pool.submit(client.post, "/api/v1/chat", json=payload) for _ in range(3)]
+                time.sleep(0.2)
+                release.set()
+                responses = [f.result(5) for f in futures]
+
+        assert [r.status_code for r in responses] == [200, 200, 200]
+        assert all(r.json()["answer"] == "shared" for r in responses)
+        assert len(calls) == 1
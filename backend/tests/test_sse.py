@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.core.sse import EventStreamRegistry, TooManyStreams, _coalesce, format_event, parse_last_event_id
+
+URL = "https://example.com"
+
+
+def parse_frames(body: str):
+    """Returns (event id, payload) pairs and the number of heartbeat comments."""
+    frames, heartbeats = [], 0
+    for block in body.split("\n\n"):
+        if block.startswith(": heartbeat"):
+            heartbeats += 1
+            continue
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "data" in fields:
+            frames.append((fields.get("id"), json.loads(fields["data"])))
+    return frames, heartbeats
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+class TestEventStreams:
+    """Test cases for the SSE buffer, coalescing and framing helpers."""
+
+    def test_format_and_parse_ids(self):
+        """Test that frames carry ids and that only well-formed ids are resumable."""
+        assert format_event('{"a": 1}', "abc:3") == 'id: abc:3\ndata: {"a": 1}\n\n'
+        assert parse_last_event_id("abc:3") == ("abc", 3)
+        assert parse_last_event_id("garbage") is None
+        assert parse_last_event_id(None) is None
+
+    def test_coalesce_merges_runs_of_tokens(self):
+        """Test that consecutive content events merge and keep the id of the last one."""
+        batch = [(1, {"type": "sources"}), (2, {"type": "content", "content": "a"}),
+                 (3, {"type": "content", "content": "b"}), (4, {"type": "end"})]
+        assert _coalesce(batch, 100) == [(1, {"type": "sources"}), (3, {"type": "content", "content": "ab"}),
+                                         (4, {"type": "end"})]
+        assert len(_coalesce(batch, 1)) == 4
+
+    def test_abandoned_stream_closes_its_source(self):
+        """Test that a stream nobody reads is cancelled after the grace period."""
+        closed = threading.Event()
+
+        def source():
+            try:
+                while True:
+                    yield {"type": "content", "content": "x"}
+                    time.sleep(0.01)
+            finally:
+                closed.set()
+
+        stream = EventStreamRegistry(ttl=60, grace=0.05).open(source())
+        assert closed.wait(2)
+        wait_until(lambda: stream.done)
+        assert stream.cancelled
+        assert stream.events_after(0)[0][-1][1]["type"] == "error"
+
+    def test_finished_streams_expire(self):
+        """Test that finished streams are forgotten after the resume TTL."""
+        now = [0.0]
+        registry = EventStreamRegistry(ttl=10, grace=5, clock=lambda: now[0])
+        stream = registry.open(iter([{"type": "end"}]))
+        wait_until(lambda: stream.done)
+        assert registry.get(stream.id) is stream
+        now[0] = 11
+        assert registry.get(stream.id) is None
+
+    def test_producer_threads_are_capped(self):
+        """Test that no stream is opened while the maximum number is still producing."""
+        gate = threading.Event()
+
+        def blocked():
+            gate.wait(2)
+            yield {"type": "end"}
+
+        registry = EventStreamRegistry(ttl=10, grace=5, max_streams=1)
+        stream = registry.open(blocked())
+        with pytest.raises(TooManyStreams):
+            registry.open(iter([]))
+        gate.set()
+        wait_until(lambda: stream.done)
+        registry.open(iter([]))
+
+    def test_stuck_cancelled_streams_expire(self):
+        """Test that a cancelled stream whose producer never returns is forgotten after the TTL."""
+        now = [0.0]
+        gate = threading.Event()
+
+        def stuck():
+            gate.wait(2)
+            yield {"type": "end"}
+
+        registry = EventStreamRegistry(ttl=10, grace=5, clock=lambda: now[0])
+        stream = registry.open(stuck())
+        stream.cancel()
+        assert registry.get(stream.id) is stream
+        now[0] = 11
+        assert registry.get(stream.id) is None
+        gate.set()
+
+
+class TestChatStreamSSE:
+    """Test cases for the /chat-stream SSE transport."""
+
+    @pytest.fixture
+    def rag(self):
+        with patch("app.api.v1.endpoints.chat.get_intelligent_rag_service") as get_rag:
+            yield get_rag.return_value
+
+    def test_event_stream_with_ids(self, client, rag):
+        """Test the content type, the event ids and the coalesced tokens."""
+        rag.process_query_stream.side_effect = lambda **kwargs: iter(
+            [{"type": "sources", "sources": []}] + [{"type": "content", "content": c} for c in "Hello"])
+        response = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": URL})
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text.startswith("retry: ")
+        frames, _ = parse_frames(response.text)
+        stream_id = response.headers["x-stream-id"]
+        assert [event["type"] for _, event in frames] == ["sources", "content", "end"]
+        assert frames[1][1]["content"] == "Hello"
+        assert [event_id for event_id, _ in frames] == [f"{stream_id}:1", f"{stream_id}:6", f"{stream_id}:7"]
+
+    def test_resume_with_last_event_id(self, client, rag):
+        """Test that a reconnecting client receives only the events after its Last-Event-ID."""
+        rag.process_query_stream.side_effect = lambda **kwargs: iter(
+            [{"type": "content", "content": c} for c in ["a", "b", "c"]])
+        with patch("app.core.sse.settings.SSE_COALESCE_MAX_DELAY_MS", 0), \
+                patch("app.core.sse.settings.SSE_COALESCE_MAX_CHARS", 1):
+            first = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": URL})
+            stream_id = first.headers["x-stream-id"]
+            resumed = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": URL},
+                                  headers={"Last-Event-ID": f"{stream_id}:1"})
+
+        frames, _ = parse_frames(resumed.text)
+        assert [event.get("content") for _, event in frames] == ["b", "c", None]
+        assert rag.process_query_stream.call_count == 1
+
+    def test_resume_of_unknown_stream(self, client):
+        """Test that resuming an expired stream is reported instead of starting a new one."""
+        response = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": URL},
+                               headers={"Last-Event-ID": "unknown:3"})
+        assert response.status_code == 404
+
+    def test_too_many_streams_returns_503_and_frees_the_slot(self, client, rag):
+        """Test that a request over the stream cap is rejected without keeping its admission slot."""
+        with patch("app.api.v1.endpoints.chat.event_streams.open", side_effect=TooManyStreams("full")), \
+                patch("app.api.v1.endpoints.chat.admission") as admission:
+            response = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": URL})
+        assert response.status_code == 503
+        assert admission.get.return_value.acquire.return_value.release.called
+
+    def test_heartbeats_while_waiting(self, client, rag):
+        """Test that heartbeat comments are sent while the model is silent."""
+        def slow(**kwargs):
+            time.sleep(0.3)
+            yield {"type": "content", "content": "late"}
+
+        rag.process_query_stream.side_effect = slow
+        with patch("app.core.sse.settings.SSE_HEARTBEAT_SECONDS", 0.05):
+            response = client.post("/api/v1/chat-stream", json={"query": "q", "context_url": URL})
+
+        frames, heartbeats = parse_frames(response.text)
+        assert heartbeats >= 2
+        assert frames[0][1] == {"type": "content", "content": "late"}
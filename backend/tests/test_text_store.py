@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+import pytest
+from app.services import text_store as text_store_module
+from app.services.text_store import TextStore
+from app.services.vector_db_service import MilvusService, build_schema
+from app.services.vector_storage import VectorStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TextStore(str(tmp_path / "texts" / "chunks.sqlite3"))
+    yield store
+    store.close()
+
+
+class TestTextStore:
+    """Test cases for the compressed chunk text store."""
+
+    def test_texts_round_trip_compressed(self, store):
+        """Test that texts are stored compressed and read back by id, in batches larger than SQLite's limit."""
+        texts = [(i, f"chunk {i} " + "repeated words " * 200) for i in range(1, 1201)]
+        store.put_many("https://a", texts)
+        assert store.get_many(range(0, 1202)) == dict(texts)
+        size = store._db.execute("SELECT SUM(LENGTH(data)) FROM chunks").fetchone()[0]
+        assert size * 10 < sum(len(text) for _, text in texts)
+
+    def test_zlib_without_zstandard(self, tmp_path):
+        """Test that texts are compressed with zlib when zstandard is missing and stay readable."""
+        with patch.object(text_store_module, "zstandard", None):
+            fallback = TextStore(str(tmp_path / "zlib.sqlite3"))
+            fallback.put(1, "https://a", "café")
+            assert fallback.get_many([1]) == {1: "café"}
+            fallback.close()
+
+    def test_delete_by_id_and_context(self, store):
+        """Test that chunks are deleted by id and by context URL."""
+        store.put_many("https://a", [(1, "one"), (2, "two")])
+        store.put(3, "https://b", "three")
+        assert store.delete([1, 99]) == 1
+        assert store.delete_context("https://a") == 1
+        assert store.get_many([1, 2, 3]) == {3: "three"}
+
+
+class TestMilvusServiceWithTextStore:
+    """Test cases for MilvusService keeping chunk texts in the text store."""
+
+    def service(self, store):
+        storage = VectorStorage(dim=2, model_dim=2)
+        collection = Mock()
+        collection.name = "web_content_v2"
+        collection.schema = build_schema(storage)
+        with patch("app.services.vector_db_service.connections"), \
+             patch("app.services.vector_db_service.utility.has_collection", return_value=True), \
+             patch("app.services.vector_db_service.Collection", return_value=collection):
+            return MilvusService(text_store=store, storage=storage), collection
+
+    def test_insert_keeps_text_out_of_milvus(self, store):
+        """Test that the collection row gets an empty text and the store gets the text under the row id."""
+        service, collection = self.service(store)
+        collection.insert.return_value = SimpleNamespace(primary_keys=[7], insert_count=1)
+        assert service.insert_data("https://a", "chunk text", [0.1, 0.2]) == 1
+        assert collection.insert.call_args.args[0][0]["text"] == ""
+        assert store.get_many([7]) == {7: "chunk text"}
+
+    def test_search_fetches_texts_in_bulk(self, store):
+        """Test that hit texts come from the store, and that hits without a text anywhere are dropped."""
+        service, collection = self.service(store)
+        store.put_many("https://a", [(1, "from store")])
+
+        def hit(id_, text):
+            return SimpleNamespace(id=id_, distance=0.5,
+                                   entity={"text": text, "url": "https://a", "page_url": "https://a"})
+        collection.search.return_value = [[hit(1, ""), hit(2, "still in milvus"), hit(3, "")]]
+        with patch.object(store, "get_many", wraps=store.get_many) as get_many:
+            results = service.search([0.1, 0.2], "https://a", top_k=3)
+        assert [r["text"] for r in results] == ["from store", "still in milvus"]
+        get_many.assert_called_once_with([1, 3])
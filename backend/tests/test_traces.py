@@ -0,0 +1,90 @@
+import json
+import pytest
+from app.core.tracing import Tracer, InMemorySpanExporter, FileSpanExporter, tracer
+
+
+class TestTracer:
+    """Test cases for the tracer and its exporters."""
+
+    def test_nested_spans_share_trace(self):
+        """Test that child spans get the parent's trace id and span id."""
+        exporter = InMemorySpanExporter()
+        test_tracer = Tracer(exporter)
+
+        with test_tracer.start_span("parent") as parent:
+            with test_tracer.start_span("child", {"model": "tinyllama"}):
+                pass
+
+        child, parent_span = exporter.get_finished_spans()
+        assert parent_span is parent
+        assert child.trace_id == parent.trace_id
+        assert child.parent_span_id == parent.span_id
+        assert child.attributes["model"] == "tinyllama"
+        assert child.status == "OK"
+
+    def test_exception_marks_span_as_error(self):
+        """Test that an exception is recorded on the span and re-raised."""
+        exporter = InMemorySpanExporter()
+        test_tracer = Tracer(exporter)
+
+        with pytest.raises(RuntimeError):
+            with test_tracer.start_span("failing"):
+                raise RuntimeError("boom")
+
+        span = exporter.get_finished_spans()[0]
+        assert span.status == "ERROR"
+        assert "boom" in span.status_message
+
+    def test_trace_stream_parents_nested_spans(self):
+        """Test that spans opened while a traced stream is iterated are its children."""
+        exporter = InMemorySpanExporter()
+        test_tracer = Tracer(exporter)
+
+        def tokens():
+            for token in ["a", "b"]:
+                with test_tracer.start_span("token"):
+                    pass
+                yield token
+
+        assert list(test_tracer.trace_stream(tokens(), "stream")) == ["a", "b"]
+
+        spans = exporter.get_finished_spans()
+        stream_span = spans[-1]
+        assert stream_span.name == "stream"
+        assert stream_span.attributes["items"] == 2
+        assert all(s.parent_span_id == stream_span.span_id for s in spans[:-1])
+
+    def test_file_exporter_writes_json_lines(self, tmp_path):
+        """Test that the file exporter appends one JSON object per span."""
+        path = tmp_path / "traces.jsonl"
+        test_tracer = Tracer(FileSpanExporter(str(path)))
+
+        with test_tracer.start_span("milvus.search"):
+            pass
+
+        record = json.loads(path.read_text().splitlines()[0])
+        assert record["name"] == "milvus.search"
+        assert record["durationMs"] >= 0
+
+
+class TestTracesEndpoint:
+    """Test cases for the traces endpoint."""
+
+    def test_get_traces_filters_by_name(self, client):
+        """Test that spans can be listed and filtered by name."""
+        with tracer.start_span("test.endpoint"):
+            pass
+
+        response = client.get("/api/v1/traces", params={"name": "test.endpoint"})
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) >= 1
+        assert all(span["name"] == "test.endpoint" for span in data)
+
+        trace_response = client.get(f"/api/v1/traces/{data[0]['traceId']}")
+        assert trace_response.status_code == 200
+
+    def test_get_unknown_trace(self, client):
+        """Test that an unknown trace id returns 404."""
+        response = client.get("/api/v1/traces/does-not-exist")
+        assert response.status_code == 404
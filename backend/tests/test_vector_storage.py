@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+import numpy as np
+import pytest
+from pymilvus import DataType
+from app.services.vector_db_service import (
+    MilvusService, UnsupportedMilvusVersion, build_schema, content_hash, collection_name, create_collection,
+)
+from app.services.vector_storage import VectorStorage
+
+
+def unit_vectors(count, dim, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestVectorStorage:
+    """Test cases for the embedding storage layouts."""
+
+    def test_layouts_and_collections(self):
+        """Test the field type, index, memory and collection of each layout."""
+        assert collection_name(VectorStorage()) == "web_content_v2"
+        binary = VectorStorage("binary", 512)
+        assert collection_name(binary) == "web_content_v2_binary_512"
+        assert binary.field_dtype() == DataType.BINARY_VECTOR
+        assert binary.index_params()["metric_type"] == "HAMMING"
+        assert binary.bytes_per_vector == 64
+        assert VectorStorage("int8").index_params()["index_type"] == "IVF_SQ8"
+        assert VectorStorage("float16", 256).bytes_per_vector == 512
+        with pytest.raises(ValueError):
+            VectorStorage("int4")
+        with pytest.raises(ValueError):
+            VectorStorage("binary", 100)
+
+    def test_matryoshka_truncation(self):
+        """Test that truncated embeddings keep the leading dimensions, re-normalized."""
+        storage = VectorStorage("float32", 2, 4)
+        assert storage.prepare([3.0, 4.0, 1.0, 1.0]).tolist() == pytest.approx([0.6, 0.8])
+        assert storage.encode([3.0, 4.0, 1.0, 1.0]) == pytest.approx([0.6, 0.8])
+        assert VectorStorage("float16", 2, 4).encode([3.0, 4.0, 1.0, 1.0]).dtype == np.float16
+        assert VectorStorage("binary", 8, 8).encode([1, -1, 1, -1, 1, -1, 1, -1]) == bytes([0b10101010])
+        with pytest.raises(ValueError):
+            storage.prepare([1.0])
+
+    def test_quantized_search_finds_the_nearest_vectors(self):
+        """Test that each layout finds the exact nearest neighbour of a slightly perturbed vector."""
+        vectors = unit_vectors(300, 64)
+        query = vectors[42] + 0.05 * unit_vectors(1, 64, seed=1)[0]
+        for mode in ("float32", "float16", "int8", "binary"):
+            rows, distances = VectorStorage(mode, 64, 64).exact_search(vectors, query, 3)
+            assert rows[0] == 42, mode
+            assert list(distances) == sorted(distances)
+
+
+class TestMilvusServiceStorage:
+    """Test cases for MilvusService with a binary embedding layout."""
+
+    def test_binary_candidates_are_rescored_with_cached_embeddings(self):
+        """Test that the search oversamples and ranks Hamming candidates by their cached float embeddings."""
+        storage = VectorStorage("binary", 8, 8, rescore_factor=3)
+        collection = Mock()
+        collection.name = collection_name(storage)
+        collection.schema = build_schema(storage)
+        vectors = {"near": [1, 1, 1, 1, 1, 1, 1, 0.9], "far": [1, 1, 1, 1, 1, 1, 1, 0.1]}
+        embeddings = Mock()
+        embeddings.get_many.side_effect = lambda model, digests: [
+            next(np.array(v) for text, v in vectors.items() if bytes.fromhex(content_hash(text)) == d)
+            for d in digests]
+
+        def hit(id_, text):
+            entity = {"text": text, "url": "https://a", "page_url": "https://a", "content_hash": content_hash(text),
+                      "embedding_model": "m", "embedding": [storage.encode(vectors[text])]}
+            return SimpleNamespace(id=id_, distance=0, entity=entity)
+        # Both candidates have the same bits; only the float embeddings tell them apart
+        collection.search.return_value = [[hit(1, "far"), hit(2, "near")]]
+        with patch("app.services.vector_db_service.connections"), \
+             patch("app.services.vector_db_service.utility.has_collection", return_value=True), \
+             patch("app.services.vector_db_service.Collection", return_value=collection):
+            service = MilvusService(storage=storage, embeddings=embeddings)
+
+        results = service.search([1.0] * 8, "https://a", top_k=1)
+        assert [r["text"] for r in results] == ["near"]
+        assert collection.search.call_args.kwargs["limit"] == 3
+        assert collection.search.call_args.kwargs["data"] == [bytes([0xFF])]
+        assert "embedding" in collection.search.call_args.kwargs["output_fields"]
+
+    def test_collection_is_dropped_when_an_index_fails(self):
+        """Test that a collection is never left behind without its indexes."""
+        collection = Mock()
+        collection.create_index.side_effect = [None, Exception("index type not supported")]
+        with patch("app.services.vector_db_service.Collection", return_value=collection):
+            with pytest.raises(Exception, match="not supported"):
+                create_collection("web_content_v2", VectorStorage(dim=8, model_dim=8))
+        collection.drop.assert_called_once()
+
+    def test_old_server_is_rejected_before_creating_a_collection(self):
+        """Test that Milvus 2.3, which lacks FLOAT16_VECTOR and INVERTED indexes, fails with a clear error."""
+        with patch("app.services.vector_db_service.connections"), \
+             patch("app.services.vector_db_service.utility.has_collection", return_value=False), \
+             patch("app.services.vector_db_service.utility.get_server_version", return_value="v2.3.10"), \
+             patch("app.services.vector_db_service.create_collection") as create:
+            with pytest.raises(UnsupportedMilvusVersion, match="2.4 or later"):
+                MilvusService(storage=VectorStorage("float16", 8, 8))
+        create.assert_not_called()